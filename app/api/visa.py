@@ -1,17 +1,44 @@
-from fastapi import APIRouter, HTTPException, File, UploadFile, Form
+from fastapi import APIRouter, BackgroundTasks, HTTPException, File, UploadFile, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, EmailStr, validator
 from typing import Literal, List, Optional
 from datetime import datetime
+import asyncio
 import re
-import io
-import pytesseract
-from PIL import Image
-import cv2
-import numpy as np
+import time
 from app.models.visa_application import VisaApplication
+from app.services.backfill import BackfillJob
+from app.services.blobs import (
+    IMMUTABLE_CACHE_CONTROL, content_sha256, document_blobs, document_derivatives
+)
+from app.services.concurrency import live_document_requests
+from app.services.deadlines import (
+    REQUEST_TIMEOUT_HEADER, Deadline, DeadlineExceeded, cancel_on_disconnect, record_cancellation,
+    timeout_from_header
+)
+from app.services.documents import process_document
+from app.services.ids import id_service, store_confirmation
+from app.services.photo_hashes import (
+    NEAR_DUPLICATE_MAX_DISTANCE, PhotoHashIndex, compute_photo_hashes
+)
+from app.services.scheduler import TenantQueueFull, tenant_from_headers
+from app.services.shadow import shadow_runner
+from app.services.uploads import (
+    MAX_CHUNK_SIZE, RECOMMENDED_CHUNK_SIZE, UploadNotFoundError, UploadOffsetError, upload_sessions
+)
+from app.storage.backends import open_store
+from app.storage.events import open_event_log
+from app.storage.export import ExportFilter, export_stream
+from app.storage.indexes import ApplicationIndexes
+from app.storage.remote import RemoteStore
+from app.storage.stats import ApplicationStats
 
 router = APIRouter()
 
+# Suggested wait before a tenant whose OCR queue is full tries again
+TENANT_RETRY_AFTER_SECONDS = 5
+
 # Pydantic models for request/response
 class VisaTypeRequest(BaseModel):
     visa_type: Literal["B1/B2", "F1", "H1B", "J1"]
@@ -175,6 +202,46 @@ class DocumentUploadResponse(BaseModel):
     validation_results: dict
     extracted_text: dict
 
+class PhotoDuplicatesResponse(BaseModel):
+    status: str
+    phash: str
+    max_distance: int
+    indexed_photos: int
+    matches: List[dict]
+
+class UploadSessionRequest(BaseModel):
+    application_id: str
+    document_type: Literal["passport", "photo", "supporting"]
+    filename: str
+    total_size: int
+    sha256: str
+    content_type: Optional[str] = None
+    expected_passport_number: Optional[str] = None
+
+class UploadSessionResponse(BaseModel):
+    status: str
+    state: str
+    upload_id: str
+    application_id: str
+    document_type: str
+    filename: str
+    offset: int
+    total_size: int
+    complete: bool
+    expires_at: str
+    chunk_size: int
+    max_chunk_size: int
+    validation_result: Optional[dict] = None
+    stored_application_id: Optional[str] = None
+
+class BackfillRequest(BaseModel):
+    rate: float = 1.0
+    cpu_budget: float = 0.25
+    window_start_hour: Optional[int] = 1
+    window_end_hour: Optional[int] = 6
+    dry_run: bool = False
+    restart: bool = False
+
 class InterviewAttendanceRequest(BaseModel):
     application_id: str
     status: Literal["attended", "missed"]
@@ -193,104 +260,43 @@ class InterviewAttendanceResponse(BaseModel):
     application_id: str
     interview_status: str
 
-# In-memory storage for demonstration (in production, use a database)
-visa_applications = {}
+# Application storage; in memory unless APPLICATION_STORE points at SQLite
+visa_applications = open_store()
 
-# OCR and Computer Vision Helper Functions
-def extract_text_from_image(image_bytes: bytes) -> str:
-    """Extract text from image using OCR"""
-    try:
-        # Convert bytes to PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Use pytesseract to extract text
-        extracted_text = pytesseract.image_to_string(image, config='--psm 6')
-        return extracted_text.strip()
-    except Exception as e:
-        raise ValueError(f"Failed to extract text from image: {str(e)}")
+# Lookups by passport number, email and confirmation IDs, near-duplicate
+# photo checks, and the counts behind GET /stats. A shared store server
+# keeps its own, so workers ask it
+if not isinstance(visa_applications, RemoteStore):
+    visa_applications.attach_indexes(ApplicationIndexes())
+    visa_applications.attach_photo_hashes(PhotoHashIndex())
+    visa_applications.attach_stats(ApplicationStats())
 
-def detect_face_in_image(image_bytes: bytes) -> bool:
-    """Detect if image contains a face using OpenCV"""
-    try:
-        # Convert bytes to numpy array
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if image is None:
-            raise ValueError("Could not decode image")
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Load face cascade classifier
-        face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        
-        # Detect faces
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-        
-        return len(faces) > 0
-    except Exception as e:
-        raise ValueError(f"Failed to detect face in image: {str(e)}")
+# Codes reserved at start-up are confirmed against the indexes rather than
+# kept in memory as well
+id_service.confirm = store_confirmation(visa_applications)
 
-def validate_passport_number(extracted_text: str, expected_passport_number: str) -> bool:
-    """Validate if passport number from OCR matches expected number"""
-    # Remove spaces and convert to uppercase for comparison
-    cleaned_extracted = re.sub(r'\s+', '', extracted_text.upper())
-    cleaned_expected = re.sub(r'\s+', '', expected_passport_number.upper())
-    
-    # Check if expected passport number is found in extracted text
-    return cleaned_expected in cleaned_extracted
-
-def process_document(file_content: bytes, document_type: str, expected_passport_number: str = None) -> dict:
-    """Process uploaded document with OCR and validation"""
-    result = {
-        "document_type": document_type,
-        "extracted_text": "",
-        "validation_passed": False,
-        "validation_message": ""
+# Every completed step, in order, for downstream consumers of GET /events
+event_log = open_event_log()
+
+# Most events one GET /events returns, the longest it waits for new ones,
+# and how often it checks meanwhile
+EVENT_FEED_MAX_LIMIT = 1000
+EVENT_FEED_MAX_WAIT = 30.0
+EVENT_FEED_POLL_INTERVAL = 0.05
+
+async def record_step(application_id: str, step: str, application: VisaApplication, data: dict) -> None:
+    """Append the step to the event log and wait until it is on disk"""
+    event = {
+        "time": application.updated_at,
+        "application_id": application_id,
+        "step": step,
+        "state": application.workflow_state,
+        "data": data
     }
-    
-    try:
-        if document_type == "photo":
-            # For photos, check if face is detected
-            has_face = detect_face_in_image(file_content)
-            result["validation_passed"] = has_face
-            result["validation_message"] = "Face detected in photo" if has_face else "No face detected in photo"
-            result["extracted_text"] = "Photo validation complete"
-            
-        elif document_type == "passport":
-            # For passport, extract text and validate passport number
-            extracted_text = extract_text_from_image(file_content)
-            result["extracted_text"] = extracted_text
-            
-            if expected_passport_number:
-                passport_match = validate_passport_number(extracted_text, expected_passport_number)
-                result["validation_passed"] = passport_match
-                result["validation_message"] = (
-                    f"Passport number {expected_passport_number} found in document" 
-                    if passport_match 
-                    else f"Passport number {expected_passport_number} not found in document"
-                )
-            else:
-                result["validation_passed"] = bool(extracted_text)
-                result["validation_message"] = "Text extracted from passport document"
-                
-        else:
-            # For other documents, just extract text
-            extracted_text = extract_text_from_image(file_content)
-            result["extracted_text"] = extracted_text
-            result["validation_passed"] = bool(extracted_text)
-            result["validation_message"] = "Text successfully extracted from document"
-            
-    except Exception as e:
-        result["validation_passed"] = False
-        result["validation_message"] = f"Error processing document: {str(e)}"
-        
-    return result
+    await asyncio.wrap_future(event_log.append(event))
+
+# Re-validation of stored documents after an OCR change; one job at a time
+backfill_job = None
 
 @router.post("/select_visa_type", response_model=VisaTypeResponse)
 async def select_visa_type(request: VisaTypeRequest):
@@ -306,9 +312,9 @@ async def select_visa_type(request: VisaTypeRequest):
         # Call the select_visa_type method
         message = visa_app.select_visa_type(request.visa_type)
         
-        # Store the application (in production, use database with proper session management)
-        application_id = f"app_{len(visa_applications) + 1}"
-        visa_applications[application_id] = visa_app
+        # Store the application
+        application_id = await run_in_threadpool(visa_applications.insert, "app", visa_app)
+        await record_step(application_id, "select_visa_type", visa_app, {"visa_type": request.visa_type})
         
         return VisaTypeResponse(
             status="success",
@@ -356,9 +362,9 @@ async def fill_ds160(request: DS160FormRequest):
         # Call the fill_ds160 method
         message = visa_app.fill_ds160(form_data)
         
-        # Store the application (in production, use database with proper session management)
-        application_id = f"ds160_{len(visa_applications) + 1}"
-        visa_applications[application_id] = visa_app
+        # Store the application
+        application_id = await run_in_threadpool(visa_applications.insert, "ds160", visa_app)
+        await record_step(application_id, "fill_ds160", visa_app, form_data)
         
         return DS160FormResponse(
             status="success",
@@ -406,9 +412,9 @@ async def pay_visa_fee(request: PaymentRequest):
         # Call the pay_fee method
         message = visa_app.pay_fee(payment_data)
         
-        # Store the application (in production, use database with proper session management)
-        application_id = f"payment_{len(visa_applications) + 1}"
-        visa_applications[application_id] = visa_app
+        # Store the application
+        application_id = await run_in_threadpool(visa_applications.insert, "payment", visa_app)
+        await record_step(application_id, "pay_fee", visa_app, payment_data)
         
         return {
             "status": "success",
@@ -469,9 +475,9 @@ async def schedule_interview(request: InterviewScheduleRequest):
         # Call the schedule_interview method
         message = visa_app.schedule_interview(interview_data)
         
-        # Store the application (in production, use database with proper session management)
-        application_id = f"interview_{len(visa_applications) + 1}"
-        visa_applications[application_id] = visa_app
+        # Store the application
+        application_id = await run_in_threadpool(visa_applications.insert, "interview", visa_app)
+        await record_step(application_id, "schedule_interview", visa_app, interview_data)
         
         return {
             "status": "success",
@@ -500,8 +506,58 @@ async def schedule_interview(request: InterviewScheduleRequest):
 
 
 
+async def validate_document(file_content: bytes, document_type: str, expected_passport_number: Optional[str],
+                            deadline: Deadline, tenant: str) -> dict:
+    """Run process_document off the event loop and offer the upload to shadow mode"""
+    start = time.perf_counter()
+    with live_document_requests.track():
+        result = await run_in_threadpool(
+            process_document, file_content, document_type, expected_passport_number, deadline, tenant
+        )
+    shadow_runner.submit(file_content, document_type, expected_passport_number, result, time.perf_counter() - start)
+    return result
+
+def tenant_queue_full(e: TenantQueueFull) -> HTTPException:
+    """429 telling a tenant to back off until some of its queued documents finish"""
+    return HTTPException(
+        status_code=429,
+        detail=ErrorResponse(
+            status="error",
+            message=str(e)
+        ).dict(),
+        headers={"Retry-After": str(TENANT_RETRY_AFTER_SECONDS)}
+    )
+
+def store_original(background_tasks: BackgroundTasks, file_content: bytes) -> str:
+    """Queue an upload for the content-addressed store once the response is sent; returns its sha256"""
+    sha256 = content_sha256(file_content)
+    background_tasks.add_task(document_blobs.put, file_content, sha256)
+    return sha256
+
+def failed_critical_validations(validation_results: dict) -> List[str]:
+    """The passport and photo validations that failed; either one rejects the upload"""
+    return [
+        f"{document} validation" for document in ("passport", "photo")
+        if document in validation_results and not validation_results[document].get("validation_passed", True)
+    ]
+
+async def store_documents(documents_data: dict) -> str:
+    """Store a ``documents_uploaded`` application and log the step; returns its key"""
+    visa_app = VisaApplication()
+    visa_app.upload_documents(documents_data)
+    application_key = await run_in_threadpool(visa_applications.insert, "documents", visa_app)
+    await record_step(application_key, "upload_documents", visa_app, {
+        "uploaded_documents": documents_data["uploaded_documents"],
+        "validation_passed": {
+            name: result.get("validation_passed") for name, result in documents_data["validation_results"].items()
+        }
+    })
+    return application_key
+
 @router.post("/upload_documents", response_model=DocumentUploadResponse)
 async def upload_documents(
+    request: Request,
+    background_tasks: BackgroundTasks,
     application_id: str = Form(...),
     expected_passport_number: Optional[str] = Form(None),
     passport: Optional[UploadFile] = File(None),
@@ -512,8 +568,29 @@ async def upload_documents(
     Upload and validate documents with OCR (Step 5).
     
     This endpoint handles document uploads with OCR processing and validation.
+    The request deadline comes from the X-Request-Timeout header (seconds) or
+    the route default. It bounds every OCR call, and outstanding work is
+    abandoned with a 504 once it passes or the client disconnects.
+    
+    OCR work is queued fairly per tenant, taken from the X-API-Key or
+    X-Tenant-ID header. A tenant with too many documents already waiting gets
+    a 429 with Retry-After.
     """
+    disconnect_watcher = None
     try:
+        try:
+            deadline = Deadline(timeout_from_header(request.headers.get(REQUEST_TIMEOUT_HEADER)))
+            tenant = tenant_from_headers(request.headers)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=400,
+                detail=ErrorResponse(
+                    status="error",
+                    message=str(e)
+                ).dict()
+            )
+        disconnect_watcher = asyncio.create_task(cancel_on_disconnect(request, deadline))
+        
         if not any([passport, photo, supporting_docs]):
             raise HTTPException(
                 status_code=400,
@@ -523,9 +600,6 @@ async def upload_documents(
                 ).dict()
             )
         
-        # Create a new visa application instance for this step
-        visa_app = VisaApplication()
-        
         validation_results = {}
         extracted_text = {}
         uploaded_documents = {}
@@ -535,15 +609,23 @@ async def upload_documents(
         if passport:
             try:
                 file_content = await passport.read()
-                result = process_document(file_content, "passport", expected_passport_number)
+                deadline.check("Passport processing")
+                result = await validate_document(
+                    file_content, "passport", expected_passport_number, deadline, tenant
+                )
                 validation_results["passport"] = result
                 extracted_text["passport"] = result["extracted_text"]
                 uploaded_documents["passport"] = {
                     "filename": passport.filename,
                     "content_type": passport.content_type,
-                    "size": len(file_content)
+                    "size": len(file_content),
+                    "content_sha256": store_original(background_tasks, file_content),
+                    # Kept so the passport can be re-validated later
+                    "expected_passport_number": expected_passport_number
                 }
                 documents_processed += 1
+            except (DeadlineExceeded, TenantQueueFull):
+                raise
             except Exception as e:
                 validation_results["passport"] = {
                     "document_type": "passport",
@@ -556,15 +638,19 @@ async def upload_documents(
         if photo:
             try:
                 file_content = await photo.read()
-                result = process_document(file_content, "photo")
+                deadline.check("Photo processing")
+                result = await validate_document(file_content, "photo", None, deadline, tenant)
                 validation_results["photo"] = result
                 extracted_text["photo"] = result["extracted_text"]
                 uploaded_documents["photo"] = {
                     "filename": photo.filename,
                     "content_type": photo.content_type,
-                    "size": len(file_content)
+                    "size": len(file_content),
+                    "content_sha256": store_original(background_tasks, file_content)
                 }
                 documents_processed += 1
+            except (DeadlineExceeded, TenantQueueFull):
+                raise
             except Exception as e:
                 validation_results["photo"] = {
                     "document_type": "photo",
@@ -578,16 +664,20 @@ async def upload_documents(
             for i, doc in enumerate(supporting_docs):
                 try:
                     file_content = await doc.read()
-                    result = process_document(file_content, "supporting")
+                    deadline.check("Supporting document processing")
+                    result = await validate_document(file_content, "supporting", None, deadline, tenant)
                     doc_key = f"supporting_doc_{i+1}"
                     validation_results[doc_key] = result
                     extracted_text[doc_key] = result["extracted_text"]
                     uploaded_documents[doc_key] = {
                         "filename": doc.filename,
                         "content_type": doc.content_type,
-                        "size": len(file_content)
+                        "size": len(file_content),
+                        "content_sha256": store_original(background_tasks, file_content)
                     }
                     documents_processed += 1
+                except (DeadlineExceeded, TenantQueueFull):
+                    raise
                 except Exception as e:
                     doc_key = f"supporting_doc_{i+1}"
                     validation_results[doc_key] = {
@@ -604,19 +694,9 @@ async def upload_documents(
             "extracted_text": extracted_text
         }
         
-        message = visa_app.upload_documents(documents_data)
-        
         # Check if any critical validations failed
-        passport_failed = (passport and not validation_results.get("passport", {}).get("validation_passed", True))
-        photo_failed = (photo and not validation_results.get("photo", {}).get("validation_passed", True))
-        
-        if passport_failed or photo_failed:
-            failed_docs = []
-            if passport_failed:
-                failed_docs.append("passport validation")
-            if photo_failed:
-                failed_docs.append("photo validation")
-            
+        failed_docs = failed_critical_validations(validation_results)
+        if failed_docs:
             raise HTTPException(
                 status_code=400,
                 detail=ErrorResponse(
@@ -625,9 +705,8 @@ async def upload_documents(
                 ).dict()
             )
         
-        # Store the application (in production, use database with proper session management)
-        application_key = f"documents_{len(visa_applications) + 1}"
-        visa_applications[application_key] = visa_app
+        # Store the application
+        await store_documents(documents_data)
         
         return {
             "status": "success",
@@ -639,6 +718,20 @@ async def upload_documents(
         
     except HTTPException:
         raise
+    except TenantQueueFull as e:
+        raise tenant_queue_full(e)
+    except DeadlineExceeded as e:
+        # Cancellations inside a pipeline are accounted there; this covers
+        # deadlines noticed between documents
+        if not e.recorded:
+            record_cancellation(e.reason)
+        raise HTTPException(
+            status_code=504,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -647,6 +740,9 @@ async def upload_documents(
                 message=f"Internal server error: {str(e)}"
             ).dict()
         )
+    finally:
+        if disconnect_watcher is not None:
+            disconnect_watcher.cancel()
 
 
 
@@ -670,9 +766,9 @@ async def attend_interview(request: InterviewAttendanceRequest):
         # Call the attend_interview method
         message = visa_app.attend_interview(attendance_data)
         
-        # Store the application (in production, use database with proper session management)
-        application_id = f"attendance_{len(visa_applications) + 1}"
-        visa_applications[application_id] = visa_app
+        # Store the application
+        application_id = await run_in_threadpool(visa_applications.insert, "attendance", visa_app)
+        await record_step(application_id, "attend_interview", visa_app, attendance_data)
         
         return {
             "status": "success",
@@ -698,3 +794,440 @@ async def attend_interview(request: InterviewAttendanceRequest):
             ).dict()
         )
 
+
+
+
+def find_photo_duplicates(phash: str, max_distance: int) -> dict:
+    """Query the store's perceptual-hash index and shape the response"""
+    found = visa_applications.photo_duplicates(phash, max_distance)
+    return {
+        "status": "success",
+        "phash": phash,
+        "max_distance": max_distance,
+        "indexed_photos": found["indexed_photos"],
+        "matches": found["matches"]
+    }
+
+@router.get("/photo_duplicates", response_model=PhotoDuplicatesResponse)
+async def get_photo_duplicates(phash: str, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE):
+    """
+    Find previously uploaded photos that are near-duplicates of a perceptual hash.
+    
+    The hash is the ``perceptual_hash.phash`` value reported for a photo by
+    ``/upload_documents``.
+    """
+    try:
+        return await run_in_threadpool(find_photo_duplicates, phash, max_distance)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+
+@router.post("/photo_duplicates", response_model=PhotoDuplicatesResponse)
+async def post_photo_duplicates(
+    photo: UploadFile = File(...),
+    max_distance: int = Form(NEAR_DUPLICATE_MAX_DISTANCE)
+):
+    """Find previously uploaded photos that are near-duplicates of an uploaded photo"""
+    try:
+        file_content = await photo.read()
+        hashes = compute_photo_hashes(file_content)
+        return await run_in_threadpool(find_photo_duplicates, hashes["phash"], max_distance)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+
+
+def upload_session_response(session) -> dict:
+    """Shape an upload session for the resumable-upload endpoints"""
+    return {
+        "status": "success",
+        "chunk_size": RECOMMENDED_CHUNK_SIZE,
+        "max_chunk_size": MAX_CHUNK_SIZE,
+        **session.to_dict()
+    }
+
+def upload_error(e: Exception) -> HTTPException:
+    """Map upload-session errors to HTTP errors"""
+    if isinstance(e, UploadNotFoundError):
+        status_code, message = 404, str(e)
+    elif isinstance(e, UploadOffsetError):
+        # The client resumes from the offset we actually hold
+        status_code, message = 409, f"{e} (resume from offset {e.expected_offset})"
+    else:
+        status_code, message = 400, str(e)
+    return HTTPException(
+        status_code=status_code,
+        detail=ErrorResponse(
+            status="error",
+            message=message
+        ).dict()
+    )
+
+@router.post("/uploads", response_model=UploadSessionResponse)
+async def create_upload(request: UploadSessionRequest):
+    """
+    Start a resumable upload for one document.
+    
+    The client then PUTs the file in chunks to ``/uploads/{upload_id}``,
+    resuming from the reported offset after any dropped connection, and
+    calls ``/uploads/{upload_id}/finalize`` to validate it.
+    """
+    try:
+        session = await run_in_threadpool(
+            upload_sessions.create,
+            request.application_id,
+            request.document_type,
+            request.filename,
+            request.total_size,
+            request.sha256,
+            request.content_type,
+            request.expected_passport_number
+        )
+        return upload_session_response(session)
+    except ValueError as e:
+        raise upload_error(e)
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """
+    Append the request body to an upload at ``offset``.
+    
+    An optional X-Chunk-SHA256 header is checked against the chunk before it
+    is stored. A 409 response carries the offset to resume from.
+    """
+    try:
+        chunk = await request.body()
+        session = await run_in_threadpool(
+            upload_sessions.append, upload_id, offset, chunk, request.headers.get("X-Chunk-SHA256")
+        )
+        return upload_session_response(session)
+    except (UploadNotFoundError, ValueError) as e:
+        raise upload_error(e)
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(upload_id: str):
+    """Report how much of an upload has been received"""
+    try:
+        return upload_session_response(upload_sessions.get(upload_id))
+    except UploadNotFoundError as e:
+        raise upload_error(e)
+
+@router.post("/uploads/{upload_id}/finalize", response_model=UploadSessionResponse)
+async def finalize_upload(upload_id: str, request: Request, background_tasks: BackgroundTasks):
+    """
+    Verify a complete upload, validate it and store it as ``/upload_documents`` does.
+    
+    A passport or photo that fails validation is rejected with a 400, as
+    there; the verdict stays on the session. If validation runs past the request deadline, or the tenant's OCR queue is
+    full, the session is reopened so finalize can be retried without
+    uploading again.
+    """
+    try:
+        session = upload_sessions.get(upload_id)
+        deadline = Deadline(timeout_from_header(request.headers.get(REQUEST_TIMEOUT_HEADER)))
+        tenant = tenant_from_headers(request.headers)
+        file_content = await run_in_threadpool(upload_sessions.finalize, upload_id)
+    except (UploadNotFoundError, ValueError) as e:
+        raise upload_error(e)
+    
+    try:
+        result = await validate_document(
+            file_content, session.document_type, session.expected_passport_number, deadline, tenant
+        )
+    except TenantQueueFull as e:
+        upload_sessions.reopen(upload_id)
+        raise tenant_queue_full(e)
+    except DeadlineExceeded as e:
+        upload_sessions.reopen(upload_id)
+        if not e.recorded:
+            record_cancellation(e.reason)
+        raise HTTPException(
+            status_code=504,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+    except Exception as e:
+        upload_sessions.reopen(upload_id)
+        raise HTTPException(
+            status_code=500,
+            detail=ErrorResponse(
+                status="error",
+                message=f"Internal server error: {str(e)}"
+            ).dict()
+        )
+    
+    # Stored as /upload_documents stores a single document of this type
+    document_key = "supporting_doc_1" if session.document_type == "supporting" else session.document_type
+    uploaded_document = {
+        "filename": session.filename,
+        "content_type": session.content_type,
+        "size": len(file_content),
+        # The whole-file digest was verified on finalize, so it names the original
+        "content_sha256": session.sha256
+    }
+    if session.document_type == "passport":
+        uploaded_document["expected_passport_number"] = session.expected_passport_number
+    documents_data = {
+        "uploaded_documents": {document_key: uploaded_document},
+        "validation_results": {document_key: result},
+        "extracted_text": {document_key: result.get("extracted_text", "")}
+    }
+    
+    failed_docs = failed_critical_validations(documents_data["validation_results"])
+    if failed_docs:
+        # The verdict stays readable from GET /uploads/{upload_id}
+        upload_sessions.complete(upload_id, result)
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=f"Document validation failed: {', '.join(failed_docs)}"
+            ).dict()
+        )
+    try:
+        application_key = await store_documents(documents_data)
+    except Exception as e:
+        upload_sessions.reopen(upload_id)
+        raise HTTPException(
+            status_code=500,
+            detail=ErrorResponse(
+                status="error",
+                message=f"Internal server error: {str(e)}"
+            ).dict()
+        )
+    background_tasks.add_task(document_blobs.put, file_content, session.sha256)
+    session = await run_in_threadpool(upload_sessions.complete, upload_id, result, application_key)
+    return upload_session_response(session)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers ``etag``"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+@router.get("/documents/{sha256}/{variant}")
+async def get_document_derivative(sha256: str, variant: str, request: Request):
+    """
+    Serve a thumbnail or screen preview of an uploaded document.
+    
+    Documents are addressed by the ``content_sha256`` recorded at upload.
+    Derivatives are rendered on first request and cached. Because the URL names
+    the content, responses carry a strong ETag and may be cached for a year.
+    """
+    etag = document_derivatives.etag(sha256.lower(), variant)
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    try:
+        if etag_matches(request.headers.get("if-none-match"), etag) and document_blobs.exists(sha256):
+            return Response(status_code=304, headers=headers)
+        path, etag = await run_in_threadpool(document_derivatives.get, sha256, variant)
+    except LookupError as e:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+@router.post("/admin/backfill")
+async def start_backfill(request: BackfillRequest):
+    """
+    Start re-validating stored documents in the background.
+    
+    The job resumes from its last checkpoint unless ``restart`` is set. It
+    only runs inside the off-peak window (set both hours to null to run at
+    any time), and it steps aside whenever live uploads are being validated.
+    """
+    global backfill_job
+    try:
+        if backfill_job is not None and backfill_job.running:
+            raise ValueError("Backfill is already running")
+        window = None
+        if request.window_start_hour is not None and request.window_end_hour is not None:
+            window = (request.window_start_hour, request.window_end_hour)
+        job = BackfillJob(
+            visa_applications,
+            rate=request.rate,
+            cpu_budget=request.cpu_budget,
+            window=window,
+            dry_run=request.dry_run
+        )
+        if request.restart:
+            job.reset()
+        job.start()
+        backfill_job = job
+        return {"status": "success", **job.status()}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+
+@router.get("/admin/backfill")
+async def get_backfill_status():
+    """Progress of the current or last backfill"""
+    if backfill_job is None:
+        return {"status": "success", "state": "idle", "running": False}
+    return {"status": "success", **backfill_job.status()}
+
+@router.post("/admin/backfill/stop")
+async def stop_backfill():
+    """Stop the backfill after the current document and save its checkpoint"""
+    if backfill_job is not None:
+        await run_in_threadpool(backfill_job.stop)
+    return await get_backfill_status()
+
+@router.get("/admin/backfill/report")
+async def get_backfill_report(limit: int = 100):
+    """Most recent documents whose text or verdict changed in the backfill"""
+    if backfill_job is None:
+        return {"status": "success", "changes": []}
+    changes = await run_in_threadpool(backfill_job.read_report, limit)
+    return {"status": "success", "changes": changes}
+
+# Registered before /applications/{application_id}, which would otherwise take "export" for an id
+@router.get("/applications/export")
+async def export_applications(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    visa_type: Optional[str] = None,
+    state: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    gzip: bool = False
+):
+    """
+    Stream applications as NDJSON in key order, gzip'd with ``gzip=true``.
+
+    Each line carries a ``cursor``; pass the last one received to resume.
+    Filters: ``visa_type``, workflow ``state``, and an inclusive
+    ``created_from``/``created_to`` date range (YYYY-MM-DD, UTC).
+    """
+    try:
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be at least 1")
+        filters = ExportFilter(visa_type, state, created_from, created_to)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+    headers = {"Content-Encoding": "gzip"} if gzip else None
+    return StreamingResponse(
+        export_stream(visa_applications, cursor, filters, limit, compress=gzip),
+        media_type="application/x-ndjson",
+        headers=headers
+    )
+
+@router.get("/applications/{application_id}")
+async def get_application(application_id: str):
+    """A stored application with every field recorded so far"""
+    application = await run_in_threadpool(visa_applications.get, application_id)
+    if application is None:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorResponse(
+                status="error",
+                message=f"Application '{application_id}' not found"
+            ).dict()
+        )
+    return {"status": "success", "application_id": application_id, "application": application.to_dict()}
+
+def find_applications(field: str, value: str) -> list:
+    """Applications whose indexed field matches, oldest first"""
+    found = []
+    for application_id in visa_applications.lookup(field, value):
+        application = visa_applications.get(application_id)
+        if application is not None:
+            found.append({"application_id": application_id, "application": application.to_dict()})
+    return found
+
+@router.get("/applications/lookup/{field}/{value}")
+async def lookup_applications(field: str, value: str):
+    """Applications by passport_number, email, or DS-160, payment or interview confirmation ID"""
+    try:
+        applications = await run_in_threadpool(find_applications, field, value)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+    if not applications:
+        raise HTTPException(
+            status_code=404,
+            detail=ErrorResponse(
+                status="error",
+                message=f"No applications found with {field} '{value}'"
+            ).dict()
+        )
+    return {"status": "success", "field": field, "count": len(applications), "applications": applications}
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Application counts by visa type and workflow state, payments by currency
+    and method, interviews by location and documents failing validation.
+
+    Kept current as applications are written, so this does not scan them;
+    ``reconciled_at`` and ``drift`` report the last check against a full scan.
+    """
+    stats = await run_in_threadpool(visa_applications.stats)
+    return {"status": "success", "stats": stats}
+
+@router.get("/events")
+async def get_events(cursor: int = 0, limit: int = 100, wait: float = 0):
+    """
+    Change feed of workflow step events in commit order.
+
+    Returns events from ``cursor`` (0 for the start of the log) and the
+    ``next_cursor`` to pass on the following call. With ``wait``, an
+    empty read waits up to that many seconds for new events.
+    """
+    limit = max(1, min(limit, EVENT_FEED_MAX_LIMIT))
+    deadline = time.monotonic() + max(0.0, min(wait, EVENT_FEED_MAX_WAIT))
+    try:
+        while True:
+            events, next_cursor = await run_in_threadpool(event_log.read, cursor, limit)
+            if events or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(EVENT_FEED_POLL_INTERVAL)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=ErrorResponse(
+                status="error",
+                message=str(e)
+            ).dict()
+        )
+    return {"status": "success", "events": events, "next_cursor": next_cursor}
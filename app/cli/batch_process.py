@@ -0,0 +1,240 @@
+"""
+Re-validate documents in bulk with process_document across a process pool.
+
+Usage:
+    python -m app.cli.batch_process --input scans/ --type passport --output results.jsonl
+    python -m app.cli.batch_process --manifest manifest.jsonl --output results.jsonl --workers 8
+
+A directory is walked recursively for images, which all get ``--type``. A
+manifest is JSON lines (or CSV with a header) with ``path`` and optional
+``document_type``, ``expected_passport_number`` and ``id`` columns.
+
+Results are streamed to ``--output`` as one JSON line per file, and the same
+file is the checkpoint. Re-running the same command skips every file
+already in it, so an interrupted run resumes where it stopped. A summary
+of throughput and per-stage timings is printed at the end.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+import cv2
+
+from app.services import ocr
+from app.services.deadlines import Deadline, DeadlineExceeded
+from app.services.documents import process_document
+
+DOCUMENT_TYPES = ("passport", "photo", "supporting")
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp"}
+
+
+def iter_directory(directory: str, document_type: str) -> Iterator[dict]:
+    """Tasks for every image under ``directory``, in a stable order"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                path = os.path.join(root, name)
+                yield {"id": path, "path": path, "document_type": document_type}
+
+
+def iter_manifest(manifest: str, default_type: str) -> Iterator[dict]:
+    """Tasks from a JSON-lines or CSV manifest; relative paths are resolved against it"""
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline="", encoding="utf-8") as f:
+        if manifest.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if not row.get("path"):
+                raise ValueError(f"Manifest row without a path: {row}")
+            document_type = row.get("document_type") or default_type
+            if document_type not in DOCUMENT_TYPES:
+                raise ValueError(f"Unknown document type '{document_type}' for {row['path']}")
+            yield {
+                "id": row.get("id") or row["path"],
+                "path": os.path.join(base, row["path"]),
+                "document_type": document_type,
+                "expected_passport_number": row.get("expected_passport_number") or None,
+            }
+
+
+def load_checkpoint(output: str) -> Set[str]:
+    """
+    Ids already in the output file.
+
+    A line cut short by a crash is truncated away so the file stays valid
+    JSON lines when the run resumes appending to it.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    good_until = 0
+    with open(output, "rb") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                break
+            good_until += len(line)
+    if good_until != os.path.getsize(output):
+        with open(output, "r+b") as f:
+            f.truncate(good_until)
+    return done
+
+
+def init_worker() -> None:
+    """Keep each worker process single-threaded; the pool is the parallelism"""
+    cv2.setNumThreads(1)
+    ocr.REGION_OCR_WORKERS = 1
+
+
+def process_task(task: dict, timeout: Optional[float] = None) -> dict:
+    """Run one file through process_document and shape its result line"""
+    record = {"id": task["id"], "path": task["path"], "document_type": task["document_type"]}
+    start = time.perf_counter()
+    try:
+        with open(task["path"], "rb") as f:
+            content = f.read()
+        record["size"] = len(content)
+        record["content_sha256"] = hashlib.sha256(content).hexdigest()
+        deadline = Deadline(timeout) if timeout else None
+        result = process_document(content, task["document_type"], task.get("expected_passport_number"), deadline)
+        record["validation_passed"] = result["validation_passed"]
+        record["result"] = result
+    except (OSError, DeadlineExceeded) as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return record
+
+
+class _TaskRunner:
+    """Picklable wrapper so pool workers get the per-document timeout"""
+
+    def __init__(self, timeout: Optional[float]):
+        self.timeout = timeout
+
+    def __call__(self, task: dict) -> dict:
+        return process_task(task, self.timeout)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class BatchReport:
+    """Running totals for the end-of-run summary"""
+
+    def __init__(self):
+        self.processed = 0
+        self.passed = 0
+        self.errors = 0
+        self.bytes = 0
+        self.stage_timings: Dict[str, List[float]] = {}
+        self.started = time.perf_counter()
+
+    def add(self, record: dict) -> None:
+        self.processed += 1
+        self.bytes += record.get("size", 0)
+        if "error" in record:
+            self.errors += 1
+            return
+        self.passed += bool(record["validation_passed"])
+        for stage, elapsed_ms in record["result"].get("stage_timings_ms", {}).items():
+            self.stage_timings.setdefault(stage, []).append(elapsed_ms)
+
+    def format(self, skipped: int) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.processed / elapsed if elapsed else 0.0
+        lines = [
+            f"processed {self.processed} files in {elapsed:.1f}s "
+            f"({rate:.2f} files/s, {self.bytes / (1024 * 1024) / elapsed if elapsed else 0:.2f} MB/s)",
+            f"  passed {self.passed}, failed {self.processed - self.passed - self.errors}, "
+            f"errors {self.errors}, skipped (already done) {skipped}",
+        ]
+        if self.stage_timings:
+            lines.append(f"  {'stage':24s} {'count':>7s} {'mean ms':>9s} {'p95 ms':>9s} {'total s':>9s}")
+            ranked = sorted(self.stage_timings.items(), key=lambda item: -sum(item[1]))
+            for stage, timings in ranked:
+                lines.append(
+                    f"  {stage:24s} {len(timings):7d} {sum(timings) / len(timings):9.1f} "
+                    f"{percentile(timings, 0.95):9.1f} {sum(timings) / 1000:9.1f}"
+                )
+        return "\n".join(lines)
+
+
+def run_batch(tasks: Iterable[dict], output: str, workers: int, timeout: Optional[float] = None,
+              max_files: Optional[int] = None, progress_every: int = 100, log=sys.stderr) -> BatchReport:
+    """Process every task not already in ``output``, appending results as they finish"""
+    done = load_checkpoint(output)
+    skipped = 0
+
+    def pending() -> Iterator[dict]:
+        nonlocal skipped
+        queued = 0
+        for task in tasks:
+            if task["id"] in done:
+                skipped += 1
+                continue
+            if max_files is not None and queued >= max_files:
+                return
+            queued += 1
+            yield task
+
+    report = BatchReport()
+    runner = _TaskRunner(timeout)
+    # Spawn rather than fork: a forked child inherits thread pools (ours and
+    # OpenCV's) whose threads do not exist in it, and hangs on first use
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(workers, initializer=init_worker) if workers > 0 else None
+    try:
+        results = pool.imap_unordered(runner, pending()) if pool else map(runner, pending())
+        with open(output, "a", encoding="utf-8") as f:
+            for record in results:
+                # One flushed line per document is the checkpoint
+                f.write(json.dumps(record, default=str) + "\n")
+                f.flush()
+                report.add(record)
+                if progress_every and report.processed % progress_every == 0:
+                    print(f"... {report.processed} processed", file=log, flush=True)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    print(report.format(skipped), file=log)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="directory of document images")
+    source.add_argument("--manifest", help="JSON-lines or CSV manifest of documents")
+    parser.add_argument("--type", choices=DOCUMENT_TYPES, default="supporting",
+                        help="document type for --input, and the manifest default")
+    parser.add_argument("--output", required=True, help="JSON-lines results file, also used to resume")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 processes inline")
+    parser.add_argument("--timeout", type=float, default=None, help="per-document deadline in seconds")
+    parser.add_argument("--max-files", type=int, default=None, help="stop after this many new files")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        tasks = iter_directory(args.input, args.type)
+    else:
+        tasks = iter_manifest(args.manifest, args.type)
+    report = run_batch(tasks, args.output, args.workers, timeout=args.timeout, max_files=args.max_files)
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
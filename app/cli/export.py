@@ -0,0 +1,135 @@
+"""
+Export applications from a store as NDJSON, optionally gzip'd.
+
+Usage:
+    python -m app.cli.export --store sqlite:applications.db --output applications.ndjson.gz
+    python -m app.cli.export --store unix:/run/visa/store.sock --output f1.ndjson --visa-type F1 --state issued
+
+Applications are written in key order, one JSON line each, in the same
+format as GET /api/v1/applications/export. Output ending in ``.gz`` is
+gzip'd. Memory stays flat however many applications there are: SQLite
+and store servers are read a page at a time.
+
+The output file is the checkpoint. If it already exists, the export
+resumes after the last application in it, first cutting off a line (or,
+gzip'd, a chunk) the previous run did not finish. Gzip'd output is written
+as one gzip member per chunk, which gzip readers treat as one stream. Use
+the same filters when resuming.
+
+Point ``--store`` at a running store server (``unix:``) to export from a
+live deployment; opening a ``snapshot:`` directory that a server is using
+would start a second writer on it.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from app.storage.backends import open_store
+from app.storage.export import EXPORT_GZIP_LEVEL, ExportFilter, export_stream
+
+
+def gzip_checkpoint(path: str) -> Tuple[int, Optional[bytes]]:
+    """(end offset of the last complete gzip member, last line in it); members hold whole lines"""
+    end = 0
+    last = None
+    offset = 0
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    member_last = None
+    pending = b""
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(1 << 20)
+            if not data:
+                break
+            while data:
+                try:
+                    output = decompressor.decompress(data)
+                except zlib.error:
+                    return end, last
+                text = pending + output
+                cut = text.rfind(b"\n")
+                if cut >= 0:
+                    member_last = text[text.rfind(b"\n", 0, cut) + 1:cut + 1]
+                    pending = text[cut + 1:]
+                else:
+                    pending = text
+                if not decompressor.eof:
+                    offset += len(data)
+                    break
+                offset += len(data) - len(decompressor.unused_data)
+                end = offset
+                last = member_last or last
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                member_last = None
+                pending = b""
+    return end, last
+
+
+def last_cursor(path: str) -> Optional[str]:
+    """Cursor of the last application in an earlier export, first cutting off anything written incompletely"""
+    if not os.path.exists(path):
+        return None
+    if path.endswith(".gz"):
+        complete, last = gzip_checkpoint(path)
+    else:
+        complete = 0
+        last = None
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                complete += len(line)
+                last = line
+    if complete < os.path.getsize(path):
+        os.truncate(path, complete)
+    return json.loads(last)["cursor"] if last else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--store", required=True,
+                        help="store to read: sqlite:<path>, tiered:<path>, snapshot:<directory> or unix:<socket>")
+    parser.add_argument("--output", required=True, help="NDJSON file (.gz to compress), also used to resume")
+    parser.add_argument("--visa-type", help="only this visa type, e.g. F1")
+    parser.add_argument("--state", help="only this workflow state, e.g. issued")
+    parser.add_argument("--created-from", help="first creation date to include, YYYY-MM-DD (UTC)")
+    parser.add_argument("--created-to", help="last creation date to include, YYYY-MM-DD (UTC)")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many applications")
+    args = parser.parse_args(argv)
+
+    try:
+        filters = ExportFilter(args.visa_type, args.state, args.created_from, args.created_to)
+    except ValueError as e:
+        parser.error(str(e))
+    cursor = last_cursor(args.output)
+    if cursor is not None:
+        print(f"Resuming after {cursor}", file=sys.stderr)
+
+    compress = args.output.endswith(".gz")
+    store = open_store(args.store)
+    start = time.perf_counter()
+    written = 0
+    try:
+        with open(args.output, "ab") as f:
+            for chunk in export_stream(store, cursor, filters, args.limit):
+                # Each chunk is its own gzip member, so an interrupted
+                # export can be cut back to its last complete one
+                if compress:
+                    chunk = gzip.compress(chunk, EXPORT_GZIP_LEVEL)
+                f.write(chunk)
+                f.flush()
+                written += len(chunk)
+    finally:
+        store.close()
+    print(f"Wrote {written} bytes to {args.output} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,51 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.api.visa import router as visa_router
+from fastapi.concurrency import run_in_threadpool
+from app.api.visa import event_log, router as visa_router, visa_applications
+from app.services import metrics
+from app.services.blobs import collect_originals, document_blobs, document_derivatives
+from app.services.ids import id_service
+from app.services.shadow import shadow_runner
+from app.storage.lifecycle import ExpiryJanitor
+from app.storage.remote import RemoteStore
+from app.storage.stats import StatsReconciler
+
+# Purges applications past their workflow state's TTL, then the uploaded
+# originals no remaining application refers to. With a shared store server
+# the server runs it, not every worker
+application_janitor = ExpiryJanitor(
+    visa_applications,
+    after_sweep=lambda: collect_originals(visa_applications, document_blobs, document_derivatives)
+)
+
+# Checks the incrementally kept stats against a full scan now and then
+stats_reconciler = StatsReconciler(visa_applications)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Codes already held by stored applications must never be issued again.
+    # Read as an ordered scan, which store servers and SQLite serve in pages
+    # and which leaves a tiered store's memory tier alone
+    await run_in_threadpool(
+        id_service.reserve_existing, (application for _, application in visa_applications.iter_sorted())
+    )
+    if not isinstance(visa_applications, RemoteStore):
+        application_janitor.start()
+        stats_reconciler.start()
+    yield
+    application_janitor.stop()
+    stats_reconciler.stop()
+    # Commit queued step events
+    event_log.close()
+    # Commit buffered application writes before the process exits
+    visa_applications.close()
 
 app = FastAPI(
     title="U.S. Visa Application API",
     description="A comprehensive API for processing U.S. visa applications",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Include visa-related routes
@@ -18,4 +59,18 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "visa-application-api"}
\ No newline at end of file
+    return {"status": "healthy", "service": "visa-application-api"}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Service metrics: counters, gauges and count/sum/max summaries"""
+    return metrics.snapshot()
+
+@app.get("/shadow_report")
+async def get_shadow_report():
+    """Agreement between live and candidate document pipelines from shadow mode"""
+    return {
+        "enabled": shadow_runner.enabled,
+        "sample_rate": shadow_runner.sample_rate,
+        "summary": await run_in_threadpool(shadow_runner.store.summary)
+    }
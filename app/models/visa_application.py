@@ -1,54 +1,288 @@
+import sys
+import time
+
+from app.services.ids import id_service
+
+
+def plain_copy(value):
+    """Copy nested dicts and lists of plain values; much cheaper than deepcopy"""
+    if isinstance(value, dict):
+        return {key: plain_copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain_copy(item) for item in value]
+    return value
+
+
+# Every field, in the order to_dict writes them
+FIELDS = (
+    "visa_type", "admission_letter", "job_offer", "sponsor_letter", "documents", "ds160_form_data",
+    "ds160_confirmation_id", "payment_amount", "payment_confirmation_id", "appointment",
+    "biometrics_confirmation_id", "interview_result", "processing_status", "visa_number",
+    "full_name", "passport_number", "dob", "nationality", "email",
+    "fee_amount", "fee_currency", "payment_method", "transaction_id", "payment_status", "payment_data",
+    "interview_location", "interview_date", "interview_confirmation_id", "interview_data",
+    "uploaded_documents", "document_validation_results", "extracted_text",
+    "interview_attendance_status", "interview_attended", "attendance_data", "created_at", "updated_at",
+)
+FIELD_NAMES = frozenset(FIELDS)
+
+# Values of VisaApplication.workflow_state, in workflow order
+WORKFLOW_STATES = (
+    "draft", "ds160_submitted", "paid", "interview_scheduled", "documents_uploaded", "interview_attended",
+    "interview_missed", "issued", "denied",
+)
+
+# Fields holding a dict; a fresh one is the default, created on first access
+DICT_FIELDS = frozenset({
+    "documents", "ds160_form_data", "payment_data", "interview_data", "uploaded_documents",
+    "document_validation_results", "extracted_text", "attendance_data",
+})
+
+# Defaults other than None (and {} for DICT_FIELDS)
+FIELD_DEFAULTS = {"admission_letter": False, "job_offer": False, "sponsor_letter": False,
+                  "payment_amount": 0.0, "interview_attended": False}
+
+# Enum-like values repeated across every application; interned on assignment
+# so each distinct value is held once however many applications share it
+INTERNED_FIELDS = frozenset({
+    "visa_type", "processing_status", "interview_result", "nationality", "fee_currency", "payment_method",
+    "payment_status", "interview_location", "interview_attendance_status",
+})
+
+
+def field_default(name: str):
+    return {} if name in DICT_FIELDS else FIELD_DEFAULTS.get(name)
+
+
+def intern_value(value):
+    """The interned copy of a string, so equal values share one object; anything else unchanged"""
+    return sys.intern(value) if type(value) is str else value
+
+
+class StepRecord:
+    """The fields of one workflow step, created the first time the step is touched"""
+
+    __slots__ = ()
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, field_default(name))
+
+
+class DS160Record(StepRecord):
+    __slots__ = ("ds160_form_data", "ds160_confirmation_id", "full_name", "passport_number", "dob",
+                 "nationality", "email")
+
+
+class PaymentRecord(StepRecord):
+    __slots__ = ("payment_amount", "payment_confirmation_id", "fee_amount", "fee_currency", "payment_method",
+                 "transaction_id", "payment_status", "payment_data")
+
+
+class InterviewRecord(StepRecord):
+    __slots__ = ("appointment", "biometrics_confirmation_id", "interview_result", "interview_location",
+                 "interview_date", "interview_confirmation_id", "interview_data")
+
+
+class DocumentsRecord(StepRecord):
+    __slots__ = ("documents", "uploaded_documents", "document_validation_results", "extracted_text")
+
+
+class AttendanceRecord(StepRecord):
+    __slots__ = ("interview_attendance_status", "interview_attended", "attendance_data")
+
+
+class StepField:
+    """
+    An application attribute kept in the record of its workflow step.
+
+    Reading a scalar of a step that was never touched returns its default
+    without creating anything; setting a field, or reading a dict field
+    (which callers may fill in place), creates the record.
+    """
+
+    def __init__(self, record_slot: str, record_class: type):
+        self.record_slot = record_slot
+        self.record_class = record_class
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.interned = name in INTERNED_FIELDS
+        self.is_dict = name in DICT_FIELDS
+        self.default = FIELD_DEFAULTS.get(name)
+
+    def record(self, application, create: bool):
+        record = getattr(application, self.record_slot)
+        if record is None and create:
+            record = self.record_class()
+            setattr(application, self.record_slot, record)
+        return record
+
+    def __get__(self, application, owner=None):
+        if application is None:
+            return self
+        record = self.record(application, create=self.is_dict)
+        if record is None:
+            return self.default
+        return getattr(record, self.name)
+
+    def __set__(self, application, value):
+        setattr(self.record(application, create=True), self.name, intern_value(value) if self.interned else value)
+
+
+class InternedField:
+    """A top-level attribute whose string values are interned; stored in the slot ``_<name>``"""
+
+    def __set_name__(self, owner, name):
+        self.slot = f"_{name}"
+
+    def __get__(self, application, owner=None):
+        if application is None:
+            return self
+        return getattr(application, self.slot)
+
+    def __set__(self, application, value):
+        setattr(application, self.slot, intern_value(value))
+
+
 class VisaApplication:
     """
     A class to simulate the U.S. visa application process step by step.
+
+    Kept compact for large in-memory populations: attributes live in
+    ``__slots__``, fields belonging to one workflow step (DS-160, payment,
+    interview, documents, attendance) sit in a small record created only when
+    that step is touched, and enum-like strings are interned. Every field in
+    FIELDS still reads and writes as a plain attribute.
     """
-    
+
+    __slots__ = ("_visa_type", "admission_letter", "job_offer", "sponsor_letter", "_processing_status",
+                 "visa_number", "created_at", "updated_at", "_ds160", "_payment", "_interview", "_documents",
+                 "_attendance")
+
+    visa_type = InternedField()
+    processing_status = InternedField()
+
+    # DS-160 specific fields
+    ds160_form_data = StepField("_ds160", DS160Record)
+    ds160_confirmation_id = StepField("_ds160", DS160Record)
+    full_name = StepField("_ds160", DS160Record)
+    passport_number = StepField("_ds160", DS160Record)
+    dob = StepField("_ds160", DS160Record)
+    nationality = StepField("_ds160", DS160Record)
+    email = StepField("_ds160", DS160Record)
+
+    # Payment specific fields
+    payment_amount = StepField("_payment", PaymentRecord)
+    payment_confirmation_id = StepField("_payment", PaymentRecord)
+    fee_amount = StepField("_payment", PaymentRecord)
+    fee_currency = StepField("_payment", PaymentRecord)
+    payment_method = StepField("_payment", PaymentRecord)
+    transaction_id = StepField("_payment", PaymentRecord)
+    payment_status = StepField("_payment", PaymentRecord)
+    payment_data = StepField("_payment", PaymentRecord)
+
+    # Interview specific fields
+    appointment = StepField("_interview", InterviewRecord)
+    biometrics_confirmation_id = StepField("_interview", InterviewRecord)
+    interview_result = StepField("_interview", InterviewRecord)
+    interview_location = StepField("_interview", InterviewRecord)
+    interview_date = StepField("_interview", InterviewRecord)
+    interview_confirmation_id = StepField("_interview", InterviewRecord)
+    interview_data = StepField("_interview", InterviewRecord)
+
+    # Document specific fields
+    documents = StepField("_documents", DocumentsRecord)
+    uploaded_documents = StepField("_documents", DocumentsRecord)
+    document_validation_results = StepField("_documents", DocumentsRecord)
+    extracted_text = StepField("_documents", DocumentsRecord)
+
+    # Interview attendance specific fields
+    interview_attendance_status = StepField("_attendance", AttendanceRecord)
+    interview_attended = StepField("_attendance", AttendanceRecord)
+    attendance_data = StepField("_attendance", AttendanceRecord)
+
     def __init__(self):
-        self.visa_type = None
+        self._visa_type = None
         self.admission_letter = False
         self.job_offer = False
         self.sponsor_letter = False
-        self.documents = {}
-        self.ds160_form_data = {}
-        self.ds160_confirmation_id = None
-        self.payment_amount = 0.0
-        self.payment_confirmation_id = None
-        self.appointment = None
-        self.biometrics_confirmation_id = None
-        self.interview_result = None
-        self.processing_status = None
+        self._processing_status = None
         self.visa_number = None
-        
-        # DS-160 specific fields
-        self.full_name = None
-        self.passport_number = None
-        self.dob = None
-        self.nationality = None
-        self.email = None
-        
-        # Payment specific fields
-        self.fee_amount = None
-        self.fee_currency = None
-        self.payment_method = None
-        self.transaction_id = None
-        self.payment_status = None
-        self.payment_data = {}
-        
-        # Interview specific fields
-        self.interview_location = None
-        self.interview_date = None
-        self.interview_confirmation_id = None
-        self.interview_data = {}
-        
-        # Document specific fields
-        self.uploaded_documents = {}
-        self.document_validation_results = {}
-        self.extracted_text = {}
-        
-        # Interview attendance specific fields
-        self.interview_attendance_status = None
-        self.interview_attended = False
-        self.attendance_data = {}
+        # Epoch seconds; updated_at moves whenever a workflow step runs
+        self.created_at = self.updated_at = time.time()
+        self._ds160 = None
+        self._payment = None
+        self._interview = None
+        self._documents = None
+        self._attendance = None
+    
+    def to_dict(self) -> dict:
+        """Plain-data copy of every field, for storage; reading does not create step records"""
+        data = {}
+        for name, record_slot in FIELD_LOCATIONS:
+            if record_slot is None:
+                data[name] = plain_copy(getattr(self, name))
+                continue
+            record = getattr(self, record_slot)
+            data[name] = plain_copy(getattr(record, name)) if record is not None else field_default(name)
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "VisaApplication":
+        """Rebuild an application saved with to_dict; unknown fields are ignored, defaults create nothing"""
+        application = cls()
+        # Records saved before timestamps existed have no known age
+        application.created_at = application.updated_at = None
+        for name, value in data.items():
+            restore = FIELD_RESTORE.get(name)
+            if restore is None:
+                continue
+            default, record_slot, record_class, attribute, interned = restore
+            if value == default:
+                continue
+            if interned:
+                value = intern_value(value)
+            if record_slot is None:
+                setattr(application, attribute, value)
+                continue
+            record = getattr(application, record_slot)
+            if record is None:
+                record = record_class()
+                setattr(application, record_slot, record)
+            setattr(record, attribute, value)
+        return application
+    
+    def touch(self) -> None:
+        """Record activity now"""
+        self.updated_at = time.time()
+    
+    def peek_field(self, name: str):
+        """``name``'s value without creating its step record; an untouched dict field reads as a detached ``{}``"""
+        descriptor = type(self).__dict__.get(name)
+        if not isinstance(descriptor, StepField):
+            return getattr(self, name)
+        record = getattr(self, descriptor.record_slot)
+        return getattr(record, name) if record is not None else field_default(name)
+    
+    @property
+    def workflow_state(self) -> str:
+        """The furthest workflow step this application reached, e.g. ``draft`` or ``paid``"""
+        if self.visa_number:
+            return "issued"
+        if self._processing_status == "Visa Denied":
+            return "denied"
+        if self._attendance is not None and self._attendance.interview_attendance_status:
+            return "interview_attended" if self._attendance.interview_attended else "interview_missed"
+        if self._documents is not None and self._documents.uploaded_documents:
+            return "documents_uploaded"
+        if self.interview_confirmation_id:
+            return "interview_scheduled"
+        if self.payment_confirmation_id:
+            return "paid"
+        if self.ds160_confirmation_id:
+            return "ds160_submitted"
+        return "draft"
     
     def select_visa_type(self, visa_type):
         """Select the appropriate visa type (B-1/B-2, F-1, H-1B, etc.)"""
@@ -61,6 +295,7 @@ class VisaApplication:
             raise ValueError(f"Invalid visa type '{visa_type}'. Valid types are: {', '.join(valid_visa_types)}")
         
         self.visa_type = visa_type
+        self.touch()
         return f"Visa type '{visa_type}' selected successfully"
     
     def check_eligibility(self):
@@ -73,9 +308,6 @@ class VisaApplication:
     
     def fill_ds160(self, form_data: dict):
         """Fill out the DS-160 online application form"""
-        import random
-        import string
-        
         # Store form data
         self.full_name = form_data.get("full_name")
         self.passport_number = form_data.get("passport_number")
@@ -88,15 +320,13 @@ class VisaApplication:
         
         # Generate DS-160 confirmation ID
         if not self.ds160_confirmation_id:
-            self.ds160_confirmation_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+            self.ds160_confirmation_id = id_service.issue("ds160")
         
+        self.touch()
         return f"DS-160 form submitted successfully. Confirmation ID: {self.ds160_confirmation_id}"
     
     def pay_fee(self, payment_data: dict):
         """Pay the visa application fee"""
-        import random
-        import string
-        
         # Store payment data
         self.payment_data = payment_data.copy()
         self.fee_amount = payment_data.get("amount")
@@ -107,15 +337,13 @@ class VisaApplication:
         
         # Generate payment confirmation ID if not already exists
         if not self.payment_confirmation_id:
-            self.payment_confirmation_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+            self.payment_confirmation_id = id_service.issue("payment")
         
+        self.touch()
         return f"Visa fee payment of {self.fee_amount} {self.fee_currency} processed successfully. Payment ID: {self.payment_confirmation_id}"
     
     def schedule_interview(self, interview_data: dict):
         """Schedule a visa interview at the U.S. embassy or consulate"""
-        import random
-        import string
-        
         # Store interview data
         self.interview_data = interview_data.copy()
         self.interview_location = interview_data.get("location")
@@ -123,8 +351,9 @@ class VisaApplication:
         
         # Generate interview confirmation ID if not already exists
         if not self.interview_confirmation_id:
-            self.interview_confirmation_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+            self.interview_confirmation_id = id_service.issue("interview")
         
+        self.touch()
         return f"Interview scheduled successfully for {self.interview_date} at {self.interview_location}. Confirmation ID: {self.interview_confirmation_id}"
     
     def upload_documents(self, documents_data: dict):
@@ -139,6 +368,7 @@ class VisaApplication:
                                    if result.get("validation_passed", False))
         total_documents = len(self.document_validation_results)
         
+        self.touch()
         return f"Documents uploaded and validated: {successful_validations}/{total_documents} validations passed"
     
     def attend_interview(self, attendance_data: dict):
@@ -147,6 +377,7 @@ class VisaApplication:
         self.attendance_data = attendance_data.copy()
         self.interview_attendance_status = attendance_data.get("status")
         self.interview_attended = (attendance_data.get("status") == "attended")
+        self.touch()
         
         if self.interview_attended:
             return f"Interview attendance marked as 'attended' for application {attendance_data.get('application_id', 'N/A')}"
@@ -171,4 +402,21 @@ class VisaApplication:
     
     def issue_visa(self):
         """Final visa issuance or denial"""
-        pass
\ No newline at end of file
+        pass
+
+
+# (field, slot of the step record holding it, or None for top-level fields)
+FIELD_LOCATIONS = tuple((name, getattr(VisaApplication.__dict__[name], "record_slot", None)) for name in FIELDS)
+
+
+def restore_plan(name: str, record_slot) -> tuple:
+    """(default, record slot or None, record class, attribute to set, whether to intern) for ``name``"""
+    descriptor = VisaApplication.__dict__[name]
+    attribute = descriptor.slot if isinstance(descriptor, InternedField) else name
+    return (field_default(name), record_slot, getattr(descriptor, "record_class", None), attribute,
+            name in INTERNED_FIELDS)
+
+
+# How from_dict restores each field, setting slots directly rather than
+# going through the descriptors
+FIELD_RESTORE = {name: restore_plan(name, record_slot) for name, record_slot in FIELD_LOCATIONS}
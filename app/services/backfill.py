@@ -0,0 +1,305 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from functools import partial
+from datetime import datetime
+from typing import Callable, Iterator, Optional, Tuple
+
+from app.services import metrics
+from app.services.blobs import BlobStore, document_blobs
+from app.services.concurrency import ActivityTracker, live_document_requests
+from app.services.documents import process_document
+from app.services.scheduler import BACKFILL_TENANT
+from app.services.shadow import text_similarity
+from app.storage.base import ApplicationStore
+
+BACKFILL_DIR = os.environ.get("BACKFILL_DIR", "backfill")
+
+# Defaults: one document a second, busy at most a quarter of the time, only
+# between 01:00 and 06:00 local time
+BACKFILL_RATE = 1.0
+BACKFILL_CPU_BUDGET = 0.25
+BACKFILL_WINDOW = (1, 6)
+
+# Live uploads must have been quiet this long before the next document starts
+LIVE_TRAFFIC_QUIET_SECONDS = 2.0
+
+CHECKPOINT_EVERY = 10
+
+# How long the job sleeps between checks while it waits for the window or for
+# live traffic to go quiet
+IDLE_POLL_INTERVAL = 1.0
+
+
+def natural_key(text: str):
+    """Sort ``documents_10`` after ``documents_9``"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', text)]
+
+
+def in_window(hour: int, window: Optional[Tuple[int, int]]) -> bool:
+    """Whether ``hour`` falls in a [start, end) window that may wrap past midnight"""
+    if window is None:
+        return True
+    start, end = window
+    if start == end:
+        return True
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def document_type_for(document_key: str, stored_result: dict) -> str:
+    """Pipeline for a stored document; keys are ``passport``, ``photo`` or ``supporting_doc_N``"""
+    if stored_result.get("document_type"):
+        return stored_result["document_type"]
+    return "supporting" if document_key.startswith("supporting") else document_key
+
+
+def summarize_result(result: dict) -> dict:
+    return {
+        "validation_passed": bool(result.get("validation_passed")),
+        "validation_message": result.get("validation_message", ""),
+    }
+
+
+class BackfillJob:
+    """
+    Re-runs document validation over stored applications after an OCR change.
+
+    Documents are visited in a stable order (application key, then document
+    key). Each one is re-processed from its stored original and, unless
+    ``dry_run``, written back into the application, unless the application
+    was deleted meanwhile. Applications are read with ``peek``, so a pass
+    does not crowd live ones out of a tiered store's memory. The job is
+    polite to the live service:
+
+    * ``rate`` caps documents per second;
+    * ``cpu_budget`` caps the fraction of wall time spent processing, by
+      sleeping in proportion to each document's processing time;
+    * ``window`` restricts work to off-peak hours;
+    * it waits whenever live ``/upload_documents`` validations are running,
+      or finished within the last ``quiet_seconds``;
+    * its OCR is queued as the low-weight ``backfill`` tenant.
+
+    Progress is checkpointed to ``<directory>/checkpoint.json`` (``BACKFILL_DIR``
+    by default) so a stopped or crashed job resumes after the last finished
+    document. Every change is appended to ``<directory>/report.jsonl``.
+    """
+
+    def __init__(
+        self,
+        applications: ApplicationStore,
+        directory: Optional[str] = None,
+        rate: float = BACKFILL_RATE,
+        cpu_budget: float = BACKFILL_CPU_BUDGET,
+        window: Optional[Tuple[int, int]] = BACKFILL_WINDOW,
+        quiet_seconds: float = LIVE_TRAFFIC_QUIET_SECONDS,
+        dry_run: bool = False,
+        blobs: BlobStore = document_blobs,
+        live_traffic: ActivityTracker = live_document_requests,
+        processor: Callable[..., dict] = partial(process_document, tenant=BACKFILL_TENANT),
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        if rate <= 0:
+            raise ValueError("Backfill rate must be positive")
+        if not 0 < cpu_budget <= 1:
+            raise ValueError("CPU budget must be in (0, 1]")
+        if window is not None and not all(0 <= hour <= 23 for hour in window):
+            raise ValueError("Window hours must be between 0 and 23")
+        self.applications = applications
+        self.directory = directory or BACKFILL_DIR
+        self.rate = rate
+        self.cpu_budget = cpu_budget
+        self.window = tuple(window) if window is not None else None
+        self.quiet_seconds = quiet_seconds
+        self.dry_run = dry_run
+        self.blobs = blobs
+        self.live_traffic = live_traffic
+        self.processor = processor
+        self.now = now
+
+        self.checkpoint_path = os.path.join(self.directory, "checkpoint.json")
+        self.report_path = os.path.join(self.directory, "report.jsonl")
+        self.state = "idle"
+        self.progress = {"processed": 0, "changed": 0, "missing_original": 0, "errors": 0, "cursor": None}
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Checkpoints
+
+    def load_checkpoint(self) -> None:
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                self.progress.update(json.load(f)["progress"])
+
+    def save_checkpoint(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"saved_at": self.now().isoformat(), "dry_run": self.dry_run, "progress": self.progress}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def reset(self) -> None:
+        """Forget previous progress so the next run starts from the beginning"""
+        for path in (self.checkpoint_path, self.report_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.progress = {"processed": 0, "changed": 0, "missing_original": 0, "errors": 0, "cursor": None}
+
+    # Work
+
+    def documents(self) -> Iterator[Tuple[str, str]]:
+        """(application key, document key) pairs after the checkpoint cursor"""
+        cursor = self.progress["cursor"]
+        cursor_key = (natural_key(cursor[0]), natural_key(cursor[1])) if cursor else None
+        for application_key in sorted(self.applications.keys_in_order(), key=natural_key):
+            if cursor_key is not None and natural_key(application_key) < cursor_key[0]:
+                continue
+            application = self.applications.peek(application_key)
+            if application is None:
+                continue
+            for document_key in sorted(application.peek_field("uploaded_documents"), key=natural_key):
+                if cursor_key is None or (natural_key(application_key), natural_key(document_key)) > cursor_key:
+                    yield application_key, document_key
+
+    def reprocess(self, application_key: str, document_key: str) -> Optional[dict]:
+        """Re-validate one document; returns its report line if anything changed"""
+        application = self.applications.peek(application_key)
+        if application is None:
+            return None
+        metadata = application.uploaded_documents.get(document_key, {})
+        before = application.document_validation_results.get(document_key, {})
+        sha256 = metadata.get("content_sha256")
+        if not sha256 or not self.blobs.exists(sha256):
+            self.progress["missing_original"] += 1
+            return None
+
+        document_type = document_type_for(document_key, before)
+        after = self.processor(self.blobs.get(sha256), document_type, metadata.get("expected_passport_number"))
+        after["reprocessed_at"] = self.now().isoformat()
+
+        old_text = application.extracted_text.get(document_key, before.get("extracted_text", ""))
+        similarity = text_similarity(old_text or "", after.get("extracted_text", ""))
+        verdict_changed = bool(before.get("validation_passed")) != bool(after.get("validation_passed"))
+        if not self.dry_run:
+            application.document_validation_results[document_key] = after
+            application.extracted_text[document_key] = after.get("extracted_text", "")
+            # Stores may hand out copies, so the change is written back, but
+            # not over a delete (the expiry janitor's) made while OCR ran
+            if not self.applications.put_if_present(application_key, application):
+                return None
+
+        if similarity == 1.0 and not verdict_changed:
+            return None
+        return {
+            "application_key": application_key,
+            "document_key": document_key,
+            "document_type": document_type,
+            "content_sha256": sha256,
+            "text_similarity": round(similarity, 4),
+            "verdict_changed": verdict_changed,
+            "before": summarize_result(before),
+            "after": summarize_result(after),
+            "applied": not self.dry_run,
+        }
+
+    def append_report(self, line: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.report_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, sort_keys=True) + "\n")
+
+    def read_report(self, limit: int = 100) -> list:
+        """The last ``limit`` report lines"""
+        if not os.path.exists(self.report_path):
+            return []
+        with open(self.report_path, encoding="utf-8") as f:
+            lines = deque(f, maxlen=limit)
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def wait_for_turn(self) -> bool:
+        """Block until the window is open and live traffic is quiet; False if stopped"""
+        while not self._stop.is_set():
+            if not in_window(self.now().hour, self.window):
+                self.state = "waiting_for_window"
+            elif self.live_traffic.active or self.live_traffic.idle_for() < self.quiet_seconds:
+                self.state = "yielding_to_live_traffic"
+                metrics.increment("backfill_yields_total")
+            else:
+                self.state = "running"
+                return True
+            self._stop.wait(IDLE_POLL_INTERVAL)
+        return False
+
+    def run(self) -> dict:
+        """Process every remaining document; returns the progress counters"""
+        self.load_checkpoint()
+        since_checkpoint = 0
+        try:
+            for application_key, document_key in self.documents():
+                if not self.wait_for_turn():
+                    break
+                start = time.perf_counter()
+                try:
+                    line = self.reprocess(application_key, document_key)
+                    if line is not None:
+                        self.progress["changed"] += 1
+                        self.append_report(line)
+                except Exception as e:
+                    self.progress["errors"] += 1
+                    self.append_report({"application_key": application_key, "document_key": document_key,
+                                        "error": f"{type(e).__name__}: {e}"})
+                busy = time.perf_counter() - start
+
+                self.progress["processed"] += 1
+                self.progress["cursor"] = [application_key, document_key]
+                metrics.increment("backfill_documents_total")
+                since_checkpoint += 1
+                if since_checkpoint >= CHECKPOINT_EVERY:
+                    self.save_checkpoint()
+                    since_checkpoint = 0
+
+                # Sleep long enough to respect both the rate and the CPU budget
+                pause = max(1.0 / self.rate - busy, busy * (1 - self.cpu_budget) / self.cpu_budget)
+                self.state = "throttled"
+                if self._stop.wait(pause):
+                    break
+            else:
+                self.state = "finished"
+        finally:
+            self.save_checkpoint()
+            if self.state != "finished":
+                self.state = "stopped"
+        return dict(self.progress)
+
+    # Background control
+
+    def start(self) -> None:
+        if self.running:
+            raise ValueError("Backfill is already running")
+        self._stop.clear()
+        self.state = "starting"
+        self._thread = threading.Thread(target=self.run, name="document-backfill", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "running": self.running,
+            "dry_run": self.dry_run,
+            "rate": self.rate,
+            "cpu_budget": self.cpu_budget,
+            "window": list(self.window) if self.window else None,
+            "progress": dict(self.progress),
+        }
@@ -0,0 +1,274 @@
+"""
+Uploaded originals, content-addressed on local disk, and a size-capped
+cache of thumbnails and previews rendered from them.
+
+Retention: an original is kept while any stored application's
+``uploaded_documents`` names it. ``collect_originals`` deletes the others,
+with their derivatives, once they are older than
+ORIGINAL_RETENTION_GRACE; it runs after every expiry sweep, so originals
+go when the applications that uploaded them expire or are deleted.
+Derivatives are capped at DERIVATIVE_CACHE_MAX_BYTES on their own.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+
+from app.services import metrics
+
+DOCUMENT_STORE_DIR = os.environ.get("DOCUMENT_STORE_DIR", os.path.join(tempfile.gettempdir(), "visa_documents"))
+
+# Derivatives are cheap to regenerate, so the cache is capped and the least
+# recently served files are evicted first
+DERIVATIVE_CACHE_MAX_BYTES = int(os.environ.get("DERIVATIVE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Unreferenced originals younger than this are kept, which leaves time for
+# an upload's application to be stored after its original was written
+ORIGINAL_RETENTION_GRACE = float(os.environ.get("ORIGINAL_RETENTION_GRACE", "3600"))
+
+# Longest side in pixels and JPEG quality for each derivative. Bump
+# DERIVATIVE_VERSION when these change so clients drop cached copies
+DERIVATIVE_VARIANTS = {
+    "thumbnail": {"size": 256, "quality": 80},
+    "preview": {"size": 1280, "quality": 85},
+}
+DERIVATIVE_VERSION = 1
+
+# Content-addressed responses never change, so clients may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def content_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def validate_sha256(sha256: str) -> str:
+    sha256 = sha256.lower()
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise ValueError("Document id must be a 64-character sha256 hex digest")
+    return sha256
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    """Write via a temporary file and rename, so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class BlobStore:
+    """Uploaded originals on local disk, named by the sha256 of their content"""
+
+    def __init__(self, directory: str = DOCUMENT_STORE_DIR):
+        self.directory = os.path.join(directory, "originals")
+
+    def path(self, sha256: str) -> str:
+        sha256 = validate_sha256(sha256)
+        return os.path.join(self.directory, sha256[:2], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def put(self, data: bytes, sha256: Optional[str] = None) -> str:
+        """Store ``data`` unless an identical upload is already stored; returns its sha256"""
+        sha256 = sha256 or content_sha256(data)
+        path = self.path(sha256)
+        if not os.path.exists(path):
+            write_atomically(path, data)
+        return sha256
+
+    def get(self, sha256: str) -> bytes:
+        try:
+            with open(self.path(sha256), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise LookupError(f"Document '{sha256}' not found")
+
+    def originals(self) -> Iterator[Tuple[str, float, int]]:
+        """``(sha256, mtime, size)`` of every stored original"""
+        if not os.path.isdir(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            directory = os.path.join(self.directory, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if len(name) != 64:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                yield name, stat.st_mtime, stat.st_size
+
+    def delete(self, sha256: str) -> bool:
+        try:
+            os.remove(self.path(sha256))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def render_derivative(data: bytes, variant: str) -> bytes:
+    """Downscale an upload to a JPEG derivative"""
+    spec = DERIVATIVE_VARIANTS[variant]
+    size = (spec["size"], spec["size"])
+    try:
+        image = Image.open(io.BytesIO(data))
+        # JPEG scans can be decoded at a reduced scale, which is far cheaper
+        # than decoding the full image and then shrinking it
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail(size, Image.LANCZOS, reducing_gap=3.0)
+    except Exception as e:
+        raise ValueError(f"Document cannot be rendered as an image: {str(e)}")
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=spec["quality"], optimize=True, progressive=True)
+    return output.getvalue()
+
+
+class DerivativeCache:
+    """
+    Lazily generated thumbnails and previews, kept under a total size limit.
+
+    Files are named ``<sha256>-<variant>-v<version>.jpg`` so a derivative is
+    generated at most once per original. The LRU order is rebuilt from file
+    modification times on start-up, and a cache hit refreshes the mtime.
+    """
+
+    def __init__(self, blobs: BlobStore, directory: str = DOCUMENT_STORE_DIR,
+                 max_bytes: int = DERIVATIVE_CACHE_MAX_BYTES):
+        self.blobs = blobs
+        self.directory = os.path.join(directory, "derivatives")
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".jpg"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._entries[name] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def etag(sha256: str, variant: str) -> str:
+        return f'"{sha256}-{variant}-v{DERIVATIVE_VERSION}"'
+
+    def file_name(self, sha256: str, variant: str) -> str:
+        return f"{validate_sha256(sha256)}-{variant}-v{DERIVATIVE_VERSION}.jpg"
+
+    def get(self, sha256: str, variant: str) -> Tuple[str, str]:
+        """Path and ETag of a derivative, rendering it from the original on first request"""
+        if variant not in DERIVATIVE_VARIANTS:
+            raise ValueError(f"Variant must be one of: {', '.join(DERIVATIVE_VARIANTS)}")
+        name = self.file_name(sha256, variant)
+        path = os.path.join(self.directory, name)
+
+        with self._lock:
+            if name in self._entries and os.path.exists(path):
+                self._entries.move_to_end(name)
+                os.utime(path)
+                return path, self.etag(sha256, variant)
+            # One render per derivative even when officers open it together
+            key_lock = self._key_locks.setdefault(name, threading.Lock())
+
+        with key_lock:
+            if not os.path.exists(path):
+                write_atomically(path, render_derivative(self.blobs.get(sha256), variant))
+            size = os.path.getsize(path)
+            with self._lock:
+                if name not in self._entries:
+                    self.total_bytes += size
+                self._entries[name] = size
+                self._entries.move_to_end(name)
+                self._key_locks.pop(name, None)
+                self._evict(keep=name)
+        return path, self.etag(sha256, variant)
+
+    def discard(self, sha256: str) -> None:
+        """Drop every derivative of an original"""
+        with self._lock:
+            for name in [name for name in self._entries if name.startswith(sha256)]:
+                self.total_bytes -= self._entries.pop(name)
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self, keep: str) -> None:
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def referenced_originals(applications) -> Set[str]:
+    """sha256 of every original named in the ``uploaded_documents`` of ``(key, application)`` pairs"""
+    referenced = set()
+    for _, application in applications:
+        for document in (application.uploaded_documents or {}).values():
+            if isinstance(document, dict) and document.get("content_sha256"):
+                referenced.add(document["content_sha256"])
+    return referenced
+
+
+def collect_originals(store, blobs: BlobStore, derivatives: Optional[DerivativeCache] = None,
+                      grace: float = ORIGINAL_RETENTION_GRACE, now: Optional[float] = None) -> int:
+    """Delete originals no application in ``store`` refers to, older than ``grace`` seconds; returns how many"""
+    start = time.perf_counter()
+    now = time.time() if now is None else now
+    # Listed before the scan, so an original written after it is never a candidate
+    candidates = [(sha256, size) for sha256, mtime, size in blobs.originals() if now - mtime >= grace]
+    if not candidates:
+        return 0
+    referenced = referenced_originals(store.iter_sorted())
+    deleted = 0
+    for sha256, size in candidates:
+        if sha256 in referenced:
+            continue
+        if blobs.delete(sha256):
+            deleted += 1
+            metrics.increment("document_originals_deleted_bytes_total", size)
+        if derivatives is not None:
+            derivatives.discard(sha256)
+    metrics.increment("document_originals_deleted_total", deleted)
+    metrics.observe("document_originals_collect_seconds", time.perf_counter() - start)
+    return deleted
+
+
+document_blobs = BlobStore()
+document_derivatives = DerivativeCache(document_blobs)
@@ -0,0 +1,128 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services import metrics
+
+# Set BUFFER_POOL_ENABLED=0 to allocate fresh arrays every time (used by the
+# soak benchmark for comparison)
+BUFFER_POOL_ENABLED = os.environ.get("BUFFER_POOL_ENABLED", "1") != "0"
+
+# Most memory the pool keeps between requests. Buffers returned beyond this
+# are dropped
+BUFFER_POOL_MAX_BYTES = 256 * 1024 * 1024
+
+# Smallest bucket; tiny arrays are cheaper to allocate than to pool
+MIN_BUCKET_BYTES = 4096
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def bucket_size(nbytes: int) -> int:
+    """Round a request up to the next power of two so similar image sizes share buffers"""
+    return max(MIN_BUCKET_BYTES, 1 << (max(nbytes, 1) - 1).bit_length())
+
+
+class BufferPool:
+    """
+    Preallocated byte buffers bucketed by capacity, handed out as shaped views.
+
+    Each worker process has one pool (see ``get_buffer_pool``) shared by its
+    request and stage threads. Pipeline stages run on different threads, so
+    a shared pool reuses buffers far better than per-thread pools would, and
+    the lock is held only for a list push or pop.
+    """
+
+    def __init__(self, max_bytes: int = BUFFER_POOL_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.retained_bytes = 0
+        self.allocations = 0
+        self.reuses = 0
+        self._free: Dict[int, List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, shape: Tuple[int, ...], dtype=np.uint8) -> Tuple[np.ndarray, np.ndarray]:
+        """A C-contiguous array of ``shape`` and its backing buffer (needed to release it)"""
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        size = bucket_size(nbytes)
+        with self._lock:
+            free = self._free.get(size)
+            backing = free.pop() if free else None
+            if backing is not None:
+                self.retained_bytes -= size
+                self.reuses += 1
+            else:
+                self.allocations += 1
+        if backing is None:
+            backing = np.empty(size, dtype=np.uint8)
+            metrics.increment("buffer_pool_allocations_total")
+        else:
+            metrics.increment("buffer_pool_reuses_total")
+        return backing[:nbytes].view(dtype).reshape(shape), backing
+
+    def release(self, backing: np.ndarray) -> None:
+        size = backing.nbytes
+        with self._lock:
+            if self.retained_bytes + size <= self.max_bytes:
+                self._free.setdefault(size, []).append(backing)
+                self.retained_bytes += size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._free.clear()
+            self.retained_bytes = 0
+
+
+def get_buffer_pool() -> BufferPool:
+    """This worker process's pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BufferPool()
+    return _pool
+
+
+class BufferLease:
+    """
+    Buffers borrowed for one unit of work, all returned together on close.
+
+    Use as a context manager around a pipeline run. Arrays handed out must not
+    be used after the lease closes, because the next request may overwrite
+    them.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = BUFFER_POOL_ENABLED if enabled is None else enabled
+        self.pool = get_buffer_pool()
+        self._borrowed: List[np.ndarray] = []
+        self._lock = threading.Lock()
+
+    def get(self, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        if not self.enabled:
+            return np.empty(shape, dtype=dtype)
+        array, backing = self.pool.acquire(shape, dtype)
+        with self._lock:
+            self._borrowed.append(backing)
+        return array
+
+    def close(self) -> None:
+        with self._lock:
+            borrowed, self._borrowed = self._borrowed, []
+        for backing in borrowed:
+            self.pool.release(backing)
+
+    def discard(self) -> None:
+        """Forget borrowed buffers without returning them, for work that may still be using them"""
+        with self._lock:
+            self._borrowed = []
+
+    def __enter__(self) -> "BufferLease":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.services import metrics
+from app.services.deadlines import Deadline, DeadlineExceeded
+
+# Starting point for the OCR limit; the limiter moves away from it within a
+# few dozen documents
+OCR_INITIAL_LIMIT = max(2, (os.cpu_count() or 1) // 2)
+OCR_MIN_LIMIT = 1
+OCR_MAX_LIMIT = 4 * (os.cpu_count() or 1)
+
+# OCR latency is compared per megapixel so a batch of large bank statements
+# is not mistaken for overload. Latency up to this multiple of the best
+# observed seconds-per-megapixel counts as healthy
+OCR_LATENCY_TOLERANCE = 1.5
+
+# Documents smaller than this still pay tesseract's fixed start-up cost
+MIN_WORK_UNITS = 0.25
+
+# Latency samples before the baseline (and so the derived target) is set
+WARMUP_SAMPLES = 10
+
+# How often a blocked caller re-checks whether its deadline was cancelled
+ACQUIRE_POLL_INTERVAL = 0.25
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit driven by normalised latency.
+
+    Each completed call reports its latency and its size in work units
+    (megapixels for OCR). The limiter keeps a smoothed seconds-per-unit figure
+    and compares it with a target. The target is either given explicitly or
+    set to ``tolerance`` times the best smoothed figure seen so far. Over target, or
+    when a call was dropped on a timeout, the limit is multiplied by
+    ``backoff_ratio``, at most once per window of ``limit`` completions. Under
+    target and saturated, the limit grows by about one per window.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = OCR_INITIAL_LIMIT,
+        min_limit: int = OCR_MIN_LIMIT,
+        max_limit: int = OCR_MAX_LIMIT,
+        target_latency: Optional[float] = None,
+        tolerance: float = OCR_LATENCY_TOLERANCE,
+        backoff_ratio: float = 0.9,
+        smoothing: float = 0.2,
+        clock=time.perf_counter,
+    ):
+        if not min_limit <= initial_limit <= max_limit:
+            raise ValueError("initial_limit must lie between min_limit and max_limit")
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self.smoothing = smoothing
+        self.clock = clock
+
+        self._limit = float(initial_limit)
+        self._inflight = 0
+        self._latency = None
+        self._baseline = None
+        self._completions = 0
+        self._samples = 0
+        self._cond = threading.Condition()
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def target(self) -> Optional[float]:
+        """Seconds per work unit above which the limit backs off"""
+        if self.target_latency is not None:
+            return self.target_latency
+        if self._baseline is None:
+            return None
+        return self._baseline * self.tolerance
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Smoothed seconds per work unit"""
+        return self._latency
+
+    def acquire(self, timeout: Optional[float] = None, deadline: Optional[Deadline] = None) -> bool:
+        """Wait for a free slot; False if ``timeout`` passes or ``deadline`` ends first"""
+        end = None if timeout is None else self.clock() + timeout
+        with self._cond:
+            while self._inflight >= self.limit:
+                wait = ACQUIRE_POLL_INTERVAL if deadline is not None else None
+                if end is not None:
+                    left = end - self.clock()
+                    if left <= 0:
+                        return False
+                    wait = left if wait is None else min(wait, left)
+                if deadline is not None and deadline.expired:
+                    return False
+                self._cond.wait(wait)
+            self._inflight += 1
+            metrics.set_gauge(f"{self.name}_concurrency_inflight", self._inflight)
+            return True
+
+    def release(self, latency: float, work_units: float = 1.0, dropped: bool = False) -> None:
+        """Return a slot and feed the call's latency into the limit"""
+        with self._cond:
+            saturated = self._inflight >= self.limit
+            self._inflight -= 1
+            self._update(latency / max(work_units, MIN_WORK_UNITS), saturated, dropped)
+            self._publish()
+            self._cond.notify_all()
+
+    def _update(self, sample: float, saturated: bool, dropped: bool) -> None:
+        if not dropped:
+            if self._latency is None:
+                self._latency = sample
+            else:
+                self._latency += self.smoothing * (sample - self._latency)
+            self._samples += 1
+            # The baseline is the lowest smoothed latency, not the lowest
+            # sample, so one blank page cannot pin the target near zero. It
+            # never creeps up, otherwise sustained overload would become the
+            # new normal
+            if self._samples >= WARMUP_SAMPLES and (self._baseline is None or self._latency < self._baseline):
+                self._baseline = self._latency
+
+        self._completions += 1
+        target = self.target
+        overloaded = dropped or (target is not None and self._latency > target)
+        if overloaded:
+            if self._completions >= self.limit:
+                self._limit = max(float(self.min_limit), self._limit * self.backoff_ratio)
+                self._completions = 0
+                metrics.increment(f"{self.name}_concurrency_backoffs_total")
+        elif saturated:
+            self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"{self.name}_concurrency_limit", self.limit)
+        metrics.set_gauge(f"{self.name}_concurrency_inflight", self._inflight)
+        if self._latency is not None:
+            metrics.set_gauge(f"{self.name}_seconds_per_unit", round(self._latency, 4))
+
+    @contextmanager
+    def slot(self, work_units: float = 1.0, deadline: Optional[Deadline] = None):
+        """
+        Hold a slot for the duration of the block and report its latency.
+
+        Running out of time inside the block counts as a dropped call, which
+        backs the limit off; a client disconnect does not.
+        """
+        queued = time.perf_counter()
+        timeout = deadline.remaining() if deadline is not None else None
+        if not self.acquire(timeout=timeout, deadline=deadline):
+            metrics.increment(f"{self.name}_concurrency_rejections_total")
+            deadline.check(f"Waiting for {self.name} capacity")
+            raise DeadlineExceeded(f"Timed out waiting for {self.name} capacity")
+        start = time.perf_counter()
+        metrics.observe(f"{self.name}_queue_seconds", start - queued)
+        dropped = False
+        try:
+            yield
+        except DeadlineExceeded as e:
+            dropped = e.reason == "deadline"
+            raise
+        finally:
+            self.release(time.perf_counter() - start, work_units, dropped=dropped)
+
+
+ocr_limiter = AdaptiveLimiter("ocr")
+
+
+class ActivityTracker:
+    """Counts in-flight work so background jobs can step aside for it"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._active = 0
+        self._last_finished = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def idle_for(self) -> float:
+        """Seconds since the last piece of work finished; 0 while any is running"""
+        with self._lock:
+            if self._active:
+                return 0.0
+            if self._last_finished is None:
+                return float("inf")
+            return self.clock() - self._last_finished
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_finished = self.clock()
+
+
+# Live document validations from the API; the backfill job waits for these
+live_document_requests = ActivityTracker()
@@ -0,0 +1,12 @@
+from typing import Dict
+
+
+def parse_pairs(text: str) -> Dict[str, str]:
+    """``"a:1,b:2"`` as ``{"a": "1", "b": "2"}``"""
+    pairs = {}
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        key, _, value = item.partition(":")
+        if not value:
+            raise ValueError(f"Expected key:value, got '{item}'")
+        pairs[key.strip()] = value.strip()
+    return pairs
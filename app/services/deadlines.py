@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from app.services import metrics
+
+# Clients may ask for a shorter (or, up to the maximum, longer) budget with
+# this header, in seconds
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+MAX_REQUEST_TIMEOUT = 120.0
+MIN_REQUEST_TIMEOUT = 0.1
+
+# Route default for /upload_documents; kept under the gateway's 30 s timeout
+# so we stop work before the gateway gives up on us
+UPLOAD_DOCUMENTS_TIMEOUT = 25.0
+
+# How often an in-flight request checks whether its client went away
+DISCONNECT_POLL_INTERVAL = 0.25
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes or the request is cancelled"""
+
+    def __init__(self, message: str, reason: str = "deadline"):
+        super().__init__(message)
+        self.reason = reason
+        # Set once the wasted and recovered work has been counted
+        self.recorded = False
+
+
+class Deadline:
+    """
+    A point in time by which a request's work must be done.
+
+    Deadlines are passed explicitly into every document stage. Work checks
+    ``check()`` at safe points. Blocking calls such as tesseract are given
+    ``timeout_for_call()`` so they are killed once the budget is spent. ``cancel()``
+    ends the budget early, for example when the client disconnects.
+    """
+
+    def __init__(self, timeout: float, clock=time.monotonic):
+        self.clock = clock
+        self.timeout = timeout
+        self.expires_at = clock() + timeout
+        self.reason = None
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        if self._cancelled.is_set():
+            return 0.0
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self) -> bool:
+        return self._cancelled.is_set() or self.clock() >= self.expires_at
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+    def check(self, what: str = "request") -> None:
+        """Raise DeadlineExceeded if no time is left"""
+        if self._cancelled.is_set():
+            raise DeadlineExceeded(f"{what} cancelled: {self.reason}", reason=self.reason or "cancelled")
+        if self.clock() >= self.expires_at:
+            raise DeadlineExceeded(f"{what} exceeded its {self.timeout:g}s deadline", reason="deadline")
+
+    def timeout_for_call(self, what: str = "request") -> float:
+        """Timeout for a blocking call; raises instead of returning zero"""
+        self.check(what)
+        return max(self.remaining(), 0.001)
+
+
+def timeout_from_header(value: Optional[str], default: float = UPLOAD_DOCUMENTS_TIMEOUT) -> float:
+    """Parse the request-timeout header, falling back to the route default"""
+    if value is None or not value.strip():
+        return default
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise ValueError(f"{REQUEST_TIMEOUT_HEADER} must be a number of seconds")
+    if timeout != timeout or timeout < MIN_REQUEST_TIMEOUT:
+        raise ValueError(f"{REQUEST_TIMEOUT_HEADER} must be at least {MIN_REQUEST_TIMEOUT:g} seconds")
+    return min(timeout, MAX_REQUEST_TIMEOUT)
+
+
+async def cancel_on_disconnect(request, deadline: Deadline, interval: float = DISCONNECT_POLL_INTERVAL) -> None:
+    """Cancel ``deadline`` once the client disconnects; run as a task alongside the work"""
+    while not deadline.expired:
+        if await request.is_disconnected():
+            deadline.cancel("client_disconnect")
+            return
+        await asyncio.sleep(interval)
+
+
+def record_cancellation(reason: str, wasted_seconds: float = 0.0, skipped_stages: int = 0,
+                        recovered_seconds: float = 0.0) -> None:
+    """
+    Account for work thrown away or avoided by a cancelled request.
+
+    ``wasted_seconds`` is stage time already spent on the cancelled request.
+    ``recovered_seconds`` estimates the stage time that was never spent,
+    based on each skipped stage's average duration.
+    """
+    labels = {"reason": reason}
+    metrics.increment("deadline_requests_cancelled_total", labels=labels)
+    metrics.increment("deadline_stage_seconds_wasted_total", wasted_seconds, labels=labels)
+    metrics.increment("deadline_stages_skipped_total", skipped_stages, labels=labels)
+    metrics.increment("deadline_stage_seconds_recovered_total", recovered_seconds, labels=labels)
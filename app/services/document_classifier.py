@@ -0,0 +1,255 @@
+import re
+from collections import deque
+from typing import Iterator, List, Tuple
+
+# Only ASCII letters are folded so that offsets in the folded text line up
+# with the original OCR text (str.lower can change the length of some
+# non-ASCII strings)
+_ASCII_LOWER = {ord(c): ord(c) + 32 for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"}
+
+# Keyword evidence per document class as (phrase, weight)
+DOCUMENT_KEYWORDS = {
+    "i20": [
+        ("form i-20", 6), ("i-20", 3),
+        ("certificate of eligibility for nonimmigrant student status", 6),
+        ("sevis", 2), ("designated school official", 3), ("program of study", 2),
+        ("estimated average costs", 2), ("student's funding", 2),
+    ],
+    "ds2019": [
+        ("ds-2019", 6), ("certificate of eligibility for exchange visitor", 6),
+        ("exchange visitor", 3), ("responsible officer", 2), ("program sponsor", 2),
+    ],
+    "admission_letter": [
+        ("offer of admission", 5), ("admission letter", 5), ("pleased to inform you", 2),
+        ("admitted to", 3), ("congratulations", 1), ("office of admissions", 3), ("enrollment", 1),
+    ],
+    "job_offer": [
+        ("offer of employment", 5), ("job offer", 4), ("offer letter", 4), ("employment offer", 4),
+        ("annual salary", 3), ("base salary", 3), ("position of", 2), ("start date", 1),
+        ("human resources", 1), ("employer", 1), ("compensation", 1),
+    ],
+    "sponsor_letter": [
+        ("affidavit of support", 5), ("sponsorship letter", 5), ("letter of sponsorship", 5),
+        ("i hereby sponsor", 4), ("financial support", 3), ("sponsor", 2), ("form i-134", 5),
+        ("bear all expenses", 3), ("relationship to applicant", 2),
+    ],
+    "bank_statement": [
+        ("bank statement", 5), ("statement of account", 5), ("account statement", 4),
+        ("account number", 2), ("opening balance", 3), ("closing balance", 3),
+        ("available balance", 3), ("statement period", 3), ("ifsc", 2), ("routing number", 2),
+        ("withdrawal", 1), ("deposit", 1),
+    ],
+}
+
+# Minimum total keyword weight for a confident classification
+MIN_CLASSIFICATION_SCORE = 4
+
+# Phrases after which a field value is read. Field kinds decide how the value
+# following the anchor is parsed.
+FIELD_ANCHORS = [
+    ("sevis id", "sevis_id", "sevis_id"), ("sevis no", "sevis_id", "sevis_id"),
+    ("sevis number", "sevis_id", "sevis_id"), ("sevis #", "sevis_id", "sevis_id"),
+    ("employer name", "employer_name", "text"), ("employer:", "employer_name", "text"),
+    ("company name", "employer_name", "text"), ("name of employer", "employer_name", "text"),
+    ("school name", "school_name", "text"), ("sponsor name", "sponsor_name", "text"),
+    ("name of sponsor", "sponsor_name", "text"),
+    ("account holder", "account_holder", "text"), ("account number", "account_number", "account"),
+    ("closing balance", "balance", "amount"), ("available balance", "balance", "amount"),
+    ("annual salary", "salary", "amount"), ("base salary", "salary", "amount"),
+    ("salary", "salary", "amount"), ("total amount", "amount", "amount"),
+    ("date", "date", "date"), ("dated", "date", "date"), ("start date", "start_date", "date"),
+    ("program start date", "start_date", "date"), ("issue date", "issue_date", "date"),
+    ("date of issue", "issue_date", "date"), ("statement date", "date", "date"),
+]
+
+# Tokens that mark a value wherever they appear, with no label in front
+VALUE_PREFIXES = [
+    ("n00", "sevis_id", "sevis_id"),
+    ("$", "amounts", "amount"), ("usd", "amounts", "amount"), ("us$", "amounts", "amount"),
+    ("eur", "amounts", "amount"), ("inr", "amounts", "amount"),
+    ("rs.", "amounts", "amount"), ("€", "amounts", "amount"), ("₹", "amounts", "amount"),
+]
+
+_SEPARATORS = " \t:#.-=–"
+_SEVIS_ID = re.compile(r'N\d{10}', re.IGNORECASE)
+_AMOUNT = re.compile(r'(usd|us\$|eur|inr|rs\.|\$|€|₹)?\s*(\d{1,3}(?:,\d{2,3})+(?:\.\d{1,2})?|\d+(?:\.\d{1,2})?)', re.IGNORECASE)
+_DATE = re.compile(
+    r'(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|'
+    r'\d{1,2}\s+[A-Za-z]{3,9}\.?,?\s+\d{4}|[A-Za-z]{3,9}\.?\s+\d{1,2},?\s+\d{4})'
+)
+_ACCOUNT = re.compile(r'[Xx*\d][Xx*\d\- ]{3,30}\d')
+
+_CURRENCY_CODES = {"$": "USD", "us$": "USD", "usd": "USD", "eur": "EUR", "€": "EUR",
+                   "inr": "INR", "rs.": "INR", "₹": "INR"}
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of phrases.
+
+    Every phrase is found in a single left-to-right pass over the text, however
+    many phrases there are. Each phrase carries a payload that is returned with
+    its matches.
+    """
+
+    def __init__(self, patterns: List[Tuple[str, object]]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+
+        for phrase, payload in patterns:
+            state = 0
+            for char in phrase:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                state = next_state
+            self.outputs[state].append((len(phrase), payload))
+
+        # Breadth-first pass to link every state to its longest proper suffix
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, object]]:
+        """Yield ``(start, end, payload)`` for every phrase occurrence in ``text``"""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                end = index + 1
+                for length, payload in outputs[state]:
+                    yield end - length, end, payload
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum()
+
+
+def _build_automaton() -> AhoCorasick:
+    patterns = []
+    for document_class, keywords in DOCUMENT_KEYWORDS.items():
+        for phrase, weight in keywords:
+            patterns.append((phrase, ("keyword", document_class, weight)))
+    for phrase, field, kind in FIELD_ANCHORS:
+        patterns.append((phrase, ("field", field, kind)))
+    for phrase, field, kind in VALUE_PREFIXES:
+        patterns.append((phrase, ("value", field, kind)))
+    return AhoCorasick(patterns)
+
+
+_automaton = _build_automaton()
+
+
+def _skip_separators(text: str, position: int) -> int:
+    while position < len(text) and text[position] in _SEPARATORS:
+        position += 1
+    return position
+
+
+def _parse_value(text: str, start: int, end: int, kind: str, anchored_value: bool):
+    """Read a field value at a match; value prefixes are parsed from their own start"""
+    position = start if anchored_value else _skip_separators(text, end)
+    if kind == "sevis_id":
+        match = _SEVIS_ID.match(text, position) if anchored_value else _SEVIS_ID.search(text, position, position + 24)
+        return match.group(0).upper() if match else None
+    if kind == "amount":
+        # Labels may be followed by a few words ("salary of USD 120,000")
+        match = _AMOUNT.match(text, position) if anchored_value else _AMOUNT.search(text, position, position + 40)
+        if not match:
+            return None
+        currency = _CURRENCY_CODES.get((match.group(1) or "").lower())
+        return {"value": float(match.group(2).replace(",", "")), "currency": currency}
+    if kind == "date":
+        match = _DATE.match(text, position)
+        return match.group(1) if match else None
+    if kind == "account":
+        match = _ACCOUNT.match(text, position)
+        return match.group(0).strip() if match else None
+    # Free text runs to the end of the line
+    line_end = text.find("\n", position)
+    value = text[position:line_end if line_end != -1 else len(text)].strip(_SEPARATORS + "\r")
+    return value[:120] or None
+
+
+def classify_document(text: str) -> dict:
+    """
+    Classify a supporting document and pull out its key fields in one pass.
+
+    A single Aho-Corasick automaton carries the class keywords, the field
+    labels and value prefixes such as currency symbols. Keyword hits add to the
+    score of their document class; label and prefix hits parse the value that
+    follows them.
+
+    Returns ``document_class`` (``"unknown"`` when no class scores at least
+    ``MIN_CLASSIFICATION_SCORE``), a ``confidence`` share in 0-1, the per-class
+    ``scores`` and the extracted ``fields``.
+    """
+    folded = text.translate(_ASCII_LOWER)
+    length = len(folded)
+    scores = {}
+    fields = {}
+    claimed_end = -1
+
+    for start, end, (kind, name, detail) in _automaton.iter_matches(folded):
+        first, last = folded[start], folded[end - 1]
+        # Word-like phrases must not match inside longer words ("date" in "update")
+        if _is_word_char(first) and start > 0 and _is_word_char(folded[start - 1]):
+            continue
+        if kind != "value" and _is_word_char(last) and end < length and _is_word_char(folded[end]):
+            continue
+
+        if kind == "keyword":
+            scores[name] = scores.get(name, 0) + detail
+            continue
+
+        # A longer label ending at the same place wins ("start date" over "date")
+        if end == claimed_end:
+            continue
+        value = _parse_value(text, start, end, detail, anchored_value=(kind == "value"))
+        if value is None:
+            continue
+        claimed_end = end
+
+        if name == "amounts":
+            amounts = fields.setdefault("amounts", [])
+            if value not in amounts:
+                amounts.append(value)
+        elif name == "date":
+            dates = fields.setdefault("dates", [])
+            if value not in dates:
+                dates.append(value)
+        else:
+            fields.setdefault(name, value)
+
+    best_class, best_score = None, 0
+    for document_class, score in scores.items():
+        if score > best_score:
+            best_class, best_score = document_class, score
+
+    total = sum(scores.values())
+    if best_class is None or best_score < MIN_CLASSIFICATION_SCORE:
+        document_class, confidence = "unknown", 0.0
+    else:
+        document_class, confidence = best_class, round(best_score / float(total), 2)
+
+    return {
+        "document_class": document_class,
+        "confidence": confidence,
+        "scores": scores,
+        "fields": fields,
+    }
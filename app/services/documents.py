@@ -0,0 +1,312 @@
+import io
+import threading
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from app.services.buffers import BufferLease
+from app.services.concurrency import MIN_WORK_UNITS
+from app.services.deadlines import Deadline, DeadlineExceeded
+from app.services.document_classifier import classify_document
+from app.services.ocr import adaptive_ocr, load_image, ocr_document_image
+from app.services.passport_match import match_passport_number
+from app.services.photo_hashes import compute_dhash, compute_phash, format_hash
+from app.services.pipeline import Stage, StageGraph
+from app.services.scheduler import DEFAULT_TENANT, TenantQueueFull, ocr_scheduler
+
+FACE_CASCADE_PATH = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+
+# Artifacts whose name starts with this prefix are validator results of the
+# form {"passed": bool, "message": str}; any failing check fails the document
+CHECK_PREFIX = "check:"
+
+_local = threading.local()
+
+
+# OCR and Computer Vision Helper Functions
+def extract_text_from_image(image_bytes: bytes) -> str:
+    """Extract text from image using OCR"""
+    try:
+        # Convert bytes to PIL Image
+        image = Image.open(io.BytesIO(image_bytes))
+
+        # Convert to RGB if needed
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # Use pytesseract to extract text
+        extracted_text = pytesseract.image_to_string(image, config='--psm 6')
+        return extracted_text.strip()
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from image: {str(e)}")
+
+def get_face_cascade() -> cv2.CascadeClassifier:
+    """Per-thread face classifier; loading the cascade XML is far slower than using it"""
+    cascade = getattr(_local, "face_cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(FACE_CASCADE_PATH)
+        _local.face_cascade = cascade
+    return cascade
+
+def detect_faces(gray: np.ndarray) -> bool:
+    """Detect if a grayscale image contains a face"""
+    faces = get_face_cascade().detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    return len(faces) > 0
+
+def detect_face_in_image(image_bytes: bytes) -> bool:
+    """Detect if image contains a face using OpenCV"""
+    try:
+        # Convert bytes to numpy array
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+        if image is None:
+            raise ValueError("Could not decode image")
+
+        # Convert to grayscale
+        with BufferLease() as buffers:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=buffers.get(image.shape[:2]))
+            return detect_faces(gray)
+    except Exception as e:
+        raise ValueError(f"Failed to detect face in image: {str(e)}")
+
+def validate_passport_number(extracted_text: str, expected_passport_number: str) -> bool:
+    """Validate if passport number from OCR matches expected number, tolerating small OCR slips"""
+    return match_passport_number(extracted_text, expected_passport_number) is not None
+
+
+# Pipeline stages. Each takes its input artifacts as keyword arguments and
+# returns a dict of output artifacts. Image stages write their intermediates
+# into arrays from the ``buffers`` lease, which are reused by later requests.
+def decode_image_stage(file_content):
+    nparr = np.frombuffer(file_content, np.uint8)
+    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Failed to detect face in image: Could not decode image")
+    return {"image_bgr": image}
+
+def grayscale_stage(image_bgr, buffers):
+    gray = buffers.get(image_bgr.shape[:2])
+    return {"gray": cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY, dst=gray)}
+
+def face_detection_stage(gray):
+    try:
+        return {"has_face": detect_faces(gray)}
+    except Exception as e:
+        raise ValueError(f"Failed to detect face in image: {str(e)}")
+
+def perceptual_hash_stage(gray):
+    # Perceptual hashes let fraud review find the same photo reused across
+    # applications
+    return {"perceptual_hash": {"phash": format_hash(compute_phash(gray)), "dhash": format_hash(compute_dhash(gray))}}
+
+def image_quality_stage(gray, buffers):
+    height, width = gray.shape[:2]
+    laplacian = cv2.Laplacian(gray, cv2.CV_64F, dst=buffers.get(gray.shape[:2], np.float64))
+    # meanStdDev works in place, where ndarray.var() allocates two
+    # float64 temporaries the size of the image
+    _, stddev = cv2.meanStdDev(laplacian)
+    return {
+        "image_quality": {
+            "width": int(width),
+            "height": int(height),
+            "sharpness": round(float(stddev[0, 0]) ** 2, 2),
+            "brightness": round(float(cv2.mean(gray)[0]), 2),
+        }
+    }
+
+def photo_verdict_stage(has_face):
+    return {
+        "extracted_text": "Photo validation complete",
+        "validation": {
+            "passed": has_face,
+            "message": "Face detected in photo" if has_face else "No face detected in photo",
+        },
+    }
+
+def load_document_stage(file_content):
+    try:
+        return {"pil_image": load_image(file_content)}
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from image: {str(e)}")
+
+def ocr_outputs(ocr_result):
+    return {
+        "extracted_text": ocr_result["text"],
+        "ocr_mean_confidence": ocr_result["mean_confidence"],
+        "ocr_passes": ocr_result["ocr_passes"],
+    }
+
+def ocr_work_units(pil_image) -> float:
+    """Megapixels to OCR, the unit the OCR limiter normalises latency by"""
+    width, height = pil_image.size
+    return max(MIN_WORK_UNITS, width * height / 1_000_000)
+
+def passport_ocr_stage(pil_image, expected_passport_number, deadline, tenant=DEFAULT_TENANT):
+    # The adaptive OCR stops after the fast pass once the number is found
+    accept = None
+    if expected_passport_number:
+        accept = lambda text: validate_passport_number(text, expected_passport_number)
+    with ocr_scheduler.slot(tenant, ocr_work_units(pil_image), deadline=deadline):
+        return ocr_outputs(adaptive_ocr(pil_image, accept=accept, deadline=deadline))
+
+def passport_verdict_stage(extracted_text, expected_passport_number):
+    if expected_passport_number:
+        match = match_passport_number(extracted_text, expected_passport_number)
+        if match is None:
+            message = f"Passport number {expected_passport_number} not found in document"
+        elif match["distance"]:
+            message = (f"Passport number {expected_passport_number} found in document "
+                       f"as '{match['matched']}' ({match['edits']} edits, {match['confusions']} OCR confusions)")
+        else:
+            message = f"Passport number {expected_passport_number} found in document"
+        return {
+            "validation": {"passed": match is not None, "message": message},
+            "passport_match": match,
+        }
+    return {
+        "validation": {"passed": bool(extracted_text), "message": "Text extracted from passport document"},
+        "passport_match": None,
+    }
+
+def document_ocr_stage(pil_image, deadline, tenant=DEFAULT_TENANT):
+    # Large pages such as bank statements are split into text regions and
+    # OCR'd in parallel. Both OCR stages queue on the adaptive limiter so
+    # tesseract runs at the concurrency the box can actually sustain, in fair
+    # order across tenants so one bulk uploader cannot starve the rest
+    with ocr_scheduler.slot(tenant, ocr_work_units(pil_image), deadline=deadline):
+        ocr_result = ocr_document_image(pil_image, deadline=deadline)
+    outputs = ocr_outputs(ocr_result)
+    outputs["ocr_regions"] = ocr_result.get("ocr_regions")
+    return outputs
+
+def classification_stage(extracted_text):
+    # Tag the document (I-20, job offer, bank statement, ...) and pull out its
+    # key fields so officers do not have to re-read it
+    classification = classify_document(extracted_text)
+    return {
+        "document_class": classification["document_class"],
+        "classification_confidence": classification["confidence"],
+        "extracted_fields": classification["fields"],
+    }
+
+def supporting_verdict_stage(extracted_text):
+    return {"validation": {"passed": bool(extracted_text), "message": "Text successfully extracted from document"}}
+
+
+OCR_REPORT = ("ocr_mean_confidence", "ocr_passes")
+
+DOCUMENT_PIPELINES = {
+    "photo": StageGraph([
+        Stage("decode_image", decode_image_stage, ["file_content"], ["image_bgr"]),
+        Stage("grayscale", grayscale_stage, ["image_bgr", "buffers"], ["gray"]),
+        Stage("face_detection", face_detection_stage, ["gray"], ["has_face"]),
+        Stage("perceptual_hash", perceptual_hash_stage, ["gray"], ["perceptual_hash"], report=["perceptual_hash"]),
+        Stage("image_quality", image_quality_stage, ["gray", "buffers"], ["image_quality"],
+              report=["image_quality"]),
+        Stage("photo_verdict", photo_verdict_stage, ["has_face"], ["extracted_text", "validation"]),
+    ]),
+    "passport": StageGraph([
+        Stage("load_image", load_document_stage, ["file_content"], ["pil_image"]),
+        Stage("ocr", passport_ocr_stage, ["pil_image", "expected_passport_number", "deadline", "tenant"],
+              ["extracted_text", "ocr_mean_confidence", "ocr_passes"], report=OCR_REPORT),
+        Stage("passport_verdict", passport_verdict_stage, ["extracted_text", "expected_passport_number"],
+              ["validation", "passport_match"], report=["passport_match"]),
+    ]),
+    "supporting": StageGraph([
+        Stage("load_image", load_document_stage, ["file_content"], ["pil_image"]),
+        Stage("ocr", document_ocr_stage, ["pil_image", "deadline", "tenant"],
+              ["extracted_text", "ocr_mean_confidence", "ocr_passes", "ocr_regions"],
+              report=OCR_REPORT + ("ocr_regions",)),
+        Stage("classification", classification_stage, ["extracted_text"],
+              ["document_class", "classification_confidence", "extracted_fields"],
+              report=["document_class", "classification_confidence", "extracted_fields"]),
+        Stage("supporting_verdict", supporting_verdict_stage, ["extracted_text"], ["validation"]),
+    ]),
+}
+
+
+def register_stage(document_type: str, stage: Stage) -> None:
+    """
+    Plug an extra stage into a document type's pipeline.
+
+    The stage can consume any artifact already in the graph (``file_content``,
+    ``image_bgr``, ``gray``, ``pil_image``, ``extracted_text``, ...). To act as a
+    validator it should output an artifact named ``"check:<name>"`` holding
+    ``{"passed": bool, "message": str}``; a failing check fails the document.
+    ``gray`` and arrays from ``buffers`` are reused once the run ends, so
+    reported artifacts must not be views of them.
+    """
+    if document_type not in DOCUMENT_PIPELINES:
+        raise ValueError(f"Unknown document type '{document_type}'")
+    DOCUMENT_PIPELINES[document_type].add_stage(stage)
+
+
+def process_document(file_content: bytes, document_type: str, expected_passport_number: str = None,
+                     deadline: Deadline = None, tenant: str = DEFAULT_TENANT) -> dict:
+    """
+    Process uploaded document with OCR and validation.
+
+    A ``deadline`` is handed to every stage and bounds each OCR call. If it
+    passes, DeadlineExceeded is raised instead of returning a failed result.
+    OCR is queued under ``tenant``; TenantQueueFull is raised, not reported
+    as a failed document, when that tenant already has too much waiting.
+
+    Image intermediates come from the worker's buffer pool and go back to it
+    when the run ends.
+    """
+    result = {
+        "document_type": document_type,
+        "extracted_text": "",
+        "validation_passed": False,
+        "validation_message": ""
+    }
+
+    buffers = BufferLease()
+    try:
+        graph = DOCUMENT_PIPELINES.get(document_type, DOCUMENT_PIPELINES["supporting"])
+        run = graph.run({
+            "file_content": file_content,
+            "expected_passport_number": expected_passport_number,
+            "buffers": buffers,
+            "tenant": tenant,
+        }, deadline=deadline)
+        artifacts = run.artifacts
+
+        result["extracted_text"] = artifacts.get("extracted_text", "")
+        result["validation_passed"] = bool(artifacts["validation"]["passed"])
+        result["validation_message"] = artifacts["validation"]["message"]
+
+        for stage in graph.stages:
+            for name in stage.report:
+                result[name] = artifacts[name]
+
+        checks = {
+            name[len(CHECK_PREFIX):]: value
+            for name, value in artifacts.items() if name.startswith(CHECK_PREFIX)
+        }
+        if checks:
+            result["checks"] = checks
+            failed = [check.get("message", name) for name, check in checks.items() if not check.get("passed")]
+            if failed:
+                result["validation_passed"] = False
+                result["validation_message"] = "; ".join([result["validation_message"]] + failed)
+
+        result["stage_timings_ms"] = run.timings
+
+    except DeadlineExceeded:
+        # Stages still running may keep writing into their buffers, so
+        # they are left to the garbage collector rather than reused
+        buffers.discard()
+        raise
+    except TenantQueueFull:
+        raise
+    except Exception as e:
+        result["validation_passed"] = False
+        result["validation_message"] = f"Error processing document: {str(e)}"
+    finally:
+        buffers.close()
+
+    return result
@@ -0,0 +1,429 @@
+import fcntl
+import hashlib
+import json
+import math
+import os
+import random
+import string
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.services import metrics
+from app.services.config import parse_pairs
+
+ID_ALPHABET = string.ascii_uppercase + string.digits
+
+# One template per kind of ID: a run of X marks the generated characters,
+# anything around it is literal (``{year}`` is replaced by the current year).
+# ID_FORMATS overrides or adds kinds, e.g. "payment:PAY-XXXXXXXX"
+DEFAULT_ID_FORMATS = {
+    "ds160": "XXXXXXXX",
+    "payment": "XXXXXXXX",
+    "interview": "XXXXXXXX",
+    "biometrics": "XXXXXXXX",
+    "visa_number": "{year}XXXXXX",
+}
+ID_FORMATS = {**DEFAULT_ID_FORMATS, **parse_pairs(os.environ.get("ID_FORMATS", ""))}
+
+# Sequence numbers a thread takes at once. The block source is only locked
+# once per block, so this is the number of IDs issued per lock
+ID_BLOCK_SIZE = int(os.environ.get("ID_BLOCK_SIZE", "4096"))
+
+# Counter file shared by every worker process on the host. Set it empty only
+# for a single process: each process then draws from its own counter under
+# its own random key, and two processes would issue colliding codes
+ID_BLOCK_FILE = os.environ.get("ID_BLOCK_FILE", os.path.join(tempfile.gettempdir(), "visa_id_blocks.json"))
+
+# Reserved codes expected per kind before the filter is grown, and its
+# false-positive rate (a false positive costs one exact lookup)
+ID_FILTER_CAPACITY = 100_000
+ID_FILTER_ERROR_RATE = 0.001
+
+# Application fields holding each kind of ID, for reserving existing codes
+ID_FIELDS = {
+    "ds160": "ds160_confirmation_id",
+    "payment": "payment_confirmation_id",
+    "interview": "interview_confirmation_id",
+    "biometrics": "biometrics_confirmation_id",
+    "visa_number": "visa_number",
+}
+
+
+class IdSpaceExhausted(RuntimeError):
+    def __init__(self, kind: str):
+        super().__init__(f"No {kind} IDs left; widen its format")
+        self.kind = kind
+
+
+# Characters encoded per table lookup; a 36-character alphabet gives a
+# 46656-entry table, shared by every format using that alphabet
+CHUNK_WIDTH = 3
+_chunk_tables: Dict[tuple, list] = {}
+
+
+def chunk_table(alphabet: str, width: int) -> list:
+    """Every ``width``-character string over ``alphabet``, indexed by its value"""
+    table = _chunk_tables.get((alphabet, width))
+    if table is None:
+        table = [""]
+        for _ in range(width):
+            table = [prefix + char for prefix in table for char in alphabet]
+        _chunk_tables[(alphabet, width)] = table
+    return table
+
+
+# Bits per Bloom filter block, the number of distinct per-item bit patterns,
+# and the extra bits blocking needs to keep the requested error rate
+BLOOM_BLOCK_BITS = 512
+BLOOM_MASKS = 1 << 16
+BLOCKED_BLOOM_OVERHEAD = 1.3
+_bloom_masks: Dict[int, list] = {}
+
+
+def bloom_masks(hashes: int) -> list:
+    """``BLOOM_MASKS`` block masks of ``hashes`` random bits each (rarely fewer, when two coincide)"""
+    masks = _bloom_masks.get(hashes)
+    if masks is None:
+        getrandbits = random.Random(hashes).getrandbits
+        width = BLOOM_BLOCK_BITS.bit_length() - 1
+        masks = []
+        for _ in range(BLOOM_MASKS):
+            mask = 0
+            for _ in range(hashes):
+                mask |= 1 << getrandbits(width)
+            masks.append(mask)
+        _bloom_masks[hashes] = masks
+    return masks
+
+
+class IdFormat:
+    """A parsed ID template: literal prefix, generated characters, literal suffix"""
+
+    def __init__(self, template: str, alphabet: str = ID_ALPHABET):
+        start = template.find("X")
+        if start < 0:
+            raise ValueError(f"ID format '{template}' has no X characters to generate")
+        end = start
+        while end < len(template) and template[end] == "X":
+            end += 1
+        if "X" in template[end:]:
+            raise ValueError(f"ID format '{template}' must have a single run of X characters")
+        if len(set(alphabet)) != len(alphabet) or len(alphabet) < 2:
+            raise ValueError("ID alphabet needs at least two distinct characters")
+        self.template = template
+        self.prefix = template[:start]
+        self.suffix = template[end:]
+        self.length = end - start
+        self.alphabet = alphabet
+        self.space = len(alphabet) ** self.length
+        self._dated = "{" in self.prefix or "{" in self.suffix
+        self._dated_cache = None
+        # Least significant chunk first: (strings for every chunk value, chunk base)
+        self._chunks = []
+        remaining = self.length
+        while remaining:
+            width = min(CHUNK_WIDTH, remaining)
+            table = chunk_table(alphabet, width)
+            self._chunks.append((table, len(table)))
+            remaining -= width
+
+    def render(self, number: int) -> str:
+        """Encode ``number`` (below ``space``) as the generated characters, padded to length"""
+        body = ""
+        for table, base in self._chunks:
+            number, digit = divmod(number, base)
+            body = table[digit] + body
+        if self._dated:
+            prefix, suffix = self._dated_parts()
+            return prefix + body + suffix
+        return self.prefix + body + self.suffix
+
+    def _dated_parts(self) -> tuple:
+        """Prefix and suffix with ``{year}`` filled in, re-rendered when the year changes"""
+        year = time.localtime().tm_year
+        parts = self._dated_cache
+        if parts is None or parts[0] != year:
+            parts = self._dated_cache = (year, self.prefix.format(year=year), self.suffix.format(year=year))
+        return parts[1], parts[2]
+
+
+class Permutation:
+    """
+    A keyed bijection on ``range(size)``.
+
+    A four-round Feistel network over the smallest even number of bits that
+    covers ``size``; outputs that land outside the range are fed back in
+    (cycle walking), which keeps it a bijection. Consecutive sequence numbers
+    so come out as distinct, unguessable-looking codes.
+    """
+
+    def __init__(self, size: int, key: bytes):
+        bits = max(2, (size - 1).bit_length())
+        bits += bits & 1
+        self.size = size
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        # Round keys no wider than a half, so round arithmetic stays in small ints
+        self.round_keys = tuple(int.from_bytes(digest[i:i + 4], "big") & self.mask for i in range(0, 16, 4))
+
+    def __call__(self, number: int) -> int:
+        half, mask, size = self.half, self.mask, self.size
+        k0, k1, k2, k3 = self.round_keys
+        while True:
+            left, right = number >> half, number & mask
+            left ^= ((right ^ k0) * 0x9E3779B1 >> 11) & mask
+            right ^= ((left ^ k1) * 0x85EBCA6B >> 11) & mask
+            left ^= ((right ^ k2) * 0xC2B2AE35 >> 11) & mask
+            right ^= ((left ^ k3) * 0x27D4EB2F >> 11) & mask
+            number = (left << half) | right
+            if number < size:
+                return number
+
+
+class BloomFilter:
+    """
+    Set membership in a few bits per item; may say yes for items never added, never no for added ones.
+
+    Blocked layout: an item's bits all fall in one 512-bit block (a cache
+    line), picked by one hash, with the bit pattern taken from a table of
+    precomputed masks. A lookup is one hash, one block and one mask test
+    instead of a probe per bit; the price is slightly more bits for the same
+    false-positive rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = ID_FILTER_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        bits = -self.capacity * math.log(error_rate) / math.log(2) ** 2 * BLOCKED_BLOOM_OVERHEAD
+        self.blocks = [0] * max(1, math.ceil(bits / BLOOM_BLOCK_BITS))
+        self.hashes = max(1, round(-math.log2(error_rate)))
+        self._masks = bloom_masks(self.hashes)
+        self.count = 0
+
+    def _locate(self, item: str):
+        # The filter never leaves the process, so the built-in (per-process
+        # salted) hash is enough and far cheaper than a cryptographic one
+        value = hash(item) & 0xFFFFFFFFFFFFFFFF
+        return (value >> 16) % len(self.blocks), self._masks[value & (BLOOM_MASKS - 1)]
+
+    def add(self, item: str) -> None:
+        block, mask = self._locate(item)
+        self.blocks[block] |= mask
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        value = hash(item) & 0xFFFFFFFFFFFFFFFF
+        mask = self._masks[value & (BLOOM_MASKS - 1)]
+        return self.blocks[(value >> 16) % len(self.blocks)] & mask == mask
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class LocalBlockSource:
+    """Sequence blocks from counters in this process, under a random key"""
+
+    def __init__(self, key: Optional[bytes] = None):
+        self.key = key or os.urandom(16)
+        self._next: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, kind: str, size: int) -> int:
+        """Reserve ``size`` sequence numbers for ``kind`` and return the first"""
+        with self._lock:
+            start = self._next.get(kind, 0)
+            self._next[kind] = start + size
+        return start
+
+
+class FileBlockSource:
+    """
+    Sequence blocks from a counter file shared by every worker on the host.
+
+    The file holds the permutation key and the next free sequence number per
+    kind; claiming a block takes an exclusive ``flock`` for one read and
+    write. Counters survive restarts, so codes are never reissued.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._locked() as state:
+            if "key" not in state:
+                state["key"] = os.urandom(16).hex()
+                state["next"] = {}
+            self.key = bytes.fromhex(state["key"])
+
+    def _locked(self):
+        return _LockedState(self.path)
+
+    def claim(self, kind: str, size: int) -> int:
+        """Reserve ``size`` sequence numbers for ``kind`` and return the first"""
+        with self._locked() as state:
+            start = state["next"].get(kind, 0)
+            state["next"][kind] = start + size
+        return start
+
+
+class _LockedState:
+    """The JSON state of a block file, read and written back under an exclusive lock"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self) -> dict:
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        raw = b""
+        while True:
+            chunk = os.read(self._fd, 65536)
+            if not chunk:
+                break
+            raw += chunk
+        self._state = json.loads(raw) if raw else {}
+        return self._state
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                data = json.dumps(self._state).encode()
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.ftruncate(self._fd, 0)
+                os.write(self._fd, data)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        return False
+
+
+class IdService:
+    """
+    Issues confirmation codes and other IDs that never collide.
+
+    Each kind of ID has a format and a keyed permutation of its code space.
+    A thread takes a block of ``block_size`` sequence numbers from the block
+    source and turns them into codes through the permutation, so codes are
+    unique by construction and only claiming a block is synchronised.
+
+    Codes that already exist but were not issued under this key (earlier
+    runs with another key, imported applications) are ``reserve``d; codes
+    issued under this key need not be, as the permutation never repeats
+    one. Every new code is checked against the reserved ones: a Bloom filter
+    rules out nearly all codes with one block test, and only possible hits
+    are confirmed exactly and skipped. Confirmation uses an in-memory set of
+    the reserved codes, or ``confirm(kind, code)`` when given, in which case
+    only the filter (about 2 bytes per code) is held in memory.
+    """
+
+    def __init__(
+        self,
+        formats: Optional[Dict[str, str]] = None,
+        source=None,
+        block_size: int = ID_BLOCK_SIZE,
+        filter_capacity: int = ID_FILTER_CAPACITY,
+        error_rate: float = ID_FILTER_ERROR_RATE,
+        confirm: Optional[Callable[[str, str], bool]] = None,
+    ):
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.source = source or LocalBlockSource()
+        self.block_size = block_size
+        self.filter_capacity = filter_capacity
+        self.error_rate = error_rate
+        self.confirm = confirm
+        self.formats: Dict[str, IdFormat] = {}
+        self._permutations: Dict[str, Permutation] = {}
+        # Per kind, filters of doubling capacity; a full one is kept and a
+        # larger one started, so nothing has to be re-added
+        self._filters: Dict[str, List[BloomFilter]] = {}
+        self._reserved: Dict[str, set] = {}
+        self._reserve_lock = threading.Lock()
+        self._local = threading.local()
+        for kind, template in (formats if formats is not None else ID_FORMATS).items():
+            self.configure(kind, template)
+
+    def configure(self, kind: str, template: str, alphabet: str = ID_ALPHABET) -> None:
+        """Set the format for ``kind``; threads pick up fresh blocks for it"""
+        id_format = IdFormat(template, alphabet)
+        self.formats[kind] = id_format
+        self._permutations[kind] = Permutation(id_format.space, self.source.key + kind.encode())
+
+    def issue(self, kind: str) -> str:
+        """A new ID of ``kind`` that was never issued before and is not reserved"""
+        id_format = self.formats.get(kind)
+        if id_format is None:
+            raise ValueError(f"Unknown ID kind '{kind}'")
+        permutation = self._permutations[kind]
+        block = self._local.__dict__.get(kind)
+        while True:
+            number = next(block, None) if block is not None else None
+            if number is None:
+                block = self._claim_block(kind, id_format)
+                number = next(block)
+            code = id_format.render(permutation(number))
+            if not self._is_reserved(kind, code):
+                return code
+            metrics.increment("id_reserved_skips_total", labels={"kind": kind})
+
+    def _claim_block(self, kind: str, id_format: IdFormat):
+        """Give this thread a fresh block of sequence numbers for ``kind``"""
+        start = self.source.claim(kind, self.block_size)
+        if start >= id_format.space:
+            raise IdSpaceExhausted(kind)
+        block = self._local.__dict__[kind] = iter(range(start, min(start + self.block_size, id_format.space)))
+        metrics.increment("id_blocks_claimed_total", labels={"kind": kind})
+        return block
+
+    def _is_reserved(self, kind: str, code: str) -> bool:
+        filters = self._filters.get(kind)
+        if filters is None or not any(code in bloom for bloom in filters):
+            return False
+        metrics.increment("id_filter_hits_total", labels={"kind": kind})
+        if self.confirm is not None:
+            return self.confirm(kind, code)
+        return code in self._reserved[kind]
+
+    def reserve(self, kind: str, code: str) -> None:
+        """Never issue ``code`` for ``kind`` (it exists already)"""
+        with self._reserve_lock:
+            if self.confirm is None:
+                reserved = self._reserved.setdefault(kind, set())
+                if code in reserved:
+                    return
+                reserved.add(code)
+            filters = self._filters.get(kind)
+            if filters is None:
+                filters = self._filters[kind] = [BloomFilter(self.filter_capacity, self.error_rate)]
+            elif len(filters[-1]) >= filters[-1].capacity:
+                filters.append(BloomFilter(2 * filters[-1].capacity, self.error_rate))
+            filters[-1].add(code)
+
+    def reserve_existing(self, applications: Iterable) -> int:
+        """Reserve every ID already held by ``applications``; returns how many"""
+        reserved = 0
+        for application in applications:
+            for kind, field in ID_FIELDS.items():
+                code = getattr(application, field, None)
+                if code and kind in self.formats:
+                    self.reserve(kind, code)
+                    reserved += 1
+        return reserved
+
+
+def store_confirmation(store) -> Callable[[str, str], bool]:
+    """A ``confirm`` that looks codes up in ``store``'s indexes, so reserved codes need not be held in memory"""
+    def confirm(kind: str, code: str) -> bool:
+        return bool(store.lookup(ID_FIELDS[kind], code))
+    return confirm
+
+
+def open_block_source(path: Optional[str] = ID_BLOCK_FILE):
+    """The shared file source, or a per-process one when ``path`` is empty (single-process use only)"""
+    return FileBlockSource(path) if path else LocalBlockSource()
+
+
+id_service = IdService(source=open_block_source())
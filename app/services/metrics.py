@@ -0,0 +1,77 @@
+import threading
+from typing import Dict, Optional
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, dict] = {}
+
+
+def metric_key(name: str, labels: Optional[dict] = None) -> str:
+    """Flatten a metric name and labels into a key such as ``name{stage=ocr}``"""
+    if not labels:
+        return name
+    label_text = ",".join(f"{key}={labels[key]}" for key in sorted(labels))
+    return f"{name}{{{label_text}}}"
+
+
+def increment(name: str, amount: float = 1, labels: Optional[dict] = None) -> None:
+    key = metric_key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name: str, value: float, labels: Optional[dict] = None) -> None:
+    key = metric_key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name: str, value: float, labels: Optional[dict] = None) -> None:
+    """Record one observation in a count/sum/max summary"""
+    key = metric_key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            _summaries[key] = {"count": 1, "sum": value, "max": value}
+        else:
+            summary["count"] += 1
+            summary["sum"] += value
+            if value > summary["max"]:
+                summary["max"] = value
+
+
+def get_counter(name: str, labels: Optional[dict] = None) -> float:
+    with _lock:
+        return _counters.get(metric_key(name, labels), 0)
+
+
+def get_gauge(name: str, labels: Optional[dict] = None) -> Optional[float]:
+    with _lock:
+        return _gauges.get(metric_key(name, labels))
+
+
+def get_mean(name: str, labels: Optional[dict] = None) -> Optional[float]:
+    """Mean of a summary, or None if nothing was observed"""
+    with _lock:
+        summary = _summaries.get(metric_key(name, labels))
+        if not summary:
+            return None
+        return summary["sum"] / summary["count"]
+
+
+def snapshot() -> dict:
+    """Copy of every metric, with summary means filled in"""
+    with _lock:
+        summaries = {}
+        for key, summary in _summaries.items():
+            summaries[key] = dict(summary, mean=summary["sum"] / summary["count"])
+        return {"counters": dict(_counters), "gauges": dict(_gauges), "summaries": summaries}
+
+
+def reset() -> None:
+    """Clear every metric (used by tests)"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
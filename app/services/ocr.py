@@ -0,0 +1,362 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+from app.services import metrics
+from app.services.deadlines import Deadline, DeadlineExceeded
+
+# OCR profiles used by the adaptive extractor. The fast profile works on a
+# downscaled copy of the page; the quality profile runs at full resolution on a
+# contrast-normalised grayscale image and upscales small scans.
+OCR_PROFILES = {
+    "fast": {
+        "config": "--oem 1 --psm 6",
+        "max_pixels": 1_000_000,
+        "min_width": 0,
+        "normalize": False,
+    },
+    "quality": {
+        "config": "--psm 6",
+        "max_pixels": None,
+        "min_width": 1000,
+        "normalize": True,
+    },
+}
+
+# Mean word confidence (0-100, as reported by tesseract) at which the fast pass
+# is trusted and the quality pass is skipped
+ADAPTIVE_OCR_MIN_CONFIDENCE = 80.0
+
+# Pages at least this large are split into text regions that are OCR'd in
+# parallel instead of being read in a single tesseract pass. Region OCR runs
+# one tesseract process per core; deployments that use it should start the
+# service with OMP_THREAD_LIMIT=1 so each of those processes does not also
+# spawn its own OpenMP threads and oversubscribe the machine. It is not set
+# here because it would apply to every tesseract call in the process
+REGION_OCR_MIN_PIXELS = 2_000_000
+REGION_OCR_WORKERS = os.cpu_count() or 1
+REGION_OCR_CONFIG = "--psm 6"
+
+_region_executor = None
+_region_executor_lock = threading.Lock()
+
+
+def load_image(image_bytes: bytes) -> Image.Image:
+    """Decode uploaded bytes into an RGB PIL image"""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+
+def prepare_image(image: Image.Image, profile: dict) -> Image.Image:
+    """Resize and normalise an image for the given OCR profile"""
+    width, height = image.size
+
+    max_pixels = profile.get("max_pixels")
+    if max_pixels and width * height > max_pixels:
+        scale = (max_pixels / float(width * height)) ** 0.5
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.BILINEAR)
+
+    min_width = profile.get("min_width") or 0
+    if width < min_width:
+        scale = min_width / float(width)
+        image = image.resize((min_width, max(1, int(height * scale))), Image.LANCZOS)
+
+    if profile.get("normalize"):
+        image = ImageOps.autocontrast(image.convert('L'))
+
+    return image
+
+
+def ocr_words(
+    image: Image.Image, config: str = '--psm 6', timeout: float = 0, deadline: Optional[Deadline] = None
+) -> Tuple[str, List[float]]:
+    """
+    Run tesseract and return the recognised text with the per-word confidences.
+
+    The text is rebuilt from tesseract's word boxes so that it keeps the same
+    line structure as ``image_to_string``. With a ``deadline`` the tesseract
+    process is given the remaining budget as its timeout and killed when it
+    runs over.
+    """
+    if deadline is not None:
+        timeout = deadline.timeout_for_call("OCR")
+    try:
+        data = pytesseract.image_to_data(
+            image, config=config, output_type=pytesseract.Output.DICT, timeout=timeout
+        )
+    except RuntimeError as e:
+        if timeout and "timeout" in str(e).lower():
+            metrics.increment("deadline_ocr_timeouts_total")
+            raise DeadlineExceeded(f"OCR exceeded its {timeout:.2f}s budget")
+        raise
+
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data.get("text", [])):
+        word = (word or "").strip()
+        if not word:
+            continue
+        try:
+            confidence = float(data["conf"][i])
+        except (TypeError, ValueError):
+            confidence = -1.0
+        if confidence >= 0:
+            confidences.append(confidence)
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(line_key, []).append(word)
+
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    return text, confidences
+
+
+def mean_confidence(confidences: List[float]) -> Optional[float]:
+    """Mean of tesseract word confidences, or None when no words were read"""
+    return round(sum(confidences) / len(confidences), 2) if confidences else None
+
+
+def ocr_with_confidence(
+    image: Image.Image, config: str = '--psm 6', timeout: float = 0, deadline: Optional[Deadline] = None
+) -> Tuple[str, Optional[float]]:
+    """Run tesseract and return the recognised text with the mean word confidence"""
+    text, confidences = ocr_words(image, config=config, timeout=timeout, deadline=deadline)
+    return text, mean_confidence(confidences)
+
+
+def adaptive_extract_text(
+    image_bytes: bytes,
+    accept: Optional[Callable[[str], bool]] = None,
+    min_confidence: float = ADAPTIVE_OCR_MIN_CONFIDENCE,
+    deadline: Optional[Deadline] = None,
+) -> dict:
+    """Decode an upload and run :func:`adaptive_ocr` on it"""
+    try:
+        image = load_image(image_bytes)
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from image: {str(e)}")
+    return adaptive_ocr(image, accept=accept, min_confidence=min_confidence, deadline=deadline)
+
+
+def adaptive_ocr(
+    image: Image.Image,
+    accept: Optional[Callable[[str], bool]] = None,
+    min_confidence: float = ADAPTIVE_OCR_MIN_CONFIDENCE,
+    deadline: Optional[Deadline] = None,
+) -> dict:
+    """
+    Extract text with a cheap first pass and an optional high-quality second pass.
+
+    The fast pass runs on a downscaled image. Its result is returned straight
+    away when ``accept(text)`` is true (for example, the expected passport number
+    was found) or when its mean word confidence reaches ``min_confidence``.
+    Otherwise the page is re-read with the quality profile and the more confident
+    of the two passes is kept.
+
+    Returns a dict with ``text``, ``mean_confidence``, ``ocr_passes`` and the
+    ``ocr_profile`` that produced the text.
+    """
+    try:
+        passes = 0
+        best = None
+        for profile_name in ("fast", "quality"):
+            profile = OCR_PROFILES[profile_name]
+            text, confidence = ocr_with_confidence(
+                prepare_image(image, profile), config=profile["config"], deadline=deadline
+            )
+            passes += 1
+
+            candidate = {
+                "text": text.strip(),
+                "mean_confidence": confidence,
+                "ocr_passes": passes,
+                "ocr_profile": profile_name,
+            }
+            if best is None or (confidence or 0) >= (best["mean_confidence"] or 0):
+                best = candidate
+            best["ocr_passes"] = passes
+
+            # Early exit when the caller already has what it needs
+            if accept is not None and candidate["text"] and accept(candidate["text"]):
+                return candidate
+            if confidence is not None and confidence >= min_confidence:
+                break
+
+        return best
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from image: {str(e)}")
+
+
+def detect_text_regions(gray: np.ndarray, min_height: int = 8) -> List[Tuple[int, int, int, int]]:
+    """
+    Find text blocks on a grayscale page using morphological operations.
+
+    Character strokes are picked out with a morphological gradient, binarised
+    with Otsu's threshold and then closed with a wide kernel so that characters
+    merge into words, words into lines and neighbouring lines into blocks.
+    Returns ``(x, y, w, h)`` boxes sorted in reading order.
+    """
+    page_height, page_width = gray.shape[:2]
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    # Kernel scales with the page so the same settings work for phone photos
+    # and 300 dpi scans
+    block_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(9, page_width // 60), max(3, page_height // 200))
+    )
+    blocks = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, block_kernel)
+    blocks = cv2.dilate(blocks, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+
+    contours = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+    pad = 4
+    regions = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h < min_height or w < min_height:
+            continue
+        x0, y0 = max(0, x - pad), max(0, y - pad)
+        x1, y1 = min(page_width, x + w + pad), min(page_height, y + h + pad)
+        regions.append((x0, y0, x1 - x0, y1 - y0))
+
+    return sort_reading_order(merge_overlapping_regions(regions))
+
+
+def merge_overlapping_regions(regions: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """Merge boxes that overlap so no text is OCR'd twice"""
+    merged = list(regions)
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        while merged:
+            x, y, w, h = merged.pop()
+            i = 0
+            while i < len(merged):
+                ox, oy, ow, oh = merged[i]
+                if x < ox + ow and ox < x + w and y < oy + oh and oy < y + h:
+                    nx, ny = min(x, ox), min(y, oy)
+                    w, h = max(x + w, ox + ow) - nx, max(y + h, oy + oh) - ny
+                    x, y = nx, ny
+                    merged.pop(i)
+                    changed = True
+                else:
+                    i += 1
+            result.append((x, y, w, h))
+        merged = result
+    return merged
+
+
+def sort_reading_order(regions: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """
+    Sort boxes top-to-bottom, then left-to-right within a row.
+
+    Boxes whose vertical extents overlap are treated as one row so that
+    side-by-side columns are read left to right.
+    """
+    rows = []
+    for region in sorted(regions, key=lambda r: (r[1], r[0])):
+        x, y, w, h = region
+        for row in rows:
+            row_top, row_bottom, members = row
+            if y < row_bottom and row_top < y + h:
+                members.append(region)
+                row[0], row[1] = min(row_top, y), max(row_bottom, y + h)
+                break
+        else:
+            rows.append([y, y + h, [region]])
+
+    ordered = []
+    for _, _, members in sorted(rows, key=lambda row: row[0]):
+        ordered.extend(sorted(members, key=lambda r: r[0]))
+    return ordered
+
+
+def get_region_executor() -> ThreadPoolExecutor:
+    """Shared pool for region OCR; tesseract runs out of process so threads scale across cores"""
+    global _region_executor
+    with _region_executor_lock:
+        if _region_executor is None:
+            _region_executor = ThreadPoolExecutor(max_workers=REGION_OCR_WORKERS, thread_name_prefix="region-ocr")
+        return _region_executor
+
+
+def extract_text_by_regions(
+    image: Image.Image, config: str = REGION_OCR_CONFIG, deadline: Optional[Deadline] = None
+) -> dict:
+    """
+    OCR a large page by detecting text regions and reading them in parallel.
+
+    Whitespace never reaches tesseract, and each region is read by its own
+    tesseract process. The region texts are joined in reading order. Falls
+    back to a single full-page pass when no regions are found. Regions still
+    queued when the deadline passes are never started.
+    """
+    gray = np.asarray(image.convert('L'))
+    regions = detect_text_regions(gray)
+    if not regions:
+        text, confidences = ocr_words(image, config=config, deadline=deadline)
+        return {
+            "text": text.strip(),
+            "mean_confidence": mean_confidence(confidences),
+            "ocr_passes": 1,
+            "ocr_profile": "full_page",
+            "ocr_regions": 0,
+        }
+
+    crops = [image.crop((x, y, x + w, y + h)) for x, y, w, h in regions]
+    results = list(get_region_executor().map(lambda crop: ocr_words(crop, config=config, deadline=deadline), crops))
+
+    texts = [text.strip() for text, _ in results if text.strip()]
+    confidences = [confidence for _, region_confidences in results for confidence in region_confidences]
+    return {
+        "text": "\n".join(texts),
+        "mean_confidence": mean_confidence(confidences),
+        "ocr_passes": 1,
+        "ocr_profile": "regions",
+        "ocr_regions": len(regions),
+    }
+
+
+def extract_document_text(
+    image_bytes: bytes, accept: Optional[Callable[[str], bool]] = None, deadline: Optional[Deadline] = None
+) -> dict:
+    """Decode an upload and run :func:`ocr_document_image` on it"""
+    try:
+        image = load_image(image_bytes)
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from image: {str(e)}")
+    return ocr_document_image(image, accept=accept, deadline=deadline)
+
+
+def ocr_document_image(
+    image: Image.Image, accept: Optional[Callable[[str], bool]] = None, deadline: Optional[Deadline] = None
+) -> dict:
+    """
+    Pick the OCR strategy for a decoded document.
+
+    Large pages go through parallel region OCR; everything else uses the
+    adaptive fast/quality passes.
+    """
+    width, height = image.size
+    if width * height < REGION_OCR_MIN_PIXELS:
+        return adaptive_ocr(image, accept=accept, deadline=deadline)
+
+    try:
+        return extract_text_by_regions(image, deadline=deadline)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        raise ValueError(f"Failed to extract text from image: {str(e)}")
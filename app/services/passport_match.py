@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional, Tuple
+
+# Characters tesseract mixes up in passport fonts. Within a group any
+# character matches any other; such a match is counted as a confusion rather
+# than an edit
+OCR_CONFUSION_GROUPS = ("0ODQ", "1IL", "2Z", "5S", "6G", "8B")
+
+# Default error budget: edits (insertions, deletions and substitutions outside
+# a confusion group) and confusions a match may use
+PASSPORT_MATCH_MAX_EDITS = 1
+PASSPORT_MATCH_MAX_CONFUSIONS = 2
+
+# Numbers shorter than this must match without edits; one edit on a short
+# number makes chance matches in a page of OCR text too likely
+MIN_LENGTH_FOR_EDITS = 8
+
+_CONFUSION_GROUP = {char: group for group in OCR_CONFUSION_GROUPS for char in group}
+
+
+def confusable(a: str, b: str) -> bool:
+    """Whether two different characters are a known OCR confusion"""
+    group = _CONFUSION_GROUP.get(a)
+    return group is not None and b in group
+
+
+def compact(text: str) -> Tuple[str, List[int]]:
+    """Upper-cased text without whitespace, and the original index of each kept character"""
+    kept = []
+    positions = []
+    for index, char in enumerate(text):
+        if not char.isspace():
+            kept.append(char.upper())
+            positions.append(index)
+    return "".join(kept), positions
+
+
+def pattern_masks(pattern: str) -> Dict[str, int]:
+    """Per character, the bitmask of pattern positions it matches exactly or by confusion"""
+    masks: Dict[str, int] = {}
+    for position, char in enumerate(pattern):
+        bit = 1 << position
+        for equivalent in _CONFUSION_GROUP.get(char, char):
+            masks[equivalent] = masks.get(equivalent, 0) | bit
+    return masks
+
+
+def candidate_ends(text: str, pattern: str, max_distance: int) -> List[Tuple[int, int]]:
+    """
+    (end index, distance) of every position where an occurrence of ``pattern`` ends.
+
+    Myers' bit-vector algorithm: the DP column for each text character is held
+    in two integers, so the scan is O(len(text)) word operations for numbers
+    up to the machine word size. Confusions count as matches here; the caller
+    prices them when it aligns each candidate.
+    """
+    m = len(pattern)
+    masks = pattern_masks(pattern)
+    full = (1 << m) - 1
+    high = 1 << (m - 1)
+    vp, vn, score = full, 0, m
+    ends = []
+    for index, char in enumerate(text):
+        eq = masks.get(char, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        if hp & high:
+            score += 1
+        elif hn & high:
+            score -= 1
+        # No carry into the first row: an occurrence may start anywhere
+        hp = (hp << 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+        if score <= max_distance:
+            ends.append((index, score))
+    return ends
+
+
+def align(text: str, pattern: str, end: int, max_edits: int) -> Tuple[int, int, int]:
+    """
+    (start, edits, confusions) of the cheapest occurrence of ``pattern`` ending at ``end``.
+
+    A small DP over the window that can hold the occurrence; costs compare
+    edits first, then confusions.
+    """
+    window_start = max(0, end + 1 - len(pattern) - max_edits)
+    window = text[window_start:end + 1]
+    # Each cell is (edits, confusions, start in window); row 0 lets the
+    # occurrence start at any column
+    previous = [(0, 0, column) for column in range(len(window) + 1)]
+    for row, expected in enumerate(pattern, 1):
+        current = [(row, 0, 0)]
+        for column, char in enumerate(window, 1):
+            diagonal = previous[column - 1]
+            if char == expected:
+                best = diagonal
+            elif confusable(expected, char):
+                best = (diagonal[0], diagonal[1] + 1, diagonal[2])
+            else:
+                best = (diagonal[0] + 1, diagonal[1], diagonal[2])
+            up = previous[column]
+            left = current[column - 1]
+            best = min(best, (up[0] + 1, up[1], up[2]), (left[0] + 1, left[1], left[2]))
+            current.append(best)
+        previous = current
+    edits, confusions, start = previous[-1]
+    return window_start + start, edits, confusions
+
+
+def match_passport_number(
+    extracted_text: str,
+    expected_passport_number: str,
+    max_edits: int = PASSPORT_MATCH_MAX_EDITS,
+    max_confusions: int = PASSPORT_MATCH_MAX_CONFUSIONS,
+) -> Optional[dict]:
+    """
+    Find the expected passport number in OCR text, allowing for OCR slips.
+
+    Whitespace is ignored and case folded, as before. Characters from the same
+    OCR confusion group (0/O, 1/I, 5/S, 8/B, ...) match at the cost of a
+    confusion; anything else costs an edit. Numbers shorter than
+    ``MIN_LENGTH_FOR_EDITS`` get no edits.
+
+    Returns None, or the best match as ``{"start", "end", "matched",
+    "distance", "edits", "confusions"}`` with ``start``/``end`` indexing the
+    original text and ``distance`` = edits + confusions.
+    """
+    pattern, _ = compact(expected_passport_number)
+    if not pattern:
+        return None
+    text, positions = compact(extracted_text)
+    if len(pattern) < MIN_LENGTH_FOR_EDITS:
+        max_edits = 0
+
+    exact = text.find(pattern)
+    if exact >= 0:
+        best = (0, 0, exact, exact + len(pattern) - 1)
+    else:
+        best = None
+        for end, _ in candidate_ends(text, pattern, max_edits):
+            start, edits, confusions = align(text, pattern, end, max_edits)
+            if edits > max_edits or confusions > max_confusions:
+                continue
+            if best is None or (edits, confusions) < best[:2]:
+                best = (edits, confusions, start, end)
+        if best is None:
+            return None
+
+    edits, confusions, start, end = best
+    return {
+        "start": positions[start],
+        "end": positions[end] + 1,
+        "matched": extracted_text[positions[start]:positions[end] + 1],
+        "distance": edits + confusions,
+        "edits": edits,
+        "confusions": confusions,
+    }
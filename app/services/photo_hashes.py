@@ -0,0 +1,254 @@
+import threading
+from array import array
+from datetime import datetime
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.models.visa_application import VisaApplication
+from app.storage.base import ApplicationStore, StoreListener
+
+HASH_BITS = 64
+
+# Default Hamming distance (out of 64 bits) under which two photos are reported
+# as near-duplicates. Re-encoded or lightly cropped copies of the same photo
+# usually land well below this; unrelated faces sit around 32.
+NEAR_DUPLICATE_MAX_DISTANCE = 10
+
+
+def decode_grayscale(image_bytes: bytes) -> np.ndarray:
+    """Decode uploaded bytes straight to a grayscale array"""
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    gray = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError("Could not decode image")
+    return gray
+
+
+def bits_to_int(bits: np.ndarray) -> int:
+    """Pack a flat boolean array into an integer, most significant bit first"""
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def compute_phash(gray: np.ndarray) -> int:
+    """
+    DCT perceptual hash.
+
+    The image is shrunk to 32x32 and the 8x8 lowest-frequency DCT coefficients
+    are compared with their median, which survives re-encoding, resizing and
+    small brightness changes.
+    """
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(small)[:8, :8]
+    return bits_to_int(low_freq > np.median(low_freq))
+
+
+def compute_dhash(gray: np.ndarray) -> int:
+    """Difference hash: whether each pixel of a 9x8 thumbnail is brighter than its right neighbour"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def compute_photo_hashes(image_bytes: bytes) -> dict:
+    """Compute pHash and dHash for an uploaded photo as 16-digit hex strings"""
+    gray = decode_grayscale(image_bytes)
+    return {
+        "phash": format_hash(compute_phash(gray)),
+        "dhash": format_hash(compute_dhash(gray)),
+    }
+
+
+def format_hash(value: int) -> str:
+    return format(value, "016x")
+
+
+def parse_hash(value: str) -> int:
+    """Parse a hex hash, raising ValueError for anything that is not 64 bits"""
+    try:
+        parsed = int(value, 16)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid perceptual hash '{value}'")
+    if parsed < 0 or parsed >= 1 << HASH_BITS:
+        raise ValueError(f"Invalid perceptual hash '{value}'")
+    return parsed
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class HammingIndex:
+    """
+    Multi-index hash table for Hamming-distance queries over 64-bit hashes.
+
+    Each hash is split into ``chunks`` equal substrings and every substring is
+    indexed in its own table. By the pigeonhole principle, two hashes within
+    distance ``r`` agree to within ``r // chunks`` bits on at least one
+    substring, so a query only has to probe the substring neighbourhoods and
+    verify the candidates it finds, instead of scanning every stored hash.
+    """
+
+    def __init__(self, chunks: int = 4):
+        if HASH_BITS % chunks:
+            raise ValueError("Hash size must be divisible by the number of chunks")
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.chunk_mask = (1 << self.chunk_bits) - 1
+        self.hashes = array('Q')
+        self.items = []
+        self.tables = [{} for _ in range(chunks)]
+        # Entry ids of removed hashes, handed out again by add
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.hashes) - len(self._free)
+
+    def split(self, value: int) -> List[int]:
+        return [(value >> (i * self.chunk_bits)) & self.chunk_mask for i in range(self.chunks)]
+
+    def add(self, value: int, item=None) -> int:
+        """Index a hash with an arbitrary payload and return its entry id (possibly one freed by ``remove``)"""
+        with self._lock:
+            if self._free:
+                entry_id = self._free.pop()
+                self.hashes[entry_id] = value
+                self.items[entry_id] = item
+            else:
+                entry_id = len(self.hashes)
+                self.hashes.append(value)
+                self.items.append(item)
+            for table, chunk in zip(self.tables, self.split(value)):
+                bucket = table.get(chunk)
+                if bucket is None:
+                    table[chunk] = [entry_id]
+                else:
+                    bucket.append(entry_id)
+            return entry_id
+
+    def remove(self, entry_id: int) -> None:
+        """Stop returning an entry; its id is reused by the next ``add``"""
+        with self._lock:
+            for table, chunk in zip(self.tables, self.split(self.hashes[entry_id])):
+                bucket = table.get(chunk)
+                if bucket is not None and entry_id in bucket:
+                    bucket.remove(entry_id)
+                    if not bucket:
+                        del table[chunk]
+            self.items[entry_id] = None
+            self._free.append(entry_id)
+
+    def neighbours(self, chunk: int, radius: int):
+        """Yield every chunk value within ``radius`` bit flips of ``chunk``"""
+        for distance in range(radius + 1):
+            for positions in combinations(range(self.chunk_bits), distance):
+                flipped = chunk
+                for position in positions:
+                    flipped ^= 1 << position
+                yield flipped
+
+    def query(self, value: int, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE, limit: Optional[int] = None) -> List[dict]:
+        """Return stored entries within ``max_distance`` bits, closest first"""
+        if max_distance < 0 or max_distance > HASH_BITS:
+            raise ValueError(f"max_distance must be between 0 and {HASH_BITS}")
+
+        sub_radius = max_distance // self.chunks
+        candidates = set()
+        for table, chunk in zip(self.tables, self.split(value)):
+            for neighbour in self.neighbours(chunk, sub_radius):
+                bucket = table.get(neighbour)
+                if bucket:
+                    candidates.update(bucket)
+
+        matches = []
+        for entry_id in candidates:
+            distance = bin(self.hashes[entry_id] ^ value).count("1")
+            if distance <= max_distance:
+                matches.append({"distance": distance, "hash": format_hash(self.hashes[entry_id]), "item": self.items[entry_id]})
+
+        matches.sort(key=lambda match: match["distance"])
+        return matches[:limit] if limit else matches
+
+
+def photo_entry(key: str, application: VisaApplication) -> Optional[Tuple[int, dict]]:
+    """(pHash, match details) for an application's validated photo, or None if it has none"""
+    # Peeked, so applications without documents do not gain a documents record
+    result = (application.peek_field("document_validation_results") or {}).get("photo")
+    if not isinstance(result, dict) or not isinstance(result.get("perceptual_hash"), dict):
+        return None
+    try:
+        phash = parse_hash(result["perceptual_hash"]["phash"])
+    except (KeyError, ValueError):
+        return None
+    uploaded = (application.peek_field("uploaded_documents") or {}).get("photo") or {}
+    return phash, {
+        "application_id": key,
+        "filename": uploaded.get("filename"),
+        "dhash": result["perceptual_hash"].get("dhash"),
+        "indexed_at": datetime.fromtimestamp(application.updated_at).isoformat() if application.updated_at else None
+    }
+
+
+class PhotoHashIndex(StoreListener):
+    """
+    Near-duplicate index over the photos of stored applications.
+
+    Kept current as a store listener and keyed by application key, so a
+    photo is only indexed once its application was stored, and a rewrite
+    or delete drops the old entry. ``rebuild`` repopulates from the hashes
+    kept in the stored validation results, so the index survives restarts.
+    """
+
+    def __init__(self):
+        self.index = HammingIndex()
+        self._entries: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _replace(self, key: str, entry: Optional[Tuple[int, dict]]) -> None:
+        """Point ``key`` at ``entry``; caller holds the lock"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.index.remove(previous)
+        if entry is not None:
+            self._entries[key] = self.index.add(*entry)
+
+    def on_write(self, items) -> None:
+        entries = [(key, photo_entry(key, application)) for key, application in items]
+        with self._lock:
+            for key, entry in entries:
+                if entry is not None or key in self._entries:
+                    self._replace(key, entry)
+
+    def on_delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._replace(key, None)
+
+    def rebuild(self, store: ApplicationStore) -> int:
+        """Replace the index with the photos ``store`` holds; returns how many were indexed"""
+        index = HammingIndex()
+        entries = {}
+        for key, application in store.iter_sorted():
+            entry = photo_entry(key, application)
+            if entry is not None:
+                entries[key] = index.add(*entry)
+        with self._lock:
+            self.index = index
+            self._entries = entries
+        return len(entries)
+
+    def duplicates(self, phash: str, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE) -> dict:
+        """Photos within ``max_distance`` bits of a hex pHash, closest first, and how many are indexed"""
+        matches = self.index.query(parse_hash(phash), max_distance=max_distance)
+        return {
+            "indexed_photos": len(self),
+            "matches": [{"phash": match["hash"], "distance": match["distance"], **match["item"]} for match in matches]
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
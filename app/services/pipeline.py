@@ -0,0 +1,225 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app.services import metrics
+from app.services.deadlines import Deadline, DeadlineExceeded, record_cancellation
+
+
+class Stage:
+    """
+    One step of a document pipeline.
+
+    ``func`` is called with the artifacts named in ``inputs`` as keyword
+    arguments and must return a dict containing every name in ``outputs``.
+    Outputs listed in ``report`` are copied into the document result.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., dict],
+        inputs: Iterable[str] = (),
+        outputs: Iterable[str] = (),
+        report: Iterable[str] = (),
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.report = tuple(report)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+
+class PipelineRun:
+    """Artifacts and per-stage wall-clock timings from one pipeline run"""
+
+    def __init__(self, artifacts: dict, timings: Dict[str, float]):
+        self.artifacts = artifacts
+        self.timings = timings
+
+
+class StageGraph:
+    """
+    A set of stages wired together by the artifacts they consume and produce.
+
+    Stages whose inputs are all available run concurrently on the executor,
+    so independent checks overlap. Every artifact is produced once and shared
+    by all downstream stages, which is how the decoded image is reused.
+    """
+
+    def __init__(self, stages: Iterable[Stage] = ()):
+        self.stages: List[Stage] = []
+        for stage in stages:
+            self.add_stage(stage)
+
+    def add_stage(self, stage: Stage) -> "StageGraph":
+        """Add a stage, rejecting duplicate names, duplicate outputs and cycles"""
+        if any(existing.name == stage.name for existing in self.stages):
+            raise ValueError(f"Stage '{stage.name}' is already registered")
+        produced = {output for existing in self.stages for output in existing.outputs}
+        clashes = produced.intersection(stage.outputs)
+        if clashes:
+            raise ValueError(f"Stage '{stage.name}' redefines artifacts: {', '.join(sorted(clashes))}")
+
+        self.stages.append(stage)
+        try:
+            self.topological_order()
+        except ValueError:
+            self.stages.pop()
+            raise
+        return self
+
+    def topological_order(self) -> List[Stage]:
+        """
+        Order stages so each runs after the stages producing its inputs.
+
+        Inputs that no stage produces are assumed to be supplied by the caller.
+        """
+        producers = {output: stage for stage in self.stages for output in stage.outputs}
+        order, visiting, done = [], set(), set()
+
+        def visit(stage):
+            if stage.name in done:
+                return
+            if stage.name in visiting:
+                raise ValueError(f"Stage '{stage.name}' is part of a dependency cycle")
+            visiting.add(stage.name)
+            for artifact in stage.inputs:
+                producer = producers.get(artifact)
+                if producer is not None:
+                    visit(producer)
+            visiting.discard(stage.name)
+            done.add(stage.name)
+            order.append(stage)
+
+        for stage in self.stages:
+            visit(stage)
+        return order
+
+    def required_inputs(self) -> List[str]:
+        """Artifacts the caller must supply"""
+        produced = {output for stage in self.stages for output in stage.outputs}
+        return sorted({artifact for stage in self.stages for artifact in stage.inputs} - produced)
+
+    def run(
+        self,
+        artifacts: dict,
+        executor: Optional[ThreadPoolExecutor] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> PipelineRun:
+        """
+        Run every stage and return the collected artifacts.
+
+        The first stage failure cancels stages that have not started and is
+        re-raised once running stages have finished. With a ``deadline`` (also
+        passed to stages as the ``deadline`` artifact) no new stage starts after
+        it expires. The caller gets DeadlineExceeded straight away, and stages
+        already running are left to stop at their own timeouts.
+        """
+        artifacts = dict(artifacts)
+        artifacts.setdefault("deadline", deadline)
+        missing = [artifact for artifact in self.required_inputs() if artifact not in artifacts]
+        if missing:
+            raise ValueError(f"Missing pipeline inputs: {', '.join(missing)}")
+
+        executor = executor or get_stage_executor()
+        pending = list(self.topological_order())
+        timings = {}
+        running = {}
+
+        def ready(stage):
+            return all(artifact in artifacts for artifact in stage.inputs)
+
+        def execute(stage, kwargs):
+            start = time.perf_counter()
+            outputs = stage.func(**kwargs)
+            elapsed = time.perf_counter() - start
+            metrics.observe("document_stage_seconds", elapsed, labels={"stage": stage.name})
+            return outputs, elapsed * 1000
+
+        def collect(stage, outputs, elapsed_ms):
+            outputs = outputs or {}
+            missing_outputs = [name for name in stage.outputs if name not in outputs]
+            if missing_outputs:
+                raise ValueError(f"Stage '{stage.name}' did not produce: {', '.join(missing_outputs)}")
+            for name in stage.outputs:
+                artifacts[name] = outputs[name]
+            timings[stage.name] = round(elapsed_ms, 2)
+
+        def abandon(error):
+            # Stages that never started are the work the deadline saved
+            not_started = list(pending)
+            for future, stage in running.items():
+                if future.cancel():
+                    not_started.append(stage)
+            recovered = sum(metrics.get_mean("document_stage_seconds", {"stage": stage.name}) or 0
+                            for stage in not_started)
+            record_cancellation(
+                getattr(error, "reason", "deadline"),
+                wasted_seconds=sum(timings.values()) / 1000,
+                skipped_stages=len(not_started),
+                recovered_seconds=recovered,
+            )
+            error.recorded = True
+            raise error
+
+        while pending or running:
+            if deadline is not None and deadline.expired:
+                try:
+                    deadline.check("Document processing")
+                except DeadlineExceeded as e:
+                    abandon(e)
+
+            launchable = [stage for stage in pending if ready(stage)]
+            for stage in launchable:
+                pending.remove(stage)
+
+            # A lone ready stage runs inline to avoid a thread hand-off
+            if len(launchable) == 1 and not running:
+                stage = launchable[0]
+                try:
+                    collect(stage, *execute(stage, {name: artifacts[name] for name in stage.inputs}))
+                except DeadlineExceeded as e:
+                    abandon(e)
+                continue
+
+            for stage in launchable:
+                kwargs = {name: artifacts[name] for name in stage.inputs}
+                running[executor.submit(execute, stage, kwargs)] = stage
+
+            if not running:
+                names = ", ".join(stage.name for stage in pending)
+                raise ValueError(f"Pipeline stages can never run: {names}")
+
+            timeout = deadline.remaining() if deadline is not None else None
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    collect(stage, *future.result())
+                except DeadlineExceeded as e:
+                    abandon(e)
+                except Exception:
+                    for other in running:
+                        other.cancel()
+                    wait(list(running))
+                    raise
+
+        return PipelineRun(artifacts, timings)
+
+
+_stage_executor = None
+_stage_executor_lock = threading.Lock()
+
+
+def get_stage_executor() -> ThreadPoolExecutor:
+    """Shared pool for concurrent stages; OpenCV and tesseract release the GIL"""
+    global _stage_executor
+    with _stage_executor_lock:
+        if _stage_executor is None:
+            _stage_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="document-stage")
+        return _stage_executor
@@ -0,0 +1,226 @@
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Mapping, Optional
+
+from app.services import metrics
+from app.services.concurrency import ACQUIRE_POLL_INTERVAL, AdaptiveLimiter, ocr_limiter
+from app.services.config import parse_pairs
+from app.services.deadlines import Deadline, DeadlineExceeded
+
+API_KEY_HEADER = "X-API-Key"
+TENANT_HEADER = "X-Tenant-ID"
+
+# Requests without a configured API key or tenant; individual applicants
+# share it
+DEFAULT_TENANT = "public"
+BACKFILL_TENANT = "backfill"
+
+# Documents a tenant may have waiting for OCR before further ones get a 429
+MAX_QUEUED_PER_TENANT = 32
+
+TENANT_NAME = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+# TENANT_API_KEYS maps partner API keys to tenants ("key:tenant,...");
+# TENANT_WEIGHTS sets relative OCR shares ("tenant:weight,...")
+TENANT_API_KEYS = parse_pairs(os.environ.get("TENANT_API_KEYS", ""))
+TENANT_WEIGHTS = {DEFAULT_TENANT: 1.0, BACKFILL_TENANT: 0.25}
+TENANT_WEIGHTS.update({tenant: float(weight) for tenant, weight in
+                       parse_pairs(os.environ.get("TENANT_WEIGHTS", "")).items()})
+
+
+def configured_tenants(api_keys: Mapping[str, str], weights: Mapping[str, float]) -> frozenset:
+    """Tenants named by an API key or given a weight; only these get a queue of their own"""
+    return frozenset(api_keys.values()) | frozenset(weights)
+
+
+def tenant_from_headers(headers: Mapping[str, str], api_keys: Optional[Mapping[str, str]] = None,
+                        tenants: Optional[frozenset] = None) -> str:
+    """
+    The tenant a request's document work is queued under.
+
+    A known API key names its tenant. Otherwise an X-Tenant-ID naming a
+    configured tenant is used. Anything else (an unknown key, an
+    unconfigured tenant, neither header) is public, so rotating keys or
+    tenant ids never buys a fresh fair share or queue.
+    """
+    api_keys = TENANT_API_KEYS if api_keys is None else api_keys
+    if tenants is None:
+        tenants = configured_tenants(api_keys, TENANT_WEIGHTS)
+    api_key = headers.get(API_KEY_HEADER)
+    if api_key:
+        tenant = api_keys.get(api_key)
+        if tenant is None:
+            metrics.increment("tenant_unrecognised_total", labels={"header": API_KEY_HEADER})
+            return DEFAULT_TENANT
+        return tenant
+    tenant = headers.get(TENANT_HEADER)
+    if tenant is None:
+        return DEFAULT_TENANT
+    if not TENANT_NAME.match(tenant):
+        raise ValueError(f"{TENANT_HEADER} must be 1-64 letters, digits, '.', '_' or '-'")
+    if tenant not in tenants:
+        metrics.increment("tenant_unrecognised_total", labels={"header": TENANT_HEADER})
+        return DEFAULT_TENANT
+    return tenant
+
+
+class TenantQueueFull(Exception):
+    """A tenant already has as many documents waiting as it is allowed"""
+
+    def __init__(self, tenant: str, limit: int):
+        super().__init__(f"Tenant '{tenant}' already has {limit} documents waiting for OCR")
+        self.tenant = tenant
+        self.limit = limit
+
+
+class _Ticket:
+    __slots__ = ("finish", "tenant", "cancelled")
+
+    def __init__(self, finish: float, tenant: str):
+        self.finish = finish
+        self.tenant = tenant
+        self.cancelled = False
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing of work across tenants in front of a limiter.
+
+    Self-clocked fair queuing: each job is stamped with a virtual finish time,
+    ``max(virtual now, tenant's previous finish) + work_units / weight``, and
+    when the limiter has a free slot the job with the smallest stamp gets it.
+    A tenant with a deep backlog therefore only gets its weighted share while
+    others are waiting, and still gets everything when it is alone. The
+    limiter still decides how many jobs run at once.
+
+    Each tenant may have at most ``max_queued`` jobs waiting (or the value in
+    ``queue_limits``); more raise TenantQueueFull.
+    """
+
+    def __init__(
+        self,
+        limiter: AdaptiveLimiter,
+        weights: Optional[Mapping[str, float]] = None,
+        default_weight: float = 1.0,
+        max_queued: int = MAX_QUEUED_PER_TENANT,
+        queue_limits: Optional[Mapping[str, int]] = None,
+    ):
+        self.limiter = limiter
+        self.weights = dict(TENANT_WEIGHTS if weights is None else weights)
+        self.default_weight = default_weight
+        self.max_queued = max_queued
+        self.queue_limits = dict(queue_limits or {})
+
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._queued: Dict[str, int] = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def weight(self, tenant: str) -> float:
+        return self.weights.get(tenant, self.default_weight)
+
+    def queued(self, tenant: str) -> int:
+        return self._queued.get(tenant, 0)
+
+    def _set_queued(self, tenant: str, delta: int) -> None:
+        queued = self._queued.get(tenant, 0) + delta
+        if queued:
+            self._queued[tenant] = queued
+        else:
+            self._queued.pop(tenant, None)
+        metrics.set_gauge(f"{self.limiter.name}_tenant_queued", queued, {"tenant": tenant})
+
+    def _prune(self) -> None:
+        """Forget idle tenants whose last finish virtual time has passed; they would start at now anyway"""
+        idle = [tenant for tenant, finish in self._last_finish.items()
+                if finish <= self._virtual_time and tenant not in self._queued]
+        for tenant in idle:
+            del self._last_finish[tenant]
+
+    def _head(self) -> Optional[_Ticket]:
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def acquire(self, tenant: str, work_units: float = 1.0, timeout: Optional[float] = None,
+                deadline: Optional[Deadline] = None) -> bool:
+        """Queue for a limiter slot in fair order; False if ``timeout`` passes or ``deadline`` ends first"""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            limit = self.queue_limits.get(tenant, self.max_queued)
+            if self.queued(tenant) >= limit:
+                metrics.increment(f"{self.limiter.name}_tenant_rejections_total", labels={"tenant": tenant})
+                raise TenantQueueFull(tenant, limit)
+            start = max(self._virtual_time, self._last_finish.get(tenant, 0.0))
+            ticket = _Ticket(start + work_units / self.weight(tenant), tenant)
+            self._last_finish[tenant] = ticket.finish
+            heapq.heappush(self._heap, (ticket.finish, next(self._sequence), ticket))
+            self._set_queued(tenant, 1)
+            try:
+                while True:
+                    if self._head() is ticket and self.limiter.acquire(timeout=0):
+                        heapq.heappop(self._heap)
+                        self._virtual_time = ticket.finish
+                        return True
+                    # Slots are normally handed on by release(); the poll
+                    # covers limiter capacity freed by other callers
+                    wait = ACQUIRE_POLL_INTERVAL
+                    if end is not None:
+                        left = end - time.monotonic()
+                        if left <= 0:
+                            ticket.cancelled = True
+                            return False
+                        wait = min(wait, left)
+                    if deadline is not None and deadline.expired:
+                        ticket.cancelled = True
+                        return False
+                    self._cond.wait(wait)
+            except BaseException:
+                ticket.cancelled = True
+                raise
+            finally:
+                self._set_queued(tenant, -1)
+                self._prune()
+                # The head may have changed hands
+                self._cond.notify_all()
+
+    def release(self, latency: float, work_units: float = 1.0, dropped: bool = False) -> None:
+        self.limiter.release(latency, work_units, dropped=dropped)
+        with self._cond:
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, tenant: str, work_units: float = 1.0, deadline: Optional[Deadline] = None):
+        """Like ``AdaptiveLimiter.slot``, queueing fairly under ``tenant`` and timing per tenant"""
+        labels = {"tenant": tenant}
+        queued = time.perf_counter()
+        timeout = deadline.remaining() if deadline is not None else None
+        if not self.acquire(tenant, work_units, timeout=timeout, deadline=deadline):
+            metrics.increment(f"{self.limiter.name}_concurrency_rejections_total")
+            deadline.check(f"Waiting for {self.limiter.name} capacity")
+            raise DeadlineExceeded(f"Timed out waiting for {self.limiter.name} capacity")
+        start = time.perf_counter()
+        metrics.observe(f"{self.limiter.name}_queue_seconds", start - queued)
+        metrics.observe(f"{self.limiter.name}_tenant_queue_seconds", start - queued, labels)
+        dropped = False
+        try:
+            yield
+        except DeadlineExceeded as e:
+            dropped = e.reason == "deadline"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.release(elapsed, work_units, dropped=dropped)
+            metrics.observe(f"{self.limiter.name}_tenant_service_seconds", elapsed, labels)
+            metrics.increment(f"{self.limiter.name}_tenant_work_units_total", work_units, labels)
+
+
+ocr_scheduler = FairScheduler(ocr_limiter)
@@ -0,0 +1,249 @@
+import difflib
+import importlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from app.services import metrics
+
+# Fraction of uploads replayed through the candidate pipeline; 0 turns shadow
+# mode off
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "0"))
+
+# Candidate pipeline as "package.module:function", called like
+# process_document(file_content, document_type, expected_passport_number)
+SHADOW_CANDIDATE = os.environ.get("SHADOW_CANDIDATE", "")
+
+SHADOW_REPORT_PATH = os.environ.get("SHADOW_REPORT_PATH", "shadow_reports.jsonl")
+
+# Uploads waiting for the candidate. When full, new samples are dropped
+# rather than holding more documents in memory
+SHADOW_QUEUE_SIZE = 16
+
+
+def load_candidate(spec: str) -> Callable[..., dict]:
+    """Import a candidate pipeline from a ``module:function`` spec"""
+    module_name, _, attribute = spec.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"Shadow candidate '{spec}' must look like 'package.module:function'")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def text_similarity(primary: str, candidate: str) -> float:
+    """Similarity ratio of two OCR outputs, ignoring whitespace differences"""
+    primary, candidate = " ".join(primary.split()), " ".join(candidate.split())
+    if not primary and not candidate:
+        return 1.0
+    return difflib.SequenceMatcher(None, primary, candidate, autojunk=False).ratio()
+
+
+def compare_results(document_type: str, primary: dict, candidate: dict) -> dict:
+    """
+    Agreement between the live and candidate results for one document.
+
+    Only scores and verdicts are kept; extracted text never reaches the report.
+    """
+    comparison = {
+        "text_similarity": round(text_similarity(primary.get("extracted_text", ""),
+                                                 candidate.get("extracted_text", "")), 4),
+        "verdict_agrees": bool(primary.get("validation_passed")) == bool(candidate.get("validation_passed")),
+        "primary_passed": bool(primary.get("validation_passed")),
+        "candidate_passed": bool(candidate.get("validation_passed")),
+    }
+    # Name the verdict by what it means for each document type so the report
+    # reads as face agreement or passport-number agreement
+    if document_type == "photo":
+        comparison["face_verdict_agrees"] = comparison["verdict_agrees"]
+    elif document_type == "passport":
+        comparison["passport_match_agrees"] = comparison["verdict_agrees"]
+    return comparison
+
+
+class ShadowReportStore:
+    """
+    Append-only JSON-lines file of shadow comparisons.
+
+    Running totals per document type are kept alongside it and updated on
+    every append, so ``summary`` costs the same however many comparisons
+    were recorded; the file is only read once, to load the totals.
+    """
+
+    def __init__(self, path: str = SHADOW_REPORT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._totals = None
+
+    def append(self, record: dict) -> None:
+        line = json.dumps(record, sort_keys=True)
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Load what is already on file before adding to it
+            totals = self._load_totals()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._add(totals, record)
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def _add(totals: dict, record: dict) -> None:
+        stats = totals.setdefault(record["document_type"], {
+            "compared": 0, "candidate_errors": 0, "verdict_agreements": 0,
+            "text_similarity_sum": 0.0, "latency_delta_sum": 0.0,
+        })
+        if record.get("candidate_error"):
+            stats["candidate_errors"] += 1
+            return
+        stats["compared"] += 1
+        stats["verdict_agreements"] += record["verdict_agrees"]
+        stats["text_similarity_sum"] += record["text_similarity"]
+        stats["latency_delta_sum"] += record["latency_delta_ms"]
+
+    def _load_totals(self) -> dict:
+        """Running totals, read from the file the first time; caller holds the lock"""
+        if self._totals is None:
+            totals = {}
+            for record in self.records():
+                self._add(totals, record)
+            self._totals = totals
+        return self._totals
+
+    def summary(self) -> dict:
+        """Agreement rates and latency deltas per document type"""
+        with self._lock:
+            by_type = {document_type: dict(stats) for document_type, stats in self._load_totals().items()}
+
+        summary = {}
+        for document_type, stats in by_type.items():
+            compared = stats["compared"]
+            summary[document_type] = {
+                "compared": compared,
+                "candidate_errors": stats["candidate_errors"],
+                "verdict_agreement": round(stats["verdict_agreements"] / compared, 4) if compared else None,
+                "mean_text_similarity": round(stats["text_similarity_sum"] / compared, 4) if compared else None,
+                "mean_latency_delta_ms": round(stats["latency_delta_sum"] / compared, 2) if compared else None,
+            }
+        return summary
+
+
+class ShadowRunner:
+    """
+    Replays a sample of live uploads through a candidate pipeline.
+
+    ``submit`` is called after the live result is ready. It only samples and
+    enqueues, so the response path never waits on the candidate. A single
+    background thread runs the candidate, compares the results and appends
+    the comparison to the report store.
+    """
+
+    def __init__(
+        self,
+        candidate: Optional[Callable[..., dict]] = None,
+        sample_rate: float = 0.0,
+        store: Optional[ShadowReportStore] = None,
+        queue_size: int = SHADOW_QUEUE_SIZE,
+    ):
+        self.candidate = candidate
+        self.sample_rate = sample_rate
+        self.store = store or ShadowReportStore()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._random = random.Random()
+
+    @property
+    def enabled(self) -> bool:
+        return self.candidate is not None and self.sample_rate > 0
+
+    def configure(self, candidate: Optional[Callable[..., dict]] = None, sample_rate: Optional[float] = None,
+                  store: Optional[ShadowReportStore] = None) -> None:
+        if candidate is not None:
+            self.candidate = candidate
+        if sample_rate is not None:
+            if not 0 <= sample_rate <= 1:
+                raise ValueError("Shadow sample rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+        if store is not None:
+            self.store = store
+
+    def submit(self, file_content: bytes, document_type: str, expected_passport_number: Optional[str],
+               primary_result: dict, primary_seconds: float) -> bool:
+        """Offer a processed upload for shadowing; True if it was queued"""
+        if not self.enabled or self._random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait((file_content, document_type, expected_passport_number,
+                                    primary_result, primary_seconds))
+        except queue.Full:
+            metrics.increment("shadow_dropped_total", labels={"document_type": document_type})
+            return False
+        metrics.increment("shadow_sampled_total", labels={"document_type": document_type})
+        self._ensure_worker()
+        return True
+
+    def _ensure_worker(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name="shadow-pipeline", daemon=True)
+                self._thread.start()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self.run_one(*job)
+            finally:
+                self._queue.task_done()
+
+    def run_one(self, file_content: bytes, document_type: str, expected_passport_number: Optional[str],
+                primary_result: dict, primary_seconds: float) -> dict:
+        """Run the candidate on one upload and record how it compares"""
+        record = {
+            "recorded_at": datetime.now().isoformat(),
+            "document_type": document_type,
+            "document_size": len(file_content),
+            "primary_ms": round(primary_seconds * 1000, 2),
+        }
+        start = time.perf_counter()
+        try:
+            candidate_result = self.candidate(file_content, document_type, expected_passport_number)
+        except Exception as e:
+            record["candidate_error"] = f"{type(e).__name__}: {e}"
+            metrics.increment("shadow_candidate_errors_total", labels={"document_type": document_type})
+        else:
+            candidate_seconds = time.perf_counter() - start
+            record["candidate_ms"] = round(candidate_seconds * 1000, 2)
+            record["latency_delta_ms"] = round((candidate_seconds - primary_seconds) * 1000, 2)
+            record.update(compare_results(document_type, primary_result, candidate_result))
+            if not record["verdict_agrees"]:
+                metrics.increment("shadow_disagreements_total", labels={"document_type": document_type})
+        self.store.append(record)
+        return record
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued upload has been compared (used by tests and shutdown)"""
+        end = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if end is not None and time.monotonic() >= end:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+shadow_runner = ShadowRunner(
+    candidate=load_candidate(SHADOW_CANDIDATE) if SHADOW_CANDIDATE else None,
+    sample_rate=SHADOW_SAMPLE_RATE,
+)
@@ -0,0 +1,311 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import secrets
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "visa_uploads"))
+
+# Largest document a session accepts, and the largest single chunk. Clients
+# on flaky networks should use far smaller chunks; a lost chunk is re-sent
+# from the last acknowledged offset
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+RECOMMENDED_CHUNK_SIZE = 512 * 1024
+
+# Unfinished sessions and their partial files are removed after this long
+UPLOAD_SESSION_TTL = timedelta(hours=24)
+
+UPLOAD_DOCUMENT_TYPES = ("passport", "photo", "supporting")
+
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class UploadNotFoundError(LookupError):
+    """Raised for unknown or expired upload sessions"""
+
+
+class UploadOffsetError(ValueError):
+    """Raised when a chunk does not start where the upload left off"""
+
+    def __init__(self, message: str, expected_offset: int):
+        super().__init__(message)
+        self.expected_offset = expected_offset
+
+
+class UploadSession:
+    """
+    One resumable upload, stored as a partial file on local disk.
+
+    ``received`` is the acknowledged offset; every chunk must start there.
+    """
+
+    def __init__(self, upload_id: str, application_id: str, document_type: str, filename: str,
+                 content_type: Optional[str], total_size: int, sha256: str, path: str,
+                 expected_passport_number: Optional[str] = None):
+        self.upload_id = upload_id
+        self.application_id = application_id
+        self.document_type = document_type
+        self.filename = filename
+        self.content_type = content_type
+        self.total_size = total_size
+        self.sha256 = sha256
+        self.expected_passport_number = expected_passport_number
+        self.path = path
+        self.received = 0
+        self.status = "open"
+        self.result = None
+        # Key of the application stored once the upload was validated
+        self.stored_application_id = None
+        self.created_at = datetime.now()
+        self.updated_at = self.created_at
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.total_size
+
+    @property
+    def expires_at(self) -> datetime:
+        return self.updated_at + UPLOAD_SESSION_TTL
+
+    def to_dict(self) -> dict:
+        return {
+            "upload_id": self.upload_id,
+            "application_id": self.application_id,
+            "document_type": self.document_type,
+            "filename": self.filename,
+            "state": self.status,
+            "offset": self.received,
+            "total_size": self.total_size,
+            "complete": self.complete,
+            "expires_at": self.expires_at.isoformat(),
+            "validation_result": self.result,
+            "stored_application_id": self.stored_application_id,
+        }
+
+    def to_record(self) -> dict:
+        """Everything needed to pick the session up in another process"""
+        record = {name: getattr(self, name) for name in SESSION_FIELDS}
+        record["created_at"] = self.created_at.isoformat()
+        record["updated_at"] = self.updated_at.isoformat()
+        return record
+
+    @classmethod
+    def from_record(cls, record: dict) -> "UploadSession":
+        session = cls.__new__(cls)
+        for name in SESSION_FIELDS:
+            setattr(session, name, record.get(name))
+        session.created_at = datetime.fromisoformat(record["created_at"])
+        session.updated_at = datetime.fromisoformat(record["updated_at"])
+        return session
+
+
+SESSION_FIELDS = (
+    "upload_id", "application_id", "document_type", "filename", "content_type", "total_size", "sha256",
+    "expected_passport_number", "path", "received", "status", "result", "stored_application_id",
+)
+
+
+class UploadSessionStore:
+    """
+    Resumable upload sessions: create, append chunks at offsets, finalize.
+
+    Chunks go straight to a per-session file under ``directory``, so a
+    dropped connection only costs the chunk that was in flight. The
+    session's state sits beside it as ``<upload_id>.json``, replaced
+    atomically, and changes hold an flock on ``<upload_id>.lock``; every
+    worker sharing ``directory`` can therefore take any chunk or finalize
+    request for any session.
+    """
+
+    def __init__(self, directory: str = UPLOAD_DIR, clock=datetime.now):
+        self.directory = directory
+        self.clock = clock
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}{suffix}")
+
+    def _save(self, session: UploadSession) -> None:
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(session.to_record(), f)
+        os.replace(temporary, self._path(session.upload_id, ".json"))
+
+    def _load(self, upload_id: str) -> Optional[UploadSession]:
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id or ""):
+            return None
+        try:
+            with open(self._path(upload_id, ".json"), encoding="utf-8") as f:
+                return UploadSession.from_record(json.load(f))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @contextmanager
+    def _locked(self, upload_id: str) -> Iterator[UploadSession]:
+        """The session, read and held under its lock so no other worker changes it meanwhile"""
+        if not UPLOAD_ID_PATTERN.fullmatch(upload_id or ""):
+            raise UploadNotFoundError(f"Upload session '{upload_id}' not found or expired")
+        try:
+            fd = os.open(self._path(upload_id, ".lock"), os.O_RDWR)
+        except FileNotFoundError:
+            raise UploadNotFoundError(f"Upload session '{upload_id}' not found or expired")
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield self.get(upload_id)
+        finally:
+            os.close(fd)
+
+    def create(self, application_id: str, document_type: str, filename: str, total_size: int, sha256: str,
+               content_type: Optional[str] = None, expected_passport_number: Optional[str] = None) -> UploadSession:
+        if document_type not in UPLOAD_DOCUMENT_TYPES:
+            raise ValueError(f"Document type must be one of: {', '.join(UPLOAD_DOCUMENT_TYPES)}")
+        if total_size <= 0:
+            raise ValueError("Upload size must be positive")
+        if total_size > MAX_UPLOAD_SIZE:
+            raise ValueError(f"Upload size exceeds the {MAX_UPLOAD_SIZE // (1024 * 1024)} MB limit")
+        sha256 = sha256.strip().lower()
+        if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+            raise ValueError("sha256 must be a 64-character hex digest of the whole file")
+
+        self.expire_sessions()
+        os.makedirs(self.directory, exist_ok=True)
+        upload_id = secrets.token_hex(16)
+        path = self._path(upload_id, ".part")
+        open(path, "wb").close()
+        open(self._path(upload_id, ".lock"), "wb").close()
+
+        session = UploadSession(upload_id, application_id, document_type, filename, content_type,
+                                total_size, sha256, path, expected_passport_number)
+        session.created_at = session.updated_at = self.clock()
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        session = self._load(upload_id)
+        if session is None or session.expires_at <= self.clock():
+            raise UploadNotFoundError(f"Upload session '{upload_id}' not found or expired")
+        return session
+
+    def append(self, upload_id: str, offset: int, chunk: bytes, chunk_sha256: Optional[str] = None) -> UploadSession:
+        """
+        Write ``chunk`` at ``offset``.
+
+        Re-sending a chunk that was already stored (its offset plus length
+        does not pass the acknowledged offset) is accepted as a no-op, so a
+        client that missed an acknowledgement can retry safely.
+        """
+        self.get(upload_id)
+        if not chunk:
+            raise ValueError("Chunk is empty")
+        if len(chunk) > MAX_CHUNK_SIZE:
+            raise ValueError(f"Chunk exceeds the {MAX_CHUNK_SIZE // (1024 * 1024)} MB limit")
+        if chunk_sha256 is not None and hashlib.sha256(chunk).hexdigest() != chunk_sha256.strip().lower():
+            raise ValueError("Chunk checksum mismatch; re-send the chunk")
+
+        with self._locked(upload_id) as session:
+            if session.status != "open":
+                raise UploadOffsetError(f"Upload session is already {session.status}", session.received)
+            if offset + len(chunk) <= session.received and offset >= 0:
+                return session
+            if offset != session.received:
+                raise UploadOffsetError(
+                    f"Chunk offset {offset} does not match upload offset {session.received}", session.received
+                )
+            if offset + len(chunk) > session.total_size:
+                raise ValueError("Chunk runs past the declared upload size")
+
+            with open(session.path, "r+b") as f:
+                f.seek(offset)
+                f.write(chunk)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            session.received = offset + len(chunk)
+            session.updated_at = self.clock()
+            self._save(session)
+        return session
+
+    def finalize(self, upload_id: str) -> bytes:
+        """
+        Verify a complete upload against its declared sha256 and return its bytes.
+
+        The session moves to ``processing`` until ``complete`` records the
+        validation result, or ``reopen`` hands it back to the client. That
+        way a timed-out validation does not throw the upload away.
+        """
+        with self._locked(upload_id) as session:
+            if session.status != "open":
+                raise UploadOffsetError(f"Upload session is already {session.status}", session.received)
+            if not session.complete:
+                raise UploadOffsetError(
+                    f"Upload is incomplete: {session.received} of {session.total_size} bytes received",
+                    session.received
+                )
+            with open(session.path, "rb") as f:
+                content = f.read()
+            if hashlib.sha256(content).hexdigest() != session.sha256:
+                # Nothing in the file can be trusted, so start the upload over
+                self._reset(session)
+                raise ValueError("Upload checksum mismatch; the upload has been reset to offset 0")
+            session.status = "processing"
+            session.updated_at = self.clock()
+            self._save(session)
+        return content
+
+    def complete(self, upload_id: str, result: dict, stored_application_id: Optional[str] = None) -> UploadSession:
+        """Record the validation result (and the application stored from it) and drop the uploaded bytes"""
+        with self._locked(upload_id) as session:
+            session.status = "finalized"
+            session.result = result
+            session.stored_application_id = stored_application_id
+            session.updated_at = self.clock()
+            self._save(session)
+            self._remove_file(session.path)
+        return session
+
+    def reopen(self, upload_id: str) -> None:
+        """Return a session whose validation did not finish to the client for another finalize"""
+        with self._locked(upload_id) as session:
+            if session.status == "processing":
+                session.status = "open"
+                session.updated_at = self.clock()
+                self._save(session)
+
+    def _reset(self, session: UploadSession) -> None:
+        open(session.path, "wb").close()
+        session.received = 0
+        session.updated_at = self.clock()
+        self._save(session)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def expire_sessions(self) -> int:
+        """Drop sessions idle for longer than the TTL, finalized or not; returns how many"""
+        if not os.path.isdir(self.directory):
+            return 0
+        now = self.clock()
+        expired = 0
+        for name in os.listdir(self.directory):
+            upload_id, extension = os.path.splitext(name)
+            if extension != ".json":
+                continue
+            session = self._load(upload_id)
+            if session is None or session.expires_at > now:
+                continue
+            for suffix in (".json", ".part", ".lock"):
+                self._remove_file(self._path(upload_id, suffix))
+            expired += 1
+        return expired
+
+
+upload_sessions = UploadSessionStore()
@@ -0,0 +1,41 @@
+import os
+
+from app.storage.base import ApplicationStore
+from app.storage.memory import MemoryStore
+from app.storage.remote import RemoteStore
+from app.storage.snapshots import SnapshotStore
+from app.storage.sqlite import SQLiteStore
+from app.storage.tiered import TieredStore
+
+# "memory" (the default; nothing survives a restart), "sqlite:<path>",
+# "tiered:<path>" (recent applications in memory within
+# APPLICATION_MEMORY_BUDGET, all of them in SQLite at <path>),
+# "snapshot:<directory>" (all in memory, recovered from a snapshot and a
+# write-ahead log in <directory>), or "unix:<socket>" for a store server
+# shared by every worker process (see app.storage.server)
+APPLICATION_STORE = os.environ.get("APPLICATION_STORE", "memory")
+
+
+def open_store(url: str = None) -> ApplicationStore:
+    """Open the application store described by ``url`` (``APPLICATION_STORE`` by default)"""
+    url = url or APPLICATION_STORE
+    scheme, _, location = url.partition(":")
+    if scheme == "memory":
+        return MemoryStore()
+    if scheme == "sqlite":
+        if not location:
+            raise ValueError("sqlite store needs a path, e.g. sqlite:applications.db")
+        return SQLiteStore(location)
+    if scheme == "tiered":
+        if not location:
+            raise ValueError("tiered store needs a path for its disk tier, e.g. tiered:applications.db")
+        return TieredStore(SQLiteStore(location))
+    if scheme == "snapshot":
+        if not location:
+            raise ValueError("snapshot store needs a directory, e.g. snapshot:/var/lib/visa/applications")
+        return SnapshotStore(location)
+    if scheme == "unix":
+        if not location:
+            raise ValueError("unix store needs a socket path, e.g. unix:/run/visa/store.sock")
+        return RemoteStore(location)
+    raise ValueError(f"Unknown application store '{url}'")
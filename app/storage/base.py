@@ -0,0 +1,201 @@
+import bisect
+import threading
+from collections.abc import MutableMapping
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from app.models.visa_application import VisaApplication
+
+
+class StoreListener:
+    """
+    Told about every change to a store it is added to.
+
+    Backends call listeners while holding their write lock, so listeners see
+    changes in the order the store applied them and must be quick.
+    """
+
+    def on_write(self, items: Sequence[Tuple[str, VisaApplication]]) -> None:
+        pass
+
+    def on_delete(self, key: str) -> None:
+        pass
+
+
+class ApplicationStore(MutableMapping):
+    """
+    Where visa applications live, keyed by application id.
+
+    Backends implement ``get``, ``put``, ``put_many``, ``delete``, ``keys_in_order``
+    and ``count`` (and ``peek`` if ``get`` has side effects, ``replace_if`` for
+    conditional writes); the mapping interface (``store[key]``, ``key in store``,
+    ``len(store)``, iteration in insertion order) is built on them, so code
+    written against the old module-level dict keeps working.
+
+    Applications handed out are copies for backends that serialise, so
+    changes must be written back with ``put`` (or ``store[key] = ...``).
+    """
+
+    def __init__(self):
+        # Highest n used by a <prefix>_<n> key; backends that reopen existing
+        # data raise it to what they find
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+        self._listeners: List[StoreListener] = []
+        self.indexes = None
+        self.statistics = None
+        self.photo_hashes = None
+
+    # Backend interface
+
+    def get(self, key: str, default=None) -> Optional[VisaApplication]:
+        raise NotImplementedError
+
+    def peek(self, key: str) -> Optional[VisaApplication]:
+        """Read without side effects such as pulling the application into a memory tier"""
+        return self.get(key)
+
+    def put(self, key: str, application: VisaApplication) -> None:
+        raise NotImplementedError
+
+    def put_many(self, items: Iterable[Tuple[str, VisaApplication]]) -> None:
+        for key, application in items:
+            self.put(key, application)
+
+    def delete(self, key: str) -> bool:
+        """Remove an application; False if it was not there"""
+        raise NotImplementedError
+
+    def replace_if(self, key: str, check: Callable[[Optional[VisaApplication]], bool],
+                   application: Optional[VisaApplication]) -> bool:
+        """
+        Write ``application`` (or delete, if None) only if ``check`` passes the current one (None if absent).
+
+        The check and the write happen under the backend's write lock, so no
+        other write to the store lands in between. Returns whether it wrote.
+        """
+        raise NotImplementedError
+
+    def put_if_present(self, key: str, application: VisaApplication) -> bool:
+        """Overwrite an application only if it is still stored, so a concurrent delete is not undone"""
+        return self.replace_if(key, lambda current: current is not None, application)
+
+    def delete_if(self, key: str, check: Callable[[VisaApplication], bool]) -> bool:
+        """Delete an application only if it is stored and ``check`` passes it, so a rewrite meanwhile is seen"""
+        return self.replace_if(key, lambda current: current is not None and check(current), None)
+
+    def keys_in_order(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Make buffered writes durable"""
+
+    def close(self) -> None:
+        self.flush()
+
+    def index_rows(self, fields: Sequence[str]) -> Iterator[Tuple[str, tuple]]:
+        """``(key, values of fields)`` for every application, for rebuilding indexes"""
+        for key in self.keys_in_order():
+            application = self.peek(key)
+            if application is not None:
+                yield key, tuple(getattr(application, field) for field in fields)
+
+    def iter_sorted(self, after: Optional[str] = None) -> Iterator[Tuple[str, VisaApplication]]:
+        """``(key, application)`` in key order, from the first key above ``after``; read lazily, for exports"""
+        keys = sorted(self.keys_in_order())
+        start = bisect.bisect_right(keys, after) if after is not None else 0
+        for index in range(start, len(keys)):
+            application = self.peek(keys[index])
+            if application is not None:
+                yield keys[index], application
+
+    # Listeners, indexes, photo hashes and statistics
+
+    def add_listener(self, listener: StoreListener) -> None:
+        self._listeners.append(listener)
+
+    def _notify_write(self, items: Sequence[Tuple[str, VisaApplication]]) -> None:
+        for listener in self._listeners:
+            listener.on_write(items)
+
+    def _notify_delete(self, key: str) -> None:
+        for listener in self._listeners:
+            listener.on_delete(key)
+
+    def attach_indexes(self, indexes) -> None:
+        """Build ``indexes`` from the stored applications, then keep them current; call before serving"""
+        indexes.rebuild(self)
+        self.add_listener(indexes)
+        self.indexes = indexes
+
+    def lookup(self, field: str, value: str) -> List[str]:
+        """Keys of applications whose indexed ``field`` matches ``value``, oldest first"""
+        if self.indexes is None:
+            raise ValueError("This application store has no indexes")
+        return self.indexes.lookup(field, value)
+
+    def attach_photo_hashes(self, photo_hashes) -> None:
+        """Index the stored photos into ``photo_hashes``, then keep it current; call before serving"""
+        photo_hashes.rebuild(self)
+        self.add_listener(photo_hashes)
+        self.photo_hashes = photo_hashes
+
+    def photo_duplicates(self, phash: str, max_distance: int) -> dict:
+        """Stored photos within ``max_distance`` bits of a hex pHash, closest first, and how many are indexed"""
+        if self.photo_hashes is None:
+            raise ValueError("This application store has no photo hash index")
+        return self.photo_hashes.duplicates(phash, max_distance)
+
+    def attach_stats(self, statistics) -> None:
+        """Count the stored applications into ``statistics``, then keep it current; call before serving"""
+        statistics.rebuild(self)
+        self.add_listener(statistics)
+        self.statistics = statistics
+
+    def stats(self) -> dict:
+        """Counts and payment totals over every application, from the attached statistics"""
+        if self.statistics is None:
+            raise ValueError("This application store has no statistics")
+        return self.statistics.summary()
+
+    # Keys
+
+    def insert(self, prefix: str, application: VisaApplication) -> str:
+        """Store a new application under the next ``<prefix>_<n>`` key and return the key"""
+        with self._sequence_lock:
+            self._sequence += 1
+            key = f"{prefix}_{self._sequence}"
+        self.put(key, application)
+        return key
+
+    # Mapping interface
+
+    def __getitem__(self, key: str) -> VisaApplication:
+        application = self.get(key)
+        if application is None:
+            raise KeyError(key)
+        return application
+
+    def __setitem__(self, key: str, application: VisaApplication) -> None:
+        self.put(key, application)
+
+    def __delitem__(self, key: str) -> None:
+        if not self.delete(key):
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys_in_order()
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+
+def sequence_of(key: str) -> int:
+    """The ``n`` of a ``<prefix>_<n>`` key, or 0"""
+    _, _, number = key.rpartition("_")
+    return int(number) if number.isdigit() else 0
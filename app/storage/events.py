@@ -0,0 +1,304 @@
+"""
+Append-only log of workflow step events, with group commit.
+
+Events are JSON lines appended to segment files named after the log
+position they start at (``00000000000000000000.log``, then e.g.
+``00000000000067108912.log``); a segment is closed once the next batch
+would take it past ``segment_bytes``. An event's cursor is its byte
+position in the whole log, so cursors only grow and a consumer resumes
+from the last cursor it was given. Segments before the last may be
+archived or deleted; reading from a cursor before the first remaining
+segment starts at that segment.
+
+``append`` queues an event and returns a future. A writer thread collects
+what arrives within ``commit_interval`` of the first queued event, writes
+the batch with one ``write`` and one ``fsync``, then resolves each future
+with the event's cursor. Every process appending to the same directory
+takes an exclusive ``flock`` around that write, so several workers can
+share one log.
+"""
+import bisect
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from app.services import metrics
+
+# Directory holding the log; without it events go to a temporary directory
+# removed at shutdown (like the in-memory application store, nothing
+# survives a restart)
+EVENT_LOG = os.environ.get("EVENT_LOG", "")
+
+# Segment size past which a new segment is started, the longest an event
+# waits for others to share its fsync (events arriving during an fsync wait
+# for the next one regardless, so 0 still groups them; raise it where
+# fsync is slow), and the most events in one commit
+EVENT_LOG_SEGMENT_BYTES = int(os.environ.get("EVENT_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+EVENT_LOG_COMMIT_INTERVAL = float(os.environ.get("EVENT_LOG_COMMIT_INTERVAL", "0.002"))
+EVENT_LOG_MAX_BATCH = 1024
+
+SEGMENT_SUFFIX = ".log"
+LOCK_FILE = "log.lock"
+
+
+def segment_name(base: int) -> str:
+    return f"{base:020d}{SEGMENT_SUFFIX}"
+
+
+def encode_event(event: dict) -> bytes:
+    return json.dumps(event, separators=(",", ":"), default=str).encode() + b"\n"
+
+
+class EventLog:
+    """
+    Segmented append-only event log in ``directory`` (see the module docstring).
+
+    ``read`` returns events from a cursor in log order; ``end`` is the
+    cursor the next event will get.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = EVENT_LOG_SEGMENT_BYTES,
+        commit_interval: float = EVENT_LOG_COMMIT_INTERVAL,
+        max_batch: int = EVENT_LOG_MAX_BATCH,
+        temporary: bool = False,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.temporary = temporary
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        # (base, fd) of the segment this process last appended to
+        self._segment: Optional[Tuple[int, int]] = None
+        self._repair_tail()
+
+        # (encoded event, future) waiting for the next commit
+        self._pending: List[Tuple[bytes, Future]] = []
+        self._first_pending_at = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._writer = threading.Thread(target=self._commit_loop, name="event-log-writer", daemon=True)
+        self._writer.start()
+
+    # Segments
+
+    def segments(self) -> List[int]:
+        """Start positions of the segments present, in order"""
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def _path(self, base: int) -> str:
+        return os.path.join(self.directory, segment_name(base))
+
+    def _repair_tail(self) -> None:
+        """Cut a partial event left by a crash mid-write off the last segment"""
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            bases = self.segments()
+            if not bases:
+                return
+            with open(self._path(bases[-1]), "r+b") as segment:
+                size = segment.seek(0, os.SEEK_END)
+                keep = size
+                while keep:
+                    start = max(0, keep - 65536)
+                    segment.seek(start)
+                    newline = segment.read(keep - start).rfind(b"\n")
+                    if newline >= 0:
+                        keep = start + newline + 1
+                        break
+                    keep = start
+                if keep < size:
+                    segment.truncate(keep)
+                    os.fsync(segment.fileno())
+                    metrics.increment("event_log_torn_tail_repairs_total")
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def prune(self, cursor: int) -> int:
+        """Delete segments holding only events before ``cursor``; the last segment is always kept"""
+        bases = self.segments()
+        removed = 0
+        for base, following in zip(bases, bases[1:]):
+            if following > cursor:
+                break
+            os.remove(self._path(base))
+            removed += 1
+        return removed
+
+    def end(self) -> int:
+        """Cursor just past the last committed event"""
+        bases = self.segments()
+        if not bases:
+            return 0
+        return bases[-1] + os.path.getsize(self._path(bases[-1]))
+
+    # Appending
+
+    def append(self, event: dict) -> Future:
+        """Queue ``event``; the future resolves to its cursor once the event is on disk"""
+        future = Future()
+        line = encode_event(event)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Event log is closed")
+            self._pending.append((line, future))
+            if len(self._pending) == 1:
+                self._first_pending_at = time.monotonic()
+                self._wakeup.notify()
+            elif len(self._pending) >= self.max_batch:
+                self._wakeup.notify()
+        return future
+
+    def _commit_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+                # Give other events until commit_interval after the first
+                # one to join this fsync
+                while not self._closed and len(self._pending) < self.max_batch:
+                    remaining = self._first_pending_at + self.commit_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                if self._pending:
+                    self._first_pending_at = time.monotonic()
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[bytes, Future]]) -> None:
+        data = b"".join(line for line, _ in batch)
+        start = time.perf_counter()
+        try:
+            cursor = self._write(data)
+        except Exception as e:
+            metrics.increment("event_log_commit_errors_total")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        metrics.observe("event_log_commit_seconds", time.perf_counter() - start)
+        metrics.observe("event_log_batch_size", len(batch))
+        metrics.increment("event_log_events_total", len(batch))
+        for line, future in batch:
+            future.set_result(cursor)
+            cursor += len(line)
+
+    def _write(self, data: bytes) -> int:
+        """Append ``data`` durably to the last segment, starting a new one if it is full; returns its cursor"""
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            bases = self.segments()
+            base = bases[-1] if bases else 0
+            if self._segment is None or self._segment[0] != base:
+                self._open_segment(base)
+            fd = self._segment[1]
+            size = os.fstat(fd).st_size
+            if size and size + len(data) > self.segment_bytes:
+                base += size
+                self._open_segment(base)
+                fd = self._segment[1]
+                size = 0
+                # Make the new segment's name durable too
+                directory_fd = os.open(self.directory, os.O_RDONLY)
+                try:
+                    os.fsync(directory_fd)
+                finally:
+                    os.close(directory_fd)
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            os.fsync(fd)
+            return base + size
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _open_segment(self, base: int) -> None:
+        if self._segment is not None:
+            os.close(self._segment[1])
+            self._segment = None
+        fd = os.open(self._path(base), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment = (base, fd)
+
+    # Reading
+
+    def read(self, cursor: int = 0, limit: int = 100) -> Tuple[List[dict], int]:
+        """Up to ``limit`` events from ``cursor``, each with its ``cursor``, and the cursor to read from next"""
+        if cursor < 0:
+            raise ValueError("Cursor must not be negative")
+        bases = self.segments()
+        if not bases:
+            if cursor:
+                raise ValueError(f"Cursor {cursor} is past the end of the event log")
+            return [], 0
+        cursor = max(cursor, bases[0])
+        index = bisect.bisect_right(bases, cursor) - 1
+        events = []
+        while len(events) < limit:
+            base = bases[index]
+            with open(self._path(base), "rb") as segment:
+                size = os.fstat(segment.fileno()).st_size
+                if cursor - base > size:
+                    raise ValueError(f"Cursor {cursor} is past the end of the event log")
+                if cursor > base:
+                    segment.seek(cursor - base - 1)
+                    if segment.read(1) != b"\n":
+                        raise ValueError(f"Cursor {cursor} does not point at an event")
+                for line in segment:
+                    # Another process may be part way through a write
+                    if not line.endswith(b"\n"):
+                        break
+                    event = json.loads(line)
+                    event["cursor"] = cursor
+                    events.append(event)
+                    cursor += len(line)
+                    if len(events) >= limit:
+                        break
+                else:
+                    if cursor - base >= size and index + 1 < len(bases) and bases[index + 1] == cursor:
+                        index += 1
+                        continue
+            break
+        return events, cursor
+
+    # Lifecycle
+
+    def close(self) -> None:
+        """Commit what is queued, stop the writer and release the files"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+        if self._segment is not None:
+            os.close(self._segment[1])
+            self._segment = None
+        os.close(self._lock_fd)
+        if self.temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def open_event_log(directory: str = None) -> EventLog:
+    """The event log in ``directory`` (``EVENT_LOG`` by default), or a temporary one"""
+    directory = directory or EVENT_LOG
+    if directory:
+        return EventLog(directory)
+    return EventLog(tempfile.mkdtemp(prefix="visa-events-"), temporary=True)
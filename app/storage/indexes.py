@@ -0,0 +1,133 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.services import metrics
+from app.storage.base import ApplicationStore, StoreListener
+
+
+def normalize_passport_number(value: str) -> str:
+    """As DS160FormRequest stores it: stripped and uppercased"""
+    return value.strip().upper()
+
+
+def normalize_email(value: str) -> str:
+    return value.strip().lower()
+
+
+def normalize_code(value: str) -> str:
+    """Confirmation IDs are issued uppercase; accept any case when looking up"""
+    return value.strip().upper()
+
+
+# Indexed application fields and the normalisation applied both when
+# indexing and when looking up
+INDEXED_FIELDS: Dict[str, Callable[[str], str]] = {
+    "passport_number": normalize_passport_number,
+    "email": normalize_email,
+    "ds160_confirmation_id": normalize_code,
+    "payment_confirmation_id": normalize_code,
+    "interview_confirmation_id": normalize_code,
+    "biometrics_confirmation_id": normalize_code,
+    "visa_number": normalize_code,
+}
+
+
+class ApplicationIndexes(StoreListener):
+    """
+    Hash indexes from normalised field values to application keys.
+
+    A value held by one application maps straight to its key; once several
+    share it (a passport used for several applications) it maps to an
+    insertion-ordered dict of keys. A reverse map remembers what each key
+    was indexed under, so an overwrite or delete removes the stale entries
+    without reading the old application back. Applications with no indexed
+    values cost nothing.
+
+    Kept current as a store listener; ``rebuild`` repopulates from a store.
+    """
+
+    def __init__(self, fields: Optional[Dict[str, Callable[[str], str]]] = None):
+        self.fields = dict(INDEXED_FIELDS if fields is None else fields)
+        self.field_names = tuple(self.fields)
+        self._postings: Dict[str, dict] = {field: {} for field in self.field_names}
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _normalized(self, values: tuple) -> Optional[tuple]:
+        """Normalised values in field order, or None if the application has none"""
+        normalized = tuple(
+            (normalize(str(value)) or None) if value is not None else None
+            for normalize, value in zip(self.fields.values(), values)
+        )
+        return normalized if any(normalized) else None
+
+    def _replace(self, key: str, values: Optional[tuple]) -> None:
+        """Point the indexes at ``values`` for ``key``; caller holds the lock"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            for field, value in zip(self.field_names, previous):
+                if value is not None:
+                    self._remove(self._postings[field], value, key)
+        if values is None:
+            return
+        self._entries[key] = values
+        for field, value in zip(self.field_names, values):
+            if value is not None:
+                self._add(self._postings[field], value, key)
+
+    @staticmethod
+    def _add(postings: dict, value: str, key: str) -> None:
+        current = postings.get(value)
+        if current is None:
+            postings[value] = key
+        elif isinstance(current, dict):
+            current[key] = None
+        elif current != key:
+            postings[value] = {current: None, key: None}
+
+    @staticmethod
+    def _remove(postings: dict, value: str, key: str) -> None:
+        current = postings.get(value)
+        if current == key:
+            del postings[value]
+        elif isinstance(current, dict):
+            current.pop(key, None)
+            if len(current) == 1:
+                postings[value] = next(iter(current))
+
+    def on_write(self, items) -> None:
+        with self._lock:
+            for key, application in items:
+                self._replace(key, self._normalized(tuple(getattr(application, field) for field in self.field_names)))
+
+    def on_delete(self, key: str) -> None:
+        with self._lock:
+            self._replace(key, None)
+
+    def rebuild(self, store: ApplicationStore) -> int:
+        """Replace the indexes with what ``store`` holds; returns the number of indexed applications"""
+        start = time.perf_counter()
+        with self._lock:
+            self._postings = {field: {} for field in self.field_names}
+            self._entries = {}
+            for key, values in store.index_rows(self.field_names):
+                self._replace(key, self._normalized(values))
+            indexed = len(self._entries)
+        metrics.observe("application_index_rebuild_seconds", time.perf_counter() - start)
+        metrics.set_gauge("application_index_entries", indexed)
+        return indexed
+
+    def lookup(self, field: str, value: str) -> List[str]:
+        """Keys of applications whose ``field`` matches ``value`` after normalisation, oldest first"""
+        normalize = self.fields.get(field)
+        if normalize is None:
+            raise ValueError(f"'{field}' is not indexed; indexed fields are {', '.join(self.field_names)}")
+        with self._lock:
+            current = self._postings[field].get(normalize(value))
+            if current is None:
+                return []
+            return [current] if isinstance(current, str) else list(current)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.services.config import parse_pairs
+from app.storage.base import ApplicationStore
+
+DAY = 24 * 60 * 60
+
+# Seconds an application may sit untouched in each workflow state before it
+# is purged; every state has one, so abandoned applications never pile up.
+# A paid fee stays usable for a year. APPLICATION_TTLS overrides entries as
+# "state:seconds,..." (0 keeps that state forever)
+DEFAULT_APPLICATION_TTLS = {
+    "draft": 7 * DAY,
+    "ds160_submitted": 30 * DAY,
+    "paid": 365 * DAY,
+    "interview_scheduled": 180 * DAY,
+    "documents_uploaded": 90 * DAY,
+    "interview_attended": 180 * DAY,
+    "interview_missed": 90 * DAY,
+    "issued": 180 * DAY,
+    "denied": 180 * DAY,
+}
+
+
+def parse_ttls(text: str, defaults: Dict[str, float] = DEFAULT_APPLICATION_TTLS) -> Dict[str, float]:
+    """``"state:seconds,..."`` applied over ``defaults``; a TTL of 0 removes the state's limit"""
+    ttls = dict(defaults)
+    for state, seconds in parse_pairs(text).items():
+        if float(seconds) < 0:
+            raise ValueError(f"TTL for '{state}' must not be negative")
+        ttls[state] = float(seconds)
+    return {state: seconds for state, seconds in ttls.items() if seconds > 0}
+
+
+APPLICATION_TTLS = parse_ttls(os.environ.get("APPLICATION_TTLS", ""))
+
+# Applications checked per batch and the pause between batches, which keeps
+# a sweep from holding the store (or the GIL) away from request handlers;
+# and the time between sweeps
+SWEEP_BATCH_SIZE = 500
+SWEEP_BATCH_PAUSE = 0.01
+SWEEP_INTERVAL = 300.0
+
+
+def is_expired(application: VisaApplication, ttls: Dict[str, float], now: float) -> bool:
+    """Whether ``application`` has been idle longer than its workflow state allows"""
+    ttl = ttls.get(application.workflow_state)
+    last_active = application.updated_at or application.created_at
+    # Records saved before timestamps existed have no known age and are kept
+    return ttl is not None and last_active is not None and now - last_active > ttl
+
+
+class ExpiryJanitor:
+    """
+    Purges applications whose workflow state's TTL has passed.
+
+    A sweep lists the keys once, then checks them ``batch_size`` at a time
+    with ``store.peek`` (which does not pull records into a memory tier),
+    deleting expired ones with ``store.delete_if`` (which checks the expiry
+    again under the store's lock) and pausing between batches. ``start`` runs a
+    sweep every ``interval`` seconds on a daemon thread, followed by
+    ``after_sweep`` (e.g. deleting the originals the purged applications
+    uploaded).
+    """
+
+    def __init__(
+        self,
+        store: ApplicationStore,
+        ttls: Optional[Dict[str, float]] = None,
+        batch_size: int = SWEEP_BATCH_SIZE,
+        batch_pause: float = SWEEP_BATCH_PAUSE,
+        interval: float = SWEEP_INTERVAL,
+        clock=time.time,
+        after_sweep: Optional[Callable[[], None]] = None,
+    ):
+        self.store = store
+        self.ttls = APPLICATION_TTLS if ttls is None else ttls
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self.clock = clock
+        self.after_sweep = after_sweep
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def sweep(self) -> int:
+        """One pass over every application; returns how many were purged"""
+        if not self.ttls:
+            return 0
+        start = time.perf_counter()
+        keys = list(self.store.keys_in_order())
+        purged = 0
+        for offset in range(0, len(keys), self.batch_size):
+            if offset and self._stopped.wait(self.batch_pause):
+                break
+            purged += self.sweep_batch(keys[offset:offset + self.batch_size])
+        metrics.observe("application_store_sweep_seconds", time.perf_counter() - start)
+        return purged
+
+    def sweep_batch(self, keys) -> int:
+        now = self.clock()
+        purged = 0
+        for key in keys:
+            application = self.store.peek(key)
+            if application is None or not is_expired(application, self.ttls, now):
+                continue
+            # Checked again under the store's lock: a rewrite since the peek
+            # (a step run, a new state) must keep the application
+            if self.store.delete_if(key, lambda current: is_expired(current, self.ttls, now)):
+                purged += 1
+                metrics.increment("application_store_expired_total", labels={"state": application.workflow_state})
+        return purged
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="application-janitor", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sweep()
+                if self.after_sweep is not None:
+                    self.after_sweep()
+            except Exception:
+                metrics.increment("application_store_sweep_errors_total")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,148 @@
+import bisect
+import heapq
+import threading
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from app.models.visa_application import VisaApplication
+from app.storage.base import ApplicationStore
+
+# New keys collected in a small sorted run before it is merged into the
+# main sorted list, and the share of deleted keys the main list may hold
+# before it is rebuilt
+RECENT_KEYS_LIMIT = 1024
+DELETED_KEYS_SHARE = 0.25
+
+
+class SortedKeys:
+    """
+    Keys in sorted order, for ordered scans that resume from a cursor.
+
+    The main list is never changed in place: new keys go into a small sorted
+    run that is merged in once it passes RECENT_KEYS_LIMIT, and deleted keys
+    stay behind until they pass DELETED_KEYS_SHARE of it, when a new list is
+    built. A scan can so hold on to the main list without a lock, and a page
+    costs a bisect rather than a sort of every key. Callers hold the
+    store's lock.
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self._main = sorted(keys)
+        self._recent = []
+        self._deleted = set()
+
+    def add(self, key: str) -> None:
+        if key in self._deleted:
+            # Still in the main list
+            self._deleted.discard(key)
+            return
+        bisect.insort(self._recent, key)
+        if len(self._recent) > RECENT_KEYS_LIMIT:
+            # Two sorted runs, which the sort merges in one linear pass
+            self._main = sorted(self._main + self._recent)
+            self._recent = []
+
+    def discard(self, key: str) -> None:
+        index = bisect.bisect_left(self._recent, key)
+        if index < len(self._recent) and self._recent[index] == key:
+            del self._recent[index]
+            return
+        self._deleted.add(key)
+        if len(self._deleted) > DELETED_KEYS_SHARE * len(self._main):
+            self._main = [key for key in self._main if key not in self._deleted]
+            self._deleted = set()
+
+    def after(self, key: Optional[str]) -> Iterator[str]:
+        """Keys above ``key`` in order; may include keys deleted since, which callers skip"""
+        main, recent = self._main, list(self._recent)
+        if key is None:
+            return heapq.merge(main, recent)
+        return heapq.merge(islice(main, bisect.bisect_right(main, key), None),
+                           recent[bisect.bisect_right(recent, key):])
+
+
+class MemoryStore(ApplicationStore):
+    """
+    Applications kept as live objects in a dict, as before the store existed.
+
+    Nothing survives a restart. Objects are not copied, so in-place changes
+    are visible immediately; callers should still ``put`` them back so the
+    same code works with persistent backends.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._applications = {}
+        # Built by the first ordered scan, then kept current by writes
+        self._sorted_keys: Optional[SortedKeys] = None
+        self._lock = threading.Lock()
+
+    def _track_writes(self, keys: Iterable[str]) -> None:
+        """Add keys about to be written to the sorted keys; caller holds the lock"""
+        if self._sorted_keys is not None:
+            for key in keys:
+                if key not in self._applications:
+                    self._sorted_keys.add(key)
+
+    def _track_delete(self, key: str) -> None:
+        """Take a deleted key out of the sorted keys; caller holds the lock"""
+        if self._sorted_keys is not None:
+            self._sorted_keys.discard(key)
+
+    def get(self, key: str, default=None) -> Optional[VisaApplication]:
+        return self._applications.get(key, default)
+
+    def put(self, key: str, application: VisaApplication) -> None:
+        with self._lock:
+            self._track_writes([key])
+            self._applications[key] = application
+            self._notify_write([(key, application)])
+
+    def put_many(self, items: Iterable[Tuple[str, VisaApplication]]) -> None:
+        items = list(items)
+        with self._lock:
+            self._track_writes(key for key, _ in items)
+            self._applications.update(items)
+            self._notify_write(items)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            existed = self._applications.pop(key, None) is not None
+            if existed:
+                self._track_delete(key)
+                self._notify_delete(key)
+            return existed
+
+    def replace_if(self, key: str, check: Callable[[Optional[VisaApplication]], bool],
+                   application: Optional[VisaApplication]) -> bool:
+        with self._lock:
+            current = self._applications.get(key)
+            if not check(current):
+                return False
+            if application is not None:
+                self._track_writes([key])
+                self._applications[key] = application
+                self._notify_write([(key, application)])
+            elif current is not None:
+                del self._applications[key]
+                self._track_delete(key)
+                self._notify_delete(key)
+            return True
+
+    def iter_sorted(self, after: Optional[str] = None) -> Iterator[Tuple[str, VisaApplication]]:
+        """Resumes from ``after`` with a bisect over keys kept sorted, so paged scans do not sort every page"""
+        with self._lock:
+            if self._sorted_keys is None:
+                self._sorted_keys = SortedKeys(self._applications)
+            keys = self._sorted_keys.after(after)
+        for key in keys:
+            application = self._applications.get(key)
+            if application is not None:
+                yield key, application
+
+    def keys_in_order(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._applications))
+
+    def count(self) -> int:
+        return len(self._applications)
@@ -0,0 +1,39 @@
+import json
+import socket
+import struct
+from typing import Optional
+
+# Largest frame either side accepts; applications are a few KB
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+_LENGTH = struct.Struct(">I")
+
+
+def send_frame(sock: socket.socket, message: dict) -> None:
+    body = json.dumps(message, separators=(",", ":"), default=str).encode()
+    sock.sendall(_LENGTH.pack(len(body)) + body)
+
+
+def recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """``size`` bytes, or None if the peer closed before sending any"""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise ConnectionError("Connection closed mid-frame")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Optional[dict]:
+    header = recv_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    (length,) = _LENGTH.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    return json.loads(recv_exact(sock, length))
@@ -0,0 +1,135 @@
+import socket
+import threading
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.models.visa_application import VisaApplication
+from app.storage.base import ApplicationStore
+from app.storage.protocol import recv_frame, send_frame
+
+# Errors the server may report, re-raised as the same type in the worker
+REMOTE_ERRORS = {"KeyError": KeyError, "ValueError": ValueError}
+
+# Applications fetched per request by iter_sorted
+SCAN_PAGE_SIZE = 500
+
+
+class StoreUnavailable(ConnectionError):
+    """The store server could not be reached"""
+
+
+class RemoteStore(ApplicationStore):
+    """
+    Client for an ``app.storage.server`` store shared by every worker.
+
+    Each thread keeps its own connection, so concurrent requests from one
+    worker do not queue behind each other. Requests are synchronous: once a
+    write returns, a read from any worker sees it. ``insert`` runs on the
+    server so keys are unique across workers.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        super().__init__()
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise StoreUnavailable(f"Application store at {self.socket_path} is unavailable: {e}")
+            self._local.sock = sock
+            with self._connections_lock:
+                self._connections.append(sock)
+        return sock
+
+    def _drop_connection(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+            with self._connections_lock:
+                if sock in self._connections:
+                    self._connections.remove(sock)
+
+    def call(self, op: str, *args):
+        """Send one request and return its result, re-raising server-side errors"""
+        try:
+            sock = self._connection()
+            send_frame(sock, {"op": op, "args": list(args)})
+            reply = recv_frame(sock)
+        except StoreUnavailable:
+            raise
+        except OSError as e:
+            # The request may or may not have been applied; the next call
+            # reconnects
+            self._drop_connection()
+            raise StoreUnavailable(f"Application store request '{op}' failed: {e}")
+        if reply is None:
+            self._drop_connection()
+            raise StoreUnavailable(f"Application store closed the connection during '{op}'")
+        if not reply["ok"]:
+            raise REMOTE_ERRORS.get(reply["error"], RuntimeError)(reply["message"])
+        return reply["result"]
+
+    def get(self, key: str, default=None) -> Optional[VisaApplication]:
+        data = self.call("get", key)
+        return VisaApplication.from_dict(data) if data is not None else default
+
+    def put(self, key: str, application: VisaApplication) -> None:
+        self.call("put", key, application.to_dict())
+
+    def put_many(self, items: Iterable[Tuple[str, VisaApplication]]) -> None:
+        self.call("put_many", [[key, application.to_dict()] for key, application in items])
+
+    def insert(self, prefix: str, application: VisaApplication) -> str:
+        return self.call("insert", prefix, application.to_dict())
+
+    def delete(self, key: str) -> bool:
+        return self.call("delete", key)
+
+    def put_if_present(self, key: str, application: VisaApplication) -> bool:
+        return self.call("put_if_present", key, application.to_dict())
+
+    def keys_in_order(self) -> Iterator[str]:
+        return iter(self.call("keys"))
+
+    def count(self) -> int:
+        return self.call("count")
+
+    def iter_sorted(self, after: Optional[str] = None) -> Iterator[Tuple[str, VisaApplication]]:
+        """Pages of SCAN_PAGE_SIZE applications from the server, so memory does not grow with the store"""
+        while True:
+            page = self.call("scan", after, SCAN_PAGE_SIZE)
+            for key, data in page:
+                yield key, VisaApplication.from_dict(data)
+            if len(page) < SCAN_PAGE_SIZE:
+                return
+            after = page[-1][0]
+
+    def lookup(self, field: str, value: str) -> List[str]:
+        return self.call("lookup", field, value)
+
+    def photo_duplicates(self, phash: str, max_distance: int) -> dict:
+        return self.call("photo_duplicates", phash, max_distance)
+
+    def stats(self) -> dict:
+        return self.call("stats")
+
+    def flush(self) -> None:
+        self.call("flush")
+
+    def close(self) -> None:
+        """Close this worker's connections; the server and its data stay up"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for sock in connections:
+            sock.close()
+        self._local = threading.local()
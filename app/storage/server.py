@@ -0,0 +1,154 @@
+"""
+Serve one application store to every worker process on the host.
+
+Usage:
+    python -m app.storage.server --socket /run/visa/store.sock --store sqlite:applications.db
+    APPLICATION_STORE=unix:/run/visa/store.sock uvicorn app.main:app --workers 8
+
+Each uvicorn worker otherwise has its own store, so a DS-160 saved by one
+worker is invisible to the next request served by another. The server owns
+the real store (memory or SQLite) and applies every request in arrival
+order, so a read sent after a write was acknowledged always sees it, from
+any worker. Keys for new applications are also assigned here, so workers
+never hand out the same key, and the secondary indexes, photo hash index
+and aggregate statistics live here so lookups, duplicate checks and stats
+see every worker's writes.
+
+The protocol is length-prefixed JSON over a Unix socket: a 4-byte
+big-endian length, then ``{"op": ..., "args": [...]}``; replies are
+``{"ok": true, "result": ...}`` or ``{"ok": false, "error": ..., "message": ...}``.
+"""
+import argparse
+import itertools
+import os
+import socketserver
+import sys
+import threading
+
+from app.models.visa_application import VisaApplication
+from app.services.blobs import collect_originals, document_blobs, document_derivatives
+from app.services.photo_hashes import PhotoHashIndex
+from app.storage.backends import open_store
+from app.storage.base import ApplicationStore
+from app.storage.indexes import ApplicationIndexes
+from app.storage.lifecycle import ExpiryJanitor
+from app.storage.stats import ApplicationStats, StatsReconciler
+from app.storage.protocol import recv_frame, send_frame
+
+
+def dispatch(store: ApplicationStore, op: str, args: list):
+    """Apply one request to the store and return a JSON-able result"""
+    if op == "get":
+        application = store.get(args[0])
+        return application.to_dict() if application is not None else None
+    if op == "put":
+        store.put(args[0], VisaApplication.from_dict(args[1]))
+        return None
+    if op == "put_many":
+        store.put_many([(key, VisaApplication.from_dict(data)) for key, data in args[0]])
+        return None
+    if op == "insert":
+        return store.insert(args[0], VisaApplication.from_dict(args[1]))
+    if op == "put_if_present":
+        return store.put_if_present(args[0], VisaApplication.from_dict(args[1]))
+    if op == "delete":
+        return store.delete(args[0])
+    if op == "keys":
+        return list(store.keys_in_order())
+    if op == "scan":
+        # One page of an ordered scan; the worker asks again from the last key
+        page = itertools.islice(store.iter_sorted(args[0]), args[1])
+        return [[key, application.to_dict()] for key, application in page]
+    if op == "count":
+        return store.count()
+    if op == "lookup":
+        return store.lookup(args[0], args[1])
+    if op == "photo_duplicates":
+        return store.photo_duplicates(args[0], args[1])
+    if op == "stats":
+        return store.stats()
+    if op == "flush":
+        store.flush()
+        return None
+    raise ValueError(f"Unknown store operation '{op}'")
+
+
+class StoreRequestHandler(socketserver.BaseRequestHandler):
+    """Serves requests from one worker connection until it closes"""
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (ConnectionError, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                reply = {"ok": True, "result": dispatch(self.server.store, request["op"], request.get("args", []))}
+            except Exception as e:
+                reply = {"ok": False, "error": type(e).__name__, "message": str(e)}
+            try:
+                send_frame(self.request, reply)
+            except OSError:
+                return
+
+
+class StoreServer(socketserver.ThreadingUnixStreamServer):
+    """A thread per worker connection in front of one shared store"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, store: ApplicationStore):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        if store.indexes is None:
+            store.attach_indexes(ApplicationIndexes())
+        if store.photo_hashes is None:
+            store.attach_photo_hashes(PhotoHashIndex())
+        if store.statistics is None:
+            store.attach_stats(ApplicationStats())
+        self.store = store
+        super().__init__(socket_path, StoreRequestHandler)
+
+    def serve_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, args=(0.05,), name="store-server", daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        self.store.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", required=True, help="Unix socket path the workers connect to")
+    parser.add_argument("--store", default="memory", help="backing store: memory, sqlite:<path> or tiered:<path>")
+    args = parser.parse_args(argv)
+
+    server = StoreServer(args.socket, open_store(args.store))
+    # Originals live on this host's disk, shared with the workers
+    janitor = ExpiryJanitor(
+        server.store,
+        after_sweep=lambda: collect_originals(server.store, document_blobs, document_derivatives)
+    )
+    janitor.start()
+    reconciler = StatsReconciler(server.store)
+    reconciler.start()
+    print(f"Serving {args.store} on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        janitor.stop()
+        reconciler.stop()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+Durable in-memory application store: a write-ahead log plus snapshots.
+
+Applications live in memory as in MemoryStore. Every write is also
+appended to a log (an EventLog, so concurrent writers share fsyncs) and
+``put`` returns once it is on disk. A background thread periodically
+writes a snapshot of every application, then drops the log segments the
+snapshot covers; recovery loads the latest snapshot and replays only the
+log after it.
+
+Snapshots do not pause writes. A snapshot records the log position ``end``
+had when it started, then serialises applications one at a time while
+writes carry on, so later applications may already hold changes logged
+after that position. Log records are whole-application puts and deletes,
+so replaying from the recorded position over such a snapshot ends in the
+same state as replaying the whole log.
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+from app.models.visa_application import VisaApplication, field_default
+from app.services import metrics
+from app.storage.base import sequence_of
+from app.storage.events import EventLog
+from app.storage.memory import MemoryStore
+
+# A snapshot is taken once the log has grown by SNAPSHOT_LOG_BYTES since the
+# last one, or SNAPSHOT_INTERVAL seconds after it if anything was written;
+# the snapshotter checks every SNAPSHOT_CHECK_INTERVAL seconds
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", "300"))
+SNAPSHOT_LOG_BYTES = int(os.environ.get("SNAPSHOT_LOG_BYTES", str(256 * 1024 * 1024)))
+SNAPSHOT_CHECK_INTERVAL = 5.0
+
+# Events read from the log per batch while replaying
+REPLAY_BATCH_SIZE = 10000
+
+SNAPSHOT_PREFIX = "snapshot-"
+SNAPSHOT_SUFFIX = ".jsonl.gz"
+
+
+def snapshot_name(cursor: int) -> str:
+    return f"{SNAPSHOT_PREFIX}{cursor:020d}{SNAPSHOT_SUFFIX}"
+
+
+def compact_record(application: VisaApplication) -> dict:
+    """to_dict without the fields at their defaults, which from_dict fills back in"""
+    return {name: value for name, value in application.to_dict().items() if value != field_default(name)}
+
+
+def fsync_directory(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SnapshotStore(MemoryStore):
+    """
+    MemoryStore whose contents survive restarts, kept in ``directory``.
+
+    ``directory/log`` holds the write-ahead log and ``directory/snapshots``
+    the latest snapshot (see the module docstring). Writes are visible in
+    memory before they are durable, as with SQLiteStore's buffering, but
+    ``put`` and ``delete`` only return once their log record is on disk.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        snapshot_interval: float = SNAPSHOT_INTERVAL,
+        snapshot_log_bytes: int = SNAPSHOT_LOG_BYTES,
+        check_interval: float = SNAPSHOT_CHECK_INTERVAL,
+    ):
+        super().__init__()
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_log_bytes = snapshot_log_bytes
+        self.check_interval = check_interval
+        self.snapshot_directory = os.path.join(directory, "snapshots")
+        os.makedirs(self.snapshot_directory, exist_ok=True)
+        # Left by a snapshot interrupted before its rename
+        for name in os.listdir(self.snapshot_directory):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(self.snapshot_directory, name))
+        self.log = EventLog(os.path.join(directory, "log"))
+        self._snapshot_lock = threading.Lock()
+        self.snapshot_cursor = 0
+        self._snapshot_at = time.monotonic()
+        self.recover()
+
+        self._stopped = threading.Event()
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, name="application-snapshotter", daemon=True)
+        self._snapshotter.start()
+
+    # Writes
+
+    def put(self, key: str, application: VisaApplication) -> None:
+        self.put_many([(key, application)])
+
+    def put_many(self, items: Iterable[Tuple[str, VisaApplication]]) -> None:
+        items = list(items)
+        records = [{"op": "put", "key": key, "application": compact_record(application)}
+                   for key, application in items]
+        # Appending under the lock keeps log order the same as memory order
+        with self._lock:
+            futures = [self.log.append(record) for record in records]
+            self._track_writes(key for key, _ in items)
+            self._applications.update(items)
+            self._notify_write(items)
+        for future in futures:
+            future.result()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            existed = self._applications.pop(key, None) is not None
+            if existed:
+                future = self.log.append({"op": "delete", "key": key})
+                self._track_delete(key)
+                self._notify_delete(key)
+        if existed:
+            future.result()
+        return existed
+
+    def replace_if(self, key: str, check: Callable[[Optional[VisaApplication]], bool],
+                   application: Optional[VisaApplication]) -> bool:
+        future = None
+        with self._lock:
+            current = self._applications.get(key)
+            if not check(current):
+                return False
+            if application is not None:
+                future = self.log.append({"op": "put", "key": key, "application": compact_record(application)})
+                self._track_writes([key])
+                self._applications[key] = application
+                self._notify_write([(key, application)])
+            elif current is not None:
+                future = self.log.append({"op": "delete", "key": key})
+                del self._applications[key]
+                self._track_delete(key)
+                self._notify_delete(key)
+        if future is not None:
+            future.result()
+        return True
+
+    # Snapshots
+
+    def latest_snapshot(self) -> Optional[Tuple[int, str]]:
+        """(log cursor, path) of the newest snapshot, if any"""
+        snapshots = sorted(
+            name for name in os.listdir(self.snapshot_directory)
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+        )
+        if not snapshots:
+            return None
+        name = snapshots[-1]
+        return int(name[len(SNAPSHOT_PREFIX):-len(SNAPSHOT_SUFFIX)]), os.path.join(self.snapshot_directory, name)
+
+    def snapshot(self) -> str:
+        """Write a snapshot of every application without blocking writes; returns its path"""
+        with self._snapshot_lock:
+            start = time.perf_counter()
+            cursor = self.log.end()
+            keys = list(self.keys_in_order())
+            fd, temporary = tempfile.mkstemp(dir=self.snapshot_directory, suffix=".tmp")
+            written = 0
+            try:
+                with os.fdopen(fd, "wb") as raw:
+                    with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1) as snapshot:
+                        for key in keys:
+                            application = self._applications.get(key)
+                            if application is None:
+                                continue
+                            snapshot.write(json.dumps([key, compact_record(application)], separators=(",", ":"),
+                                                      default=str).encode() + b"\n")
+                            written += 1
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                path = os.path.join(self.snapshot_directory, snapshot_name(cursor))
+                os.replace(temporary, path)
+            except BaseException:
+                os.remove(temporary)
+                raise
+            fsync_directory(self.snapshot_directory)
+
+            # The new snapshot replaces older ones and the log before it
+            for name in os.listdir(self.snapshot_directory):
+                if name != snapshot_name(cursor) and name.startswith(SNAPSHOT_PREFIX):
+                    os.remove(os.path.join(self.snapshot_directory, name))
+            self.log.prune(cursor)
+            self.snapshot_cursor = cursor
+            self._snapshot_at = time.monotonic()
+
+            metrics.observe("application_snapshot_seconds", time.perf_counter() - start)
+            metrics.set_gauge("application_snapshot_records", written)
+            metrics.set_gauge("application_snapshot_bytes", os.path.getsize(path))
+            return path
+
+    def snapshot_due(self) -> bool:
+        grown = self.log.end() - self.snapshot_cursor
+        if grown <= 0:
+            return False
+        return grown >= self.snapshot_log_bytes or time.monotonic() - self._snapshot_at >= self.snapshot_interval
+
+    def _snapshot_loop(self) -> None:
+        while not self._stopped.wait(self.check_interval):
+            try:
+                if self.snapshot_due():
+                    self.snapshot()
+            except Exception:
+                metrics.increment("application_snapshot_errors_total")
+
+    # Recovery
+
+    def recover(self) -> int:
+        """Load the latest snapshot and replay the log after it; returns the log records replayed"""
+        start = time.perf_counter()
+        applications = {}
+        cursor = 0
+        latest = self.latest_snapshot()
+        if latest is not None:
+            cursor, path = latest
+            with gzip.open(path, "rb") as snapshot:
+                for line in snapshot:
+                    key, data = json.loads(line)
+                    applications[key] = VisaApplication.from_dict(data)
+        loaded = len(applications)
+
+        replayed = 0
+        while True:
+            records, next_cursor = self.log.read(cursor, REPLAY_BATCH_SIZE)
+            if not records:
+                break
+            for record in records:
+                if record["op"] == "put":
+                    applications[record["key"]] = VisaApplication.from_dict(record["application"])
+                else:
+                    applications.pop(record["key"], None)
+            replayed += len(records)
+            cursor = next_cursor
+
+        with self._lock:
+            self._applications = applications
+            self._sorted_keys = None
+        self._sequence = max((sequence_of(key) for key in applications), default=0)
+        self.snapshot_cursor = latest[0] if latest is not None else 0
+
+        metrics.observe("application_recovery_seconds", time.perf_counter() - start)
+        metrics.set_gauge("application_recovery_snapshot_records", loaded)
+        metrics.set_gauge("application_recovery_replayed_records", replayed)
+        return replayed
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._snapshotter.join()
+        self.log.close()
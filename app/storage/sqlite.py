@@ -0,0 +1,251 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.base import ApplicationStore, sequence_of
+
+# Read connections kept open; the single write connection is separate
+SQLITE_POOL_SIZE = 4
+
+# Buffered writes are committed together once this many are waiting, or
+# every FLUSH_INTERVAL seconds, whichever comes first
+WRITE_BATCH_SIZE = 256
+FLUSH_INTERVAL = 0.05
+
+# Rows read per query by iter_sorted
+SCAN_PAGE_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applications (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+)
+"""
+
+# Statements are module constants so every connection's statement cache
+# reuses one prepared statement per query
+SELECT_ONE = "SELECT data FROM applications WHERE key = ?"
+SELECT_KEYS = "SELECT key FROM applications ORDER BY rowid"
+SELECT_COUNT = "SELECT COUNT(*) FROM applications"
+SELECT_PAGE = "SELECT key, data FROM applications WHERE key > ? ORDER BY key LIMIT ?"
+UPSERT = "INSERT INTO applications (key, data) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET data = excluded.data"
+DELETE = "DELETE FROM applications WHERE key = ?"
+
+
+def encode(application: VisaApplication) -> str:
+    return json.dumps(application.to_dict(), separators=(",", ":"), default=str)
+
+
+def decode(data: str) -> VisaApplication:
+    return VisaApplication.from_dict(json.loads(data))
+
+
+class SQLiteStore(ApplicationStore):
+    """
+    Applications as JSON rows in an embedded SQLite database.
+
+    The database runs in WAL mode so readers never block the writer. Reads
+    borrow a connection from a small pool. Writes are buffered and committed
+    in batches by a background flusher (or by the writer that fills a
+    batch). Buffered writes are visible to ``get`` straight away, but a crash
+    loses up to ``flush_interval`` seconds of them; call ``flush`` where that
+    matters.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        pool_size: int = SQLITE_POOL_SIZE,
+        batch_size: int = WRITE_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        super().__init__()
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute(SCHEMA)
+        self._writer.commit()
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+
+        # key -> encoded application, or None for a delete. Writes move to
+        # _flushing while their batch commits so readers still see them
+        self._pending = {}
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._sequence = max((sequence_of(key) for key in self.keys_in_order()), default=0)
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="sqlite-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        # With WAL, NORMAL only syncs at checkpoints; a power cut can lose
+        # the last commits but never corrupts the database
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    @contextmanager
+    def _reader(self):
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def _buffered(self, key: str):
+        """(found, encoded) for a write not yet committed"""
+        with self._lock:
+            for writes in (self._pending, self._flushing):
+                if key in writes:
+                    return True, writes[key]
+        return False, None
+
+    def get(self, key: str, default=None) -> Optional[VisaApplication]:
+        found, data = self._buffered(key)
+        if not found:
+            with self._reader() as connection:
+                row = connection.execute(SELECT_ONE, (key,)).fetchone()
+            data = row[0] if row else None
+        return decode(data) if data is not None else default
+
+    def put(self, key: str, application: VisaApplication) -> None:
+        self.put_many([(key, application)])
+
+    def put_many(self, items: Iterable[Tuple[str, VisaApplication]]) -> None:
+        items = list(items)
+        encoded = [(key, encode(application)) for key, application in items]
+        with self._lock:
+            self._pending.update(encoded)
+            full = len(self._pending) >= self.batch_size
+            self._notify_write(items)
+        if full:
+            self.flush()
+
+    def delete(self, key: str) -> bool:
+        # The check and the delete happen under both locks, so concurrent
+        # deletes of one key cannot both report (and notify) a removal.
+        # Holding the flush lock means no batch is half committed
+        with self._flush_lock:
+            with self._lock:
+                if key in self._pending:
+                    existed = self._pending[key] is not None
+                    self._pending[key] = None
+                else:
+                    with self._writer:
+                        existed = self._writer.execute(DELETE, (key,)).rowcount > 0
+                if existed:
+                    self._notify_delete(key)
+        return existed
+
+    def replace_if(self, key: str, check: Callable[[Optional[VisaApplication]], bool],
+                   application: Optional[VisaApplication]) -> bool:
+        encoded = encode(application) if application is not None else None
+        # Under both locks, as in delete: nothing is half committed and no
+        # other write can land between the check and the write
+        with self._flush_lock:
+            with self._lock:
+                if key in self._pending:
+                    data = self._pending[key]
+                else:
+                    row = self._writer.execute(SELECT_ONE, (key,)).fetchone()
+                    data = row[0] if row else None
+                current = decode(data) if data is not None else None
+                if not check(current):
+                    return False
+                if application is not None:
+                    self._pending[key] = encoded
+                    self._notify_write([(key, application)])
+                elif current is not None:
+                    self._pending[key] = None
+                    self._notify_delete(key)
+                full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+        return True
+
+    def index_rows(self, fields: Sequence[str]) -> Iterator[Tuple[str, tuple]]:
+        # Pull just the indexed fields out of the JSON in SQLite instead of
+        # decoding every application
+        self.flush()
+        columns = ", ".join(f"json_extract(data, '$.{field}')" for field in fields)
+        with self._reader() as connection:
+            for row in connection.execute(f"SELECT key, {columns} FROM applications ORDER BY rowid"):
+                yield row[0], row[1:]
+
+    def keys_in_order(self) -> Iterator[str]:
+        self.flush()
+        with self._reader() as connection:
+            return iter([row[0] for row in connection.execute(SELECT_KEYS)])
+
+    def iter_sorted(self, after: Optional[str] = None) -> Iterator[Tuple[str, VisaApplication]]:
+        """Pages of SCAN_PAGE_SIZE rows along the primary key, so memory does not grow with the table"""
+        self.flush()
+        after = "" if after is None else after
+        while True:
+            with self._reader() as connection:
+                rows = connection.execute(SELECT_PAGE, (after, SCAN_PAGE_SIZE)).fetchall()
+            for key, data in rows:
+                yield key, decode(data)
+            if len(rows) < SCAN_PAGE_SIZE:
+                return
+            after = rows[-1][0]
+
+    def count(self) -> int:
+        self.flush()
+        with self._reader() as connection:
+            return connection.execute(SELECT_COUNT).fetchone()[0]
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            try:
+                with self._writer:
+                    self._writer.executemany(UPSERT, [(k, v) for k, v in batch.items() if v is not None])
+                    self._writer.executemany(DELETE, [(k,) for k, v in batch.items() if v is None])
+            except Exception:
+                # Put the batch back under any newer writes so it is retried
+                with self._lock:
+                    self._pending = {**batch, **self._pending}
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+            metrics.increment("application_store_commits_total")
+            metrics.observe("application_store_batch_size", len(batch))
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                metrics.increment("application_store_flush_errors_total")
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        self._writer.close()
+        while not self._pool.empty():
+            self._pool.get().close()
@@ -0,0 +1,261 @@
+"""
+Aggregate statistics over stored applications, kept current as they change.
+
+ApplicationStats is a store listener. Each write works out what the
+application contributes to the totals (its visa type, workflow state,
+payment, interview location and failed documents), takes away what the
+key contributed before and adds the new contribution, so the totals never
+need a scan and ``summary`` costs the same however many applications there
+are.
+
+StatsReconciler periodically recounts everything from a full scan and
+compares: any difference is drift (a write that bypassed the store, a bug
+in the bookkeeping), which is counted in metrics, reported by ``summary``
+and corrected. Writes carry on during the scan; keys written meanwhile are
+taken from the live bookkeeping rather than the scan.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.base import ApplicationStore, StoreListener
+
+# Seconds between reconciliations against a full scan
+STATS_RECONCILE_INTERVAL = float(os.environ.get("STATS_RECONCILE_INTERVAL", "3600"))
+
+# Group for applications missing the value being grouped by
+UNKNOWN = "unknown"
+
+# Single counts, and counts grouped by a value
+TOTALS = ("applications", "payments", "interviews", "failed_documents", "applications_with_failed_documents")
+GROUPS = ("visa_type", "workflow_state", "payment_currency", "payment_method", "payment_cents",
+          "interview_location", "failed_document")
+
+
+def label(value) -> str:
+    return str(value) if value not in (None, "") else UNKNOWN
+
+
+def cents(amount) -> int:
+    """Whole cents, so sums stay exact however often they are added to and taken from"""
+    try:
+        return round(float(amount) * 100)
+    except (TypeError, ValueError):
+        return 0
+
+
+def contribution(application: VisaApplication) -> tuple:
+    """What one application adds to the totals: (visa type, state, payment, location, failed documents)"""
+    payment = None
+    if application.payment_confirmation_id:
+        payment = (label(application.fee_currency), label(application.payment_method), cents(application.fee_amount))
+    location = label(application.interview_location) if application.interview_confirmation_id else None
+    failed = tuple(sorted(
+        document for document, result in (application.peek_field("document_validation_results") or {}).items()
+        if not (isinstance(result, dict) and result.get("validation_passed", False))
+    ))
+    return label(application.visa_type), application.workflow_state, payment, location, failed
+
+
+class ApplicationStats(StoreListener):
+    """
+    Counts and payment sums over every application in a store.
+
+    Remembers each key's contribution, so an overwrite or delete takes away
+    exactly what the key added without reading the old application back.
+
+    Kept current as a store listener; ``rebuild`` recounts from a store and
+    ``reconcile`` does the same, reporting what had drifted.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, tuple] = {}
+        self._totals: Dict[str, int] = dict.fromkeys(TOTALS, 0)
+        self._groups: Dict[str, Dict[str, int]] = {group: {} for group in GROUPS}
+        # Keys written while a scan is running
+        self._touched: Optional[set] = None
+        self.reconciled_at: Optional[float] = None
+        self.drift: List[str] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bump(counts: Dict[str, int], key: str, delta: int) -> None:
+        value = counts.get(key, 0) + delta
+        if value:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
+
+    def _apply(self, values: tuple, sign: int) -> None:
+        """Add (sign 1) or take away (sign -1) one contribution; caller holds the lock"""
+        visa_type, state, payment, location, failed = values
+        self._totals["applications"] += sign
+        self._bump(self._groups["visa_type"], visa_type, sign)
+        self._bump(self._groups["workflow_state"], state, sign)
+        if payment is not None:
+            currency, method, amount = payment
+            self._totals["payments"] += sign
+            self._bump(self._groups["payment_currency"], currency, sign)
+            self._bump(self._groups["payment_method"], method, sign)
+            self._bump(self._groups["payment_cents"], currency, sign * amount)
+        if location is not None:
+            self._totals["interviews"] += sign
+            self._bump(self._groups["interview_location"], location, sign)
+        if failed:
+            self._totals["applications_with_failed_documents"] += sign
+            self._totals["failed_documents"] += sign * len(failed)
+            for document in failed:
+                self._bump(self._groups["failed_document"], document, sign)
+
+    def _replace(self, key: str, values: Optional[tuple]) -> None:
+        """Count ``values`` for ``key`` instead of what it had; caller holds the lock"""
+        previous = self._entries.get(key)
+        if previous == values:
+            # Rewrites that change nothing counted (a touch, a re-save)
+            return
+        if previous is not None:
+            del self._entries[key]
+            self._apply(previous, -1)
+        if values is not None:
+            self._entries[key] = values
+            self._apply(values, 1)
+
+    def on_write(self, items) -> None:
+        values = [(key, contribution(application)) for key, application in items]
+        with self._lock:
+            for key, contributed in values:
+                self._replace(key, contributed)
+                if self._touched is not None:
+                    self._touched.add(key)
+
+    def on_delete(self, key: str) -> None:
+        with self._lock:
+            self._replace(key, None)
+            if self._touched is not None:
+                self._touched.add(key)
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Tuple[str, tuple]]) -> "ApplicationStats":
+        stats = cls()
+        for key, values in entries:
+            stats._replace(key, values)
+        return stats
+
+    def _recount(self, store: ApplicationStore, replace_only_on_drift: bool) -> List[str]:
+        """Count ``store`` afresh and adopt the result; returns how the old totals differed"""
+        start = time.perf_counter()
+        with self._lock:
+            self._touched = set()
+        try:
+            # Counted outside the lock so writers are not held up by the scan
+            scanned = ApplicationStats.from_entries(
+                (key, contribution(application)) for key, application in store.iter_sorted()
+            )
+            with self._lock:
+                for key in self._touched:
+                    scanned._replace(key, self._entries.get(key))
+                drift = self._differences(scanned)
+                if drift or not replace_only_on_drift:
+                    self._entries = scanned._entries
+                    self._totals = scanned._totals
+                    self._groups = scanned._groups
+        finally:
+            with self._lock:
+                self._touched = None
+        metrics.observe("application_stats_recount_seconds", time.perf_counter() - start)
+        return drift
+
+    def _differences(self, other: "ApplicationStats") -> List[str]:
+        """``name: ours != theirs`` for every count that differs from ``other``'s"""
+        differences = [
+            f"{name}: {self._totals[name]} != {other._totals[name]}"
+            for name in TOTALS if self._totals[name] != other._totals[name]
+        ]
+        for group in GROUPS:
+            ours, theirs = self._groups[group], other._groups[group]
+            for key in sorted(set(ours) | set(theirs)):
+                if ours.get(key, 0) != theirs.get(key, 0):
+                    differences.append(f"{group}[{key}]: {ours.get(key, 0)} != {theirs.get(key, 0)}")
+        return differences
+
+    def rebuild(self, store: ApplicationStore) -> int:
+        """Replace the counts with what ``store`` holds; returns the number of applications"""
+        self._recount(store, replace_only_on_drift=False)
+        return len(self)
+
+    def reconcile(self, store: ApplicationStore) -> List[str]:
+        """Recount ``store`` from a full scan, correct any drift and return what differed"""
+        drift = self._recount(store, replace_only_on_drift=True)
+        self.reconciled_at = time.time()
+        self.drift = drift
+        metrics.increment("application_stats_reconciliations_total")
+        if drift:
+            metrics.increment("application_stats_drift_total", len(drift))
+        metrics.set_gauge("application_stats_drift", len(drift))
+        return drift
+
+    def summary(self) -> dict:
+        """The current totals, JSON-able"""
+        with self._lock:
+            totals = dict(self._totals)
+            groups = {group: dict(counts) for group, counts in self._groups.items()}
+        return {
+            "applications": totals["applications"],
+            "by_visa_type": groups["visa_type"],
+            "by_workflow_state": groups["workflow_state"],
+            "payments": {
+                "count": totals["payments"],
+                "by_currency": {
+                    currency: {"count": count, "amount": groups["payment_cents"].get(currency, 0) / 100}
+                    for currency, count in groups["payment_currency"].items()
+                },
+                "by_method": groups["payment_method"],
+            },
+            "interviews": {
+                "count": totals["interviews"],
+                "by_location": groups["interview_location"],
+            },
+            "documents": {
+                "failed": totals["failed_documents"],
+                "applications_with_failures": totals["applications_with_failed_documents"],
+                "failed_by_type": groups["failed_document"],
+            },
+            "reconciled_at": self.reconciled_at,
+            "drift": list(self.drift),
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class StatsReconciler:
+    """Runs ``reconcile`` on a store's attached stats every ``interval`` seconds on a daemon thread"""
+
+    def __init__(self, store: ApplicationStore, interval: float = STATS_RECONCILE_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None or self.store.statistics is None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="application-stats-reconciler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.store.statistics.reconcile(self.store)
+            except Exception:
+                metrics.increment("application_stats_reconcile_errors_total")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,159 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.base import ApplicationStore
+
+# Estimated bytes of applications kept in memory; past it the least recently
+# used ones are dropped to the disk tier
+APPLICATION_MEMORY_BUDGET = int(os.environ.get("APPLICATION_MEMORY_BUDGET", str(256 * 1024 * 1024)))
+
+
+def approximate_size(value) -> int:
+    """Bytes held by ``value`` and what it references: containers, strings and slotted objects"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += approximate_size(key) + approximate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += approximate_size(item)
+    elif not isinstance(value, (str, int, float, bool, type(None))):
+        for cls in type(value).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                size += approximate_size(getattr(value, name, None))
+    return size
+
+
+class TieredStore(ApplicationStore):
+    """
+    Recently used applications in memory, within a byte budget, over a disk tier holding all of them.
+
+    Writes go to the disk tier (a SQLiteStore, which batches them) and to
+    memory. When the memory tier passes ``memory_budget`` estimated bytes,
+    the least recently used applications are dropped from it; the disk tier
+    already has them, so spilling costs no I/O. A ``get`` that misses memory
+    reads the disk tier and keeps the result in memory again.
+    """
+
+    def __init__(self, cold: ApplicationStore, memory_budget: int = APPLICATION_MEMORY_BUDGET):
+        super().__init__()
+        self.cold = cold
+        self.memory_budget = memory_budget
+        self._sequence = cold._sequence
+        # key -> (application, estimated bytes), least recently used first
+        self._hot = OrderedDict()
+        self._hot_bytes = 0
+        # Bumped by every write; a disk read only fills memory if no write
+        # landed meanwhile, so a stale copy never shadows a newer one
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._hot_bytes
+
+    def _admit(self, key: str, application: VisaApplication, size: int) -> None:
+        """Keep ``application`` in memory and spill the coldest past the budget; caller holds the lock"""
+        previous = self._hot.pop(key, None)
+        if previous is not None:
+            self._hot_bytes -= previous[1]
+        self._hot[key] = (application, size)
+        self._hot_bytes += size
+        spilled = 0
+        while self._hot_bytes > self.memory_budget and self._hot:
+            _, (_, spilled_size) = self._hot.popitem(last=False)
+            self._hot_bytes -= spilled_size
+            spilled += 1
+        if spilled:
+            metrics.increment("application_store_spills_total", spilled)
+        metrics.set_gauge("application_store_memory_bytes", self._hot_bytes)
+
+    def get(self, key: str, default=None) -> Optional[VisaApplication]:
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                self._hot.move_to_end(key)
+                return entry[0]
+            writes = self._writes
+        metrics.increment("application_store_memory_misses_total")
+        application = self.cold.get(key)
+        if application is None:
+            return default
+        size = approximate_size(application)
+        with self._lock:
+            if writes == self._writes:
+                self._admit(key, application, size)
+        return application
+
+    def peek(self, key: str) -> Optional[VisaApplication]:
+        with self._lock:
+            entry = self._hot.get(key)
+        return entry[0] if entry is not None else self.cold.get(key)
+
+    def put(self, key: str, application: VisaApplication) -> None:
+        self.put_many([(key, application)])
+
+    def put_many(self, items: Iterable[Tuple[str, VisaApplication]]) -> None:
+        sized = [(key, application, approximate_size(application)) for key, application in items]
+        with self._lock:
+            self._writes += 1
+            self.cold.put_many([(key, application) for key, application, _ in sized])
+            for key, application, size in sized:
+                self._admit(key, application, size)
+            self._notify_write([(key, application) for key, application, _ in sized])
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            self._writes += 1
+            entry = self._hot.pop(key, None)
+            if entry is not None:
+                self._hot_bytes -= entry[1]
+            existed = self.cold.delete(key)
+            if existed:
+                self._notify_delete(key)
+            return existed
+
+    def replace_if(self, key: str, check: Callable[[Optional[VisaApplication]], bool],
+                   application: Optional[VisaApplication]) -> bool:
+        # Every write to the disk tier goes through this lock, so the check
+        # holds until the write; peeking leaves the memory tier as it is
+        with self._lock:
+            entry = self._hot.get(key)
+            current = entry[0] if entry is not None else self.cold.peek(key)
+            if not check(current):
+                return False
+            self._writes += 1
+            if application is not None:
+                self.cold.put(key, application)
+                self._admit(key, application, approximate_size(application))
+                self._notify_write([(key, application)])
+            elif current is not None:
+                entry = self._hot.pop(key, None)
+                if entry is not None:
+                    self._hot_bytes -= entry[1]
+                self.cold.delete(key)
+                self._notify_delete(key)
+            return True
+
+    def keys_in_order(self) -> Iterator[str]:
+        return self.cold.keys_in_order()
+
+    def index_rows(self, fields: Sequence[str]) -> Iterator[Tuple[str, tuple]]:
+        return self.cold.index_rows(fields)
+
+    def iter_sorted(self, after: Optional[str] = None) -> Iterator[Tuple[str, VisaApplication]]:
+        return self.cold.iter_sorted(after)
+
+    def count(self) -> int:
+        return self.cold.count()
+
+    def flush(self) -> None:
+        self.cold.flush()
+
+    def close(self) -> None:
+        self.cold.close()
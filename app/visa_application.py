@@ -1,3 +1,6 @@
+from app.services.ids import id_service
+
+
 class VisaApplication:
     """
     A class to simulate the U.S. visa application process step by step.
@@ -94,9 +97,6 @@ class VisaApplication:
     
     def fill_ds160(self, form_data):
         """Fill out the DS-160 online application form"""
-        import random
-        import string
-        
         if self.visa_type is None:
             raise ValueError("No visa type selected. Please select a visa type first.")
         
@@ -119,15 +119,12 @@ class VisaApplication:
         
         self.ds160_form_data = form_data.copy()
         
-        self.ds160_confirmation_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        self.ds160_confirmation_id = id_service.issue("ds160")
         
         return f"DS-160 form submitted successfully. Confirmation ID: {self.ds160_confirmation_id}"
     
     def pay_fee(self, amount):
         """Pay the visa application fee"""
-        import random
-        import string
-        
         if self.visa_type is None:
             raise ValueError("No visa type selected. Please select a visa type first.")
         
@@ -147,7 +144,7 @@ class VisaApplication:
             raise ValueError(f"Insufficient payment. Required fee for {self.visa_type} visa is ${required_fee:.2f}, but ${amount:.2f} was provided")
         
         self.payment_amount = amount
-        self.payment_confirmation_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        self.payment_confirmation_id = id_service.issue("payment")
         
         return f"Payment successful. Amount: ${amount:.2f}, Confirmation ID: {self.payment_confirmation_id}"
     
@@ -183,14 +180,11 @@ class VisaApplication:
     
     def collect_biometrics(self):
         """Collect biometric information (fingerprints, photo)"""
-        import random
-        import string
-        
         if self.appointment is None:
             raise ValueError("Appointment must be scheduled before collecting biometrics")
         
         if self.biometrics_confirmation_id is None:
-            self.biometrics_confirmation_id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+            self.biometrics_confirmation_id = id_service.issue("biometrics")
         
         return f"Biometrics collected successfully. Confirmation ID: {self.biometrics_confirmation_id}"
     
@@ -255,9 +249,6 @@ class VisaApplication:
     
     def issue_visa(self):
         """Final visa issuance or denial"""
-        import random
-        import string
-        
         if self.processing_status is None:
             raise ValueError("Application processing must be completed before issuing visa")
         
@@ -269,10 +260,7 @@ class VisaApplication:
         
         if self.processing_status == "Visa Approved":
             if self.visa_number is None:
-                # Generate visa number with current year prefix
-                from datetime import datetime
-                year = datetime.now().year
-                random_part = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-                self.visa_number = f"{year}{random_part}"
+                # Visa number with current year prefix
+                self.visa_number = id_service.issue("visa_number")
             
             return f"VISA ISSUED SUCCESSFULLY! Visa Number: {self.visa_number}. Your visa is now ready for pickup or delivery."
\ No newline at end of file
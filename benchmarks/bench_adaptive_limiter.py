@@ -0,0 +1,126 @@
+"""
+Load-test the adaptive OCR concurrency limit under changing document sizes.
+
+Usage:
+    python -m benchmarks.bench_adaptive_limiter --cores 4 --clients 32 --phase-seconds 4
+
+OCR is simulated so the run needs no tesseract: a job takes ``megapixels *
+--ms-per-megapixel`` on an idle core, and jobs beyond ``--cores`` share the
+cores and slow each other down.
+
+Closed-loop clients keep submitting through the limiter while the document
+mix moves from small passport scans to large statements, a blend, and back.
+The adaptive limit is printed every second. It is then compared with fixed
+limits that are too low and too high.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from app.services.concurrency import AdaptiveLimiter
+
+PHASES = [
+    ("passport scans, 0.5 MP", lambda rng: 0.5),
+    ("statements, 8 MP", lambda rng: 8.0),
+    ("mixed, 0.5-8 MP", lambda rng: rng.choice([0.5, 1.0, 2.0, 8.0])),
+    ("passport scans, 0.5 MP", lambda rng: 0.5),
+]
+
+
+class SimulatedOCR:
+    """
+    Jobs share ``cores`` cores the way oversubscribed tesseract processes do:
+    with more jobs than cores, each one runs proportionally slower.
+    """
+
+    def __init__(self, cores: int, seconds_per_megapixel: float):
+        self.cores = cores
+        self.seconds_per_megapixel = seconds_per_megapixel
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def run(self, megapixels: float) -> None:
+        with self.lock:
+            self.active += 1
+            slowdown = max(1.0, self.active / self.cores)
+        try:
+            time.sleep(megapixels * self.seconds_per_megapixel * slowdown)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def run_phases(limiter, engine, clients, phase_seconds, report=True):
+    """Drive the limiter through every phase; returns per-phase throughput and latency"""
+    results = []
+    for title, size_of in PHASES:
+        started = time.perf_counter()
+        stop = started + phase_seconds
+        done = []
+        lock = threading.Lock()
+
+        def client(seed):
+            rng = random.Random(seed)
+            while time.perf_counter() < stop:
+                megapixels = size_of(rng)
+                start = time.perf_counter()
+                with limiter.slot(megapixels):
+                    engine.run(megapixels)
+                with lock:
+                    done.append((megapixels, time.perf_counter() - start))
+
+        threads = [threading.Thread(target=client, args=(seed,), daemon=True) for seed in range(clients)]
+        for thread in threads:
+            thread.start()
+        if report:
+            print(f"  {title}")
+            while time.perf_counter() < stop:
+                time.sleep(min(1.0, max(0.0, stop - time.perf_counter())))
+                latency = limiter.latency
+                print(f"    limit {limiter.limit:3d}  in flight {limiter.inflight:3d}  "
+                      f"smoothed {latency * 1000 if latency else 0:7.1f} ms/MP")
+        for thread in threads:
+            thread.join()
+
+        # Clients finish the job they were on when the phase ended, so time
+        # the whole phase rather than assuming it took phase_seconds
+        elapsed = time.perf_counter() - started
+        throughput = sum(megapixels for megapixels, _ in done) / elapsed
+        per_mp = statistics.median(latency / megapixels for megapixels, latency in done)
+        results.append((title, throughput, per_mp))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cores", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--phase-seconds", type=float, default=4.0)
+    parser.add_argument("--ms-per-megapixel", type=float, default=20.0)
+    args = parser.parse_args()
+
+    engine = SimulatedOCR(args.cores, args.ms_per_megapixel / 1000)
+    ideal = args.ms_per_megapixel
+    print(f"{args.cores} simulated cores, {ideal:.0f} ms/MP uncontended, {args.clients} clients")
+
+    limiters = [
+        ("adaptive", AdaptiveLimiter("bench", initial_limit=2, max_limit=args.clients)),
+        ("fixed, too low", AdaptiveLimiter("bench", initial_limit=1, min_limit=1, max_limit=1)),
+        ("fixed, too high", AdaptiveLimiter("bench", initial_limit=args.clients, min_limit=args.clients,
+                                            max_limit=args.clients)),
+    ]
+    summary = []
+    for name, limiter in limiters:
+        print(f"\n{name}:")
+        summary.append((name, run_phases(limiter, engine, args.clients, args.phase_seconds, report=name == "adaptive")))
+
+    print(f"\n{'limiter':16s} {'phase':24s} {'MP/s':>8s} {'p50 ms/MP':>10s}")
+    for name, results in summary:
+        for title, throughput, per_mp in results:
+            print(f"{name:16s} {title:24s} {throughput:8.1f} {per_mp * 1000:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Measure bytes per application for large in-memory populations.
+
+Usage:
+    python -m benchmarks.bench_application_memory --applications 1000000 --profiles new ds160 paid
+
+Applications are rebuilt from JSON, as the stores load them, so every
+string is a fresh object. ``before`` keeps every field as an ordinary
+instance attribute (the layout VisaApplication had before it moved to
+slots); ``after`` is the current VisaApplication. Profiles are how far
+through the workflow the applications are: ``new`` (visa type only),
+``ds160`` (form submitted), ``paid`` (fee paid) and ``documents`` (a
+passport validated). Memory is measured with tracemalloc, excluding the list
+holding the applications.
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from app.models.visa_application import FIELDS, VisaApplication, field_default
+
+
+class DictApplication:
+    """Every field as an instance attribute in a per-object __dict__"""
+
+    def __init__(self, data: dict):
+        for name in FIELDS:
+            setattr(self, name, data.get(name, field_default(name)))
+
+
+def application_json(profile: str, i: int) -> str:
+    data = {"visa_type": ["B1/B2", "F1", "H1B", "J1"][i % 4]}
+    if profile in ("ds160", "paid", "documents"):
+        form = {"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}", "dob": "1990-01-01",
+                "nationality": "Indian", "email": f"applicant{i}@example.com"}
+        data.update(form, ds160_form_data=form, ds160_confirmation_id=f"C{i:07d}")
+    if profile in ("paid", "documents"):
+        payment = {"amount": 185.0, "currency": "USD", "payment_method": "credit_card",
+                   "transaction_id": f"TXN{i:010d}"}
+        data.update(payment_data=payment, fee_amount=185.0, fee_currency="USD", payment_method="credit_card",
+                    transaction_id=payment["transaction_id"], payment_status="completed",
+                    payment_confirmation_id=f"P{i:07d}")
+    if profile == "documents":
+        data.update(uploaded_documents={"passport": {"filename": "passport.png", "size": 182311}},
+                    document_validation_results={"passport": {"validation_passed": True}},
+                    extracted_text={"passport": f"P<IND APPLICANT<<{i} A{i:08d}"})
+    return json.dumps(data)
+
+
+def measure(build, profile: str, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    applications = [None] * count
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        applications[i] = build(json.loads(application_json(profile, i)))
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del applications
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--applications", type=int, default=1_000_000)
+    parser.add_argument("--profiles", nargs="+", default=["new", "ds160", "paid"],
+                        choices=["new", "ds160", "paid", "documents"])
+    args = parser.parse_args()
+
+    print(f"{args.applications} applications per profile")
+    print(f"\n{'profile':10s} {'before B/app':>13s} {'after B/app':>12s} {'saved':>7s}")
+    for profile in args.profiles:
+        before = measure(DictApplication, profile, args.applications)
+        after = measure(VisaApplication.from_dict, profile, args.applications)
+        print(f"{profile:10s} {before:13.0f} {after:12.0f} {1 - after / before:7.0%}")
+
+
+if __name__ == "__main__":
+    main()
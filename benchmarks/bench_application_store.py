@@ -0,0 +1,81 @@
+"""
+Measure write and read throughput of the application store backends.
+
+Usage:
+    python -m benchmarks.bench_application_store --applications 20000 --threads 4
+
+Each backend is filled with realistic applications (DS-160, payment and
+document results) through ``insert``, then read back by random key from
+``--threads`` threads. The SQLite store runs in a temporary directory with
+its default batching; its write figure includes the final flush, so it
+counts committed writes.
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from app.models.visa_application import VisaApplication
+from app.storage.memory import MemoryStore
+from app.storage.sqlite import SQLiteStore
+
+
+def make_application(i: int) -> VisaApplication:
+    application = VisaApplication()
+    application.select_visa_type(random.choice(["B1/B2", "F1", "H1B", "J1"]))
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}", "dob": "1990-01-01",
+                            "nationality": "Indian", "email": f"applicant{i}@example.com"})
+    application.pay_fee({"amount": 185.0, "currency": "USD", "payment_method": "credit_card",
+                         "transaction_id": f"TXN{i:010d}"})
+    application.upload_documents({
+        "uploaded_documents": {"passport": {"filename": "passport.png", "size": 182311}},
+        "validation_results": {"passport": {"validation_passed": True, "validation_message": "found",
+                                            "extracted_text": f"P<IND APPLICANT<<{i} A{i:08d}"}},
+        "extracted_text": {"passport": f"P<IND APPLICANT<<{i} A{i:08d}"},
+    })
+    return application
+
+
+def bench(store, applications, threads: int, reads: int) -> tuple:
+    start = time.perf_counter()
+    keys = [store.insert("app", application) for application in applications]
+    store.flush()
+    write_rate = len(keys) / (time.perf_counter() - start)
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        for _ in range(reads // threads):
+            assert store.get(rng.choice(keys)) is not None
+
+    workers = [threading.Thread(target=reader, args=(seed,)) for seed in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    read_rate = reads / (time.perf_counter() - start)
+    return write_rate, read_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--applications", type=int, default=20000)
+    parser.add_argument("--reads", type=int, default=50000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    random.seed(5)
+    applications = [make_application(i) for i in range(args.applications)]
+    print(f"{args.applications} applications, {args.reads} random reads on {args.threads} threads")
+    print(f"\n{'backend':10s} {'writes/s':>10s} {'reads/s':>10s}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, store in [("memory", MemoryStore()), ("sqlite", SQLiteStore(f"{directory}/applications.db"))]:
+            write_rate, read_rate = bench(store, applications, args.threads, args.reads)
+            store.close()
+            print(f"{name:10s} {write_rate:10.0f} {read_rate:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Soak-test the photo pipeline with and without the image buffer pool.
+
+Usage:
+    python -m benchmarks.bench_buffer_pool --iterations 2000 --sample-every 200
+
+Photos of a few realistic sizes (passport photo to phone camera) are run
+through process_document in a loop, once with pooling and once with a fresh
+allocation per intermediate. Every ``--sample-every`` iterations the resident
+set size is printed, so steady-state growth (fragmentation) shows up as a
+rising column. The summary compares throughput, peak traced numpy memory per
+request, and how many pool buffers were allocated versus reused.
+
+Each mode runs in its own process so one run's heap does not colour the
+other's RSS.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+SIZES = [(413, 531), (600, 800), (1200, 1600), (2448, 3264)]
+
+
+def rss_mb() -> float:
+    """Resident set size of this process from /proc"""
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def make_photos(seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    photos = []
+    for width, height in SIZES:
+        image = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+        photos.append(cv2.imencode(".jpg", image)[1].tobytes())
+    return photos
+
+
+def soak(pooled: bool, iterations: int, sample_every: int, results) -> None:
+    os.environ["BUFFER_POOL_ENABLED"] = "1" if pooled else "0"
+    from app.services import buffers
+    from app.services.documents import process_document
+
+    photos = make_photos()
+    rng = np.random.default_rng(1)
+    samples = []
+    peak_traced = 0
+    start = time.perf_counter()
+    for i in range(1, iterations + 1):
+        content = photos[rng.integers(len(photos))]
+        trace = i % sample_every == 0
+        if trace:
+            tracemalloc.start()
+        process_document(content, "photo")
+        if trace:
+            peak_traced = max(peak_traced, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            samples.append((i, rss_mb()))
+            print(f"  {'pooled' if pooled else 'fresh':6s} {i:7d} rss {samples[-1][1]:8.1f} MB", flush=True)
+    elapsed = time.perf_counter() - start
+
+    pool = buffers.get_buffer_pool()
+    results.put({
+        "mode": "pooled" if pooled else "fresh",
+        "per_second": iterations / elapsed,
+        "peak_traced_mb": peak_traced / (1024 * 1024),
+        "rss_first_mb": samples[0][1] if samples else rss_mb(),
+        "rss_last_mb": samples[-1][1] if samples else rss_mb(),
+        "allocations": pool.allocations,
+        "reuses": pool.reuses,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--sample-every", type=int, default=200)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    summary = []
+    for pooled in (False, True):
+        process = context.Process(target=soak, args=(pooled, args.iterations, args.sample_every, results))
+        process.start()
+        summary.append(results.get())
+        process.join()
+
+    print(f"\n{'mode':8s} {'photos/s':>9s} {'peak MB/req':>12s} {'rss start':>10s} {'rss end':>9s} "
+          f"{'allocs':>7s} {'reuses':>7s}")
+    for row in summary:
+        print(f"{row['mode']:8s} {row['per_second']:9.1f} {row['peak_traced_mb']:12.1f} {row['rss_first_mb']:10.1f} "
+              f"{row['rss_last_mb']:9.1f} {row['allocations']:7d} {row['reuses']:7d}")
+
+
+if __name__ == "__main__":
+    main()
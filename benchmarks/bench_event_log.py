@@ -0,0 +1,90 @@
+"""
+Measure durable event appends with group commit against one fsync per event.
+
+Usage:
+    python -m benchmarks.bench_event_log --threads 16 --events 200 --intervals 0 0.002 0.005
+
+``--threads`` writers each append ``--events`` step events and wait for
+each to be on disk before the next, as request handlers do. The baseline
+writes and fsyncs every event on its own under a lock; the event log is
+run with each ``--intervals`` commit interval. Latency is from ``append``
+until the event is durable.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from app.services import metrics
+from app.storage.events import EventLog, encode_event
+
+
+def make_event(thread: int, i: int) -> dict:
+    return {"time": time.time(), "application_id": f"ds160_{thread * 100000 + i}", "step": "fill_ds160",
+            "state": "ds160_submitted", "data": {"full_name": "Jane Doe", "passport_number": f"A{i:08d}",
+                                                 "email": f"applicant{i}@example.com"}}
+
+
+def run(threads: int, events: int, append) -> tuple:
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def writer(thread: int):
+        own = []
+        for i in range(events):
+            start = time.perf_counter()
+            append(make_event(thread, i))
+            own.append(time.perf_counter() - start)
+        with latencies_lock:
+            latencies.extend(own)
+
+    workers = [threading.Thread(target=writer, args=(thread,)) for thread in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--intervals", type=float, nargs="+", default=[0.0, 0.002, 0.005])
+    args = parser.parse_args()
+
+    print(f"{args.threads} writers x {args.events} events")
+    print(f"\n{'mode':22s} {'events/s':>10s} {'fsyncs':>8s} {'p50':>9s} {'p99':>9s}")
+    with tempfile.TemporaryDirectory() as directory:
+        fd = os.open(os.path.join(directory, "baseline.log"), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        lock = threading.Lock()
+
+        def fsync_each(event):
+            line = encode_event(event)
+            with lock:
+                os.write(fd, line)
+                os.fsync(fd)
+
+        rate, p50, p99 = run(args.threads, args.events, fsync_each)
+        os.close(fd)
+        fsyncs = args.threads * args.events
+        print(f"{'fsync per event':22s} {rate:10.0f} {fsyncs:8d} {p50 * 1e3:7.2f}ms {p99 * 1e3:7.2f}ms")
+
+        for interval in args.intervals:
+            metrics.reset()
+            log = EventLog(os.path.join(directory, f"log-{interval}"), commit_interval=interval)
+            rate, p50, p99 = run(args.threads, args.events, lambda event: log.append(event).result())
+            log.close()
+            fsyncs = metrics.snapshot()["summaries"]["event_log_batch_size"]["count"]
+            label = f"group commit {interval * 1e3:g}ms"
+            print(f"{label:22s} {rate:10.0f} {fsyncs:8d} {p50 * 1e3:7.2f}ms {p99 * 1e3:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
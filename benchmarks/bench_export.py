@@ -0,0 +1,81 @@
+"""
+Measure the streaming export's throughput and peak memory against one big JSON response.
+
+Usage:
+    python -m benchmarks.bench_export --sizes 10000 50000 100000
+
+For each size an SQLite store is filled with DS-160 applications and
+exported to /dev/null through ``export_stream`` (plain and gzip'd). Peak
+memory allocated during the export is measured with tracemalloc in a
+separate pass. The baseline builds the whole dict of ``to_dict`` copies
+and serialises it in one ``json.dumps``, as returning every application
+in one response would.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.models.visa_application import VisaApplication
+from app.storage.export import export_stream
+from app.storage.sqlite import SQLiteStore
+
+
+def make_application(i: int) -> VisaApplication:
+    application = VisaApplication()
+    application.select_visa_type("F1")
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}", "dob": "1990-01-01",
+                            "nationality": "Indian", "email": f"applicant{i}@example.com"})
+    return application
+
+
+def stream(store, compress: bool) -> int:
+    written = 0
+    with open(os.devnull, "wb") as sink:
+        for chunk in export_stream(store, compress=compress):
+            sink.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def whole(store, compress: bool) -> int:
+    body = json.dumps({key: application.to_dict() for key, application in store.iter_sorted()}, default=str)
+    return len(body)
+
+
+def peak_bytes(function, *args) -> int:
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'applications':>12s} {'mode':>12s} {'records/s':>10s} {'output':>9s} {'peak memory':>12s}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteStore(os.path.join(directory, "applications.db"))
+            for offset in range(0, size, 10000):
+                end = min(offset + 10000, size)
+                store.put_many([(f"ds160_{i + 1}", make_application(i)) for i in range(offset, end)])
+            store.flush()
+            for name, function, compress in [("stream", stream, False), ("stream gzip", stream, True),
+                                             ("one dumps", whole, False)]:
+                start = time.perf_counter()
+                written = function(store, compress)
+                rate = size / (time.perf_counter() - start)
+                peak = peak_bytes(function, store, compress)
+                print(f"{size:12d} {name:>12s} {rate:10.0f} {written / 1e6:7.1f}MB {peak / 1e6:10.1f}MB")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compare applicant latency behind a bulk uploader with and without fair queuing.
+
+Usage:
+    python -m benchmarks.bench_fair_scheduler --slots 4 --bulk-clients 32 --seconds 5
+
+A partner tenant keeps ``--bulk-clients`` documents in flight at all times,
+while a few individual applicants submit one document at a time. OCR is
+simulated with a sleep of ``--ms-per-job`` inside a fixed-size limiter, so
+only the queueing policy differs between runs: FIFO on the limiter alone, or
+weighted fair queuing across tenants in front of it.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from app.services.concurrency import AdaptiveLimiter
+from app.services.scheduler import FairScheduler
+
+
+def run(policy: str, args) -> dict:
+    limiter = AdaptiveLimiter("bench", initial_limit=args.slots, min_limit=args.slots, max_limit=args.slots)
+    scheduler = FairScheduler(limiter, weights={}, max_queued=10 ** 6)
+    latencies = {"bulk": [], "applicant": []}
+    stop = time.perf_counter() + args.seconds
+
+    def client(tenant: str):
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            if policy == "fifo":
+                with limiter.slot():
+                    time.sleep(args.ms_per_job / 1000)
+            else:
+                with scheduler.slot(tenant):
+                    time.sleep(args.ms_per_job / 1000)
+            latencies[tenant].append(time.perf_counter() - start)
+            if tenant == "applicant":
+                # Applicants pause between uploads
+                time.sleep(args.ms_per_job / 1000)
+
+    threads = [threading.Thread(target=client, args=("bulk",)) for _ in range(args.bulk_clients)]
+    threads += [threading.Thread(target=client, args=("applicant",)) for _ in range(args.applicants)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--bulk-clients", type=int, default=32)
+    parser.add_argument("--applicants", type=int, default=2)
+    parser.add_argument("--ms-per-job", type=float, default=20.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'policy':6s} {'tenant':10s} {'jobs':>6s} {'p50 ms':>8s} {'p95 ms':>8s} {'mean ms':>8s}")
+    for policy in ("fifo", "wfq"):
+        latencies = run(policy, args)
+        for tenant, values in latencies.items():
+            print(f"{policy:6s} {tenant:10s} {len(values):6d} {percentile(values, 0.5) * 1000:8.1f} "
+                  f"{percentile(values, 0.95) * 1000:8.1f} {statistics.fmean(values) * 1000 if values else 0:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
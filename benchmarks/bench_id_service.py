@@ -0,0 +1,80 @@
+"""
+Measure ID issuing throughput and compare it with random codes plus a uniqueness check.
+
+Usage:
+    python -m benchmarks.bench_id_service --ids 500000 --reserved 100000 --processes 1 2 4
+
+``random`` draws 8-character codes with ``random.choices`` and checks each
+against a set of every code issued so far (what uniqueness would cost the old
+way, in memory that grows with every ID). ``id service`` issues through
+``IdService`` with ``--reserved`` existing codes reserved, in one process and
+then in several processes sharing a block file.
+"""
+import argparse
+import multiprocessing
+import random
+import string
+import tempfile
+import time
+
+from app.services.ids import FileBlockSource, IdService
+
+
+def random_codes(count: int) -> float:
+    seen = set()
+    start = time.perf_counter()
+    while len(seen) < count:
+        code = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        if code not in seen:
+            seen.add(code)
+    return count / (time.perf_counter() - start)
+
+
+def reserved_service(reserved: int, source=None) -> IdService:
+    service = IdService(source=source)
+    for i in range(reserved):
+        service.reserve("ds160", f"R{i:07d}")
+    return service
+
+
+def service_codes(service: IdService, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        service.issue("ds160")
+    return count / (time.perf_counter() - start)
+
+
+def worker(path: str, count: int, reserved: int, results) -> None:
+    service = reserved_service(reserved, FileBlockSource(path))
+    results.put(service_codes(service, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, default=500000, help="IDs per process")
+    parser.add_argument("--reserved", type=int, default=100000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    print(f"{args.ids} IDs per process, {args.reserved} reserved codes")
+    print(f"\n{'generator':28s} {'IDs/s':>10s}")
+    print(f"{'random + set check':28s} {random_codes(args.ids):10.0f}")
+    print(f"{'id service, 1 thread':28s} {service_codes(reserved_service(args.reserved), args.ids):10.0f}")
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for count in args.processes:
+            results = context.Queue()
+            processes = [context.Process(target=worker, args=(f"{directory}/ids.json", args.ids, args.reserved,
+                                                              results))
+                         for _ in range(count)]
+            for process in processes:
+                process.start()
+            rates = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            print(f"{f'id service, {count} processes':28s} {sum(rates):10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measure lookups by passport number through the secondary indexes against a full scan.
+
+Usage:
+    python -m benchmarks.bench_indexes --sizes 10000 100000 1000000 --rebuild 100000
+
+For each size a MemoryStore with indexes attached is filled with DS-160
+applications (every tenth passport is shared by two applications), then
+random passports are looked up through ``lookup`` and, up to
+``--scan-limit`` applications, by scanning the store as the API did before.
+``--rebuild`` applications are also written to a SQLite store and the
+indexes rebuilt from it, as on startup.
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from app.models.visa_application import VisaApplication
+from app.storage.indexes import ApplicationIndexes
+from app.storage.memory import MemoryStore
+from app.storage.sqlite import SQLiteStore
+
+
+def passport(i: int) -> str:
+    """Applications 8 and 9 of every ten share a passport"""
+    return f"A{i - i % 10 // 9:08d}"
+
+
+def make_application(i: int) -> VisaApplication:
+    application = VisaApplication()
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": passport(i),
+                            "dob": "1990-01-01", "nationality": "Indian", "email": f"applicant{i}@example.com"})
+    return application
+
+
+def fill(store, count: int) -> None:
+    batch = 10000
+    for start in range(0, count, batch):
+        store.put_many([(f"ds160_{i + 1}", make_application(i)) for i in range(start, min(start + batch, count))])
+    store.flush()
+
+
+def lookup_time(store, size: int, lookups: int) -> float:
+    rng = random.Random(size)
+    passports = [passport(rng.randrange(size)).lower() for _ in range(lookups)]
+    start = time.perf_counter()
+    for value in passports:
+        assert store.lookup("passport_number", value)
+    return (time.perf_counter() - start) / lookups
+
+
+def scan_time(store, size: int, lookups: int) -> float:
+    rng = random.Random(size)
+    passports = [passport(rng.randrange(size)) for _ in range(lookups)]
+    start = time.perf_counter()
+    for value in passports:
+        assert [key for key in store if store[key].passport_number == value]
+    return (time.perf_counter() - start) / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--scan-limit", type=int, default=100000)
+    parser.add_argument("--rebuild", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'applications':>12s} {'lookup':>10s} {'scan':>10s}")
+    for size in args.sizes:
+        store = MemoryStore()
+        store.attach_indexes(ApplicationIndexes())
+        fill(store, size)
+        lookup = lookup_time(store, size, args.lookups)
+        scan = f"{scan_time(store, size, 5) * 1e3:8.1f}ms" if size <= args.scan_limit else f"{'-':>10s}"
+        print(f"{size:12d} {lookup * 1e6:8.2f}us {scan}")
+        store.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteStore(f"{directory}/applications.db")
+        fill(store, args.rebuild)
+        start = time.perf_counter()
+        indexed = ApplicationIndexes().rebuild(store)
+        elapsed = time.perf_counter() - start
+        store.close()
+    print(f"\nrebuilt indexes for {indexed} applications from SQLite in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Measure false-accept and false-reject rates of passport-number matching.
+
+Usage:
+    python -m benchmarks.bench_passport_match --cases 5000 --slip-rate 0.08
+
+Builds a synthetic corpus of passport OCR text: an MRZ-like page with the
+applicant's number, run through a noise model that swaps characters within
+OCR confusion groups (most slips), substitutes a random character, or drops
+or inserts one. Each page is checked against the number it holds (a reject
+is a false reject) and against a different random number (an accept is a
+false accept).
+
+Exact substring matching is compared with the approximate matcher at a few
+error budgets, with the time per page.
+"""
+import argparse
+import random
+import string
+import time
+
+from app.services.passport_match import OCR_CONFUSION_GROUPS, match_passport_number
+
+ALPHABET = string.ascii_uppercase + string.digits
+
+# Share of slips that stay inside a confusion group; the rest are random
+# substitutions, deletions and insertions in equal parts
+CONFUSION_SHARE = 0.7
+
+PAGE = ("PASSPORT  UNITED STATES OF AMERICA\nSurname {surname}\nGiven names {given}\n"
+        "Passport No. {number}\nDate of birth 12 JAN 1990\n"
+        "P<USA{surname}<<{given}<<<<<<<<<<<<<<<<<<<<\n{number}<4USA9001125M3001012<<<<<<<<<<<<<<02\n")
+
+NAMES = ["SMITH", "GARCIA", "NGUYEN", "OKAFOR", "IVANOVA", "SATO", "KUMAR", "BROWN"]
+
+
+def random_number(rng: random.Random) -> str:
+    return rng.choice(string.ascii_uppercase) + "".join(rng.choice(string.digits) for _ in range(8))
+
+
+def ocr_noise(text: str, rng: random.Random, slip_rate: float) -> str:
+    """Apply OCR-like slips to alphanumeric characters"""
+    groups = {char: group for group in OCR_CONFUSION_GROUPS for char in group}
+    out = []
+    for char in text:
+        if not char.isalnum() or rng.random() >= slip_rate:
+            out.append(char)
+            continue
+        kind = rng.random()
+        if kind < CONFUSION_SHARE and char in groups:
+            out.append(rng.choice([other for other in groups[char] if other != char]))
+        elif kind < CONFUSION_SHARE + (1 - CONFUSION_SHARE) / 3:
+            out.append(rng.choice(ALPHABET))
+        elif kind < CONFUSION_SHARE + 2 * (1 - CONFUSION_SHARE) / 3:
+            continue
+        else:
+            out.append(char + rng.choice(ALPHABET))
+    return "".join(out)
+
+
+def make_corpus(cases: int, slip_rate: float, seed: int = 11):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(cases):
+        number = random_number(rng)
+        page = PAGE.format(number=number, surname=rng.choice(NAMES), given=rng.choice(NAMES))
+        corpus.append((ocr_noise(page, rng, slip_rate), number, random_number(rng)))
+    return corpus
+
+
+def exact_match(text: str, number: str) -> bool:
+    """The previous check: whitespace-insensitive substring"""
+    return "".join(number.upper().split()) in "".join(text.upper().split())
+
+
+def evaluate(corpus, matcher):
+    false_rejects = false_accepts = 0
+    start = time.perf_counter()
+    for text, number, impostor in corpus:
+        false_rejects += not matcher(text, number)
+        false_accepts += bool(matcher(text, impostor))
+    elapsed = time.perf_counter() - start
+    return false_rejects / len(corpus), false_accepts / len(corpus), elapsed / (2 * len(corpus))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--slip-rate", type=float, default=0.08,
+                        help="probability that OCR garbles any one alphanumeric character")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.cases, args.slip_rate)
+    print(f"{args.cases} pages, slip rate {args.slip_rate:.0%} per character, "
+          f"~{sum(len(text) for text, _, _ in corpus) / len(corpus):.0f} characters per page")
+
+    matchers = [("exact substring", exact_match)]
+    for max_edits, max_confusions in [(0, 2), (1, 2), (1, 3), (2, 3)]:
+        matchers.append((
+            f"edits<={max_edits} confusions<={max_confusions}",
+            lambda text, number, e=max_edits, c=max_confusions: match_passport_number(text, number, e, c),
+        ))
+
+    print(f"\n{'matcher':28s} {'FRR':>8s} {'FAR':>8s} {'us/page':>9s}")
+    for name, matcher in matchers:
+        frr, far, seconds = evaluate(corpus, matcher)
+        print(f"{name:28s} {frr:8.2%} {far:8.3%} {seconds * 1e6:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark building and querying the perceptual-hash index.
+
+Usage:
+    python -m benchmarks.bench_photo_hash_index --sizes 10000 100000 1000000
+
+For each size the index is filled with random 64-bit hashes plus a planted
+near-duplicate for every query, then queried at several distances. A linear
+scan over the same hashes is timed for comparison.
+"""
+import argparse
+import random
+import time
+
+from app.services.photo_hashes import HammingIndex
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--distances", type=int, nargs="+", default=[4, 8, 10])
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    for size in args.sizes:
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        queries = [rng.choice(hashes) for _ in range(args.queries)]
+        hashes.extend(flip_bits(query, 3, rng) for query in queries)
+
+        index = HammingIndex()
+        start = time.perf_counter()
+        for i, value in enumerate(hashes):
+            index.add(value, i)
+        build = time.perf_counter() - start
+        print(f"{len(hashes):>9,} hashes  build {build:7.2f} s  ({len(hashes) / build:,.0f} inserts/s)")
+
+        for max_distance in args.distances:
+            start = time.perf_counter()
+            found = sum(len(index.query(query, max_distance)) for query in queries)
+            elapsed = (time.perf_counter() - start) / len(queries)
+            print(f"    query d<={max_distance:<2}  {elapsed * 1000:8.3f} ms/query  ({found / len(queries):.1f} matches/query)")
+
+        scan_queries = queries[:10]
+        start = time.perf_counter()
+        for query in scan_queries:
+            [value for value in hashes if bin(value ^ query).count("1") <= max(args.distances)]
+        scan = (time.perf_counter() - start) / len(scan_queries)
+        print(f"    linear scan     {scan * 1000:8.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
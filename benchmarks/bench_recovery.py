@@ -0,0 +1,104 @@
+"""
+Measure restart time of the snapshot store: full log replay against snapshot plus log suffix.
+
+Usage:
+    python -m benchmarks.bench_recovery --applications 1000000 --suffix 10000
+
+A SnapshotStore is filled with ``--applications`` DS-160 applications
+(written ``--batch`` at a time), closed and reopened, which replays the
+whole log. A snapshot is then taken while a writer thread keeps updating
+applications, to show writes carry on meanwhile; ``--suffix`` more writes
+follow, and the store is reopened again, loading the snapshot and
+replaying only those.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.snapshots import SnapshotStore
+
+
+def make_application(i: int) -> VisaApplication:
+    application = VisaApplication()
+    application.select_visa_type("F1")
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}", "dob": "1990-01-01",
+                            "nationality": "Indian", "email": f"applicant{i}@example.com"})
+    return application
+
+
+def directory_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def reopen(directory: str) -> SnapshotStore:
+    metrics.reset()
+    start = time.perf_counter()
+    store = SnapshotStore(directory, snapshot_interval=10 ** 9, snapshot_log_bytes=2 ** 62)
+    elapsed = time.perf_counter() - start
+    loaded = metrics.get_gauge("application_recovery_snapshot_records")
+    replayed = metrics.get_gauge("application_recovery_replayed_records")
+    rate = (loaded + replayed) / elapsed if elapsed else 0
+    print(f"  recovered {len(store)} applications in {elapsed:.1f}s "
+          f"({loaded:.0f} from snapshot, {replayed:.0f} log records; {rate:.0f} records/s)")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--applications", type=int, default=1000000)
+    parser.add_argument("--suffix", type=int, default=10000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        directory = os.path.join(root, "applications")
+        store = SnapshotStore(directory, snapshot_interval=10 ** 9, snapshot_log_bytes=2 ** 62)
+        start = time.perf_counter()
+        for offset in range(0, args.applications, args.batch):
+            end = min(offset + args.batch, args.applications)
+            store.put_many([(f"ds160_{i + 1}", make_application(i)) for i in range(offset, end)])
+        elapsed = time.perf_counter() - start
+        print(f"wrote {args.applications} applications in {elapsed:.1f}s "
+              f"({args.applications / elapsed:.0f}/s, log {directory_bytes(store.log.directory) / 1e6:.0f}MB)")
+        store.close()
+
+        print("restart, replaying the whole log:")
+        store = reopen(directory)
+
+        stop = threading.Event()
+        latencies = []
+
+        def writer():
+            i = 0
+            while not stop.is_set():
+                key = f"ds160_{i % args.applications + 1}"
+                began = time.perf_counter()
+                store.put(key, make_application(i))
+                latencies.append(time.perf_counter() - began)
+                i += 1
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        start = time.perf_counter()
+        path = store.snapshot()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        thread.join()
+        print(f"snapshot of {len(store)} applications in {elapsed:.1f}s ({os.path.getsize(path) / 1e6:.0f}MB); "
+              f"{len(latencies)} writes meanwhile, slowest {max(latencies) * 1e3:.1f}ms")
+
+        for offset in range(0, args.suffix, args.batch):
+            end = min(offset + args.batch, args.suffix)
+            store.put_many([(f"ds160_{i + 1}", make_application(i)) for i in range(offset, end)])
+        store.close()
+
+        print(f"restart after {args.suffix} more writes, from the snapshot:")
+        reopen(directory).close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark full-page OCR against parallel region OCR on large synthetic pages.
+
+Usage:
+    python -m benchmarks.bench_region_ocr --pages 3 --workers 1 2 4 8
+
+Requires the tesseract binary. Each page is an A4 scan at 300 dpi with a few
+paragraphs of text and lots of whitespace, similar to a bank statement.
+OMP_THREAD_LIMIT defaults to 1, as deployments using region OCR set it.
+"""
+import argparse
+import os
+import random
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.services import ocr
+
+
+def make_statement_page(seed: int, width: int = 2480, height: int = 3508) -> Image.Image:
+    """Draw a mostly-empty statement page with a handful of text blocks"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), color='white')
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 36)
+    except OSError:
+        font = ImageFont.load_default()
+
+    y = 200
+    for block in range(6):
+        x = rng.choice([150, 150, 1300])
+        for line in range(rng.randint(3, 8)):
+            amount = rng.randint(10, 99999) / 100.0
+            draw.text((x, y), f"2024-0{rng.randint(1, 9)}-1{line} Transfer ref {rng.randint(1000, 9999)} {amount:.2f}",
+                      fill='black', font=font)
+            y += 48
+        y += rng.randint(150, 400)
+        if y > height - 400:
+            break
+    return image
+
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, ocr.REGION_OCR_WORKERS])
+    args = parser.parse_args()
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    pages = [make_statement_page(seed) for seed in range(args.pages)]
+
+    full_page = sum(time_call(ocr.ocr_words, page, ocr.REGION_OCR_CONFIG) for page in pages) / len(pages)
+    print(f"full page, single pass: {full_page * 1000:8.1f} ms/page")
+
+    for workers in sorted(set(args.workers)):
+        ocr._region_executor = None
+        ocr.REGION_OCR_WORKERS = workers
+        elapsed = sum(time_call(ocr.extract_text_by_regions, page) for page in pages) / len(pages)
+        print(f"regions, {workers:2d} workers:     {elapsed * 1000:8.1f} ms/page  ({full_page / elapsed:4.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
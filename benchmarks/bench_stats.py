@@ -0,0 +1,77 @@
+"""
+Compare reading incrementally kept stats with counting them from a full scan.
+
+Usage:
+    python -m benchmarks.bench_stats --sizes 10000 100000 1000000
+
+For each size a MemoryStore is filled with applications spread over visa
+types, workflow steps, currencies, payment methods, interview locations and
+document results. Reported: the time ``store.stats()`` takes with
+ApplicationStats attached, the time the same numbers take to count by
+scanning every application (what a reconciliation does), and the cost the
+listener adds to each write.
+"""
+import argparse
+import time
+
+from app.models.visa_application import VisaApplication
+from app.storage.memory import MemoryStore
+from app.storage.stats import ApplicationStats
+
+VISA_TYPES = ["B1/B2", "F1", "H1B", "J1"]
+CURRENCIES = ["USD", "EUR", "INR"]
+METHODS = ["credit_card", "debit_card", "bank_transfer"]
+LOCATIONS = ["Mumbai", "Chennai", "London", "Lagos", "Mexico City"]
+
+
+def make_application(i: int) -> VisaApplication:
+    application = VisaApplication()
+    application.select_visa_type(VISA_TYPES[i % len(VISA_TYPES)])
+    step = i % 4
+    if step >= 1:
+        application.pay_fee({"amount": 185.0, "currency": CURRENCIES[i % 3], "payment_method": METHODS[i % 3 - 1]})
+    if step >= 2:
+        application.schedule_interview({"location": LOCATIONS[i % len(LOCATIONS)], "date": "2030-01-01"})
+    if step >= 3:
+        application.upload_documents({"uploaded_documents": {"passport": {}, "photo": {}}, "validation_results": {
+            "passport": {"validation_passed": True}, "photo": {"validation_passed": i % 7 != 0}}})
+    return application
+
+
+def write_seconds(store: MemoryStore, applications) -> float:
+    start = time.perf_counter()
+    for i, application in enumerate(applications):
+        store.put(f"app_{i + 1}", application)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--reads", type=int, default=1000, help="stats() calls to average over")
+    args = parser.parse_args()
+
+    print(f"{'applications':>12s} {'stats()':>10s} {'full scan':>10s} {'put':>9s} {'put+stats':>10s}")
+    for size in args.sizes:
+        applications = [make_application(i) for i in range(size)]
+        plain = MemoryStore()
+        plain_put = write_seconds(plain, applications) / size
+        store = MemoryStore()
+        store.attach_stats(ApplicationStats())
+        tracked_put = write_seconds(store, applications) / size
+
+        start = time.perf_counter()
+        for _ in range(args.reads):
+            store.stats()
+        read = (time.perf_counter() - start) / args.reads
+
+        start = time.perf_counter()
+        ApplicationStats().rebuild(store)
+        scan = time.perf_counter() - start
+
+        print(f"{size:12d} {read * 1e6:8.1f}µs {scan * 1e3:8.0f}ms {plain_put * 1e6:7.2f}µs "
+              f"{tracked_put * 1e6:8.2f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Measure shared-store throughput as the number of worker processes grows.
+
+Usage:
+    python -m benchmarks.bench_store_server --workers 1 2 4 8 --seconds 3 --store memory
+
+A store server is started on a temporary Unix socket, then each worker
+count in turn runs that many processes, each with ``--threads`` threads
+doing a request mix of one insert, one read-back and ``--reads`` reads of
+random earlier keys, like an application going through its steps.
+Reported are total operations per second and per-request latency.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app.models.visa_application import VisaApplication
+from app.storage.backends import open_store
+from app.storage.remote import RemoteStore
+from app.storage.server import StoreServer
+
+
+def make_application(i: int) -> VisaApplication:
+    application = VisaApplication()
+    application.select_visa_type("F1")
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}", "dob": "1990-01-01",
+                            "nationality": "Indian", "email": f"applicant{i}@example.com"})
+    return application
+
+
+def worker(socket_path: str, threads: int, reads: int, seconds: float, results) -> None:
+    store = RemoteStore(socket_path)
+    totals = {"ops": 0, "latency": 0.0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def loop(seed: int):
+        rng = random.Random(seed)
+        keys = []
+        ops, latency = 0, 0.0
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            key = store.insert("app", make_application(ops))
+            assert store.get(key) is not None
+            keys.append(key)
+            for _ in range(reads):
+                store.get(rng.choice(keys))
+            latency += time.perf_counter() - start
+            ops += 2 + reads
+        with lock:
+            totals["ops"] += ops
+            totals["latency"] += latency
+
+    pool = [threading.Thread(target=loop, args=(os.getpid() * 100 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    store.close()
+    results.put(totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--reads", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--store", default="memory", help="server backing store: memory or sqlite")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        url = "memory" if args.store == "memory" else f"sqlite:{directory}/applications.db"
+        server = StoreServer(f"{directory}/store.sock", open_store(url))
+        server.serve_in_background()
+        print(f"store server backed by {args.store}; {args.threads} threads per worker, "
+              f"1 insert + {1 + args.reads} reads per request")
+        print(f"\n{'workers':>7s} {'ops/s':>10s} {'ms/request':>11s}")
+        try:
+            for count in args.workers:
+                results = context.Queue()
+                processes = [context.Process(target=worker, args=(server.server_address, args.threads, args.reads,
+                                                                   args.seconds, results))
+                             for _ in range(count)]
+                for process in processes:
+                    process.start()
+                totals = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                ops = sum(total["ops"] for total in totals)
+                requests = ops / (2 + args.reads)
+                latency = sum(total["latency"] for total in totals) / requests if requests else 0.0
+                print(f"{count:7d} {ops / args.seconds:10.0f} {latency * 1000:11.2f}")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
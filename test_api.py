@@ -1490,4 +1490,536 @@ class TestInterviewAttendanceAPI:
         
         # Verify values match specification
         assert data["application_id"] == "12345"
-        assert data["interview_status"] == "attended"
\ No newline at end of file
+        assert data["interview_status"] == "attended"
+
+class TestPhotoDuplicatesAPI:
+    """Test suite for the perceptual-hash photo duplicate API"""
+    
+    def create_photo(self, seed: int) -> bytes:
+        """Create a deterministic photo-like image"""
+        from PIL import Image, ImageDraw
+        import io
+        import random
+        
+        rng = random.Random(seed)
+        image = Image.new('RGB', (240, 320), color='white')
+        draw = ImageDraw.Draw(image)
+        for _ in range(12):
+            x0, y0 = rng.randint(0, 240), rng.randint(0, 320)
+            draw.ellipse([x0, y0, x0 + rng.randint(20, 120), y0 + rng.randint(20, 120)],
+                         fill=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+        img_byte_arr = io.BytesIO()
+        image.save(img_byte_arr, format='PNG')
+        return img_byte_arr.getvalue()
+    
+    def test_stored_photo_is_found_as_duplicate(self):
+        """Test a photo stored with an application is found, under its key, when re-uploaded"""
+        import io
+        from app.api.visa import visa_applications
+        from app.models.visa_application import VisaApplication
+        from app.services.photo_hashes import compute_photo_hashes
+        
+        photo_content = self.create_photo(seed=2024)
+        # As /upload_documents stores a photo that passed validation
+        application = VisaApplication()
+        application.upload_documents({
+            "uploaded_documents": {"photo": {"filename": "photo.png"}},
+            "validation_results": {"photo": {"validation_passed": True,
+                                             "perceptual_hash": compute_photo_hashes(photo_content)}}
+        })
+        key = visa_applications.insert("documents", application)
+        
+        response = client.post(
+            "/api/v1/photo_duplicates",
+            files={"photo": ("again.png", io.BytesIO(photo_content), "image/png")},
+            data={"max_distance": "4"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "success"
+        assert data["indexed_photos"] >= 1
+        assert any(match["application_id"] == key and match["distance"] == 0 for match in data["matches"])
+        
+        response = client.get("/api/v1/photo_duplicates", params={"phash": data["phash"], "max_distance": 0})
+        assert response.status_code == 200
+        assert any(match["application_id"] == key for match in response.json()["matches"])
+        
+        visa_applications.delete(key)
+        response = client.get("/api/v1/photo_duplicates", params={"phash": data["phash"], "max_distance": 0})
+        assert all(match["application_id"] != key for match in response.json()["matches"])
+    
+    def test_rejected_upload_is_not_indexed(self):
+        """Test a photo whose upload failed validation is not indexed"""
+        import io
+        
+        photo_content = self.create_photo(seed=2025)
+        response = client.post(
+            "/api/v1/upload_documents",
+            files={"photo": ("photo.png", io.BytesIO(photo_content), "image/png")},
+            data={"application_id": "DUPCHECK2"}
+        )
+        # Mock photos have no real face, so the upload is rejected
+        assert response.status_code == 400
+        
+        response = client.post(
+            "/api/v1/photo_duplicates",
+            files={"photo": ("again.png", io.BytesIO(photo_content), "image/png")},
+            data={"max_distance": "0"}
+        )
+        assert response.status_code == 200
+        assert response.json()["matches"] == []
+    
+    def test_photo_duplicates_invalid_hash(self):
+        """Test an invalid hash returns a 400 error"""
+        response = client.get("/api/v1/photo_duplicates", params={"phash": "not-a-hash"})
+        assert response.status_code == 400
+        assert response.json()["detail"]["status"] == "error"
+    
+    def test_photo_duplicates_invalid_image(self):
+        """Test an undecodable upload returns a 400 error"""
+        import io
+        
+        response = client.post(
+            "/api/v1/photo_duplicates",
+            files={"photo": ("photo.txt", io.BytesIO(b"not an image"), "text/plain")}
+        )
+        assert response.status_code == 400
+
+
+class TestRequestDeadlinesAPI:
+    """Test suite for request deadlines on document uploads"""
+    
+    def test_invalid_request_timeout_header(self):
+        """Test a malformed X-Request-Timeout header returns a 400 error"""
+        import io
+        
+        response = client.post(
+            "/api/v1/upload_documents",
+            files={"photo": ("photo.png", io.BytesIO(b"not an image"), "image/png")},
+            data={"application_id": "DEADLINE1"},
+            headers={"X-Request-Timeout": "soon"}
+        )
+        assert response.status_code == 400
+        assert "X-Request-Timeout" in response.json()["detail"]["message"]
+    
+    def test_metrics_endpoint(self):
+        """Test the metrics endpoint exposes counters, gauges and summaries"""
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data) == {"counters", "gauges", "summaries"}
+
+
+class TestShadowReportAPI:
+    """Test suite for the shadow-mode report endpoint"""
+    
+    def test_shadow_report(self):
+        """Test the shadow report exposes configuration and a summary"""
+        response = client.get("/shadow_report")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["enabled"] in [True, False]
+        assert isinstance(data["summary"], dict)
+
+
+class TestResumableUploadAPI:
+    """Test suite for resumable chunked uploads"""
+    
+    def create_session(self, data, document_type="supporting"):
+        import hashlib
+        
+        response = client.post("/api/v1/uploads", json={
+            "application_id": "CHUNKED1",
+            "document_type": document_type,
+            "filename": "statement.png",
+            "total_size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()
+        })
+        assert response.status_code == 200
+        return response.json()
+    
+    def test_chunked_upload_and_finalize(self):
+        """Test a document uploaded in chunks is validated on finalize"""
+        import hashlib
+        import io
+        from PIL import Image
+        
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 100), color='white').save(buffer, format='PNG')
+        data = buffer.getvalue()
+        session = self.create_session(data)
+        assert session["offset"] == 0
+        
+        upload_id = session["upload_id"]
+        half = len(data) // 2
+        response = client.put(
+            f"/api/v1/uploads/{upload_id}",
+            params={"offset": 0},
+            content=data[:half],
+            headers={"X-Chunk-SHA256": hashlib.sha256(data[:half]).hexdigest()}
+        )
+        assert response.status_code == 200
+        assert response.json()["offset"] == half
+        
+        response = client.get(f"/api/v1/uploads/{upload_id}")
+        assert response.json()["offset"] == half
+        assert response.json()["complete"] is False
+        
+        response = client.put(f"/api/v1/uploads/{upload_id}", params={"offset": half}, content=data[half:])
+        assert response.json()["complete"] is True
+        
+        response = client.post(f"/api/v1/uploads/{upload_id}/finalize")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "success"
+        assert data["state"] == "finalized"
+        assert data["validation_result"]["document_type"] == "supporting"
+        
+        # Stored like an /upload_documents upload
+        application_id = data["stored_application_id"]
+        response = client.get(f"/api/v1/applications/{application_id}")
+        assert response.status_code == 200
+        application = response.json()["application"]
+        assert application["uploaded_documents"]["supporting_doc_1"]["filename"] == "statement.png"
+        assert application["document_validation_results"]["supporting_doc_1"]["document_type"] == "supporting"
+    
+    def test_failed_photo_is_rejected_and_not_stored(self):
+        """Test a photo that fails validation on finalize returns 400 and stores nothing"""
+        import io
+        from PIL import Image
+        from app.api.visa import visa_applications
+        
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 240), color='white').save(buffer, format='PNG')
+        data = buffer.getvalue()
+        session = self.create_session(data, document_type="photo")
+        upload_id = session["upload_id"]
+        client.put(f"/api/v1/uploads/{upload_id}", params={"offset": 0}, content=data)
+        count = len(visa_applications)
+        
+        response = client.post(f"/api/v1/uploads/{upload_id}/finalize")
+        assert response.status_code == 400
+        assert len(visa_applications) == count
+        response = client.get(f"/api/v1/uploads/{upload_id}")
+        assert response.json()["state"] == "finalized"
+        assert response.json()["validation_result"]["validation_passed"] is False
+        assert response.json()["stored_application_id"] is None
+    
+    def test_offset_conflict(self):
+        """Test a chunk at the wrong offset returns 409 with the resume offset"""
+        session = self.create_session(b"0123456789")
+        response = client.put(f"/api/v1/uploads/{session['upload_id']}", params={"offset": 5}, content=b"56789")
+        assert response.status_code == 409
+        assert "resume from offset 0" in response.json()["detail"]["message"]
+    
+    def test_chunk_checksum_mismatch(self):
+        """Test a chunk with a bad checksum returns 400"""
+        session = self.create_session(b"0123456789")
+        response = client.put(
+            f"/api/v1/uploads/{session['upload_id']}",
+            params={"offset": 0},
+            content=b"0123456789",
+            headers={"X-Chunk-SHA256": "0" * 64}
+        )
+        assert response.status_code == 400
+    
+    def test_finalize_incomplete_upload(self):
+        """Test finalizing before all bytes arrive returns 409"""
+        session = self.create_session(b"0123456789")
+        response = client.post(f"/api/v1/uploads/{session['upload_id']}/finalize")
+        assert response.status_code == 409
+    
+    def test_unknown_upload(self):
+        """Test unknown upload sessions return 404"""
+        response = client.get("/api/v1/uploads/missing")
+        assert response.status_code == 404
+    
+    def test_invalid_session_request(self):
+        """Test an invalid digest returns 400"""
+        response = client.post("/api/v1/uploads", json={
+            "application_id": "CHUNKED1",
+            "document_type": "photo",
+            "filename": "photo.png",
+            "total_size": 10,
+            "sha256": "abc"
+        })
+        assert response.status_code == 400
+
+
+class TestDocumentDerivativesAPI:
+    """Test suite for serving thumbnails and previews of uploaded documents"""
+    
+    def upload(self, data):
+        import hashlib
+        
+        response = client.post("/api/v1/uploads", json={
+            "application_id": "PREVIEW1",
+            "document_type": "supporting",
+            "filename": "scan.png",
+            "total_size": len(data),
+            "sha256": hashlib.sha256(data).hexdigest()
+        })
+        upload_id = response.json()["upload_id"]
+        client.put(f"/api/v1/uploads/{upload_id}", params={"offset": 0}, content=data)
+        response = client.post(f"/api/v1/uploads/{upload_id}/finalize")
+        assert response.status_code == 200
+        return hashlib.sha256(data).hexdigest()
+    
+    def test_thumbnail_with_etag(self):
+        """Test a thumbnail is served with a long cache lifetime and revalidates with 304"""
+        import io
+        from PIL import Image
+        
+        buffer = io.BytesIO()
+        Image.new('RGB', (900, 600), color='blue').save(buffer, format='PNG')
+        sha256 = self.upload(buffer.getvalue())
+        
+        response = client.get(f"/api/v1/documents/{sha256}/thumbnail")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        assert "immutable" in response.headers["cache-control"]
+        assert max(Image.open(io.BytesIO(response.content)).size) == 256
+        
+        etag = response.headers["etag"]
+        response = client.get(f"/api/v1/documents/{sha256}/thumbnail", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+    
+    def test_unknown_document(self):
+        """Test an unknown document returns 404"""
+        response = client.get(f"/api/v1/documents/{'0' * 64}/preview")
+        assert response.status_code == 404
+    
+    def test_invalid_variant(self):
+        """Test an unknown variant returns 400"""
+        response = client.get(f"/api/v1/documents/{'0' * 64}/poster")
+        assert response.status_code == 400
+
+
+class TestBackfillAPI:
+    """Test suite for the document backfill admin endpoints"""
+    
+    def test_backfill_lifecycle(self, tmp_path, monkeypatch):
+        """Test a backfill can be started, inspected and stopped"""
+        import app.services.backfill as backfill
+        
+        monkeypatch.setattr(backfill, "BACKFILL_DIR", str(tmp_path))
+        
+        response = client.post("/api/v1/admin/backfill", json={"dry_run": True, "restart": True})
+        assert response.status_code == 200
+        assert response.json()["dry_run"] is True
+        
+        response = client.get("/api/v1/admin/backfill")
+        assert response.status_code == 200
+        assert "progress" in response.json()
+        
+        response = client.post("/api/v1/admin/backfill/stop")
+        assert response.status_code == 200
+        assert response.json()["running"] is False
+        
+        response = client.get("/api/v1/admin/backfill/report")
+        assert response.status_code == 200
+        assert isinstance(response.json()["changes"], list)
+    
+    def test_invalid_backfill_config(self):
+        """Test an invalid CPU budget returns 400"""
+        response = client.post("/api/v1/admin/backfill", json={"cpu_budget": 2})
+        assert response.status_code == 400
+
+
+class TestTenantFairnessAPI:
+    """Test suite for per-tenant OCR queueing on document uploads"""
+    
+    def test_invalid_tenant_header(self):
+        """Test a malformed X-Tenant-ID header returns a 400 error"""
+        import io
+        
+        response = client.post(
+            "/api/v1/upload_documents",
+            files={"passport": ("passport.png", io.BytesIO(b"not an image"), "image/png")},
+            data={"application_id": "TENANT1"},
+            headers={"X-Tenant-ID": "not a tenant"}
+        )
+        assert response.status_code == 400
+        assert "X-Tenant-ID" in response.json()["detail"]["message"]
+    
+    def test_full_tenant_queue_returns_429(self, monkeypatch):
+        """Test a tenant whose OCR queue is full is told to retry later"""
+        import io
+        from PIL import Image
+        from app.services.scheduler import TENANT_WEIGHTS, ocr_scheduler
+        
+        monkeypatch.setitem(TENANT_WEIGHTS, "flood", 1.0)
+        monkeypatch.setitem(ocr_scheduler.queue_limits, "flood", 0)
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 100), color='white').save(buffer, format='PNG')
+        
+        response = client.post(
+            "/api/v1/upload_documents",
+            files={"passport": ("passport.png", io.BytesIO(buffer.getvalue()), "image/png")},
+            data={"application_id": "TENANT2"},
+            headers={"X-Tenant-ID": "flood"}
+        )
+        assert response.status_code == 429
+        assert response.headers["Retry-After"]
+        assert "flood" in response.json()["detail"]["message"]
+
+
+class TestApplicationStoreAPI:
+    """Test suite for reading stored applications"""
+    
+    def test_get_stored_application(self):
+        """Test an application created by a step can be read back from the store"""
+        from app.api.visa import visa_applications
+        
+        response = client.post("/api/v1/select_visa_type", json={"visa_type": "H1B"})
+        assert response.status_code == 200
+        application_id = list(visa_applications)[-1]
+        
+        response = client.get(f"/api/v1/applications/{application_id}")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["application_id"] == application_id
+        assert data["application"]["visa_type"] == "H1B"
+    
+    def test_missing_application(self):
+        """Test an unknown application id returns 404"""
+        response = client.get("/api/v1/applications/app_999999")
+        assert response.status_code == 404
+
+class TestApplicationLookupAPI:
+    """Test suite for looking applications up by indexed fields"""
+    
+    def test_lookup_by_passport_email_and_confirmation_id(self):
+        """Test an application is found by each indexed field, whatever the case"""
+        form_data = {
+            "full_name": "Lookup Tester",
+            "passport_number": "LK9081726",
+            "dob": "1988-02-03",
+            "nationality": "India",
+            "email": "lookup.tester@example.com"
+        }
+        response = client.post("/api/v1/fill_ds160", json=form_data)
+        assert response.status_code == 200
+        confirmation_id = response.json()["confirmation_id"]
+        
+        for field, value in [("passport_number", "lk9081726"), ("email", "Lookup.Tester@Example.com"),
+                             ("ds160_confirmation_id", confirmation_id.lower())]:
+            response = client.get(f"/api/v1/applications/lookup/{field}/{value}")
+            assert response.status_code == 200
+            data = response.json()
+            assert data["count"] == 1
+            assert data["applications"][0]["application"]["ds160_confirmation_id"] == confirmation_id
+    
+    def test_lookup_unknown_field(self):
+        """Test looking up by a field that is not indexed returns 400"""
+        response = client.get("/api/v1/applications/lookup/full_name/Jane")
+        assert response.status_code == 400
+    
+    def test_lookup_no_match(self):
+        """Test a value no application has returns 404"""
+        response = client.get("/api/v1/applications/lookup/passport_number/ZZ0000000")
+        assert response.status_code == 404
+
+class TestEventFeedAPI:
+    """Test suite for the change feed of workflow step events"""
+    
+    def test_steps_appear_in_feed(self):
+        """Test completed steps are returned in order from a cursor"""
+        from app.api.visa import event_log
+        
+        cursor = event_log.end()
+        assert client.post("/api/v1/select_visa_type", json={"visa_type": "J1"}).status_code == 200
+        response = client.post("/api/v1/attend_interview", json={"application_id": "APP123", "status": "attended"})
+        assert response.status_code == 200
+        
+        response = client.get(f"/api/v1/events?cursor={cursor}")
+        assert response.status_code == 200
+        data = response.json()
+        assert [event["step"] for event in data["events"]] == ["select_visa_type", "attend_interview"]
+        assert data["events"][0]["data"] == {"visa_type": "J1"}
+        assert data["events"][1]["state"] == "interview_attended"
+        
+        response = client.get(f"/api/v1/events?cursor={data['next_cursor']}")
+        assert response.json()["events"] == []
+        assert response.json()["next_cursor"] == data["next_cursor"]
+    
+    def test_feed_limit(self):
+        """Test the feed returns at most limit events and a cursor to continue from"""
+        from app.api.visa import event_log
+        
+        cursor = event_log.end()
+        for visa_type in ["F1", "H1B"]:
+            assert client.post("/api/v1/select_visa_type", json={"visa_type": visa_type}).status_code == 200
+        
+        first = client.get(f"/api/v1/events?cursor={cursor}&limit=1").json()
+        second = client.get(f"/api/v1/events?cursor={first['next_cursor']}&limit=1").json()
+        assert first["events"][0]["data"]["visa_type"] == "F1"
+        assert second["events"][0]["data"]["visa_type"] == "H1B"
+    
+    def test_bad_cursor(self):
+        """Test a cursor past the end of the log returns 400"""
+        response = client.get("/api/v1/events?cursor=999999999999")
+        assert response.status_code == 400
+
+class TestApplicationExportAPI:
+    """Test suite for the streaming application export"""
+    
+    def test_export_streams_ndjson_with_cursors(self):
+        """Test the export is NDJSON in key order and resumes from a cursor"""
+        import json
+        
+        for _ in range(3):
+            assert client.post("/api/v1/select_visa_type", json={"visa_type": "B1/B2"}).status_code == 200
+        response = client.get("/api/v1/applications/export?limit=2")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        first = [json.loads(line) for line in response.text.splitlines()]
+        assert len(first) == 2
+        assert first[0]["application_id"] < first[1]["application_id"]
+        
+        response = client.get(f"/api/v1/applications/export?cursor={first[-1]['cursor']}&limit=1")
+        second = [json.loads(line) for line in response.text.splitlines()]
+        assert second[0]["application_id"] > first[1]["application_id"]
+    
+    def test_export_filters_and_gzip(self):
+        """Test filters apply server-side and gzip output is marked as such"""
+        import json
+        
+        assert client.post("/api/v1/select_visa_type", json={"visa_type": "J1"}).status_code == 200
+        response = client.get("/api/v1/applications/export?visa_type=J1&state=draft&gzip=true")
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        exported = [json.loads(line) for line in response.text.splitlines()]
+        assert exported
+        assert all(record["application"]["visa_type"] == "J1" for record in exported)
+    
+    def test_export_invalid_filter(self):
+        """Test unknown states and bad dates return 400 before anything streams"""
+        assert client.get("/api/v1/applications/export?state=approved").status_code == 400
+        assert client.get("/api/v1/applications/export?created_from=yesterday").status_code == 400
+        assert client.get("/api/v1/applications/export?limit=0").status_code == 400
+
+class TestApplicationStatsAPI:
+    """Test suite for the incrementally kept application statistics"""
+    
+    def test_stats_follow_each_step(self):
+        """Test each step is reflected in the stats without a scan"""
+        before = client.get("/api/v1/stats").json()["stats"]
+        response = client.post("/api/v1/select_visa_type", json={"visa_type": "H1B"})
+        assert response.status_code == 200
+        
+        response = client.get("/api/v1/stats")
+        assert response.status_code == 200
+        stats = response.json()["stats"]
+        assert stats["applications"] == before["applications"] + 1
+        assert stats["by_visa_type"]["H1B"] == before["by_visa_type"].get("H1B", 0) + 1
+        assert stats["by_workflow_state"]["draft"] == before["by_workflow_state"].get("draft", 0) + 1
+        for section in ("payments", "interviews", "documents"):
+            assert section in stats
+    
+    def test_stats_match_full_scan(self):
+        """Test the kept stats agree with a recount of every application"""
+        from app.api.visa import visa_applications
+        
+        client.post("/api/v1/select_visa_type", json={"visa_type": "F1"})
+        assert visa_applications.statistics.reconcile(visa_applications) == []
@@ -0,0 +1,219 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.models.visa_application import VisaApplication
+from app.services import backfill
+from app.services.backfill import BackfillJob, in_window, natural_key
+from app.services.blobs import BlobStore
+from app.services.concurrency import ActivityTracker
+from app.storage.memory import MemoryStore
+from app.storage.sqlite import SQLiteStore
+from app.storage.tiered import TieredStore
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(backfill, "IDLE_POLL_INTERVAL", 0.01)
+
+
+def make_application(blobs, documents):
+    """An application whose documents were uploaded with the given (text, passed) results"""
+    application = VisaApplication()
+    uploaded, results, texts = {}, {}, {}
+    for key, (content, text, passed) in documents.items():
+        uploaded[key] = {"filename": f"{key}.png", "content_sha256": blobs.put(content)}
+        results[key] = {"document_type": "supporting" if key.startswith("supporting") else key,
+                        "extracted_text": text, "validation_passed": passed, "validation_message": "old"}
+        texts[key] = text
+    application.upload_documents({"uploaded_documents": uploaded, "validation_results": results,
+                                  "extracted_text": texts})
+    return application
+
+
+def stored(applications):
+    store = MemoryStore()
+    store.put_many(applications.items())
+    return store
+
+
+def fake_processor(outputs):
+    """process_document stand-in returning canned results by file content"""
+    calls = []
+
+    def process(file_content, document_type, expected_passport_number=None):
+        calls.append((file_content, document_type))
+        text, passed = outputs[file_content]
+        return {"document_type": document_type, "extracted_text": text, "validation_passed": passed,
+                "validation_message": "new"}
+
+    process.calls = calls
+    return process
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    return BlobStore(str(tmp_path / "store"))
+
+
+def make_job(tmp_path, applications, processor, **kwargs):
+    options = {"blobs": BlobStore(str(tmp_path / "store")), "rate": 1000.0, "cpu_budget": 1.0, "window": None,
+               "quiet_seconds": 0.0, "live_traffic": ActivityTracker(), "processor": processor}
+    options.update(kwargs)
+    return BackfillJob(applications, directory=str(tmp_path / "backfill"), **options)
+
+
+class TestBackfillHelpers:
+    """Test suite for backfill scheduling helpers"""
+
+    def test_in_window(self):
+        """Test off-peak windows, including ones that wrap past midnight"""
+        assert in_window(3, (1, 6))
+        assert not in_window(6, (1, 6))
+        assert in_window(23, (22, 4)) and in_window(2, (22, 4))
+        assert not in_window(12, (22, 4))
+        assert in_window(12, None)
+
+    def test_natural_key(self):
+        """Test numbered keys sort numerically"""
+        assert sorted(["documents_10", "documents_9"], key=natural_key) == ["documents_9", "documents_10"]
+
+    def test_invalid_config(self, tmp_path):
+        """Test invalid rates, budgets and windows are rejected"""
+        with pytest.raises(ValueError):
+            make_job(tmp_path, {}, None, rate=0)
+        with pytest.raises(ValueError):
+            make_job(tmp_path, {}, None, cpu_budget=1.5)
+        with pytest.raises(ValueError):
+            make_job(tmp_path, {}, None, window=(1, 25))
+
+
+class TestBackfillJob:
+    """Test suite for re-validating stored documents"""
+
+    def test_reprocesses_and_reports_changes(self, tmp_path, blobs):
+        """Test stale results are replaced and only changed documents are reported"""
+        applications = stored({
+            "documents_1": make_application(blobs, {
+                "passport": (b"p1", "P<USA SMITH", False),
+                "supporting_doc_1": (b"s1", "BANK STATEMENT", True),
+            }),
+        })
+        processor = fake_processor({b"p1": ("P<USA SMITH A1234567", True), b"s1": ("BANK STATEMENT", True)})
+        job = make_job(tmp_path, applications, processor)
+
+        progress = job.run()
+
+        assert progress["processed"] == 2
+        assert progress["changed"] == 1
+        application = applications["documents_1"]
+        assert application.document_validation_results["passport"]["validation_passed"] is True
+        assert application.extracted_text["passport"] == "P<USA SMITH A1234567"
+
+        report = job.read_report()
+        assert len(report) == 1
+        assert report[0]["document_key"] == "passport"
+        assert report[0]["verdict_changed"] is True
+        assert report[0]["before"]["validation_passed"] is False
+        assert job.state == "finished"
+
+    def test_dry_run_leaves_applications_untouched(self, tmp_path, blobs):
+        """Test a dry run only reports"""
+        applications = stored({"documents_1": make_application(blobs, {"photo": (b"ph", "", False)})})
+        job = make_job(tmp_path, applications, fake_processor({b"ph": ("", True)}), dry_run=True)
+        job.run()
+
+        assert applications["documents_1"].document_validation_results["photo"]["validation_passed"] is False
+        assert job.read_report()[0]["applied"] is False
+
+    def test_resumes_from_checkpoint(self, tmp_path, blobs):
+        """Test a new job continues after the last checkpointed document"""
+        applications = stored({
+            f"documents_{i}": make_application(blobs, {"photo": (f"photo{i}".encode(), "", True)})
+            for i in range(1, 13)
+        })
+        outputs = {f"photo{i}".encode(): ("", True) for i in range(1, 13)}
+
+        first = make_job(tmp_path, applications, fake_processor(outputs))
+        first.progress["cursor"] = ["documents_9", "photo"]
+        first.save_checkpoint()
+
+        processor = fake_processor(outputs)
+        second = make_job(tmp_path, applications, processor)
+        second.run()
+        assert [content for content, _ in processor.calls] == [b"photo10", b"photo11", b"photo12"]
+
+    def test_deleted_application_is_not_written_back(self, tmp_path, blobs):
+        """Test an application deleted while its document is re-processed stays deleted"""
+        applications = stored({"documents_1": make_application(blobs, {"photo": (b"x", "", False)})})
+        processor = fake_processor({b"x": ("", True)})
+
+        def expire_meanwhile(*args):
+            del applications["documents_1"]
+            return processor(*args)
+
+        job = make_job(tmp_path, applications, expire_meanwhile)
+        assert job.run()["processed"] == 1
+        assert "documents_1" not in applications
+        assert job.read_report() == []
+
+    def test_reads_do_not_fill_memory_tier(self, tmp_path, blobs):
+        """Test a pass over a tiered store leaves its memory tier to live applications"""
+        applications = TieredStore(SQLiteStore(str(tmp_path / "applications.db")), memory_budget=1 << 20)
+        applications.put_many([(f"documents_{i}", make_application(blobs, {"photo": (b"x", "", True)}))
+                               for i in range(1, 4)])
+        applications._hot.clear()
+        job = make_job(tmp_path, applications, fake_processor({b"x": ("", True)}), dry_run=True)
+        assert job.run()["processed"] == 3
+        assert len(applications._hot) == 0
+        applications.close()
+
+    def test_missing_original_is_counted(self, tmp_path, blobs):
+        """Test documents uploaded before originals were stored are skipped"""
+        application = make_application(blobs, {"photo": (b"x", "", True)})
+        application.uploaded_documents["photo"].pop("content_sha256")
+        job = make_job(tmp_path, stored({"documents_1": application}), fake_processor({}))
+        assert job.run()["missing_original"] == 1
+
+    def test_processing_errors_are_reported(self, tmp_path, blobs):
+        """Test a failing document is recorded and the job moves on"""
+        applications = stored({"documents_1": make_application(blobs, {"photo": (b"x", "", True)})})
+
+        def broken(*args):
+            raise RuntimeError("tesseract missing")
+
+        job = make_job(tmp_path, applications, broken)
+        assert job.run()["errors"] == 1
+        assert job.read_report()[0]["error"] == "RuntimeError: tesseract missing"
+
+    def test_waits_outside_window(self, tmp_path, blobs):
+        """Test no document is processed outside the off-peak window"""
+        applications = stored({"documents_1": make_application(blobs, {"photo": (b"x", "", True)})})
+        processor = fake_processor({b"x": ("", True)})
+        job = make_job(tmp_path, applications, processor, window=(1, 6),
+                       now=lambda: datetime(2024, 1, 1, 12, 0))
+        job.start()
+        threading.Event().wait(0.1)
+        assert job.state == "waiting_for_window"
+        job.stop(timeout=2)
+
+        assert processor.calls == []
+        assert job.state == "stopped"
+
+    def test_yields_to_live_traffic(self, tmp_path, blobs):
+        """Test the job waits while live uploads are being validated"""
+        applications = stored({"documents_1": make_application(blobs, {"photo": (b"x", "", True)})})
+        processor = fake_processor({b"x": ("", True)})
+        live = ActivityTracker()
+        job = make_job(tmp_path, applications, processor, live_traffic=live)
+
+        with live.track():
+            job.start()
+            threading.Event().wait(0.1)
+            assert job.state == "yielding_to_live_traffic"
+            assert processor.calls == []
+        job._thread.join(2)
+
+        assert len(processor.calls) == 1
+        assert job.state == "finished"
@@ -0,0 +1,117 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from app.cli import batch_process
+
+
+def write_image(path, color=(120, 80, 40)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', (120, 120), color=color).save(path)
+
+
+def read_lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestBatchInputs:
+    """Test suite for batch task discovery"""
+
+    def test_directory_walk(self, tmp_path):
+        """Test images are found recursively in a stable order and other files ignored"""
+        write_image(tmp_path / "b.png")
+        write_image(tmp_path / "a" / "c.jpg")
+        (tmp_path / "notes.txt").write_text("skip me")
+
+        tasks = list(batch_process.iter_directory(str(tmp_path), "photo"))
+        assert [task["path"] for task in tasks] == [str(tmp_path / "b.png"), str(tmp_path / "a" / "c.jpg")]
+        assert all(task["document_type"] == "photo" for task in tasks)
+
+    def test_jsonl_manifest(self, tmp_path):
+        """Test JSON-lines manifests resolve paths relative to the manifest"""
+        manifest = tmp_path / "manifest.jsonl"
+        manifest.write_text(
+            json.dumps({"id": "doc-1", "path": "scans/p.png", "document_type": "passport",
+                        "expected_passport_number": "A1234567"}) + "\n"
+            + json.dumps({"path": "scans/q.png"}) + "\n"
+        )
+        tasks = list(batch_process.iter_manifest(str(manifest), "supporting"))
+
+        assert tasks[0]["id"] == "doc-1"
+        assert tasks[0]["path"] == str(tmp_path / "scans" / "p.png")
+        assert tasks[0]["expected_passport_number"] == "A1234567"
+        assert tasks[1]["document_type"] == "supporting"
+
+    def test_csv_manifest(self, tmp_path):
+        """Test CSV manifests with a header row"""
+        manifest = tmp_path / "manifest.csv"
+        manifest.write_text("path,document_type\nphoto.png,photo\n")
+        tasks = list(batch_process.iter_manifest(str(manifest), "supporting"))
+        assert tasks == [{"id": "photo.png", "path": str(tmp_path / "photo.png"), "document_type": "photo",
+                          "expected_passport_number": None}]
+
+    def test_manifest_rejects_unknown_type(self, tmp_path):
+        """Test manifest rows with an unknown document type are rejected"""
+        manifest = tmp_path / "manifest.jsonl"
+        manifest.write_text(json.dumps({"path": "x.png", "document_type": "visa"}) + "\n")
+        with pytest.raises(ValueError):
+            list(batch_process.iter_manifest(str(manifest), "supporting"))
+
+
+class TestBatchRun:
+    """Test suite for running, checkpointing and resuming a batch"""
+
+    def test_run_and_resume(self, tmp_path):
+        """Test results stream to JSONL and a second run only processes new files"""
+        for i in range(3):
+            write_image(tmp_path / "scans" / f"photo{i}.png", color=(i * 60, 10, 10))
+        output = tmp_path / "results.jsonl"
+        log = io.StringIO()
+
+        report = batch_process.run_batch(
+            batch_process.iter_directory(str(tmp_path / "scans"), "photo"), str(output), workers=0,
+            max_files=2, log=log
+        )
+        assert report.processed == 2
+        assert len(read_lines(output)) == 2
+        assert "face_detection" in log.getvalue()
+
+        report = batch_process.run_batch(
+            batch_process.iter_directory(str(tmp_path / "scans"), "photo"), str(output), workers=0, log=log
+        )
+        assert report.processed == 1
+        records = read_lines(output)
+        assert len({record["id"] for record in records}) == 3
+        assert all("stage_timings_ms" in record["result"] for record in records)
+        assert "skipped (already done) 2" in log.getvalue()
+
+    def test_truncated_checkpoint_line(self, tmp_path):
+        """Test a line cut short by a crash is dropped before resuming"""
+        output = tmp_path / "results.jsonl"
+        output.write_text(json.dumps({"id": "done"}) + "\n" + '{"id": "half')
+
+        assert batch_process.load_checkpoint(str(output)) == {"done"}
+        assert output.read_text() == json.dumps({"id": "done"}) + "\n"
+
+    def test_missing_file_is_an_error_record(self, tmp_path):
+        """Test unreadable files are reported without stopping the batch"""
+        record = batch_process.process_task(
+            {"id": "gone", "path": str(tmp_path / "gone.png"), "document_type": "photo"}
+        )
+        assert record["error"].startswith("FileNotFoundError")
+
+    def test_process_pool(self, tmp_path):
+        """Test files are processed across worker processes"""
+        for i in range(4):
+            write_image(tmp_path / "scans" / f"photo{i}.png")
+        output = tmp_path / "results.jsonl"
+
+        report = batch_process.run_batch(
+            batch_process.iter_directory(str(tmp_path / "scans"), "photo"), str(output), workers=2,
+            log=io.StringIO()
+        )
+        assert report.processed == 4
+        assert report.errors == 0
+        assert len(read_lines(output)) == 4
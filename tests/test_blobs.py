@@ -0,0 +1,136 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from app.models.visa_application import VisaApplication
+from app.services.blobs import BlobStore, DerivativeCache, collect_originals, content_sha256, render_derivative
+from app.storage.memory import MemoryStore
+
+
+def make_image(width=1600, height=1200, color=(200, 30, 30), format="JPEG"):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color=color).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def blobs(tmp_path):
+    return BlobStore(str(tmp_path))
+
+
+class TestBlobStore:
+    """Test suite for the content-addressed originals store"""
+
+    def test_put_and_get(self, blobs):
+        """Test originals are stored under their sha256 and deduplicated"""
+        data = make_image()
+        sha256 = blobs.put(data)
+
+        assert sha256 == content_sha256(data)
+        assert blobs.get(sha256) == data
+        assert blobs.put(data) == sha256
+        assert blobs.exists(sha256)
+
+    def test_missing_and_invalid(self, blobs):
+        """Test unknown ids raise LookupError and malformed ids ValueError"""
+        with pytest.raises(LookupError):
+            blobs.get("0" * 64)
+        with pytest.raises(ValueError):
+            blobs.get("../etc/passwd")
+
+
+class TestDerivativeCache:
+    """Test suite for lazily generated thumbnails and previews"""
+
+    def test_render_derivative(self):
+        """Test derivatives are JPEGs bounded by the variant size"""
+        thumbnail = Image.open(io.BytesIO(render_derivative(make_image(format="PNG"), "thumbnail")))
+        assert thumbnail.format == "JPEG"
+        assert max(thumbnail.size) == 256
+        assert thumbnail.size == (256, 192)
+
+    def test_generated_once(self, blobs, tmp_path, monkeypatch):
+        """Test a derivative is rendered on first request and then served from disk"""
+        cache = DerivativeCache(blobs, str(tmp_path))
+        sha256 = blobs.put(make_image())
+
+        path, etag = cache.get(sha256, "preview")
+        assert os.path.exists(path)
+        assert sha256 in etag
+
+        monkeypatch.setattr("app.services.blobs.render_derivative", lambda *args: pytest.fail("re-rendered"))
+        assert cache.get(sha256, "preview") == (path, etag)
+
+    def test_lru_eviction(self, blobs, tmp_path):
+        """Test the least recently served derivatives are evicted over the size limit"""
+        shas = [blobs.put(make_image(color=(i * 40, 0, 0))) for i in range(3)]
+        probe = DerivativeCache(blobs, str(tmp_path / "probe"))
+        size = os.path.getsize(probe.get(shas[0], "thumbnail")[0])
+
+        cache = DerivativeCache(blobs, str(tmp_path), max_bytes=int(size * 2.5))
+        first, _ = cache.get(shas[0], "thumbnail")
+        second, _ = cache.get(shas[1], "thumbnail")
+        cache.get(shas[0], "thumbnail")
+        cache.get(shas[2], "thumbnail")
+
+        assert os.path.exists(first)
+        assert not os.path.exists(second)
+        assert cache.total_bytes <= cache.max_bytes
+
+    def test_reloads_existing_derivatives(self, blobs, tmp_path):
+        """Test the cache picks up derivatives written by a previous process"""
+        sha256 = blobs.put(make_image())
+        DerivativeCache(blobs, str(tmp_path)).get(sha256, "thumbnail")
+
+        reloaded = DerivativeCache(blobs, str(tmp_path))
+        assert reloaded.total_bytes > 0
+
+    def test_unknown_variant_and_document(self, blobs, tmp_path):
+        """Test invalid variants and unknown documents are rejected"""
+        cache = DerivativeCache(blobs, str(tmp_path))
+        sha256 = blobs.put(make_image())
+        with pytest.raises(ValueError):
+            cache.get(sha256, "poster")
+        with pytest.raises(LookupError):
+            cache.get("f" * 64, "thumbnail")
+
+    def test_non_image_document(self, blobs, tmp_path):
+        """Test a stored file that is not an image cannot be rendered"""
+        cache = DerivativeCache(blobs, str(tmp_path))
+        with pytest.raises(ValueError):
+            cache.get(blobs.put(b"%PDF-1.4 not really"), "thumbnail")
+
+
+class TestOriginalRetention:
+    """Test suite for deleting originals no stored application refers to"""
+
+    def make_store(self, *shas):
+        store = MemoryStore()
+        for sha256 in shas:
+            application = VisaApplication()
+            application.upload_documents({"uploaded_documents": {"photo": {"content_sha256": sha256}}})
+            store.insert("documents", application)
+        return store
+
+    def test_unreferenced_originals_are_deleted(self, blobs, tmp_path):
+        """Test originals without an application go, with their derivatives, and referenced ones stay"""
+        kept = blobs.put(make_image(color=(1, 0, 0)))
+        orphan = blobs.put(make_image(color=(2, 0, 0)))
+        cache = DerivativeCache(blobs, str(tmp_path))
+        thumbnail, _ = cache.get(orphan, "thumbnail")
+
+        assert collect_originals(self.make_store(kept), blobs, cache, grace=0) == 1
+        assert blobs.exists(kept)
+        assert not blobs.exists(orphan)
+        assert not os.path.exists(thumbnail)
+        assert cache.total_bytes == 0
+
+    def test_recent_originals_are_kept(self, blobs):
+        """Test an original younger than the grace period survives without an application"""
+        sha256 = blobs.put(b"just uploaded")
+        assert collect_originals(self.make_store(), blobs, grace=3600) == 0
+        assert blobs.exists(sha256)
+        assert collect_originals(self.make_store(), blobs, grace=3600, now=time.time() + 7200) == 1
@@ -0,0 +1,135 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import buffers, documents
+from app.services.buffers import BufferLease, BufferPool, bucket_size
+from app.services.deadlines import DeadlineExceeded
+
+
+def photo_bytes(width=320, height=240, seed=0):
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+class TestBufferPool:
+    """Test suite for the reusable image buffer pool"""
+
+    def test_bucket_size(self):
+        """Test requests round up to a power of two with a floor"""
+        assert bucket_size(1) == buffers.MIN_BUCKET_BYTES
+        assert bucket_size(640 * 480) == 512 * 1024
+        assert bucket_size(512 * 1024) == 512 * 1024
+
+    def test_released_buffers_are_reused(self):
+        """Test a similar-sized request gets the same backing memory back"""
+        pool = BufferPool()
+        array, backing = pool.acquire((480, 640))
+        assert array.shape == (480, 640) and array.dtype == np.uint8
+        pool.release(backing)
+
+        again, backing_again = pool.acquire((470, 630), np.uint8)
+        assert backing_again is backing
+        assert np.shares_memory(again, backing)
+        assert (pool.allocations, pool.reuses) == (1, 1)
+
+    def test_typed_views(self):
+        """Test buffers are viewed with the requested dtype and are contiguous"""
+        pool = BufferPool()
+        array, _ = pool.acquire((100, 200), np.float64)
+        assert array.dtype == np.float64
+        assert array.flags["C_CONTIGUOUS"]
+
+    def test_retention_is_bounded(self):
+        """Test buffers beyond max_bytes are dropped instead of kept"""
+        pool = BufferPool(max_bytes=2 * 1024 * 1024)
+        backings = [pool.acquire((1024, 1024))[1] for _ in range(3)]
+        for backing in backings:
+            pool.release(backing)
+        assert pool.retained_bytes == 2 * 1024 * 1024
+
+        pool.clear()
+        assert pool.retained_bytes == 0
+
+
+class TestBufferLease:
+    """Test suite for per-request buffer leases"""
+
+    def test_close_returns_buffers(self, monkeypatch):
+        """Test every borrowed buffer goes back to the pool, including ones taken on other threads"""
+        pool = BufferPool()
+        monkeypatch.setattr(buffers, "_pool", pool)
+        with BufferLease(enabled=True) as lease:
+            lease.get((256, 256))
+            worker = threading.Thread(target=lease.get, args=((256, 256),))
+            worker.start()
+            worker.join()
+            assert pool.retained_bytes == 0
+        assert pool.retained_bytes == 2 * bucket_size(256 * 256)
+
+    def test_discard_keeps_buffers_out_of_the_pool(self, monkeypatch):
+        """Test discarded buffers are never handed to another request"""
+        pool = BufferPool()
+        monkeypatch.setattr(buffers, "_pool", pool)
+        lease = BufferLease(enabled=True)
+        lease.get((256, 256))
+        lease.discard()
+        lease.close()
+        assert pool.retained_bytes == 0
+
+    def test_disabled(self, monkeypatch):
+        """Test a disabled lease allocates fresh arrays and never touches the pool"""
+        pool = BufferPool()
+        monkeypatch.setattr(buffers, "_pool", pool)
+        with BufferLease(enabled=False) as lease:
+            array = lease.get((64, 64), np.float64)
+        assert array.shape == (64, 64)
+        assert pool.allocations == 0 and pool.retained_bytes == 0
+
+
+class TestPooledPhotoPipeline:
+    """Test suite for the photo pipeline running on pooled buffers"""
+
+    def test_results_match_unpooled(self, monkeypatch):
+        """Test quality metrics and hashes are identical with and without pooling"""
+        content = photo_bytes()
+        pooled = [documents.process_document(content, "photo") for _ in range(2)]
+        monkeypatch.setattr(buffers, "BUFFER_POOL_ENABLED", False)
+        fresh = documents.process_document(content, "photo")
+
+        for key in ("image_quality", "perceptual_hash", "validation_passed"):
+            assert pooled[0][key] == pooled[1][key] == fresh[key]
+
+        gray = cv2.cvtColor(cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2GRAY)
+        assert fresh["image_quality"]["sharpness"] == round(float(cv2.Laplacian(gray, cv2.CV_64F).var()), 2)
+
+    def test_repeated_requests_reuse_buffers(self, monkeypatch):
+        """Test a steady stream of similar photos stops allocating image buffers"""
+        pool = BufferPool()
+        monkeypatch.setattr(buffers, "_pool", pool)
+        for seed in range(5):
+            documents.process_document(photo_bytes(seed=seed), "photo")
+        assert pool.allocations == 2
+        assert pool.reuses == 8
+
+    def test_deadline_discards_buffers(self, monkeypatch):
+        """Test buffers of a run abandoned at its deadline are not reused"""
+        pool = BufferPool()
+        monkeypatch.setattr(buffers, "_pool", pool)
+
+        def expire(image_bgr, buffers):
+            buffers.get(image_bgr.shape[:2])
+            raise DeadlineExceeded("test")
+
+        graph = documents.StageGraph([
+            documents.Stage(stage.name, expire, stage.inputs, stage.outputs) if stage.name == "grayscale" else stage
+            for stage in documents.DOCUMENT_PIPELINES["photo"].stages
+        ])
+        monkeypatch.setitem(documents.DOCUMENT_PIPELINES, "photo", graph)
+
+        with pytest.raises(DeadlineExceeded):
+            documents.process_document(photo_bytes(), "photo")
+        assert pool.retained_bytes == 0
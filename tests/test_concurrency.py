@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+from PIL import Image
+
+from app.services import documents, metrics
+from app.services.concurrency import AdaptiveLimiter
+from app.services.deadlines import Deadline, DeadlineExceeded
+from app.services.scheduler import FairScheduler
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def complete(limiter, latency, work_units=1.0, times=1):
+    """Run ``times`` saturated calls through the limiter with a given latency"""
+    for _ in range(times):
+        slots = limiter.limit
+        for _ in range(slots):
+            assert limiter.acquire(timeout=0)
+        for _ in range(slots):
+            limiter.release(latency, work_units)
+
+
+class TestAdaptiveLimiter:
+    """Test suite for the AIMD concurrency limiter"""
+
+    def test_grows_while_latency_is_on_target(self):
+        """Test the limit increases while saturated and latency is healthy"""
+        limiter = AdaptiveLimiter("test", initial_limit=2, max_limit=16, target_latency=1.0)
+        complete(limiter, 0.5, times=20)
+        assert limiter.limit > 2
+        assert metrics.get_gauge("test_concurrency_limit") == limiter.limit
+
+    def test_backs_off_when_latency_exceeds_target(self):
+        """Test the limit shrinks multiplicatively when latency is over target"""
+        limiter = AdaptiveLimiter("test", initial_limit=10, max_limit=16, target_latency=1.0)
+        complete(limiter, 3.0, times=5)
+        assert limiter.limit < 10
+        assert metrics.get_counter("test_concurrency_backoffs_total") >= 1
+
+    def test_respects_bounds(self):
+        """Test the limit never leaves [min_limit, max_limit]"""
+        limiter = AdaptiveLimiter("test", initial_limit=2, min_limit=2, max_limit=4, target_latency=1.0)
+        complete(limiter, 0.1, times=50)
+        assert limiter.limit == 4
+        complete(limiter, 10.0, times=50)
+        assert limiter.limit == 2
+
+    def test_latency_is_normalised_by_work(self):
+        """Test large documents are not mistaken for overload"""
+        limiter = AdaptiveLimiter("test", initial_limit=4, max_limit=16, target_latency=1.0)
+        complete(limiter, 4.0, work_units=8.0, times=20)
+        assert limiter.limit > 4
+        assert limiter.latency == pytest.approx(0.5)
+
+    def test_derived_target_from_baseline(self):
+        """Test without an explicit target the limiter backs off relative to its best latency"""
+        limiter = AdaptiveLimiter("test", initial_limit=4, max_limit=16, tolerance=1.5)
+        complete(limiter, 1.0, times=10)
+        assert limiter.target == pytest.approx(1.5)
+        before = limiter.limit
+        complete(limiter, 4.0, times=10)
+        assert limiter.limit < before
+
+    def test_invalid_bounds(self):
+        """Test an initial limit outside the bounds is rejected"""
+        with pytest.raises(ValueError):
+            AdaptiveLimiter("test", initial_limit=10, max_limit=4)
+
+    def test_acquire_blocks_at_limit(self):
+        """Test callers wait for a slot once the limit is reached"""
+        limiter = AdaptiveLimiter("test", initial_limit=1, max_limit=1)
+        assert limiter.acquire(timeout=0)
+        assert not limiter.acquire(timeout=0.01)
+
+        acquired = threading.Event()
+
+        def waiter():
+            if limiter.acquire(timeout=2):
+                acquired.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        limiter.release(0.1)
+        thread.join()
+        assert acquired.is_set()
+
+    def test_slot_gives_up_at_deadline(self):
+        """Test waiting for a slot is bounded by the request deadline"""
+        limiter = AdaptiveLimiter("test", initial_limit=1, max_limit=1)
+        limiter.acquire()
+        with pytest.raises(DeadlineExceeded):
+            with limiter.slot(deadline=Deadline(0.05)):
+                pass
+        assert metrics.get_counter("test_concurrency_rejections_total") == 1
+
+    def test_slot_timeout_counts_as_drop(self):
+        """Test a call that runs out of time backs the limit off"""
+        limiter = AdaptiveLimiter("test", initial_limit=1, min_limit=1, max_limit=8, target_latency=100.0)
+        limiter._limit = 4.0
+        for _ in range(4):
+            with pytest.raises(DeadlineExceeded):
+                with limiter.slot():
+                    raise DeadlineExceeded("OCR timed out")
+        assert limiter.limit < 4
+        assert limiter.inflight == 0
+
+
+class TestOCRLimiterIntegration:
+    """Test suite for the OCR stages running under the limiter"""
+
+    def test_work_units_are_megapixels(self):
+        """Test OCR work is measured in megapixels with a floor for small scans"""
+        assert documents.ocr_work_units(Image.new('RGB', (2000, 1500))) == pytest.approx(3.0)
+        assert documents.ocr_work_units(Image.new('RGB', (10, 10))) == documents.MIN_WORK_UNITS
+
+    def test_ocr_stage_holds_a_slot(self, monkeypatch):
+        """Test the OCR stage runs inside a limiter slot"""
+        limiter = AdaptiveLimiter("test", initial_limit=2, max_limit=4)
+        seen = {}
+
+        def fake_ocr(image, deadline=None):
+            seen["inflight"] = limiter.inflight
+            return {"text": "I-20", "mean_confidence": 90.0, "ocr_passes": 1}
+
+        monkeypatch.setattr(documents, "ocr_scheduler", FairScheduler(limiter))
+        monkeypatch.setattr(documents, "ocr_document_image", fake_ocr)
+        outputs = documents.document_ocr_stage(Image.new('RGB', (100, 100)), deadline=None)
+
+        assert outputs["extracted_text"] == "I-20"
+        assert seen["inflight"] == 1
+        assert limiter.inflight == 0
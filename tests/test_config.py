@@ -0,0 +1,13 @@
+import pytest
+
+from app.services.config import parse_pairs
+
+
+class TestParsePairs:
+    """Test suite for key:value settings read from the environment"""
+
+    def test_parse_pairs(self):
+        """Test key:value configuration strings"""
+        assert parse_pairs("a:1, b:2,") == {"a": "1", "b": "2"}
+        with pytest.raises(ValueError):
+            parse_pairs("a")
@@ -0,0 +1,175 @@
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from app.services import metrics, ocr
+from app.services.deadlines import Deadline, DeadlineExceeded, timeout_from_header
+from app.services.pipeline import Stage, StageGraph
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+class TestDeadline:
+    """Test suite for request deadlines"""
+
+    def test_remaining_and_expiry(self):
+        """Test remaining time counts down and expiry raises"""
+        clock = FakeClock()
+        deadline = Deadline(5, clock=clock)
+
+        assert deadline.remaining() == 5
+        deadline.check()
+
+        clock.now += 6
+        assert deadline.expired
+        assert deadline.remaining() == 0
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            deadline.check("OCR")
+        assert exc_info.value.reason == "deadline"
+
+    def test_cancel(self):
+        """Test cancelling ends the budget with the given reason"""
+        deadline = Deadline(60)
+        deadline.cancel("client_disconnect")
+
+        assert deadline.cancelled
+        assert deadline.remaining() == 0
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            deadline.timeout_for_call()
+        assert exc_info.value.reason == "client_disconnect"
+
+    def test_timeout_for_call_is_remaining_budget(self):
+        """Test blocking calls get the remaining budget as their timeout"""
+        clock = FakeClock()
+        deadline = Deadline(10, clock=clock)
+        clock.now += 4
+        assert deadline.timeout_for_call() == pytest.approx(6)
+
+    def test_timeout_from_header(self):
+        """Test header parsing, defaults and clamping"""
+        assert timeout_from_header(None, default=25) == 25
+        assert timeout_from_header("", default=25) == 25
+        assert timeout_from_header("3.5") == 3.5
+        assert timeout_from_header("100000") == 120.0
+        for value in ("abc", "0", "-1", "nan"):
+            with pytest.raises(ValueError):
+                timeout_from_header(value)
+
+
+class TestPipelineDeadlines:
+    """Test suite for deadline-driven cancellation in the stage graph"""
+
+    def test_expired_deadline_skips_remaining_stages(self):
+        """Test no stage starts after the deadline and skipped work is counted"""
+        ran = []
+        deadline = Deadline(60)
+
+        def first(source):
+            ran.append("first")
+            deadline.cancel("client_disconnect")
+            return {"a": 1}
+
+        graph = StageGraph([
+            Stage("first", first, ["source"], ["a"]),
+            Stage("second", lambda a: ran.append("second") or {"b": 2}, ["a"], ["b"]),
+            Stage("third", lambda b: ran.append("third") or {"c": 3}, ["b"], ["c"]),
+        ])
+
+        with pytest.raises(DeadlineExceeded) as exc_info:
+            graph.run({"source": 1}, deadline=deadline)
+
+        assert ran == ["first"]
+        assert exc_info.value.recorded
+        labels = {"reason": "client_disconnect"}
+        assert metrics.get_counter("deadline_requests_cancelled_total", labels) == 1
+        assert metrics.get_counter("deadline_stages_skipped_total", labels) == 2
+        assert metrics.get_counter("deadline_stage_seconds_wasted_total", labels) >= 0
+
+    def test_caller_is_released_while_stage_still_runs(self):
+        """Test the caller gets DeadlineExceeded without waiting for slow concurrent stages"""
+        release = threading.Event()
+
+        def slow(source):
+            release.wait(2)
+            return {"a": 1}
+
+        graph = StageGraph([
+            Stage("slow_a", slow, ["source"], ["a"]),
+            Stage("slow_b", lambda source: slow(source) and {"b": 1}, ["source"], ["b"]),
+        ])
+
+        start = time.perf_counter()
+        with pytest.raises(DeadlineExceeded):
+            graph.run({"source": 1}, deadline=Deadline(0.1))
+        release.set()
+
+        assert time.perf_counter() - start < 1
+
+    def test_stages_receive_deadline_artifact(self):
+        """Test stages can declare the deadline as an input"""
+        deadline = Deadline(30)
+        graph = StageGraph([Stage("a", lambda deadline: {"seen": deadline}, ["deadline"], ["seen"])])
+
+        assert graph.run({}, deadline=deadline).artifacts["seen"] is deadline
+
+
+class TestOCRDeadlines:
+    """Test suite for deadline-bounded OCR calls"""
+
+    def test_ocr_gets_remaining_budget_as_timeout(self, monkeypatch):
+        """Test tesseract is invoked with the deadline's remaining time"""
+        seen = {}
+
+        def image_to_data(image, config='', output_type=None, timeout=0):
+            seen["timeout"] = timeout
+            return {"text": [], "conf": [], "block_num": [], "par_num": [], "line_num": []}
+
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+        ocr.ocr_words(Image.new('RGB', (10, 10)), deadline=Deadline(8))
+
+        assert 7 < seen["timeout"] <= 8
+
+    def test_tesseract_timeout_becomes_deadline_exceeded(self, monkeypatch):
+        """Test a killed tesseract process surfaces as DeadlineExceeded and is counted"""
+        def image_to_data(image, config='', output_type=None, timeout=0):
+            raise RuntimeError("Tesseract process timeout")
+
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+        with pytest.raises(DeadlineExceeded):
+            ocr.ocr_words(Image.new('RGB', (10, 10)), deadline=Deadline(8))
+
+        assert metrics.get_counter("deadline_ocr_timeouts_total") == 1
+
+    def test_expired_deadline_skips_quality_pass(self, monkeypatch):
+        """Test the adaptive OCR does not start a second pass after the deadline"""
+        clock = FakeClock()
+        deadline = Deadline(5, clock=clock)
+        calls = []
+
+        def image_to_data(image, config='', output_type=None, timeout=0):
+            calls.append(config)
+            clock.now += 10
+            return {"text": ["LOW"], "conf": ["10"], "block_num": [1], "par_num": [1], "line_num": [1]}
+
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+        with pytest.raises(DeadlineExceeded):
+            ocr.adaptive_ocr(Image.new('RGB', (50, 50)), deadline=deadline)
+
+        assert len(calls) == 1
@@ -0,0 +1,114 @@
+import pytest
+
+from app.services.document_classifier import AhoCorasick, classify_document
+
+
+I20_TEXT = """FORM I-20 Certificate of Eligibility for Nonimmigrant Student Status
+SEVIS ID: N0012345678
+School Name: State University
+Program Start Date: 2024-08-20
+Estimated average costs $45,000.00 per year
+Designated School Official signature, Date: 05/01/2024
+"""
+
+JOB_OFFER_TEXT = """OFFER OF EMPLOYMENT
+Employer: Acme Robotics Inc
+We are pleased to offer you the position of Engineer with an annual salary of USD 120,000.
+Start date: 1 September 2024. Please update your records.
+"""
+
+BANK_STATEMENT_TEXT = """First National Bank - Account Statement
+Account Holder: Jane Doe
+Account Number: XXXX-XXXX-4521
+Statement Period 01/01/2024 - 03/31/2024
+Opening Balance $8,200.50
+Deposit 2,000.00
+Closing Balance: $10,200.50
+"""
+
+SPONSOR_TEXT = """Affidavit of Support
+I hereby sponsor my nephew and will bear all expenses for his studies.
+Name of Sponsor: Robert Doe
+Relationship to applicant: Uncle
+Annual income INR 2,500,000
+"""
+
+
+class TestAhoCorasick:
+    """Test suite for the multi-pattern automaton"""
+
+    def test_finds_all_overlapping_patterns(self):
+        """Test overlapping and nested phrases are all reported"""
+        automaton = AhoCorasick([("he", 1), ("she", 2), ("his", 3), ("hers", 4)])
+        matches = sorted((start, end, payload) for start, end, payload in automaton.iter_matches("ushers"))
+        assert matches == [(1, 4, 2), (2, 4, 1), (2, 6, 4)]
+
+    def test_no_matches(self):
+        """Test text without any phrase yields nothing"""
+        automaton = AhoCorasick([("abc", None)])
+        assert list(automaton.iter_matches("xyz")) == []
+
+
+class TestDocumentClassifier:
+    """Test suite for supporting document classification and field extraction"""
+
+    def test_classifies_i20_and_extracts_fields(self):
+        """Test an I-20 is tagged with its SEVIS ID, school and dates"""
+        result = classify_document(I20_TEXT)
+
+        assert result["document_class"] == "i20"
+        assert result["confidence"] > 0.5
+        assert result["fields"]["sevis_id"] == "N0012345678"
+        assert result["fields"]["school_name"] == "State University"
+        assert result["fields"]["start_date"] == "2024-08-20"
+        assert {"value": 45000.0, "currency": "USD"} in result["fields"]["amounts"]
+        assert "05/01/2024" in result["fields"]["dates"]
+
+    def test_classifies_job_offer(self):
+        """Test a job offer is tagged with employer and salary"""
+        result = classify_document(JOB_OFFER_TEXT)
+
+        assert result["document_class"] == "job_offer"
+        assert result["fields"]["employer_name"] == "Acme Robotics Inc"
+        assert result["fields"]["salary"] == {"value": 120000.0, "currency": "USD"}
+        assert result["fields"]["start_date"] == "1 September 2024"
+
+    def test_classifies_bank_statement(self):
+        """Test a bank statement is tagged with holder, account and balance"""
+        result = classify_document(BANK_STATEMENT_TEXT)
+
+        assert result["document_class"] == "bank_statement"
+        assert result["fields"]["account_holder"] == "Jane Doe"
+        assert result["fields"]["account_number"] == "XXXX-XXXX-4521"
+        assert result["fields"]["balance"] == {"value": 10200.5, "currency": "USD"}
+
+    def test_classifies_sponsor_letter(self):
+        """Test a sponsor letter is tagged with the sponsor name and INR amount"""
+        result = classify_document(SPONSOR_TEXT)
+
+        assert result["document_class"] == "sponsor_letter"
+        assert result["fields"]["sponsor_name"] == "Robert Doe"
+        assert {"value": 2500000.0, "currency": "INR"} in result["fields"]["amounts"]
+
+    def test_unrecognised_text_is_unknown(self):
+        """Test text without enough evidence is classified as unknown"""
+        result = classify_document("Lorem ipsum dolor sit amet")
+
+        assert result["document_class"] == "unknown"
+        assert result["confidence"] == 0.0
+        assert result["fields"] == {}
+
+    def test_keywords_do_not_match_inside_words(self):
+        """Test 'date' does not fire inside 'update'"""
+        result = classify_document("Please update 2024-01-01")
+        assert "dates" not in result["fields"]
+
+    def test_unlabelled_sevis_id(self):
+        """Test a bare SEVIS ID is still extracted"""
+        result = classify_document("Student record n0098765432 on file")
+        assert result["fields"]["sevis_id"] == "N0098765432"
+
+    @pytest.mark.parametrize("text", ["", "\n\n", "$", "SEVIS ID:"])
+    def test_degenerate_input(self, text):
+        """Test empty or truncated text does not raise"""
+        assert classify_document(text)["document_class"] == "unknown"
@@ -0,0 +1,132 @@
+import os
+import threading
+
+import pytest
+
+from app.services import metrics
+from app.storage.events import EventLog, open_event_log, segment_name
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = EventLog(str(tmp_path / "events"), commit_interval=0.001)
+    yield log
+    log.close()
+
+
+def event(i):
+    return {"application_id": f"app_{i}", "step": "select_visa_type", "data": {"visa_type": "F1"}}
+
+
+class TestEventLog:
+    """Test suite for the append-only step event log"""
+
+    def test_append_and_read_in_order(self, log):
+        """Test events come back in append order with cursors to resume from"""
+        cursors = [log.append(event(i)).result(timeout=5) for i in range(5)]
+        assert cursors[0] == 0 and cursors == sorted(cursors)
+        events, next_cursor = log.read(0, limit=3)
+        assert [e["application_id"] for e in events] == ["app_0", "app_1", "app_2"]
+        assert [e["cursor"] for e in events] == cursors[:3]
+        rest, end = log.read(next_cursor)
+        assert [e["application_id"] for e in rest] == ["app_3", "app_4"]
+        assert end == log.end()
+        assert log.read(end) == ([], end)
+
+    def test_group_commit_shares_fsyncs(self, tmp_path):
+        """Test events appended together are committed in fewer batches than events"""
+        log = EventLog(str(tmp_path / "events"), commit_interval=0.05)
+        futures = [log.append(event(i)) for i in range(50)]
+        cursors = [future.result(timeout=5) for future in futures]
+        log.close()
+        assert len(set(cursors)) == 50
+        assert metrics.get_counter("event_log_events_total") == 50
+        assert metrics.snapshot()["summaries"]["event_log_batch_size"]["count"] < 5
+
+    def test_segments_roll_over(self, tmp_path):
+        """Test a full segment is closed and reads continue across segments"""
+        log = EventLog(str(tmp_path / "events"), segment_bytes=300, commit_interval=0)
+        cursors = [log.append(event(i)).result(timeout=5) for i in range(20)]
+        assert len(log.segments()) > 3
+        assert log.segments()[1] in cursors
+        events, _ = log.read(0, limit=100)
+        assert [e["cursor"] for e in events] == cursors
+        log.close()
+
+    def test_deleted_segments_start_at_oldest(self, tmp_path):
+        """Test reading from 0 after old segments were removed starts at the first one left"""
+        log = EventLog(str(tmp_path / "events"), segment_bytes=300, commit_interval=0)
+        for i in range(20):
+            log.append(event(i)).result(timeout=5)
+        first, second = log.segments()[:2]
+        os.remove(os.path.join(log.directory, segment_name(first)))
+        events, _ = log.read(0, limit=1)
+        assert events[0]["cursor"] == second
+        log.close()
+
+    def test_bad_cursors(self, log):
+        """Test cursors inside an event or past the end are refused"""
+        log.append(event(1)).result(timeout=5)
+        with pytest.raises(ValueError):
+            log.read(3)
+        with pytest.raises(ValueError):
+            log.read(log.end() + 10)
+        with pytest.raises(ValueError):
+            log.read(-1)
+
+    def test_reopen_continues(self, tmp_path):
+        """Test a reopened log keeps its events and appends after them"""
+        directory = str(tmp_path / "events")
+        log = EventLog(directory)
+        log.append(event(1)).result(timeout=5)
+        log.close()
+        reopened = EventLog(directory)
+        cursor = reopened.append(event(2)).result(timeout=5)
+        assert cursor > 0
+        events, _ = reopened.read(0)
+        assert [e["application_id"] for e in events] == ["app_1", "app_2"]
+        reopened.close()
+
+    def test_writers_sharing_a_directory(self, tmp_path):
+        """Test two logs on one directory, as in two workers, interleave whole events"""
+        directory = str(tmp_path / "events")
+        logs = [EventLog(directory, segment_bytes=2000, commit_interval=0.001) for _ in range(2)]
+
+        def writer(log, prefix):
+            for i in range(50):
+                log.append({"application_id": f"{prefix}_{i}"}).result(timeout=5)
+
+        threads = [threading.Thread(target=writer, args=(log, prefix)) for log, prefix in zip(logs, "ab")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        events, _ = logs[0].read(0, limit=1000)
+        ids = [e["application_id"] for e in events]
+        assert sorted(ids) == sorted([f"a_{i}" for i in range(50)] + [f"b_{i}" for i in range(50)])
+        assert [i for i in ids if i.startswith("a")] == [f"a_{i}" for i in range(50)]
+        for log in logs:
+            log.close()
+
+    def test_close_commits_queued_events(self, tmp_path):
+        """Test events queued before close are written"""
+        log = EventLog(str(tmp_path / "events"), commit_interval=10)
+        future = log.append(event(1))
+        log.close()
+        assert future.result(timeout=5) == 0
+        with pytest.raises(RuntimeError):
+            log.append(event(2))
+
+    def test_temporary_log_removed(self):
+        """Test a log opened without a directory cleans up after itself"""
+        log = open_event_log("")
+        log.append(event(1)).result(timeout=5)
+        log.close()
+        assert not os.path.exists(log.directory)
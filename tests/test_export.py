@@ -0,0 +1,173 @@
+import gzip
+import json
+
+import pytest
+
+from app.cli import export as export_cli
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage import sqlite
+from app.storage.export import ExportFilter, chunked, export_lines, export_stream, parse_date
+from app.storage.memory import MemoryStore
+from app.storage.sqlite import SQLiteStore
+from app.storage.tiered import TieredStore
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def make_application(i, visa_type="F1", paid=False):
+    application = VisaApplication()
+    application.select_visa_type(visa_type)
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}"})
+    if paid:
+        application.pay_fee({"amount": 185.0, "currency": "USD"})
+    application.created_at = parse_date("2030-01-01") + i * 24 * 60 * 60
+    return application
+
+
+@pytest.fixture(params=["memory", "sqlite", "tiered"])
+def store(request, tmp_path, monkeypatch):
+    # Small pages so SQLite exports cross page boundaries
+    monkeypatch.setattr(sqlite, "SCAN_PAGE_SIZE", 3)
+    if request.param == "memory":
+        store = MemoryStore()
+    elif request.param == "sqlite":
+        store = SQLiteStore(str(tmp_path / "applications.db"))
+    else:
+        store = TieredStore(SQLiteStore(str(tmp_path / "applications.db")), memory_budget=4096)
+    for i in range(10):
+        store.insert("app", make_application(i, visa_type="F1" if i % 2 else "J1", paid=i >= 5))
+    yield store
+    store.close()
+
+
+def records(lines):
+    return [json.loads(line) for line in b"".join(lines).splitlines()]
+
+
+class TestExportFilter:
+    """Test suite for choosing which applications an export includes"""
+
+    def test_visa_type_and_state(self):
+        """Test visa type and workflow state filters"""
+        assert ExportFilter(visa_type="F1").matches(make_application(1))
+        assert not ExportFilter(visa_type="J1").matches(make_application(1))
+        assert ExportFilter(state="paid").matches(make_application(1, paid=True))
+        assert not ExportFilter(state="paid").matches(make_application(1))
+
+    def test_date_range_is_inclusive(self):
+        """Test both ends of the creation date range are included"""
+        filters = ExportFilter(created_from="2030-01-02", created_to="2030-01-03")
+        assert [i for i in range(5) if filters.matches(make_application(i))] == [1, 2]
+        assert not filters.matches(VisaApplication.from_dict({"visa_type": "F1"}))
+
+    def test_invalid_filters(self):
+        """Test unknown states and malformed or reversed dates are refused"""
+        with pytest.raises(ValueError):
+            ExportFilter(state="approved")
+        with pytest.raises(ValueError):
+            ExportFilter(created_from="01/02/2030")
+        with pytest.raises(ValueError):
+            ExportFilter(created_from="2030-02-01", created_to="2030-01-01")
+
+
+class TestExportStream:
+    """Test suite for streaming applications out of a store"""
+
+    def test_key_order_and_resume(self, store):
+        """Test an export in pages with cursors returns every application once, in key order"""
+        exported = []
+        cursor = None
+        while True:
+            page = records(export_lines(store, cursor, limit=4))
+            if not page:
+                break
+            exported.extend(page)
+            cursor = page[-1]["cursor"]
+        keys = [record["application_id"] for record in exported]
+        assert keys == sorted(store.keys_in_order())
+        assert exported[0]["application"]["full_name"] == store[keys[0]].full_name
+        assert metrics.get_counter("application_export_records_total") == 10
+
+    def test_filters(self, store):
+        """Test only matching applications are exported"""
+        exported = records(export_lines(store, filters=ExportFilter(visa_type="F1", state="paid")))
+        assert [record["application_id"] for record in exported] == ["app_10", "app_6", "app_8"]
+
+    def test_resume_after_deleted_key(self, store):
+        """Test a cursor whose application was deleted still resumes at the next key"""
+        del store["app_3"]
+        exported = records(export_lines(store, "app_3"))
+        assert exported[0]["application_id"] == "app_4"
+
+    def test_gzip_stream(self, store):
+        """Test a gzip'd export decompresses to the plain one"""
+        plain = b"".join(export_stream(store))
+        assert gzip.decompress(b"".join(export_stream(store, compress=True))) == plain
+
+    def test_chunks(self):
+        """Test lines are grouped into chunks of about the requested size"""
+        chunks = list(chunked((b"x" * 9 + b"\n" for _ in range(25)), chunk_bytes=100))
+        assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+class TestExportCli:
+    """Test suite for the export command"""
+
+    def test_export_and_resume(self, tmp_path):
+        """Test an interrupted export resumes where it stopped"""
+        database = str(tmp_path / "applications.db")
+        store = SQLiteStore(database)
+        for i in range(10):
+            store.insert("app", make_application(i))
+        store.close()
+        output = str(tmp_path / "export.ndjson")
+
+        assert export_cli.main(["--store", f"sqlite:{database}", "--output", output, "--limit", "4"]) == 0
+        # A line cut short by a crash is dropped before resuming
+        with open(output, "ab") as f:
+            f.write(b'{"cursor":"app_5","appl')
+        assert export_cli.main(["--store", f"sqlite:{database}", "--output", output]) == 0
+        with open(output, "rb") as f:
+            keys = [json.loads(line)["application_id"] for line in f]
+        assert keys == sorted(f"app_{i}" for i in range(1, 11))
+
+    def test_gzip_export_resumes_after_last_member(self, tmp_path, monkeypatch):
+        """Test a gzip'd export cut mid-chunk is trimmed to its last whole chunk and completed"""
+        monkeypatch.setattr("app.storage.export.EXPORT_CHUNK_BYTES", 1)
+        database = str(tmp_path / "applications.db")
+        store = SQLiteStore(database)
+        for i in range(6):
+            store.insert("app", make_application(i, visa_type="H1B"))
+        store.close()
+        output = str(tmp_path / "export.ndjson.gz")
+
+        assert export_cli.main(["--store", f"sqlite:{database}", "--output", output, "--limit", "3"]) == 0
+        with open(output, "ab") as f:
+            f.write(gzip.compress(b'{"cursor":"app_4"}\n')[:12])
+        assert export_cli.main(["--store", f"sqlite:{database}", "--output", output,
+                                "--visa-type", "H1B"]) == 0
+        with gzip.open(output, "rb") as f:
+            keys = [json.loads(line)["application_id"] for line in f]
+        assert keys == sorted(f"app_{i}" for i in range(1, 7))
+
+    def test_gzip_checkpoint_of_clean_file(self, tmp_path):
+        """Test a complete multi-member file is kept whole"""
+        path = str(tmp_path / "export.ndjson.gz")
+        with open(path, "wb") as f:
+            for i in range(3):
+                f.write(gzip.compress(json.dumps({"cursor": f"app_{i}"}).encode() + b"\n"))
+        end, last = export_cli.gzip_checkpoint(path)
+        assert end == len(open(path, "rb").read())
+        assert json.loads(last)["cursor"] == "app_2"
+
+    def test_invalid_filter(self, tmp_path):
+        """Test a bad filter stops the command before anything is written"""
+        with pytest.raises(SystemExit):
+            export_cli.main(["--store", "memory", "--output", str(tmp_path / "x.ndjson"), "--state", "nope"])
+        assert not (tmp_path / "x.ndjson").exists()
@@ -0,0 +1,241 @@
+import multiprocessing
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.services.ids import (
+    ID_ALPHABET, BloomFilter, FileBlockSource, IdFormat, IdService, IdSpaceExhausted, LocalBlockSource, Permutation,
+    id_service, open_block_source, store_confirmation
+)
+from app.storage.indexes import ApplicationIndexes
+from app.storage.memory import MemoryStore
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def issue_from_file(path, count, queue):
+    service = IdService(source=FileBlockSource(path), block_size=64)
+    queue.put([service.issue("ds160") for _ in range(count)])
+
+
+class TestIdFormat:
+    """Test suite for ID templates"""
+
+    def test_render_is_fixed_width(self):
+        """Test numbers become zero-padded codes over the alphabet"""
+        id_format = IdFormat("XXXXXXX")
+        assert id_format.render(0) == "AAAAAAA"
+        assert id_format.render(37) == "AAAAABB"
+        assert id_format.render(id_format.space - 1) == "9999999"
+
+    def test_literal_parts_and_year(self):
+        """Test text around the X run is kept and the year filled in"""
+        id_format = IdFormat("{year}-PAY-XXXX")
+        code = id_format.render(0)
+        assert code == f"{datetime.now().year}-PAY-AAAA"
+
+    def test_bad_templates(self):
+        """Test templates without exactly one run of X are rejected"""
+        with pytest.raises(ValueError):
+            IdFormat("PAY-0000")
+        with pytest.raises(ValueError):
+            IdFormat("XX-XX")
+        with pytest.raises(ValueError):
+            IdFormat("XXXX", alphabet="AA")
+
+
+class TestPermutation:
+    """Test suite for the keyed permutation of sequence numbers"""
+
+    def test_is_a_bijection(self):
+        """Test every number in a range maps to a distinct number in the same range"""
+        for size in (2, 37, 1000, 4096):
+            permutation = Permutation(size, b"key")
+            assert sorted(permutation(i) for i in range(size)) == list(range(size))
+
+    def test_key_changes_the_order(self):
+        """Test two keys give different codes for the same sequence"""
+        first = Permutation(36 ** 8, b"one")
+        second = Permutation(36 ** 8, b"two")
+        assert [first(i) for i in range(10)] != [second(i) for i in range(10)]
+
+
+class TestBloomFilter:
+    """Test suite for the reserved-code filter"""
+
+    def test_no_false_negatives_and_few_false_positives(self):
+        """Test added items are always found and others rarely are"""
+        bloom = BloomFilter(5000, error_rate=0.01)
+        for i in range(5000):
+            bloom.add(f"IN{i}")
+        assert all(f"IN{i}" in bloom for i in range(5000))
+        false_positives = sum(f"OUT{i}" in bloom for i in range(20000))
+        assert false_positives < 20000 * 0.03
+        assert len(bloom) == 5000
+
+
+class TestIdService:
+    """Test suite for issuing IDs"""
+
+    def test_default_formats(self):
+        """Test confirmation codes keep their 8-character shape and visa numbers their year"""
+        service = IdService()
+        for kind in ("ds160", "payment", "interview", "biometrics"):
+            code = service.issue(kind)
+            assert len(code) == 8 and set(code) <= set(ID_ALPHABET)
+        visa_number = service.issue("visa_number")
+        assert len(visa_number) == 10 and visa_number.startswith(str(datetime.now().year))
+
+    def test_unknown_kind(self):
+        """Test asking for an unconfigured kind fails clearly"""
+        with pytest.raises(ValueError):
+            IdService().issue("passport")
+
+    def test_unique_across_threads(self):
+        """Test threads drawing their own blocks never hand out the same code"""
+        service = IdService(block_size=16)
+        codes = []
+        lock = threading.Lock()
+
+        def issue_many():
+            issued = [service.issue("payment") for _ in range(2000)]
+            with lock:
+                codes.extend(issued)
+
+        threads = [threading.Thread(target=issue_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(codes)) == 8000
+        assert metrics.get_counter("id_blocks_claimed_total", {"kind": "payment"}) == 500
+
+    def test_reserved_codes_are_skipped(self):
+        """Test codes that already exist are never issued"""
+        key = b"fixed-key-123456"
+        upcoming = IdService(source=LocalBlockSource(key)).issue("ds160")
+        service = IdService(source=LocalBlockSource(key))
+        service.reserve("ds160", upcoming)
+        codes = [service.issue("ds160") for _ in range(10)]
+        assert upcoming not in codes
+        assert metrics.get_counter("id_reserved_skips_total", {"kind": "ds160"}) == 1
+
+    def test_issued_codes_are_not_held(self):
+        """Test issuing keeps nothing per code: the permutation alone keeps codes unique"""
+        service = IdService(source=LocalBlockSource(b"fixed-key-123456"))
+        codes = [service.issue("ds160") for _ in range(1000)]
+        assert len(set(codes)) == 1000
+        assert service._reserved == {} and service._filters == {}
+
+    def test_store_confirmation(self):
+        """Test filter hits are confirmed by looking the code up in the store's indexes"""
+        key = b"fixed-key-123456"
+        upcoming = IdService(source=LocalBlockSource(key)).issue("visa_number")
+        store = MemoryStore()
+        store.attach_indexes(ApplicationIndexes())
+        application = VisaApplication()
+        application.visa_number = upcoming
+        store.insert("app", application)
+
+        service = IdService(source=LocalBlockSource(key), confirm=store_confirmation(store))
+        assert service.reserve_existing(application for _, application in store.iter_sorted()) == 1
+        assert service._reserved == {}
+        assert service.issue("visa_number") != upcoming
+        assert metrics.get_counter("id_reserved_skips_total", {"kind": "visa_number"}) == 1
+
+    def test_filter_grows_with_reservations(self):
+        """Test reserving past the filter capacity keeps every code reserved"""
+        service = IdService(filter_capacity=10)
+        for i in range(100):
+            service.reserve("ds160", f"R{i:07d}")
+        assert len(service._filters["ds160"]) > 1
+        assert all(service._is_reserved("ds160", f"R{i:07d}") for i in range(100))
+
+    def test_external_confirmation(self):
+        """Test filter hits are confirmed through the given lookup instead of a set"""
+        key = b"fixed-key-123456"
+        upcoming = IdService(source=LocalBlockSource(key)).issue("ds160")
+        lookups = []
+
+        def confirm(kind, code):
+            lookups.append(code)
+            return code == upcoming
+
+        service = IdService(source=LocalBlockSource(key), confirm=confirm)
+        service.reserve("ds160", upcoming)
+        assert service._reserved == {}
+        assert service.issue("ds160") != upcoming
+        assert lookups[0] == upcoming
+
+    def test_reserve_existing_applications(self):
+        """Test the codes held by stored applications are reserved"""
+        application = VisaApplication()
+        application.ds160_confirmation_id = "ABCD1234"
+        application.payment_confirmation_id = "WXYZ9876"
+        service = IdService()
+        assert service.reserve_existing([application, VisaApplication()]) == 2
+        assert service._is_reserved("payment", "WXYZ9876")
+
+    def test_configure_format(self):
+        """Test a kind can be given its own format"""
+        service = IdService(formats={})
+        service.configure("receipt", "RCP-XXX", alphabet="0123456789")
+        codes = {service.issue("receipt") for _ in range(1000)}
+        assert len(codes) == 1000
+        assert all(code.startswith("RCP-") and code[4:].isdigit() for code in codes)
+        with pytest.raises(IdSpaceExhausted):
+            service.issue("receipt")
+
+
+class TestFileBlockSource:
+    """Test suite for sharing the ID space between worker processes"""
+
+    def test_counters_survive_reopening(self, tmp_path):
+        """Test a reopened file keeps its key and hands out later blocks"""
+        path = str(tmp_path / "ids.json")
+        first = FileBlockSource(path)
+        assert first.claim("ds160", 100) == 0
+        second = FileBlockSource(path)
+        assert second.key == first.key
+        assert second.claim("ds160", 100) == 100
+        assert second.claim("payment", 10) == 0
+
+    def test_file_source_is_the_default(self, tmp_path):
+        """Test workers share the counter file unless it is explicitly turned off"""
+        assert isinstance(open_block_source(str(tmp_path / "ids.json")), FileBlockSource)
+        assert isinstance(open_block_source(""), LocalBlockSource)
+        assert isinstance(id_service.source, FileBlockSource)
+
+    def test_unique_across_processes(self, tmp_path):
+        """Test worker processes sharing the file never issue the same code"""
+        path = str(tmp_path / "ids.json")
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        processes = [context.Process(target=issue_from_file, args=(path, 500, queue)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        codes = [code for _ in processes for code in queue.get(timeout=30)]
+        for process in processes:
+            process.join()
+        assert len(set(codes)) == 1500
+
+
+class TestApplicationCodes:
+    """Test suite for the codes handed out by applications"""
+
+    def test_confirmation_codes_are_distinct(self):
+        """Test many DS-160 submissions never share a confirmation code"""
+        codes = set()
+        for _ in range(2000):
+            application = VisaApplication()
+            application.fill_ds160({"full_name": "A B"})
+            codes.add(application.ds160_confirmation_id)
+        assert len(codes) == 2000
@@ -0,0 +1,107 @@
+import pytest
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.indexes import ApplicationIndexes
+from app.storage.memory import MemoryStore
+from app.storage.sqlite import SQLiteStore
+from app.storage.tiered import TieredStore
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def make_application(passport="A1234567", email="jane@example.com"):
+    application = VisaApplication()
+    application.fill_ds160({"full_name": "Jane Doe", "passport_number": passport, "dob": "1990-01-01",
+                            "nationality": "Indian", "email": email})
+    return application
+
+
+@pytest.fixture(params=["memory", "sqlite", "tiered"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryStore()
+    elif request.param == "sqlite":
+        store = SQLiteStore(str(tmp_path / "applications.db"))
+    else:
+        store = TieredStore(SQLiteStore(str(tmp_path / "applications.db")), memory_budget=4096)
+    store.attach_indexes(ApplicationIndexes())
+    yield store
+    store.close()
+
+
+class TestApplicationIndexes:
+    """Test suite for secondary indexes kept current by the store"""
+
+    def test_lookup_normalises_values(self, store):
+        """Test lookups match the way the request validators store values"""
+        key = store.insert("ds160", make_application(passport="X1234567", email="Jane.Doe@Example.com"))
+        application = store.get(key)
+        assert store.lookup("passport_number", " x1234567 ") == [key]
+        assert store.lookup("email", "jane.doe@example.COM") == [key]
+        assert store.lookup("ds160_confirmation_id", application.ds160_confirmation_id.lower()) == [key]
+        assert store.lookup("payment_confirmation_id", "NOPE0000") == []
+
+    def test_shared_values_list_every_application(self, store):
+        """Test a passport used for several applications finds all of them, oldest first"""
+        keys = [store.insert("ds160", make_application()) for _ in range(3)]
+        store.insert("ds160", make_application(passport="B7654321"))
+        assert store.lookup("passport_number", "A1234567") == keys
+        store.delete(keys[1])
+        assert store.lookup("passport_number", "A1234567") == [keys[0], keys[2]]
+
+    def test_overwrite_and_delete_remove_stale_entries(self, store):
+        """Test rewriting an application moves its entries and deleting drops them"""
+        key = store.insert("ds160", make_application(passport="C1111111"))
+        application = store.get(key)
+        application.passport_number = "D2222222"
+        store[key] = application
+        assert store.lookup("passport_number", "C1111111") == []
+        assert store.lookup("passport_number", "D2222222") == [key]
+        del store[key]
+        assert store.lookup("passport_number", "D2222222") == []
+        assert len(store.indexes) == 0
+
+    def test_unindexed_field(self, store):
+        """Test looking up by a field without an index fails clearly"""
+        with pytest.raises(ValueError):
+            store.lookup("full_name", "Jane Doe")
+
+    def test_rebuild_matches_live_indexes(self, store):
+        """Test indexes rebuilt from the stored data answer like the ones kept current"""
+        keys = [store.insert("ds160", make_application(passport=f"P{i % 3:07d}", email=f"u{i}@example.com"))
+                for i in range(9)]
+        store.insert("app", VisaApplication())
+        del store[keys[4]]
+        live = {(field, value): store.lookup(field, value)
+                for field, value in [("passport_number", f"P{i:07d}") for i in range(3)] + [("email", "u5@example.com")]}
+        rebuilt = ApplicationIndexes()
+        assert rebuilt.rebuild(store) == 8
+        assert {(field, value): rebuilt.lookup(field, value) for field, value in live} == live
+        assert metrics.get_gauge("application_index_entries") == 8
+
+
+class TestIndexesOnStartup:
+    """Test suite for rebuilding indexes when a store is reopened"""
+
+    def test_reopened_store_is_indexed(self, tmp_path):
+        """Test attaching indexes to a reopened SQLite store finds earlier applications"""
+        path = str(tmp_path / "applications.db")
+        store = SQLiteStore(path)
+        key = store.insert("ds160", make_application(passport="E5555555"))
+        store.close()
+
+        reopened = SQLiteStore(path)
+        reopened.attach_indexes(ApplicationIndexes())
+        assert reopened.lookup("passport_number", "e5555555") == [key]
+        reopened.close()
+
+    def test_store_without_indexes(self):
+        """Test lookups on a store with no indexes attached fail clearly"""
+        with pytest.raises(ValueError):
+            MemoryStore().lookup("email", "jane@example.com")
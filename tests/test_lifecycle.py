@@ -0,0 +1,138 @@
+import pytest
+
+from app.models.visa_application import WORKFLOW_STATES, VisaApplication
+from app.services import metrics
+from app.storage.lifecycle import DAY, DEFAULT_APPLICATION_TTLS, ExpiryJanitor, is_expired, parse_ttls
+from app.storage.memory import MemoryStore
+
+NOW = 1_800_000_000.0
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def application_in(state, idle_days):
+    application = VisaApplication()
+    application.select_visa_type("F1")
+    if state == "ds160_submitted":
+        application.fill_ds160({"full_name": "Jane Doe"})
+    elif state == "paid":
+        application.pay_fee({"amount": 185.0, "currency": "USD"})
+    elif state == "interview_missed":
+        application.attend_interview({"status": "missed"})
+    application.updated_at = NOW - idle_days * DAY
+    return application
+
+
+class TestWorkflowState:
+    """Test suite for deriving how far an application got"""
+
+    def test_states(self):
+        """Test each step moves the application to its state"""
+        application = VisaApplication()
+        assert application.workflow_state == "draft"
+        application.fill_ds160({"full_name": "Jane Doe"})
+        assert application.workflow_state == "ds160_submitted"
+        application.pay_fee({"amount": 185.0})
+        assert application.workflow_state == "paid"
+        application.schedule_interview({"location": "Mumbai", "date": "2030-01-01"})
+        assert application.workflow_state == "interview_scheduled"
+        application.upload_documents({"uploaded_documents": {"passport": {}}})
+        assert application.workflow_state == "documents_uploaded"
+        application.attend_interview({"status": "attended"})
+        assert application.workflow_state == "interview_attended"
+        application.visa_number = "2030ABCDEF"
+        assert application.workflow_state == "issued"
+
+    def test_reading_state_creates_nothing(self):
+        """Test the state of a fresh application is derived without allocating step records"""
+        application = VisaApplication()
+        assert application.workflow_state == "draft"
+        assert application._documents is None and application._attendance is None
+
+    def test_timestamps(self):
+        """Test steps move updated_at and records saved without timestamps have none"""
+        application = VisaApplication()
+        application.updated_at = 0
+        application.select_visa_type("J1")
+        assert application.updated_at > 0 and application.created_at > 0
+        restored = VisaApplication.from_dict({"visa_type": "J1"})
+        assert restored.created_at is None and restored.updated_at is None
+        assert VisaApplication.from_dict(application.to_dict()).updated_at == application.updated_at
+
+
+class TestTtls:
+    """Test suite for per-state lifetimes"""
+
+    def test_parse_overrides_defaults(self):
+        """Test configured TTLs replace defaults and 0 removes a limit"""
+        ttls = parse_ttls("draft:3600,issued:0,paid:60", defaults={"draft": 7 * DAY, "issued": DAY})
+        assert ttls == {"draft": 3600.0, "paid": 60.0}
+        with pytest.raises(ValueError):
+            parse_ttls("draft:-1")
+
+    def test_every_state_has_a_default(self):
+        """Test no workflow state is kept forever unless configured to be"""
+        assert set(DEFAULT_APPLICATION_TTLS) == set(WORKFLOW_STATES)
+        assert all(ttl > 0 for ttl in DEFAULT_APPLICATION_TTLS.values())
+
+    def test_is_expired(self):
+        """Test expiry depends on the state's TTL and the time since the last activity"""
+        ttls = {"draft": 7 * DAY}
+        assert is_expired(application_in("draft", 8), ttls, NOW)
+        assert not is_expired(application_in("draft", 6), ttls, NOW)
+        assert not is_expired(application_in("paid", 400), ttls, NOW)
+        assert not is_expired(VisaApplication.from_dict({}), ttls, NOW)
+
+
+class TestExpiryJanitor:
+    """Test suite for purging expired applications"""
+
+    def test_sweep_purges_in_batches(self):
+        """Test a sweep removes only expired applications, a batch at a time"""
+        store = MemoryStore()
+        for i in range(25):
+            store.insert("app", application_in("draft", 10))
+        keep = [store.insert("ds160", application_in("ds160_submitted", 10)),
+                store.insert("app", application_in("draft", 1)),
+                store.insert("payment", application_in("paid", 1000))]
+        janitor = ExpiryJanitor(store, ttls={"draft": 7 * DAY, "ds160_submitted": 30 * DAY}, batch_size=4,
+                                batch_pause=0, clock=lambda: NOW)
+        assert janitor.sweep() == 25
+        assert list(store) == keep
+        assert metrics.get_counter("application_store_expired_total", {"state": "draft"}) == 25
+        assert janitor.sweep() == 0
+
+    def test_rewrite_after_peek_is_kept(self):
+        """Test an application rewritten between the expiry check and the delete survives the sweep"""
+        store = MemoryStore()
+        key = store.insert("app", application_in("draft", 1))
+        # The sweep saw the copy from before the rewrite
+        stale = application_in("draft", 10)
+        store.peek = lambda peeked: stale
+        janitor = ExpiryJanitor(store, ttls={"draft": 7 * DAY}, batch_pause=0, clock=lambda: NOW)
+        assert janitor.sweep() == 0
+        assert key in store
+
+    def test_background_sweeps(self):
+        """Test a started janitor sweeps on its own and stops cleanly"""
+        store = MemoryStore()
+        store.insert("app", application_in("interview_missed", 100))
+        swept = []
+        janitor = ExpiryJanitor(store, ttls={"interview_missed": 90 * DAY}, interval=0.01, clock=lambda: NOW,
+                                after_sweep=lambda: swept.append(len(store)))
+        janitor.start()
+        try:
+            for _ in range(200):
+                if not len(store) and swept:
+                    break
+                janitor._stopped.wait(0.01)
+        finally:
+            janitor.stop()
+        assert len(store) == 0
+        # Runs after the sweep has purged
+        assert swept[0] == 0
@@ -0,0 +1,198 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.services import ocr
+
+
+def make_image_bytes(width=400, height=200):
+    """Create a blank PNG for OCR tests"""
+    image = Image.new('RGB', (width, height), color='white')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def fake_tesseract(passes):
+    """Build an image_to_data replacement that returns one canned pass per call"""
+    calls = []
+
+    def image_to_data(image, config='', output_type=None, timeout=0):
+        words, confs = passes[len(calls)]
+        calls.append({"size": image.size, "config": config})
+        return {
+            "text": words,
+            "conf": confs,
+            "block_num": [1] * len(words),
+            "par_num": [1] * len(words),
+            "line_num": list(range(1, len(words) + 1)),
+        }
+
+    return image_to_data, calls
+
+
+class TestAdaptiveOCR:
+    """Test suite for the confidence-driven adaptive OCR"""
+
+    def test_high_confidence_fast_pass_skips_quality_pass(self, monkeypatch):
+        """Test a confident fast pass is returned without a second pass"""
+        image_to_data, calls = fake_tesseract([(["PASSPORT", "A1234567"], ["95", "91"])])
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+
+        result = ocr.adaptive_extract_text(make_image_bytes())
+
+        assert result["text"] == "PASSPORT\nA1234567"
+        assert result["mean_confidence"] == 93.0
+        assert result["ocr_passes"] == 1
+        assert result["ocr_profile"] == "fast"
+        assert len(calls) == 1
+
+    def test_low_confidence_runs_quality_pass(self, monkeypatch):
+        """Test a low-confidence fast pass triggers the quality pass"""
+        image_to_data, calls = fake_tesseract([
+            (["PASSP0RT"], ["40"]),
+            (["PASSPORT"], ["88"]),
+        ])
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+
+        result = ocr.adaptive_extract_text(make_image_bytes())
+
+        assert result["text"] == "PASSPORT"
+        assert result["mean_confidence"] == 88.0
+        assert result["ocr_passes"] == 2
+        assert result["ocr_profile"] == "quality"
+        assert calls[1]["config"] == ocr.OCR_PROFILES["quality"]["config"]
+
+    def test_keeps_more_confident_pass(self, monkeypatch):
+        """Test the fast pass is kept when the quality pass is less confident"""
+        image_to_data, _ = fake_tesseract([
+            (["PASSPORT"], ["60"]),
+            (["PASS"], ["30"]),
+        ])
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+
+        result = ocr.adaptive_extract_text(make_image_bytes())
+
+        assert result["text"] == "PASSPORT"
+        assert result["ocr_passes"] == 2
+        assert result["ocr_profile"] == "fast"
+
+    def test_accept_callback_exits_early(self, monkeypatch):
+        """Test an accepted low-confidence fast pass exits early"""
+        image_to_data, calls = fake_tesseract([(["A1234567"], ["20"])])
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+
+        result = ocr.adaptive_extract_text(make_image_bytes(), accept=lambda text: "A1234567" in text)
+
+        assert result["ocr_passes"] == 1
+        assert len(calls) == 1
+
+    def test_fast_pass_downscales_large_images(self, monkeypatch):
+        """Test the fast profile downscales pages above its pixel budget"""
+        image_to_data, calls = fake_tesseract([(["TEXT"], ["99"])])
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+
+        ocr.adaptive_extract_text(make_image_bytes(2000, 2000))
+
+        width, height = calls[0]["size"]
+        assert width * height <= ocr.OCR_PROFILES["fast"]["max_pixels"]
+
+    def test_ignores_negative_confidence_entries(self, monkeypatch):
+        """Test non-word boxes with -1 confidence do not skew the mean"""
+        image_to_data, _ = fake_tesseract([(["", "WORD", " "], ["-1", "90", "-1"])])
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+
+        result = ocr.adaptive_extract_text(make_image_bytes())
+
+        assert result["text"] == "WORD"
+        assert result["mean_confidence"] == 90.0
+
+    def test_invalid_image_raises_value_error(self):
+        """Test undecodable bytes raise ValueError"""
+        with pytest.raises(ValueError) as exc_info:
+            ocr.adaptive_extract_text(b"not an image")
+        assert "Failed to extract text from image" in str(exc_info.value)
+
+
+def make_page(blocks, width=1700, height=2200):
+    """Draw blocks of text lines on a blank grayscale page"""
+    from PIL import ImageDraw, ImageFont
+
+    image = Image.new('L', (width, height), color=255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    for x, y, lines in blocks:
+        for i, line in enumerate(lines):
+            draw.text((x, y + i * 14), line, fill=0, font=font)
+    return image
+
+
+class TestRegionOCR:
+    """Test suite for text-region detection and parallel region OCR"""
+
+    def test_detect_text_regions_finds_blocks(self):
+        """Test neighbouring lines merge into one block per paragraph"""
+        import numpy as np
+
+        page = make_page([
+            (100, 100, ["Account statement", "Balance 1234.56", "Period Jan-Mar"]),
+            (100, 1200, ["Closing balance", "Signed"]),
+        ])
+
+        regions = ocr.detect_text_regions(np.asarray(page))
+
+        assert len(regions) == 2
+        assert regions[0][1] < regions[1][1]
+
+    def test_detect_text_regions_blank_page(self):
+        """Test a blank page has no regions"""
+        import numpy as np
+
+        assert ocr.detect_text_regions(np.full((500, 500), 255, dtype=np.uint8)) == []
+
+    def test_sort_reading_order_columns(self):
+        """Test side-by-side boxes are read left to right within a row"""
+        regions = [(500, 100, 100, 40), (50, 110, 100, 40), (50, 400, 100, 40)]
+
+        assert ocr.sort_reading_order(regions) == [
+            (50, 110, 100, 40), (500, 100, 100, 40), (50, 400, 100, 40)
+        ]
+
+    def test_merge_overlapping_regions(self):
+        """Test overlapping boxes are merged into their union"""
+        merged = ocr.merge_overlapping_regions([(0, 0, 10, 10), (5, 5, 10, 10), (50, 50, 5, 5)])
+
+        assert sorted(merged) == [(0, 0, 15, 15), (50, 50, 5, 5)]
+
+    def test_extract_text_by_regions_reassembles_in_reading_order(self, monkeypatch):
+        """Test region texts are joined in reading order regardless of completion order"""
+        page = make_page([
+            (100, 100, ["First block of text here"]),
+            (100, 1200, ["Second"]),
+        ])
+
+        def image_to_data(image, config='', output_type=None, timeout=0):
+            # Wider crop is the first block
+            word = "FIRST" if image.size[0] > 100 else "SECOND"
+            return {"text": [word], "conf": ["90"], "block_num": [1], "par_num": [1], "line_num": [1]}
+
+        monkeypatch.setattr(ocr.pytesseract, "image_to_data", image_to_data)
+
+        result = ocr.extract_text_by_regions(page.convert('RGB'))
+
+        assert result["text"] == "FIRST\nSECOND"
+        assert result["ocr_regions"] == 2
+        assert result["ocr_profile"] == "regions"
+        assert result["mean_confidence"] == 90.0
+
+    def test_extract_document_text_uses_regions_for_large_pages(self, monkeypatch):
+        """Test large pages are routed to region OCR and small ones to adaptive OCR"""
+        calls = []
+        monkeypatch.setattr(ocr, "extract_text_by_regions", lambda image, **kwargs: calls.append("regions") or {"text": ""})
+        monkeypatch.setattr(ocr, "adaptive_ocr", lambda image, **kwargs: calls.append("adaptive") or {"text": ""})
+
+        ocr.extract_document_text(make_image_bytes(2000, 2000))
+        ocr.extract_document_text(make_image_bytes(400, 200))
+
+        assert calls == ["regions", "adaptive"]
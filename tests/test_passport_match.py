@@ -0,0 +1,75 @@
+import random
+
+from app.services import documents
+from app.services.passport_match import candidate_ends, match_passport_number
+
+
+def edit_distances(text, pattern):
+    """Reference semi-global edit distance for every end position in ``text``"""
+    previous = [0] * (len(text) + 1)
+    for row, expected in enumerate(pattern, 1):
+        current = [row]
+        for column, char in enumerate(text, 1):
+            current.append(min(previous[column - 1] + (char != expected), previous[column] + 1,
+                               current[column - 1] + 1))
+        previous = current
+    return previous[1:]
+
+
+class TestPassportMatch:
+    """Test suite for confusion-aware passport number matching"""
+
+    def test_exact_match(self):
+        """Test an exact number is found with zero distance and its original position"""
+        match = match_passport_number("P<USA SMITH A1234567 <<", "A1234567")
+        assert match == {"start": 12, "end": 20, "matched": "A1234567", "distance": 0, "edits": 0,
+                         "confusions": 0}
+
+    def test_whitespace_and_case_are_ignored(self):
+        """Test spaces inside the number and lower case still match exactly"""
+        match = match_passport_number("Passport No. a 123 4567", "A1234567")
+        assert match["distance"] == 0
+        assert match["matched"] == "a 123 4567"
+
+    def test_ocr_confusions(self):
+        """Test 0/O, 1/I, 5/S and 8/B slips are counted as confusions, not edits"""
+        match = match_passport_number("NO: AI23456O", "A1234560")
+        assert (match["edits"], match["confusions"]) == (0, 2)
+        match = match_passport_number("NO: X8O1S67I", "XB015671", max_confusions=4)
+        assert (match["edits"], match["confusions"]) == (0, 4)
+        assert match_passport_number("NO: X8O1S67I", "XB015671") is None
+
+    def test_error_budget(self):
+        """Test one edit is tolerated by default and more than that is rejected"""
+        assert match_passport_number("A1234X67", "A1234567")["edits"] == 1
+        assert match_passport_number("A123567", "A1234567")["edits"] == 1
+        assert match_passport_number("A12XX567", "A1234567") is None
+        assert match_passport_number("A1234X67", "A1234567", max_edits=0) is None
+        assert match_passport_number("AI2345G0", "A1234560", max_confusions=1) is None
+
+    def test_short_numbers_need_exact_or_confusion_matches(self):
+        """Test numbers below the minimum length get no edits"""
+        assert match_passport_number("X12Y45", "X12345") is None
+        assert match_passport_number("XI2345", "X12345")["confusions"] == 1
+
+    def test_unrelated_number_rejected(self):
+        """Test a different passport number in the text does not match"""
+        assert match_passport_number("P<USA SMITH K9876543 <<", "A1234567") is None
+        assert match_passport_number("anything", "   ") is None
+
+    def test_bit_parallel_scan_matches_dynamic_programming(self):
+        """Test the Myers scan reports the same end positions as the reference DP"""
+        rng = random.Random(7)
+        for _ in range(300):
+            pattern = "".join(rng.choice("ACG1") for _ in range(rng.randint(1, 12)))
+            text = "".join(rng.choice("ACG1") for _ in range(rng.randint(0, 40)))
+            expected = [(end, distance) for end, distance in enumerate(edit_distances(text, pattern))
+                        if distance <= 2]
+            assert candidate_ends(text, pattern, 2) == expected
+
+    def test_passport_verdict_reports_match(self):
+        """Test the passport verdict passes on an OCR slip and reports how it matched"""
+        outputs = documents.passport_verdict_stage("P<USA SMITH AI234567", "A1234567")
+        assert outputs["validation"]["passed"] is True
+        assert "1 OCR confusions" in outputs["validation"]["message"]
+        assert outputs["passport_match"]["confusions"] == 1
@@ -0,0 +1,199 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.models.visa_application import VisaApplication
+from app.services.photo_hashes import (
+    HammingIndex, PhotoHashIndex, compute_photo_hashes, hamming_distance, parse_hash
+)
+from app.storage.memory import MemoryStore
+from app.storage.sqlite import SQLiteStore
+
+
+def make_photo(seed=0, size=(240, 320), fmt='PNG', quality=95):
+    """Draw a deterministic pseudo-portrait for hashing tests"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, color=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randint(0, size[0]), rng.randint(0, size[1])
+        x1, y1 = x0 + rng.randint(20, 120), y0 + rng.randint(20, 120)
+        draw.ellipse([x0, y0, x1, y1], fill=(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)))
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue(), image
+
+
+class TestPerceptualHashes:
+    """Test suite for pHash/dHash computation"""
+
+    def test_hashes_are_64_bit_hex(self):
+        """Test both hashes are 16 hex digits"""
+        content, _ = make_photo()
+        hashes = compute_photo_hashes(content)
+        assert len(hashes["phash"]) == 16
+        assert len(hashes["dhash"]) == 16
+
+    def test_reencoded_copy_is_near_duplicate(self):
+        """Test a resized JPEG copy stays within a few bits of the original"""
+        original, image = make_photo(seed=1)
+        buffer = io.BytesIO()
+        image.resize((180, 240)).save(buffer, format='JPEG', quality=70)
+
+        a = compute_photo_hashes(original)
+        b = compute_photo_hashes(buffer.getvalue())
+
+        assert hamming_distance(parse_hash(a["phash"]), parse_hash(b["phash"])) <= 6
+        assert hamming_distance(parse_hash(a["dhash"]), parse_hash(b["dhash"])) <= 10
+
+    def test_different_photos_are_far_apart(self):
+        """Test unrelated photos are well separated"""
+        a = compute_photo_hashes(make_photo(seed=2)[0])
+        b = compute_photo_hashes(make_photo(seed=3)[0])
+        assert hamming_distance(parse_hash(a["phash"]), parse_hash(b["phash"])) > 10
+
+    def test_invalid_image_raises_value_error(self):
+        """Test undecodable bytes raise ValueError"""
+        with pytest.raises(ValueError):
+            compute_photo_hashes(b"not an image")
+
+    def test_parse_hash_rejects_bad_input(self):
+        """Test malformed and oversized hashes are rejected"""
+        with pytest.raises(ValueError):
+            parse_hash("xyz")
+        with pytest.raises(ValueError):
+            parse_hash("1" * 17)
+
+
+class TestHammingIndex:
+    """Test suite for the multi-index Hamming-distance index"""
+
+    def test_query_matches_linear_scan(self):
+        """Test index results equal a brute-force scan"""
+        rng = random.Random(42)
+        index = HammingIndex()
+        hashes = [rng.getrandbits(64) for _ in range(2000)]
+        # Plant near-duplicates of the first hash
+        base = hashes[0]
+        for flips in (1, 3, 7, 10):
+            value = base
+            for bit in rng.sample(range(64), flips):
+                value ^= 1 << bit
+            hashes.append(value)
+        for i, value in enumerate(hashes):
+            index.add(value, {"application_id": f"app_{i}"})
+
+        for max_distance in (0, 3, 8, 10, 15):
+            expected = sorted(i for i, value in enumerate(hashes) if hamming_distance(base, value) <= max_distance)
+            found = sorted(int(match["item"]["application_id"][4:]) for match in index.query(base, max_distance))
+            assert found == expected
+
+    def test_query_orders_by_distance(self):
+        """Test matches are returned closest first"""
+        index = HammingIndex()
+        index.add(0b111, "far")
+        index.add(0b1, "near")
+        index.add(0, "exact")
+
+        assert [match["item"] for match in index.query(0, max_distance=5)] == ["exact", "near", "far"]
+
+    def test_query_limit(self):
+        """Test limit caps the number of matches"""
+        index = HammingIndex()
+        for i in range(5):
+            index.add(i, i)
+        assert len(index.query(0, max_distance=64, limit=2)) == 2
+
+    def test_query_rejects_invalid_distance(self):
+        """Test out-of-range distances raise ValueError"""
+        with pytest.raises(ValueError):
+            HammingIndex().query(0, max_distance=65)
+
+    def test_len(self):
+        """Test len reports the number of indexed hashes"""
+        index = HammingIndex()
+        index.add(5)
+        assert len(index) == 1
+
+    def test_remove(self):
+        """Test a removed entry is no longer returned or counted"""
+        index = HammingIndex()
+        kept = index.add(0, "kept")
+        removed = index.add(1, "removed")
+        index.remove(removed)
+        assert [match["item"] for match in index.query(0, max_distance=4)] == ["kept"]
+        assert len(index) == 1
+        assert kept == 0
+
+    def test_removed_ids_are_reused(self):
+        """Test adding after a remove takes the freed slot instead of growing the index"""
+        index = HammingIndex()
+        index.add(0, "kept")
+        for i in range(10):
+            entry_id = index.add(0xff, f"photo {i}")
+            index.remove(entry_id)
+        entry_id = index.add(0xff, "latest")
+        assert len(index.hashes) == 2 and len(index) == 2
+        assert [match["item"] for match in index.query(0xff, max_distance=0)] == ["latest"]
+
+
+def photo_application(phash: str, filename: str = "photo.png") -> VisaApplication:
+    application = VisaApplication()
+    application.upload_documents({
+        "uploaded_documents": {"photo": {"filename": filename}},
+        "validation_results": {"photo": {"validation_passed": True,
+                                         "perceptual_hash": {"phash": phash, "dhash": "0" * 16}}}
+    })
+    return application
+
+
+class TestPhotoHashIndex:
+    """Test suite for the near-duplicate index kept current by the store"""
+
+    def test_indexed_under_stored_key(self):
+        """Test a stored photo is found under the application's store key"""
+        store = MemoryStore()
+        store.attach_photo_hashes(PhotoHashIndex())
+        key = store.insert("documents", photo_application("00000000000000ff"))
+        store.insert("app", VisaApplication())
+        found = store.photo_duplicates("00000000000000fe", 2)
+        assert found["indexed_photos"] == 1
+        assert [(match["application_id"], match["distance"], match["filename"]) for match in found["matches"]] == \
+            [(key, 1, "photo.png")]
+
+    def test_rewrite_and_delete_drop_old_entry(self):
+        """Test rewriting an application replaces its photo and deleting it removes the photo"""
+        store = MemoryStore()
+        store.attach_photo_hashes(PhotoHashIndex())
+        key = store.insert("documents", photo_application("00000000000000ff"))
+        store[key] = photo_application("ffffffffffffffff")
+        assert store.photo_duplicates("00000000000000ff", 0)["matches"] == []
+        assert len(store.photo_duplicates("ffffffffffffffff", 0)["matches"]) == 1
+        del store[key]
+        assert store.photo_duplicates("ffffffffffffffff", 0) == {"indexed_photos": 0, "matches": []}
+
+    def test_applications_without_photos_stay_compact(self):
+        """Test indexing does not create a documents record on applications without one"""
+        store = MemoryStore()
+        store.attach_photo_hashes(PhotoHashIndex())
+        key = store.insert("app", VisaApplication())
+        assert store._applications[key]._documents is None
+
+    def test_rebuilt_from_stored_results(self, tmp_path):
+        """Test a reopened store's index holds the photos stored before the restart"""
+        path = str(tmp_path / "applications.db")
+        store = SQLiteStore(path)
+        key = store.insert("documents", photo_application("0123456789abcdef"))
+        store.close()
+
+        store = SQLiteStore(path)
+        store.attach_photo_hashes(PhotoHashIndex())
+        assert [match["application_id"] for match in store.photo_duplicates("0123456789abcdef", 0)["matches"]] == [key]
+        store.close()
+
+    def test_no_photo_hash_index(self):
+        """Test asking a store without a photo hash index fails clearly"""
+        with pytest.raises(ValueError):
+            MemoryStore().photo_duplicates("0" * 16, 0)
@@ -0,0 +1,155 @@
+import io
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from app.services import documents
+from app.services.pipeline import Stage, StageGraph
+
+
+def make_png(width=120, height=120):
+    """Create a blank PNG"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color='white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class TestStageGraph:
+    """Test suite for the declarative stage graph executor"""
+
+    def test_runs_stages_in_dependency_order(self):
+        """Test each stage sees the outputs of its upstream stages"""
+        graph = StageGraph([
+            Stage("double", lambda value: {"doubled": value * 2}, ["value"], ["doubled"]),
+            Stage("add", lambda doubled, value: {"total": doubled + value}, ["doubled", "value"], ["total"]),
+        ])
+
+        run = graph.run({"value": 3})
+
+        assert run.artifacts["total"] == 9
+        assert set(run.timings) == {"double", "add"}
+
+    def test_independent_stages_run_concurrently(self):
+        """Test stages with no dependency between them overlap"""
+        barrier = threading.Barrier(2, timeout=2)
+
+        def slow(name):
+            def stage(source):
+                barrier.wait()
+                time.sleep(0.05)
+                return {name: True}
+            return stage
+
+        graph = StageGraph([
+            Stage("a", slow("a"), ["source"], ["a"]),
+            Stage("b", slow("b"), ["source"], ["b"]),
+        ])
+
+        # Both stages must be running at once to pass the barrier
+        run = graph.run({"source": 1})
+        assert run.artifacts["a"] and run.artifacts["b"]
+
+    def test_shared_artifact_computed_once(self):
+        """Test an artifact used by several stages is produced once"""
+        calls = []
+        graph = StageGraph([
+            Stage("decode", lambda raw: calls.append(raw) or {"image": raw.upper()}, ["raw"], ["image"]),
+            Stage("x", lambda image: {"x": len(image)}, ["image"], ["x"]),
+            Stage("y", lambda image: {"y": image[0]}, ["image"], ["y"]),
+        ])
+
+        run = graph.run({"raw": "abc"})
+
+        assert calls == ["abc"]
+        assert run.artifacts["x"] == 3 and run.artifacts["y"] == "A"
+
+    def test_rejects_cycles(self):
+        """Test a stage closing a dependency cycle is rejected"""
+        graph = StageGraph([Stage("a", lambda b: {"a": 1}, ["b"], ["a"])])
+        with pytest.raises(ValueError) as exc_info:
+            graph.add_stage(Stage("b", lambda a: {"b": 1}, ["a"], ["b"]))
+        assert "cycle" in str(exc_info.value)
+        assert [stage.name for stage in graph.stages] == ["a"]
+
+    def test_rejects_duplicate_outputs(self):
+        """Test two stages may not produce the same artifact"""
+        graph = StageGraph([Stage("a", lambda: {"x": 1}, [], ["x"])])
+        with pytest.raises(ValueError):
+            graph.add_stage(Stage("b", lambda: {"x": 2}, [], ["x"]))
+
+    def test_missing_inputs(self):
+        """Test running without a required input raises ValueError"""
+        graph = StageGraph([Stage("a", lambda raw: {"x": raw}, ["raw"], ["x"])])
+        with pytest.raises(ValueError) as exc_info:
+            graph.run({})
+        assert "raw" in str(exc_info.value)
+
+    def test_stage_failure_propagates(self):
+        """Test the first stage error is re-raised to the caller"""
+        def fail(source):
+            raise ValueError("boom")
+
+        graph = StageGraph([
+            Stage("fail", fail, ["source"], ["x"]),
+            Stage("ok", lambda source: {"y": 1}, ["source"], ["y"]),
+            Stage("after", lambda x: {"z": x}, ["x"], ["z"]),
+        ])
+        with pytest.raises(ValueError) as exc_info:
+            graph.run({"source": 1})
+        assert str(exc_info.value) == "boom"
+
+    def test_missing_stage_output(self):
+        """Test a stage that omits a declared output raises ValueError"""
+        graph = StageGraph([Stage("a", lambda: {}, [], ["x"])])
+        with pytest.raises(ValueError):
+            graph.run({})
+
+
+class TestDocumentPipelines:
+    """Test suite for the per-document-type pipelines"""
+
+    def test_photo_pipeline_reports_stages(self):
+        """Test a photo result carries hashes, quality metrics and stage timings"""
+        result = documents.process_document(make_png(), "photo")
+
+        assert result["validation_passed"] is False
+        assert result["validation_message"] == "No face detected in photo"
+        assert len(result["perceptual_hash"]["phash"]) == 16
+        assert result["image_quality"]["width"] == 120
+        assert {"decode_image", "grayscale", "face_detection", "perceptual_hash"} <= set(result["stage_timings_ms"])
+
+    def test_photo_pipeline_invalid_image(self):
+        """Test an undecodable photo fails with an error message"""
+        result = documents.process_document(b"not an image", "photo")
+
+        assert result["validation_passed"] is False
+        assert result["validation_message"].startswith("Error processing document")
+
+    def test_plugged_in_check_fails_document(self, monkeypatch):
+        """Test a registered validator stage can fail a document without other changes"""
+        graph = StageGraph(documents.DOCUMENT_PIPELINES["photo"].stages)
+        monkeypatch.setitem(documents.DOCUMENT_PIPELINES, "photo", graph)
+        monkeypatch.setattr(documents, "detect_faces", lambda gray: True)
+
+        documents.register_stage("photo", Stage(
+            "min_resolution",
+            lambda image_quality: {"check:min_resolution": {
+                "passed": image_quality["width"] >= 600,
+                "message": "Photo resolution is below 600px"
+            }},
+            ["image_quality"],
+            ["check:min_resolution"],
+        ))
+
+        result = documents.process_document(make_png(), "photo")
+
+        assert result["validation_passed"] is False
+        assert result["validation_message"] == "Face detected in photo; Photo resolution is below 600px"
+        assert result["checks"]["min_resolution"]["passed"] is False
+
+    def test_register_stage_unknown_type(self):
+        """Test registering against an unknown document type raises ValueError"""
+        with pytest.raises(ValueError):
+            documents.register_stage("visa", Stage("x", lambda: {}, [], []))
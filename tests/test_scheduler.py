@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+from app.services import metrics
+from app.services.concurrency import AdaptiveLimiter
+from app.services.deadlines import Deadline, DeadlineExceeded
+from app.services.scheduler import (
+    DEFAULT_TENANT, FairScheduler, TenantQueueFull, configured_tenants, tenant_from_headers
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def fixed_limiter(limit=1):
+    return AdaptiveLimiter("test", initial_limit=limit, min_limit=limit, max_limit=limit)
+
+
+def wait_until(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "condition not reached"
+        time.sleep(0.001)
+
+
+class TestTenantKeys:
+    """Test suite for deriving the tenant of a request"""
+
+    def test_api_key_names_tenant(self):
+        """Test a configured API key maps to its tenant and wins over the header"""
+        headers = {"X-API-Key": "secret", "X-Tenant-ID": "other"}
+        assert tenant_from_headers(headers, api_keys={"secret": "agency-a"}) == "agency-a"
+
+    def test_unknown_api_key_is_public(self):
+        """Test an unmapped API key shares the public tenant, so rotating keys gains nothing"""
+        assert tenant_from_headers({"X-API-Key": "secret"}, api_keys={}) == DEFAULT_TENANT
+        assert tenant_from_headers({"X-API-Key": "other"}, api_keys={}) == DEFAULT_TENANT
+        assert metrics.get_counter("tenant_unrecognised_total", {"header": "X-API-Key"}) == 2
+
+    def test_tenant_header_and_default(self):
+        """Test a configured tenant header is used, otherwise the public tenant"""
+        tenants = frozenset({"consulate.mumbai"})
+        assert tenant_from_headers({"X-Tenant-ID": "consulate.mumbai"}, api_keys={}, tenants=tenants) == \
+            "consulate.mumbai"
+        assert tenant_from_headers({"X-Tenant-ID": "made.up"}, api_keys={}, tenants=tenants) == DEFAULT_TENANT
+        assert tenant_from_headers({}, api_keys={}) == DEFAULT_TENANT
+        with pytest.raises(ValueError):
+            tenant_from_headers({"X-Tenant-ID": "bad tenant!"}, api_keys={})
+
+    def test_configured_tenants(self):
+        """Test tenants come from API key mappings and weights"""
+        assert configured_tenants({"k": "agency-a"}, {"gold": 2.0}) == {"agency-a", "gold"}
+
+
+class TestFairScheduler:
+    """Test suite for weighted fair queuing across tenants"""
+
+    def run_queued(self, scheduler, jobs):
+        """Queue ``jobs`` of (tenant, work_units) in order behind a held slot; returns the grant order"""
+        order = []
+        assert scheduler.acquire("holder")
+        threads = []
+        for tenant, units in jobs:
+            def job(tenant=tenant, units=units):
+                with scheduler.slot(tenant, units):
+                    order.append(tenant)
+            before = scheduler.queued(tenant)
+            thread = threading.Thread(target=job)
+            thread.start()
+            wait_until(lambda: scheduler.queued(tenant) == before + 1)
+            threads.append(thread)
+        scheduler.release(0.01)
+        for thread in threads:
+            thread.join(2)
+        return order
+
+    def test_bulk_tenant_does_not_starve_others(self):
+        """Test a later single job overtakes a bulk tenant's backlog"""
+        scheduler = FairScheduler(fixed_limiter(), weights={})
+        order = self.run_queued(scheduler, [("bulk", 1.0)] * 4 + [("applicant", 1.0)])
+        assert order.index("applicant") <= 1
+
+    def test_weights_set_shares(self):
+        """Test a tenant with twice the weight is served twice as often under contention"""
+        scheduler = FairScheduler(fixed_limiter(), weights={"gold": 2.0, "basic": 1.0})
+        order = self.run_queued(scheduler, [("basic", 1.0)] * 6 + [("gold", 1.0)] * 6)
+        assert order[:6].count("gold") == 4
+
+    def test_alone_tenant_gets_everything(self):
+        """Test an uncontended tenant is served straight away"""
+        scheduler = FairScheduler(fixed_limiter(2), weights={})
+        with scheduler.slot("bulk"):
+            with scheduler.slot("bulk"):
+                assert scheduler.limiter.inflight == 2
+        assert scheduler.limiter.inflight == 0
+
+    def test_idle_tenants_are_forgotten(self):
+        """Test finish times of tenants with nothing queued are dropped once they are behind"""
+        scheduler = FairScheduler(fixed_limiter(), weights={})
+        self.run_queued(scheduler, [("bulk", 1.0)] * 3 + [("applicant", 1.0)])
+        assert scheduler._last_finish == {}
+        assert scheduler._queued == {}
+
+    def test_queue_limit(self):
+        """Test a tenant over its queue limit is rejected while others still queue"""
+        scheduler = FairScheduler(fixed_limiter(), weights={}, max_queued=1)
+        assert scheduler.acquire("holder")
+        waiter = threading.Thread(target=lambda: scheduler.release(0.0) if scheduler.acquire("bulk") else None)
+        waiter.start()
+        wait_until(lambda: scheduler.queued("bulk") == 1)
+
+        with pytest.raises(TenantQueueFull):
+            scheduler.acquire("bulk")
+        assert metrics.get_counter("test_tenant_rejections_total", {"tenant": "bulk"}) == 1
+        assert not scheduler.acquire("applicant", timeout=0.01)
+
+        scheduler.release(0.01)
+        waiter.join(2)
+        assert scheduler.queued("bulk") == 0
+
+    def test_deadline_while_queued(self):
+        """Test a queued job gives up at its deadline and leaves the queue"""
+        scheduler = FairScheduler(fixed_limiter(), weights={})
+        assert scheduler.acquire("holder")
+        with pytest.raises(DeadlineExceeded):
+            with scheduler.slot("bulk", deadline=Deadline(0.05)):
+                pass
+        assert scheduler.queued("bulk") == 0
+        scheduler.release(0.01)
+        with scheduler.slot("applicant"):
+            pass
+
+    def test_latency_metrics_per_tenant(self):
+        """Test queue and service times are recorded per tenant"""
+        scheduler = FairScheduler(fixed_limiter(), weights={})
+        with scheduler.slot("agency", work_units=2.0):
+            pass
+        assert metrics.get_mean("test_tenant_queue_seconds", {"tenant": "agency"}) is not None
+        assert metrics.get_mean("test_tenant_service_seconds", {"tenant": "agency"}) is not None
+        assert metrics.get_counter("test_tenant_work_units_total", {"tenant": "agency"}) == 2.0
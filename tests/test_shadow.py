@@ -0,0 +1,125 @@
+import pytest
+
+from app.services import metrics
+from app.services.shadow import (
+    ShadowReportStore, ShadowRunner, compare_results, load_candidate, text_similarity
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def make_result(text="PASSPORT A1234567", passed=True):
+    return {"document_type": "passport", "extracted_text": text, "validation_passed": passed,
+            "validation_message": ""}
+
+
+class TestShadowComparison:
+    """Test suite for comparing live and candidate results"""
+
+    def test_text_similarity(self):
+        """Test similarity ignores whitespace and scores partial matches"""
+        assert text_similarity("A  B\nC", "A B C") == 1.0
+        assert text_similarity("", "") == 1.0
+        assert 0 < text_similarity("PASSPORT A1234567", "PASSP0RT A1234567") < 1
+
+    def test_compare_passport_results(self):
+        """Test passport comparisons report passport-number agreement"""
+        comparison = compare_results("passport", make_result(), make_result(passed=False))
+        assert comparison["verdict_agrees"] is False
+        assert comparison["passport_match_agrees"] is False
+        assert "extracted_text" not in comparison
+
+    def test_compare_photo_results(self):
+        """Test photo comparisons report face-verdict agreement"""
+        comparison = compare_results("photo", make_result(), make_result())
+        assert comparison["face_verdict_agrees"] is True
+        assert comparison["text_similarity"] == 1.0
+
+    def test_load_candidate(self):
+        """Test candidate pipelines are imported from module:function specs"""
+        assert load_candidate("app.services.shadow:text_similarity") is text_similarity
+        with pytest.raises(ValueError):
+            load_candidate("app.services.shadow")
+
+
+class TestShadowRunner:
+    """Test suite for the background shadow runner"""
+
+    def make_runner(self, tmp_path, candidate, sample_rate=1.0, queue_size=16):
+        store = ShadowReportStore(str(tmp_path / "reports" / "shadow.jsonl"))
+        return ShadowRunner(candidate=candidate, sample_rate=sample_rate, store=store, queue_size=queue_size)
+
+    def test_disabled_without_candidate(self, tmp_path):
+        """Test nothing is sampled without a candidate or with a zero rate"""
+        assert not self.make_runner(tmp_path, None).submit(b"x", "passport", None, make_result(), 0.1)
+        runner = self.make_runner(tmp_path, lambda *args: make_result(), sample_rate=0)
+        assert not runner.submit(b"x", "passport", None, make_result(), 0.1)
+
+    def test_records_agreement_and_latency(self, tmp_path):
+        """Test sampled uploads are compared in the background and summarised"""
+        calls = []
+
+        def candidate(file_content, document_type, expected_passport_number):
+            calls.append((file_content, document_type, expected_passport_number))
+            return make_result(passed=document_type != "photo")
+
+        runner = self.make_runner(tmp_path, candidate)
+        assert runner.submit(b"passport", "passport", "A1234567", make_result(), 0.5)
+        assert runner.submit(b"photo", "photo", None, make_result(), 0.2)
+        assert runner.drain(timeout=5)
+
+        assert calls[0] == (b"passport", "passport", "A1234567")
+        records = list(runner.store.records())
+        assert len(records) == 2
+        assert all("extracted_text" not in record for record in records)
+
+        summary = runner.store.summary()
+        assert summary["passport"]["verdict_agreement"] == 1.0
+        assert summary["photo"]["verdict_agreement"] == 0.0
+        assert summary["passport"]["mean_latency_delta_ms"] < 0
+        assert metrics.get_counter("shadow_disagreements_total", {"document_type": "photo"}) == 1
+
+    def test_candidate_errors_are_recorded(self, tmp_path):
+        """Test a failing candidate is reported instead of crashing the worker"""
+        def candidate(*args):
+            raise RuntimeError("boom")
+
+        runner = self.make_runner(tmp_path, candidate)
+        record = runner.run_one(b"x", "supporting", None, make_result(), 0.1)
+        assert record["candidate_error"] == "RuntimeError: boom"
+        assert runner.store.summary()["supporting"] == {
+            "compared": 0, "candidate_errors": 1, "verdict_agreement": None,
+            "mean_text_similarity": None, "mean_latency_delta_ms": None,
+        }
+
+    def test_summary_does_not_reread_report(self, tmp_path):
+        """Test the summary is loaded from an existing report once, then kept from appends"""
+        runner = self.make_runner(tmp_path, lambda *args: make_result())
+        runner.run_one(b"x", "passport", None, make_result(), 0.1)
+
+        store = ShadowReportStore(runner.store.path)
+        assert store.summary()["passport"]["compared"] == 1
+        store.records = lambda: iter(())
+        store.append({"document_type": "passport", "verdict_agrees": False, "text_similarity": 0.5,
+                      "latency_delta_ms": 10.0})
+        assert store.summary()["passport"]["compared"] == 2
+        assert store.summary()["passport"]["verdict_agreement"] == 0.5
+
+    def test_full_queue_drops_samples(self, tmp_path):
+        """Test submit never blocks the response path when the queue is full"""
+        runner = self.make_runner(tmp_path, lambda *args: make_result(), queue_size=1)
+        runner._ensure_worker = lambda: None
+        assert runner.submit(b"x", "passport", None, make_result(), 0.1)
+        assert not runner.submit(b"y", "passport", None, make_result(), 0.1)
+        assert metrics.get_counter("shadow_dropped_total", {"document_type": "passport"}) == 1
+
+    def test_invalid_sample_rate(self, tmp_path):
+        """Test sample rates outside [0, 1] are rejected"""
+        runner = self.make_runner(tmp_path, None)
+        with pytest.raises(ValueError):
+            runner.configure(sample_rate=1.5)
@@ -0,0 +1,164 @@
+import gzip
+import os
+import threading
+
+import pytest
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.backends import open_store
+from app.storage.events import segment_name
+from app.storage.snapshots import SnapshotStore
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def make_application(i):
+    application = VisaApplication()
+    application.select_visa_type("F1")
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}", "dob": "1990-01-01",
+                            "nationality": "Indian", "email": f"applicant{i}@example.com"})
+    return application
+
+
+def contents(store):
+    return [(key, store[key].to_dict()) for key in store]
+
+
+class TestSnapshotStore:
+    """Test suite for the in-memory store recovered from snapshots and its log"""
+
+    def test_recovers_from_log_alone(self, tmp_path):
+        """Test writes and deletes come back after a restart with no snapshot"""
+        directory = str(tmp_path / "applications")
+        store = SnapshotStore(directory)
+        keys = [store.insert("ds160", make_application(i)) for i in range(5)]
+        del store[keys[1]]
+        application = store[keys[2]]
+        application.full_name = "Renamed"
+        store[keys[2]] = application
+        expected = contents(store)
+        store.close()
+
+        reopened = SnapshotStore(directory)
+        assert contents(reopened) == expected
+        assert metrics.get_gauge("application_recovery_replayed_records") == 7
+        assert reopened.insert("ds160", make_application(9)) == "ds160_6"
+        reopened.close()
+
+    def test_recovery_replays_only_after_snapshot(self, tmp_path):
+        """Test a restart loads the snapshot and replays just the writes made since"""
+        directory = str(tmp_path / "applications")
+        store = SnapshotStore(directory)
+        for i in range(10):
+            store.insert("app", make_application(i))
+        path = store.snapshot()
+        assert os.path.basename(path).startswith("snapshot-")
+        store.insert("app", make_application(10))
+        del store["app_3"]
+        expected = contents(store)
+        store.close()
+
+        reopened = SnapshotStore(directory)
+        assert contents(reopened) == expected
+        assert metrics.get_gauge("application_recovery_snapshot_records") == 10
+        assert metrics.get_gauge("application_recovery_replayed_records") == 2
+        reopened.close()
+
+    def test_snapshot_prunes_old_snapshots_and_log(self, tmp_path):
+        """Test a new snapshot replaces the previous one and the log segments it covers"""
+        directory = str(tmp_path / "applications")
+        store = SnapshotStore(directory)
+        store.log.segment_bytes = 2000
+        for i in range(20):
+            store.insert("app", make_application(i))
+        first_segments = store.log.segments()
+        store.snapshot()
+        store.insert("app", make_application(20))
+        store.snapshot()
+        assert len(os.listdir(store.snapshot_directory)) == 1
+        assert len(store.log.segments()) < len(first_segments)
+        assert not os.path.exists(os.path.join(store.log.directory, segment_name(0)))
+        store.close()
+        reopened = SnapshotStore(directory)
+        assert len(reopened) == 21
+        reopened.close()
+
+    def test_snapshot_while_writing(self, tmp_path):
+        """Test writes made during a snapshot are not lost on recovery"""
+        directory = str(tmp_path / "applications")
+        store = SnapshotStore(directory)
+        for i in range(200):
+            store.insert("app", make_application(i))
+
+        def writer():
+            for i in range(200):
+                key = f"app_{i + 1}"
+                application = store[key]
+                application.full_name = f"Updated {i}"
+                store[key] = application
+                store.insert("app", make_application(1000 + i))
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        store.snapshot()
+        thread.join()
+        expected = contents(store)
+        store.close()
+
+        reopened = SnapshotStore(directory)
+        assert contents(reopened) == expected
+        reopened.close()
+
+    def test_snapshot_is_compact(self, tmp_path):
+        """Test the snapshot holds one gzip'd line per application"""
+        store = SnapshotStore(str(tmp_path / "applications"))
+        for i in range(50):
+            store.insert("app", make_application(i))
+        path = store.snapshot()
+        with gzip.open(path, "rb") as snapshot:
+            assert len(snapshot.readlines()) == 50
+        assert metrics.get_gauge("application_snapshot_records") == 50
+        store.close()
+
+    def test_background_snapshots(self, tmp_path):
+        """Test the snapshotter takes a snapshot once enough has been logged"""
+        store = SnapshotStore(str(tmp_path / "applications"), snapshot_log_bytes=1, check_interval=0.01)
+        store.insert("app", make_application(1))
+        for _ in range(300):
+            if store.latest_snapshot() is not None:
+                break
+            store._stopped.wait(0.01)
+        assert store.latest_snapshot() is not None
+        store.close()
+
+    def test_torn_log_tail_is_repaired(self, tmp_path):
+        """Test a record cut short by a crash is dropped and later writes recover"""
+        directory = str(tmp_path / "applications")
+        store = SnapshotStore(directory)
+        store.insert("app", make_application(1))
+        store.close()
+        with open(os.path.join(directory, "log", segment_name(0)), "ab") as segment:
+            segment.write(b'{"op":"put","key":"app_2","appl')
+
+        reopened = SnapshotStore(directory)
+        assert list(reopened) == ["app_1"]
+        reopened.insert("app", make_application(2))
+        reopened.close()
+        recovered = SnapshotStore(directory)
+        assert list(recovered) == ["app_1", "app_2"]
+        recovered.close()
+        assert metrics.get_counter("event_log_torn_tail_repairs_total") == 1
+
+    def test_open_store(self, tmp_path):
+        """Test the snapshot scheme opens a SnapshotStore"""
+        store = open_store(f"snapshot:{tmp_path / 'applications'}")
+        assert isinstance(store, SnapshotStore)
+        store.close()
+        with pytest.raises(ValueError):
+            open_store("snapshot:")
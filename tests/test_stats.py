@@ -0,0 +1,187 @@
+import threading
+
+import pytest
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.memory import MemoryStore
+from app.storage.sqlite import SQLiteStore
+from app.storage.stats import ApplicationStats, StatsReconciler, contribution
+from app.storage.tiered import TieredStore
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def make_application(visa_type="F1", amount=None, currency="USD", method="credit_card", location=None,
+                     validation=None):
+    application = VisaApplication()
+    application.select_visa_type(visa_type)
+    if amount is not None:
+        application.pay_fee({"amount": amount, "currency": currency, "payment_method": method})
+    if location is not None:
+        application.schedule_interview({"location": location, "date": "2030-01-01"})
+    if validation is not None:
+        application.upload_documents({
+            "uploaded_documents": {document: {} for document in validation},
+            "validation_results": {document: {"validation_passed": passed} for document, passed in validation.items()},
+        })
+    return application
+
+
+@pytest.fixture(params=["memory", "sqlite", "tiered"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryStore()
+    elif request.param == "sqlite":
+        store = SQLiteStore(str(tmp_path / "applications.db"))
+    else:
+        store = TieredStore(SQLiteStore(str(tmp_path / "applications.db")), memory_budget=4096)
+    store.attach_stats(ApplicationStats())
+    yield store
+    store.close()
+
+
+class TestApplicationStats:
+    """Test suite for aggregate statistics kept current by the store"""
+
+    def test_counts_by_group(self, store):
+        """Test each write is counted under its visa type, state, payment, location and failed documents"""
+        store.insert("app", make_application("F1"))
+        store.insert("payment", make_application("F1", amount=185.0))
+        store.insert("payment", make_application("H1B", amount=205.5, currency="EUR", method="bank_transfer"))
+        store.insert("interview", make_application("J1", amount=160.0, location="Mumbai"))
+        store.insert("documents", make_application("J1", validation={"passport": True, "photo": False}))
+
+        stats = store.stats()
+        assert stats["applications"] == 5
+        assert stats["by_visa_type"] == {"F1": 2, "H1B": 1, "J1": 2}
+        assert stats["by_workflow_state"] == {"draft": 1, "paid": 2, "interview_scheduled": 1,
+                                              "documents_uploaded": 1}
+        assert stats["payments"]["count"] == 3
+        assert stats["payments"]["by_currency"] == {"USD": {"count": 2, "amount": 345.0},
+                                                    "EUR": {"count": 1, "amount": 205.5}}
+        assert stats["payments"]["by_method"] == {"credit_card": 2, "bank_transfer": 1}
+        assert stats["interviews"] == {"count": 1, "by_location": {"Mumbai": 1}}
+        assert stats["documents"] == {"failed": 1, "applications_with_failures": 1, "failed_by_type": {"photo": 1}}
+
+    def test_overwrite_and_delete_take_back_old_contribution(self, store):
+        """Test rewriting an application moves its counts and deleting it removes them"""
+        key = store.insert("app", make_application("F1"))
+        application = store.get(key)
+        application.pay_fee({"amount": 185.0, "currency": "USD", "payment_method": "credit_card"})
+        store[key] = application
+        stats = store.stats()
+        assert stats["by_workflow_state"] == {"paid": 1}
+        assert stats["payments"]["by_currency"]["USD"] == {"count": 1, "amount": 185.0}
+
+        del store[key]
+        stats = store.stats()
+        assert stats["applications"] == 0
+        assert stats["by_visa_type"] == {}
+        assert stats["payments"] == {"count": 0, "by_currency": {}, "by_method": {}}
+
+    def test_amounts_stay_exact(self, store):
+        """Test payment sums do not pick up float error from repeated adds and removals"""
+        keys = [store.insert("payment", make_application(amount=0.1)) for _ in range(30)]
+        for key in keys[:20]:
+            del store[key]
+        assert store.stats()["payments"]["by_currency"]["USD"]["amount"] == 1.0
+
+    def test_rebuild_matches_live_stats(self, store):
+        """Test stats counted from the stored data equal the ones kept current"""
+        keys = [store.insert("payment", make_application("F1" if i % 2 else "J1", amount=100.0 + i))
+                for i in range(8)]
+        del store[keys[3]]
+        rebuilt = ApplicationStats()
+        rebuilt.rebuild(store)
+        assert rebuilt.summary() == store.stats()
+
+    def test_missing_values_grouped_as_unknown(self):
+        """Test an application without a visa type or payment method is still counted"""
+        application = VisaApplication()
+        application.pay_fee({"amount": "not a number"})
+        assert contribution(application) == ("unknown", "paid", ("unknown", "unknown", 0), None, ())
+
+    def test_counting_creates_no_step_records(self):
+        """Test an application without documents is counted without gaining a documents record"""
+        store = MemoryStore()
+        store.attach_stats(ApplicationStats())
+        key = store.insert("app", make_application("F1"))
+        assert store._applications[key]._documents is None
+
+    def test_no_statistics(self):
+        """Test asking a store without statistics fails clearly"""
+        with pytest.raises(ValueError):
+            MemoryStore().stats()
+
+
+class TestStatsReconciliation:
+    """Test suite for checking incremental stats against a full scan"""
+
+    def test_no_drift(self, store):
+        """Test reconciling stats that were kept current finds nothing"""
+        for i in range(5):
+            store.insert("payment", make_application(amount=185.0))
+        assert store.statistics.reconcile(store) == []
+        assert store.stats()["drift"] == []
+        assert store.stats()["reconciled_at"] is not None
+        assert metrics.get_gauge("application_stats_drift") == 0
+
+    def test_drift_is_reported_and_corrected(self):
+        """Test a write that bypassed the listener shows up as drift and is fixed"""
+        store = MemoryStore()
+        store.attach_stats(ApplicationStats())
+        store.insert("app", make_application("F1"))
+        # Changed in place, as code holding a MemoryStore reference could do
+        store._applications["app_1"].pay_fee({"amount": 185.0, "currency": "USD"})
+        drift = store.statistics.reconcile(store)
+        assert "payments: 0 != 1" in drift
+        assert "workflow_state[draft]: 1 != 0" in drift
+        assert store.stats()["payments"]["count"] == 1
+        assert store.stats()["drift"] == drift
+        assert metrics.get_counter("application_stats_drift_total") == len(drift)
+        assert store.statistics.reconcile(store) == []
+
+    def test_writes_during_scan_are_not_drift(self):
+        """Test applications written while the scan runs keep their live counts"""
+        store = MemoryStore()
+        store.attach_stats(ApplicationStats())
+        keys = [store.insert("app", make_application()) for _ in range(10)]
+        scanned = store.iter_sorted
+
+        def iter_sorted(after=None):
+            for i, item in enumerate(scanned(after)):
+                if i == 5:
+                    # Behind the scan and ahead of it
+                    store.delete(keys[0])
+                    store.insert("payment", make_application(amount=185.0))
+                yield item
+
+        store.iter_sorted = iter_sorted
+        assert store.statistics.reconcile(store) == []
+        assert store.stats()["applications"] == 10
+        assert store.stats()["payments"]["count"] == 1
+
+    def test_reconciler_thread(self):
+        """Test the reconciler runs in the background until stopped"""
+        store = MemoryStore()
+        store.attach_stats(ApplicationStats())
+        reconciled = threading.Event()
+        reconcile = store.statistics.reconcile
+
+        def record(target):
+            drift = reconcile(target)
+            reconciled.set()
+            return drift
+
+        store.statistics.reconcile = record
+        reconciler = StatsReconciler(store, interval=0.01)
+        reconciler.start()
+        assert reconciled.wait(5)
+        reconciler.stop()
+        assert metrics.get_counter("application_stats_reconciliations_total") >= 1
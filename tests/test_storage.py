@@ -0,0 +1,291 @@
+import json
+import threading
+
+import pytest
+
+from app.models.visa_application import FIELDS, VisaApplication
+from app.storage.backends import open_store
+from app.storage.base import StoreListener
+from app.storage import memory
+from app.storage.memory import MemoryStore
+from app.storage.snapshots import SnapshotStore
+from app.storage.sqlite import SQLiteStore
+from app.storage.tiered import TieredStore
+
+
+def make_application(visa_type="F1", name="Jane Doe"):
+    application = VisaApplication()
+    application.select_visa_type(visa_type)
+    application.fill_ds160({"full_name": name, "passport_number": "A1234567", "dob": "1990-01-01",
+                            "nationality": "Indian", "email": "jane@example.com"})
+    return application
+
+
+class DeleteRecorder(StoreListener):
+    def __init__(self):
+        self.deleted = []
+
+    def on_delete(self, key):
+        self.deleted.append(key)
+
+
+@pytest.fixture(params=["memory", "sqlite", "tiered", "snapshot"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryStore()
+    elif request.param == "snapshot":
+        store = SnapshotStore(str(tmp_path / "applications"))
+    elif request.param == "sqlite":
+        store = SQLiteStore(str(tmp_path / "applications.db"), flush_interval=0.01)
+    else:
+        store = TieredStore(SQLiteStore(str(tmp_path / "applications.db"), flush_interval=0.01), memory_budget=4096)
+    yield store
+    store.close()
+
+
+class TestVisaApplicationSerialisation:
+    """Test suite for converting applications to and from plain data"""
+
+    def test_round_trip(self):
+        """Test every field survives to_dict/from_dict"""
+        application = make_application()
+        application.upload_documents({"uploaded_documents": {"photo": {"filename": "p.png"}},
+                                      "validation_results": {}, "extracted_text": {"photo": "ok"}})
+        restored = VisaApplication.from_dict(application.to_dict())
+        assert restored.to_dict() == application.to_dict()
+        assert restored.ds160_confirmation_id == application.ds160_confirmation_id
+
+    def test_unknown_fields_ignored(self):
+        """Test data from a newer version does not add attributes"""
+        restored = VisaApplication.from_dict({"visa_type": "J1", "not_a_field": 1})
+        assert restored.visa_type == "J1"
+        assert not hasattr(restored, "not_a_field")
+
+
+class TestVisaApplicationLayout:
+    """Test suite for the compact in-memory layout of applications"""
+
+    def test_no_instance_dict(self):
+        """Test applications use slots and untouched steps allocate nothing"""
+        application = VisaApplication()
+        assert not hasattr(application, "__dict__")
+        assert application.full_name is None and application.payment_amount == 0.0
+        assert application.interview_attended is False
+        assert application._ds160 is None and application._payment is None
+        with pytest.raises(AttributeError):
+            application.not_a_field = 1
+
+    def test_step_record_created_on_write(self):
+        """Test setting one field of a step creates only that step's record"""
+        application = make_application()
+        assert application._ds160 is not None
+        assert application._payment is None and application._documents is None
+        application.payment_status = "completed"
+        assert application._payment is not None and application.payment_data == {}
+
+    def test_dict_fields_can_be_filled_in_place(self):
+        """Test a dict field read from an untouched step keeps changes made to it"""
+        application = VisaApplication()
+        application.document_validation_results["passport"] = {"validation_passed": True}
+        assert application.document_validation_results == {"passport": {"validation_passed": True}}
+
+    def test_enum_like_strings_interned(self):
+        """Test equal statuses from separate decodes share one string object"""
+        first = VisaApplication.from_dict(json.loads('{"visa_type": "H1B", "payment_status": "completed"}'))
+        second = VisaApplication.from_dict(json.loads('{"visa_type": "H1B", "payment_status": "completed"}'))
+        assert first.visa_type is second.visa_type
+        assert first.payment_status is second.payment_status
+
+    def test_to_dict_has_every_field_without_creating_records(self):
+        """Test serialising a fresh application lists all fields and leaves it compact"""
+        application = VisaApplication()
+        data = application.to_dict()
+        assert set(data) == set(FIELDS)
+        assert data["documents"] == {} and data["interview_attended"] is False
+        assert application._documents is None
+        assert VisaApplication.from_dict(data)._ds160 is None
+
+
+    def test_peek_field_does_not_create_records(self):
+        """Test peeking at a step's fields reads defaults or stored values and creates nothing"""
+        application = VisaApplication()
+        assert application.peek_field("document_validation_results") == {}
+        assert application.peek_field("visa_type") is None
+        assert application._documents is None
+        application.upload_documents({"uploaded_documents": {"photo": {}}, "validation_results": {}})
+        assert application.peek_field("uploaded_documents") == {"photo": {}}
+
+
+class TestApplicationStore:
+    """Test suite for the application store backends"""
+
+    def test_put_get_delete(self, store):
+        """Test the mapping interface over a backend"""
+        store["app_1"] = make_application()
+        assert "app_1" in store
+        assert store["app_1"].full_name == "Jane Doe"
+        assert store.get("missing") is None
+        with pytest.raises(KeyError):
+            store["missing"]
+
+        assert store.delete("app_1") is True
+        assert store.delete("app_1") is False
+        assert "app_1" not in store
+        assert len(store) == 0
+
+    def test_replace_if(self, store):
+        """Test conditional writes only happen when the check passes on the current application"""
+        assert store.put_if_present("app_1", make_application()) is False
+        assert "app_1" not in store
+
+        store["app_1"] = make_application()
+        assert store.put_if_present("app_1", make_application(name="Renamed")) is True
+        assert store["app_1"].full_name == "Renamed"
+
+        assert store.replace_if("app_1", lambda current: current.full_name == "Jane Doe", None) is False
+        assert store.replace_if("app_1", lambda current: current.full_name == "Renamed", None) is True
+        assert "app_1" not in store and len(store) == 0
+
+    def test_insert_assigns_sequential_keys(self, store):
+        """Test new applications get increasing prefixed keys in insertion order"""
+        keys = [store.insert(prefix, make_application()) for prefix in ("app", "ds160", "app")]
+        assert keys == ["app_1", "ds160_2", "app_3"]
+        assert list(store) == keys
+        assert len(store) == 3
+
+    def test_put_many_and_overwrite(self, store):
+        """Test batch writes and that overwriting keeps a key's position"""
+        store.put_many([(f"app_{i}", make_application(name=f"Person {i}")) for i in range(1, 4)])
+        store["app_1"] = make_application(name="Renamed")
+        assert list(store.keys()) == ["app_1", "app_2", "app_3"]
+        assert store["app_1"].full_name == "Renamed"
+
+    def test_concurrent_inserts(self, store):
+        """Test keys stay unique under concurrent inserts"""
+        keys = []
+
+        def insert_many():
+            for _ in range(50):
+                keys.append(store.insert("app", make_application()))
+
+        threads = [threading.Thread(target=insert_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(keys)) == 200
+        assert len(store) == 200
+
+
+class TestMemoryStoreOrder:
+    """Test suite for ordered scans over a MemoryStore"""
+
+    def test_scan_follows_writes(self, monkeypatch):
+        """Test keys written and deleted after the first scan keep later scans in order"""
+        monkeypatch.setattr(memory, "RECENT_KEYS_LIMIT", 3)
+        store = MemoryStore()
+        store.put_many([(f"app_{i}", make_application()) for i in range(0, 10, 2)])
+        assert [key for key, _ in store.iter_sorted()] == ["app_0", "app_2", "app_4", "app_6", "app_8"]
+
+        store.put_many([(f"app_{i}", make_application()) for i in range(1, 10, 2)])
+        del store["app_4"]
+        del store["app_5"]
+        store["app_4"] = make_application()
+        assert [key for key, _ in store.iter_sorted("app_3")] == ["app_4", "app_6", "app_7", "app_8", "app_9"]
+        assert len([key for key, _ in store.iter_sorted()]) == 9
+
+    def test_pages_do_not_sort_every_key(self, monkeypatch):
+        """Test resuming a scan reuses the sorted keys instead of sorting the store again"""
+        store = MemoryStore()
+        store.put_many([(f"app_{i:03d}", make_application()) for i in range(100)])
+        list(store.iter_sorted())
+        sorted_keys = store._sorted_keys
+        monkeypatch.setattr(memory, "SortedKeys", None)
+        assert [key for key, _ in store.iter_sorted("app_097")] == ["app_098", "app_099"]
+        assert store._sorted_keys is sorted_keys
+
+
+class TestSQLiteStore:
+    """Test suite for SQLite-specific behaviour"""
+
+    def test_survives_reopen(self, tmp_path):
+        """Test applications and the key sequence persist across a restart"""
+        path = str(tmp_path / "applications.db")
+        store = SQLiteStore(path)
+        store.insert("app", make_application())
+        store.insert("ds160", make_application(name="John Roe"))
+        store.close()
+
+        reopened = SQLiteStore(path)
+        assert reopened["ds160_2"].full_name == "John Roe"
+        assert reopened.insert("app", make_application()) == "app_3"
+        reopened.close()
+
+    def test_wal_mode(self, tmp_path):
+        """Test the database runs in write-ahead-log mode"""
+        store = SQLiteStore(str(tmp_path / "applications.db"))
+        with store._reader() as connection:
+            assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        store.close()
+
+    def test_buffered_writes_are_readable_and_batched(self, tmp_path):
+        """Test reads see writes before they commit, and a full batch commits at once"""
+        store = SQLiteStore(str(tmp_path / "applications.db"), batch_size=3, flush_interval=60)
+        store.put("app_1", make_application())
+        assert store._pending
+        assert store["app_1"].visa_type == "F1"
+
+        store.put_many([("app_2", make_application()), ("app_3", make_application())])
+        assert not store._pending
+        with store._reader() as connection:
+            assert connection.execute("SELECT COUNT(*) FROM applications").fetchone()[0] == 3
+        store.close()
+
+    def test_concurrent_deletes_remove_once(self, tmp_path):
+        """Test only one of several racing deletes of a stored key reports and notifies the removal"""
+        store = SQLiteStore(str(tmp_path / "applications.db"), flush_interval=60)
+        listener = DeleteRecorder()
+        store.add_listener(listener)
+        for pending in (False, True):
+            store["app_1"] = make_application()
+            if not pending:
+                store.flush()
+            results = []
+            barrier = threading.Barrier(4)
+
+            def delete():
+                barrier.wait()
+                results.append(store.delete("app_1"))
+
+            threads = [threading.Thread(target=delete) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert sorted(results) == [False, False, False, True]
+            assert store.get("app_1") is None
+        assert listener.deleted == ["app_1", "app_1"]
+        store.close()
+
+    def test_returns_copies(self, tmp_path):
+        """Test changes to a fetched application need a put to stick"""
+        store = SQLiteStore(str(tmp_path / "applications.db"))
+        store["app_1"] = make_application()
+        store["app_1"].visa_type = "J1"
+        assert store["app_1"].visa_type == "F1"
+        store.close()
+
+
+class TestOpenStore:
+    """Test suite for choosing a backend from configuration"""
+
+    def test_urls(self, tmp_path):
+        """Test memory and sqlite URLs, and rejection of anything else"""
+        assert isinstance(open_store("memory"), MemoryStore)
+        store = open_store(f"sqlite:{tmp_path / 'applications.db'}")
+        assert isinstance(store, SQLiteStore)
+        store.close()
+        with pytest.raises(ValueError):
+            open_store("sqlite:")
+        with pytest.raises(ValueError):
+            open_store("postgres://db")
@@ -0,0 +1,148 @@
+import socket
+import threading
+
+import pytest
+
+from app.models.visa_application import VisaApplication
+from app.storage.backends import open_store
+from app.storage.memory import MemoryStore
+from app.storage import remote
+from app.storage.protocol import recv_frame, send_frame
+from app.storage.remote import RemoteStore, StoreUnavailable
+from app.storage.server import StoreServer
+from app.storage.sqlite import SQLiteStore
+
+
+def make_application(visa_type="F1"):
+    application = VisaApplication()
+    application.select_visa_type(visa_type)
+    return application
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def server(request, tmp_path):
+    store = MemoryStore() if request.param == "memory" else SQLiteStore(str(tmp_path / "applications.db"))
+    server = StoreServer(str(tmp_path / "store.sock"), store)
+    server.serve_in_background()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestStoreServer:
+    """Test suite for sharing one application store between worker processes"""
+
+    def test_read_after_write_across_workers(self, server):
+        """Test a write acknowledged to one worker is immediately visible to another"""
+        worker_a = RemoteStore(server.server_address)
+        worker_b = RemoteStore(server.server_address)
+
+        key = worker_a.insert("ds160", make_application("H1B"))
+        assert worker_b[key].visa_type == "H1B"
+
+        application = worker_b[key]
+        application.visa_type = "J1"
+        worker_b[key] = application
+        assert worker_a.get(key).visa_type == "J1"
+        assert list(worker_a) == [key] and len(worker_b) == 1
+
+        assert worker_a.delete(key) is True
+        assert key not in worker_b
+        worker_a.close()
+        worker_b.close()
+
+    def test_keys_unique_across_workers(self, server):
+        """Test concurrent inserts from several workers and threads never collide"""
+        workers = [RemoteStore(server.server_address) for _ in range(3)]
+        keys = []
+        lock = threading.Lock()
+
+        def insert_many(store):
+            for _ in range(30):
+                key = store.insert("app", make_application())
+                with lock:
+                    keys.append(key)
+
+        threads = [threading.Thread(target=insert_many, args=(store,)) for store in workers for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(keys)) == 180
+        assert workers[0].count() == 180
+        for store in workers:
+            store.close()
+
+    def test_put_many(self, server):
+        """Test batched writes through the server"""
+        store = RemoteStore(server.server_address)
+        store.put_many([(f"app_{i}", make_application()) for i in range(1, 6)])
+        assert len(store) == 5
+        store.close()
+
+    def test_iter_sorted_reads_pages(self, server, monkeypatch):
+        """Test an ordered scan through a worker is fetched a page at a time"""
+        monkeypatch.setattr(remote, "SCAN_PAGE_SIZE", 2)
+        store = RemoteStore(server.server_address)
+        store.put_many([(f"app_{i}", make_application()) for i in range(1, 6)])
+        calls = []
+        call = store.call
+
+        def record(op, *args):
+            calls.append(op)
+            return call(op, *args)
+
+        store.call = record
+        assert [key for key, _ in store.iter_sorted()] == ["app_1", "app_2", "app_3", "app_4", "app_5"]
+        assert calls == ["scan"] * 3
+        assert [key for key, _ in store.iter_sorted("app_3")] == ["app_4", "app_5"]
+        store.close()
+
+    def test_lookup_runs_on_the_server(self, server):
+        """Test an application written through one worker is found through another"""
+        worker_a = RemoteStore(server.server_address)
+        worker_b = RemoteStore(server.server_address)
+        application = make_application()
+        application.fill_ds160({"full_name": "Jane Doe", "passport_number": "S1234567"})
+        key = worker_a.insert("ds160", application)
+        assert worker_b.lookup("passport_number", "s1234567") == [key]
+        with pytest.raises(ValueError):
+            worker_b.lookup("full_name", "Jane Doe")
+        worker_a.close()
+        worker_b.close()
+
+    def test_stats_run_on_the_server(self, server):
+        """Test stats count applications written through every worker"""
+        worker_a = RemoteStore(server.server_address)
+        worker_b = RemoteStore(server.server_address)
+        worker_a.insert("app", make_application())
+        worker_b.insert("app", make_application())
+        assert worker_a.stats()["applications"] == 2
+        worker_a.close()
+        worker_b.close()
+
+    def test_server_errors_are_reraised(self, server):
+        """Test a bad request surfaces as the same error type in the worker"""
+        store = RemoteStore(server.server_address)
+        with pytest.raises(ValueError):
+            store.call("drop_everything")
+        store.close()
+
+    def test_protocol_frames(self, server):
+        """Test the wire format is length-prefixed JSON"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(server.server_address)
+        send_frame(sock, {"op": "count", "args": []})
+        assert recv_frame(sock) == {"ok": True, "result": 0}
+        sock.close()
+
+
+class TestRemoteStoreUnavailable:
+    """Test suite for workers whose store server is down"""
+
+    def test_unreachable_server(self, tmp_path):
+        """Test requests fail clearly, and opening the store does not"""
+        store = open_store(f"unix:{tmp_path / 'missing.sock'}")
+        assert isinstance(store, RemoteStore)
+        with pytest.raises(StoreUnavailable):
+            store.get("app_1")
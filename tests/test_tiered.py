@@ -0,0 +1,93 @@
+import pytest
+
+from app.models.visa_application import VisaApplication
+from app.services import metrics
+from app.storage.backends import open_store
+from app.storage.sqlite import SQLiteStore
+from app.storage.tiered import TieredStore, approximate_size
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def make_application(i):
+    application = VisaApplication()
+    application.select_visa_type("F1")
+    application.fill_ds160({"full_name": f"Applicant {i}", "passport_number": f"A{i:08d}", "dob": "1990-01-01",
+                            "nationality": "Indian", "email": f"applicant{i}@example.com"})
+    return application
+
+
+@pytest.fixture
+def cold(tmp_path):
+    store = SQLiteStore(str(tmp_path / "applications.db"), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+class TestApproximateSize:
+    """Test suite for estimating the memory an application holds"""
+
+    def test_grows_with_content(self):
+        """Test filling in a step adds its record and strings to the estimate"""
+        application = VisaApplication()
+        empty = approximate_size(application)
+        assert empty > 0
+        assert approximate_size(make_application(1)) > empty + 500
+
+
+class TestTieredStore:
+    """Test suite for the memory tier over a disk tier"""
+
+    def test_memory_stays_within_budget(self, cold):
+        """Test the least recently used applications spill once the budget is passed"""
+        one = approximate_size(make_application(0))
+        store = TieredStore(cold, memory_budget=10 * one)
+        keys = [store.insert("app", make_application(i)) for i in range(50)]
+        assert store.memory_bytes <= 10 * one
+        assert metrics.get_counter("application_store_spills_total") >= 40
+        assert metrics.get_gauge("application_store_memory_bytes") == store.memory_bytes
+        # Spilled applications are still there, read from disk
+        assert store.get(keys[0]).full_name == "Applicant 0"
+        assert store.count() == 50 and list(store) == keys
+
+    def test_get_brings_spilled_application_back(self, cold):
+        """Test a spilled application read once is served from memory afterwards"""
+        store = TieredStore(cold, memory_budget=1)
+        key = store.insert("app", make_application(1))
+        assert store.memory_bytes == 0
+        store.memory_budget = 10 ** 6
+        first = store.get(key)
+        assert store.get(key) is first
+        assert metrics.get_counter("application_store_memory_misses_total") == 1
+
+    def test_peek_does_not_fill_memory(self, cold):
+        """Test peeking at a spilled application leaves the memory tier alone"""
+        store = TieredStore(cold, memory_budget=1)
+        key = store.insert("app", make_application(1))
+        store.memory_budget = 10 ** 6
+        assert store.peek(key).full_name == "Applicant 1"
+        assert store.memory_bytes == 0
+
+    def test_delete_removes_both_tiers(self, cold):
+        """Test a deleted application is gone from memory and disk"""
+        store = TieredStore(cold)
+        key = store.insert("app", make_application(1))
+        assert store.delete(key) is True
+        assert store.get(key) is None and cold.get(key) is None
+        assert store.memory_bytes == 0
+
+    def test_reopen_continues_keys(self, tmp_path):
+        """Test keys keep counting up from what the disk tier holds"""
+        path = str(tmp_path / "applications.db")
+        store = open_store(f"tiered:{path}")
+        assert isinstance(store, TieredStore)
+        store.insert("app", make_application(1))
+        store.close()
+        reopened = open_store(f"tiered:{path}")
+        assert reopened.insert("app", make_application(2)) == "app_2"
+        reopened.close()
@@ -0,0 +1,153 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.uploads import (
+    UPLOAD_SESSION_TTL, UploadNotFoundError, UploadOffsetError, UploadSessionStore
+)
+
+
+class FakeClock:
+    """Manually advanced wall clock"""
+
+    def __init__(self):
+        self.now = datetime(2024, 1, 1, 12, 0)
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadSessionStore(str(tmp_path / "uploads"), clock=FakeClock())
+
+
+def start(store, data, **kwargs):
+    return store.create("APP123", kwargs.pop("document_type", "supporting"), "scan.png", len(data),
+                        hashlib.sha256(data).hexdigest(), **kwargs)
+
+
+class TestUploadSessionStore:
+    """Test suite for resumable upload sessions"""
+
+    def test_chunked_upload_round_trip(self, store):
+        """Test chunks appended in order reassemble the original file"""
+        data = os.urandom(10_000)
+        session = start(store, data)
+
+        for offset in range(0, len(data), 3000):
+            chunk = data[offset:offset + 3000]
+            store.append(session.upload_id, offset, chunk, hashlib.sha256(chunk).hexdigest())
+
+        assert store.get(session.upload_id).complete
+        assert store.finalize(session.upload_id) == data
+        assert store.get(session.upload_id).status == "processing"
+
+        store.complete(session.upload_id, {"validation_passed": True})
+        assert store.get(session.upload_id).to_dict()["validation_result"] == {"validation_passed": True}
+        assert not os.path.exists(session.path)
+
+    def test_offset_mismatch(self, store):
+        """Test a chunk at the wrong offset is rejected with the offset to resume from"""
+        data = b"a" * 100
+        session = start(store, data)
+        store.append(session.upload_id, 0, data[:40])
+
+        with pytest.raises(UploadOffsetError) as exc_info:
+            store.append(session.upload_id, 60, data[60:])
+        assert exc_info.value.expected_offset == 40
+
+    def test_resent_chunk_is_idempotent(self, store):
+        """Test re-sending an acknowledged chunk does not corrupt the upload"""
+        data = bytes(range(100))
+        session = start(store, data)
+        store.append(session.upload_id, 0, data[:50])
+        store.append(session.upload_id, 0, data[:50])
+        store.append(session.upload_id, 50, data[50:])
+
+        assert store.finalize(session.upload_id) == data
+
+    def test_chunk_checksum_mismatch(self, store):
+        """Test a corrupted chunk is refused and the offset does not move"""
+        data = b"x" * 64
+        session = start(store, data)
+        with pytest.raises(ValueError):
+            store.append(session.upload_id, 0, data, hashlib.sha256(b"other").hexdigest())
+        assert store.get(session.upload_id).received == 0
+
+    def test_chunk_past_declared_size(self, store):
+        """Test a chunk cannot grow the file beyond its declared size"""
+        session = start(store, b"abc")
+        with pytest.raises(ValueError):
+            store.append(session.upload_id, 0, b"abcd")
+
+    def test_finalize_incomplete(self, store):
+        """Test an incomplete upload cannot be finalized"""
+        session = start(store, b"abcdef")
+        store.append(session.upload_id, 0, b"abc")
+        with pytest.raises(UploadOffsetError):
+            store.finalize(session.upload_id)
+
+    def test_finalize_checksum_mismatch_resets(self, store):
+        """Test a whole-file checksum mismatch restarts the upload"""
+        session = store.create("APP123", "supporting", "scan.png", 6, hashlib.sha256(b"abcdef").hexdigest())
+        store.append(session.upload_id, 0, b"abcxyz")
+        with pytest.raises(ValueError):
+            store.finalize(session.upload_id)
+        assert store.get(session.upload_id).received == 0
+
+    def test_reopen_after_failed_validation(self, store):
+        """Test a session can be finalized again after validation did not finish"""
+        data = b"document"
+        session = start(store, data)
+        store.append(session.upload_id, 0, data)
+        store.finalize(session.upload_id)
+        with pytest.raises(UploadOffsetError):
+            store.finalize(session.upload_id)
+
+        store.reopen(session.upload_id)
+        assert store.finalize(session.upload_id) == data
+
+    def test_sessions_expire(self, store):
+        """Test idle sessions and their partial files are removed after the TTL"""
+        session = start(store, b"abc")
+        store.clock.now += UPLOAD_SESSION_TTL + timedelta(seconds=1)
+
+        with pytest.raises(UploadNotFoundError):
+            store.get(session.upload_id)
+        assert store.expire_sessions() == 1
+        assert not os.path.exists(session.path)
+
+    def test_sessions_shared_through_directory(self, store):
+        """Test another worker's store over the same directory can continue and finalize an upload"""
+        data = os.urandom(1000)
+        session = start(store, data)
+        store.append(session.upload_id, 0, data[:400])
+
+        other = UploadSessionStore(store.directory, clock=store.clock)
+        assert other.get(session.upload_id).received == 400
+        other.append(session.upload_id, 400, data[400:])
+        assert store.finalize(session.upload_id) == data
+        other.complete(session.upload_id, {"validation_passed": True}, "documents_7")
+        assert store.get(session.upload_id).to_dict()["stored_application_id"] == "documents_7"
+
+    def test_malformed_upload_id(self, store):
+        """Test ids that are not session ids never reach the filesystem"""
+        with pytest.raises(UploadNotFoundError):
+            store.get("../../etc/passwd")
+        with pytest.raises(UploadNotFoundError):
+            store.append("../x", 0, b"abc")
+
+    def test_create_validation(self, store):
+        """Test invalid document types, sizes and digests are rejected"""
+        digest = hashlib.sha256(b"x").hexdigest()
+        with pytest.raises(ValueError):
+            store.create("APP123", "visa", "scan.png", 1, digest)
+        with pytest.raises(ValueError):
+            store.create("APP123", "photo", "scan.png", 0, digest)
+        with pytest.raises(ValueError):
+            store.create("APP123", "photo", "scan.png", 1, "not-a-digest")
+        with pytest.raises(UploadNotFoundError):
+            store.get("missing")